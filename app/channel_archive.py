@@ -0,0 +1,330 @@
+import datetime
+import gzip
+import logging
+import os
+import shutil
+from typing import Any, AsyncIterator, Dict, IO
+
+import orjson
+
+
+MESSAGES_FILE = "messages.jsonl.gz"
+MANIFEST_FILE = "manifest.json"
+MEDIA_DIR = "media"
+
+
+class ArchivedPeer:
+    __slots__ = ("channel_id",)
+
+    def __init__(self, channel_id: int | None) -> None:
+        self.channel_id = channel_id
+
+
+class ArchivedFile:
+    """
+    Stands in for a Telethon `Photo` or `Document`: the Telegram reference needed to fetch the file again.
+    """
+
+    __slots__ = ("id", "access_hash", "file_reference", "dc_id", "mime_type", "size")
+
+    def __init__(
+        self,
+        id: int,
+        access_hash: int | None = None,
+        file_reference: str | None = None,
+        dc_id: int | None = None,
+        mime_type: str | None = None,
+        size: int | None = None,
+    ) -> None:
+        self.id = id
+        self.access_hash = access_hash
+        self.file_reference = file_reference
+        self.dc_id = dc_id
+        self.mime_type = mime_type
+        self.size = size
+
+
+class ArchivedMedia:
+    __slots__ = ("photo", "document")
+
+    def __init__(self, photo: ArchivedFile | None = None, document: ArchivedFile | None = None) -> None:
+        self.photo = photo
+        self.document = document
+
+
+class ArchivedMessage:
+    """
+    Stands in for a Telethon `Message`, exposing the attributes the scraper reads.
+    """
+
+    __slots__ = (
+        "id",
+        "sender_id",
+        "text",
+        "date",
+        "post_author",
+        "views",
+        "peer_id",
+        "grouped_id",
+        "media",
+        "archived_media",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        sender_id: int | None,
+        text: str | None,
+        date: datetime.datetime | None,
+        post_author: str | None,
+        views: int | None,
+        peer_id: ArchivedPeer,
+        grouped_id: int | None,
+        media: ArchivedMedia | None,
+        archived_media: ArchivedMedia | None,
+    ) -> None:
+        self.id = id
+        self.sender_id = sender_id
+        self.text = text
+        self.date = date
+        self.post_author = post_author
+        self.views = views
+        self.peer_id = peer_id
+        self.grouped_id = grouped_id
+        self.media = media
+        self.archived_media = archived_media
+
+    @property
+    def message(self) -> str | None:
+        return self.text
+
+
+def _file_reference(file: Any) -> Dict[str, Any]:
+    file_reference = getattr(file, "file_reference", None)
+    return {
+        "id": file.id,
+        "access_hash": getattr(file, "access_hash", None),
+        "file_reference": file_reference.hex() if isinstance(file_reference, bytes) else file_reference,
+        "dc_id": getattr(file, "dc_id", None),
+        "mime_type": getattr(file, "mime_type", None),
+        "size": getattr(file, "size", None),
+    }
+
+
+def media_reference(message: Any) -> Dict[str, Any] | None:
+    """
+    Extract the Telegram reference of a message's photo or document, or None if it has neither.
+    """
+    media = getattr(message, "media", None)
+    if media is None:
+        return None
+    photo = getattr(media, "photo", None)
+    if photo is not None:
+        return {"kind": "photo", **_file_reference(photo)}
+    document = getattr(media, "document", None)
+    if document is not None:
+        return {"kind": "document", **_file_reference(document)}
+    return None
+
+
+def message_to_record(message: Any) -> Dict[str, Any]:
+    """
+    Serialize the fields of a Telethon message that the scraper reads into a plain dict.
+    """
+    peer_id = getattr(message, "peer_id", None)
+    return {
+        "id": message.id,
+        "sender_id": message.sender_id,
+        "text": message.text,
+        "date": message.date,
+        "post_author": message.post_author,
+        "views": message.views,
+        "channel_id": getattr(peer_id, "channel_id", None),
+        "grouped_id": getattr(message, "grouped_id", None),
+        "media": media_reference(message),
+    }
+
+
+def record_to_message(record: Dict[str, Any], media_available: bool) -> ArchivedMessage:
+    """
+    Rebuild a message from its archived record.
+
+    If the media bytes were not archived, the message is replayed without `media`; its reference is still available as
+    `archived_media`.
+    """
+    archived_media = None
+    reference = record.get("media")
+    if reference:
+        file = ArchivedFile(**{key: value for key, value in reference.items() if key != "kind"})
+        if reference["kind"] == "photo":
+            archived_media = ArchivedMedia(photo=file)
+        else:
+            archived_media = ArchivedMedia(document=file)
+
+    date = record.get("date")
+    return ArchivedMessage(
+        id=record["id"],
+        sender_id=record.get("sender_id"),
+        text=record.get("text"),
+        date=datetime.datetime.fromisoformat(date) if date else None,
+        post_author=record.get("post_author"),
+        views=record.get("views"),
+        peer_id=ArchivedPeer(record.get("channel_id")),
+        grouped_id=record.get("grouped_id"),
+        media=archived_media if media_available else None,
+        archived_media=archived_media,
+    )
+
+
+class ChannelArchiveWriter:
+    """
+    Writes messages to a channel archive: a directory with gzipped JSON lines of messages, a manifest, and optionally
+    the media bytes, one file per message id.
+    """
+
+    def __init__(self, path: str, channel_name: str, include_media: bool = False) -> None:
+        self._path = path
+        self._channel_name = channel_name
+        self._include_media = include_media
+        self._count = 0
+        self._media_count = 0
+        self._file: IO[bytes] | None = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def include_media(self) -> bool:
+        return self._include_media
+
+    def open(self) -> None:
+        os.makedirs(os.path.join(self._path, MEDIA_DIR), exist_ok=True)
+        self._file = gzip.open(os.path.join(self._path, MESSAGES_FILE), "wb", compresslevel=6)
+
+    def write(self, message: Any) -> None:
+        assert self._file is not None, "The archive must be opened before writing"
+        self._file.write(orjson.dumps(message_to_record(message)) + b"\n")
+        self._count += 1
+
+    def write_media(self, message_id: int, file_path: str) -> None:
+        shutil.copyfile(file_path, os.path.join(self._path, MEDIA_DIR, str(message_id)))
+        self._media_count += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        manifest = {
+            "channel_name": self._channel_name,
+            "recorded_at": datetime.datetime.now(datetime.timezone.utc),
+            "messages": self._count,
+            "media": self._media_count,
+            "include_media": self._include_media,
+        }
+        with open(os.path.join(self._path, MANIFEST_FILE), "wb") as f:
+            f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+
+
+class RecordingTelegramClient:
+    """
+    Wraps a `TelegramClient`, writing every message it fetches (and, optionally, every media item it downloads) to a
+    channel archive. It can be passed to `scrape()` in place of the client it wraps.
+    """
+
+    def __init__(self, client: Any, archive_path: str, channel_name: str, include_media: bool = False) -> None:
+        self._client = client
+        self._writer = ChannelArchiveWriter(archive_path, channel_name, include_media)
+        # maps the media objects handed out to the ids of the messages they belong to
+        self._media_owners: Dict[int, int] = {}
+        self._logger = logging.getLogger(__name__)
+
+    async def __aenter__(self) -> "RecordingTelegramClient":
+        await self._client.__aenter__()
+        self._writer.open()
+        self._logger.info(f"Recording channel archive to {self._writer.path}")
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self._writer.close()
+        await self._client.__aexit__(*args)
+
+    async def iter_messages(self, entity: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        async for message in self._client.iter_messages(entity, **kwargs):
+            self._writer.write(message)
+            if self._writer.include_media and message.media is not None:
+                for attribute in ("photo", "document"):
+                    file = getattr(message.media, attribute, None)
+                    if file is not None:
+                        self._media_owners[id(file)] = message.id
+            yield message
+
+    async def download_media(self, media: Any, file: str, **kwargs: Any) -> Any:
+        result = await self._client.download_media(media, file=file, **kwargs)
+        message_id = self._media_owners.pop(id(media), None)
+        if message_id is not None:
+            self._writer.write_media(message_id, file)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+class ArchiveReplayClient:
+    """
+    Replays a channel archive through the subset of the `TelegramClient` interface that `scrape()` uses, without any
+    network access. Messages are streamed from disk as fast as they are consumed.
+    """
+
+    def __init__(self, archive_path: str) -> None:
+        self._path = archive_path
+        with open(os.path.join(archive_path, MANIFEST_FILE), "rb") as f:
+            self._manifest = orjson.loads(f.read())
+        # maps the ids of the media files handed out to the ids of the messages they belong to
+        self._media_owners: Dict[int, int] = {}
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        return self._manifest
+
+    async def __aenter__(self) -> "ArchiveReplayClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        return None
+
+    def _media_file(self, message_id: int) -> str:
+        return os.path.join(self._path, MEDIA_DIR, str(message_id))
+
+    async def iter_messages(self, entity: Any = None, limit: int | None = None, offset_id: int = 0, **kwargs: Any) -> AsyncIterator[ArchivedMessage]:
+        """
+        Yield the archived messages in their recorded order (newest first).
+
+        :param entity: ignored, the archive holds a single channel.
+        :param limit: the maximum number of messages to yield.
+        :param offset_id: if set, only messages with a lower id are yielded, like Telethon does.
+        """
+        yielded = 0
+        with gzip.open(os.path.join(self._path, MESSAGES_FILE), "rb") as f:
+            for line in f:
+                record = orjson.loads(line)
+                if offset_id and record["id"] >= offset_id:
+                    continue
+                if limit is not None and yielded >= limit:
+                    return
+                media_available = bool(record.get("media")) and os.path.exists(self._media_file(record["id"]))
+                if media_available:
+                    self._media_owners[record["media"]["id"]] = record["id"]
+                yield record_to_message(record, media_available)
+                yielded += 1
+
+    async def download_media(self, media: ArchivedFile, file: str, **kwargs: Any) -> str:
+        """
+        Copy the archived bytes of a media item yielded by `iter_messages` to `file`.
+        """
+        message_id = self._media_owners.get(media.id)
+        if message_id is None:
+            raise FileNotFoundError(f"Media {media.id} is not part of the archive at {self._path}")
+        shutil.copyfile(self._media_file(message_id), file)
+        return file
@@ -0,0 +1,271 @@
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, List, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.sdk.models import (
+    DeferredMediaRecord,
+    ImageTransformRecord,
+    KernelPlancksterSourceData,
+    LLMUsage,
+    MediaAlbum,
+)
+
+
+class ScrapeCheckpoint(BaseModel):
+    """
+    The progress of a scrape job, saved periodically so that a failed job can resume where it stopped.
+
+    Messages are fetched newest first, so every message older than `last_message_id` is still to be processed.
+
+    @attr last_message_id: the id of the last fully processed message, or None if no message was processed yet
+    @attr processed_messages: the number of fully processed messages
+    @attr registered_media: ids of the messages whose media were already uploaded and registered
+    @attr augmented_rows: the augmented rows emitted so far, keyed by message id
+    @attr source_data_list: the source data registered so far
+    @attr image_transforms: the photos downscaled before upload so far
+    @attr deferred_media: the media not uploaded so far
+    @attr duplicate_messages: the near-duplicate messages found so far, keyed by the message they duplicate
+    @attr llm_usage: the LLM usage so far, counted against the budget of the resumed job
+    @attr albums: the albums found so far, keyed by grouped id
+    @attr saves: the number of times the checkpoint was saved, including the changes appended to its journal
+    """
+
+    job_id: int
+    tracer_id: str
+    channel_name: str
+    last_message_id: int | None = None
+    processed_messages: int = 0
+    registered_media: List[int] = []
+    augmented_rows: Dict[int, List[Any]] = {}
+    source_data_list: List[KernelPlancksterSourceData] = []
+    image_transforms: List[ImageTransformRecord] = []
+    deferred_media: List[DeferredMediaRecord] = []
+    duplicate_messages: Dict[str, List[str]] = {}
+    llm_usage: LLMUsage = Field(default_factory=LLMUsage)
+    albums: Dict[int, MediaAlbum] = {}
+    saves: int = 0
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class CheckpointChanges(BaseModel):
+    """
+    The changes to a checkpoint since it was last saved, one line of its journal.
+
+    The progress and the LLM usage replace the saved ones; the other fields hold what was added since.
+    """
+
+    saves: int
+    last_message_id: int | None = None
+    processed_messages: int = 0
+    registered_media: List[int] = []
+    augmented_rows: Dict[int, List[Any]] = {}
+    source_data_list: List[KernelPlancksterSourceData] = []
+    image_transforms: List[ImageTransformRecord] = []
+    deferred_media: List[DeferredMediaRecord] = []
+    duplicate_messages: Dict[str, List[str]] = {}
+    llm_usage: LLMUsage = Field(default_factory=LLMUsage)
+    albums: Dict[int, MediaAlbum] = {}
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+    def apply(self, checkpoint: ScrapeCheckpoint) -> None:
+        if self.saves <= checkpoint.saves:
+            # already in the checkpoint, rewritten before its journal was removed
+            return
+        checkpoint.saves = self.saves
+        checkpoint.last_message_id = self.last_message_id
+        checkpoint.processed_messages = self.processed_messages
+        checkpoint.registered_media.extend(self.registered_media)
+        checkpoint.augmented_rows.update(self.augmented_rows)
+        checkpoint.source_data_list.extend(self.source_data_list)
+        checkpoint.image_transforms.extend(self.image_transforms)
+        checkpoint.deferred_media.extend(self.deferred_media)
+        for original, duplicates in self.duplicate_messages.items():
+            checkpoint.duplicate_messages.setdefault(original, []).extend(duplicates)
+        checkpoint.llm_usage = self.llm_usage
+        # albums are small, a changed album is saved whole
+        checkpoint.albums.update(self.albums)
+        checkpoint.updated_at = self.updated_at
+
+
+@dataclass
+class _Saved:
+    """
+    What was saved of a checkpoint so far: the size of each of its collections, which only grow while a job runs.
+    """
+
+    registered_media: set[int] = field(default_factory=set)
+    augmented_rows: int = 0
+    source_data_list: int = 0
+    image_transforms: int = 0
+    deferred_media: int = 0
+    duplicate_messages: Dict[str, int] = field(default_factory=dict)
+    albums: Dict[int, Tuple[int, int]] = field(default_factory=dict)
+    checkpoint_bytes: int = 0
+    journal_bytes: int = 0
+
+
+@dataclass
+class CheckpointWrite:
+    """
+    A checkpoint, or the changes to it since it was last saved, serialized to be written by `CheckpointStore.write`.
+    """
+
+    path: str
+    data: str
+    journal: bool
+
+
+class CheckpointStore:
+    """
+    Saves checkpoints as JSON files, one per (tracer_id, job_id, channel_name).
+
+    A saved checkpoint is not rewritten every time: the changes since the last save are appended to a journal next to
+    it, one JSON line per save, and the checkpoint is rewritten with them once the journal is larger than it. The bytes
+    written grow with the size of the checkpoint, not with its square.
+
+    Rewrites are atomic, so a crash while saving leaves the previous checkpoint intact; a line of the journal cut short by
+    a crash is ignored.
+    """
+
+    def __init__(self, directory: str = "checkpoints", every: int = 50) -> None:
+        self._directory = directory
+        self._every = every
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # by checkpoint path, what this store saved of it; the first save of a checkpoint rewrites it
+        self._saved: Dict[str, _Saved] = {}
+
+    @property
+    def every(self) -> int:
+        """
+        Save a checkpoint every this many processed messages.
+        """
+        return self._every
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    def path(self, tracer_id: str, job_id: int, channel_name: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_.+-]", "_", f"{tracer_id}-{job_id}-{channel_name}")
+        return os.path.join(self._directory, f"{name}.json")
+
+    def load(self, tracer_id: str, job_id: int, channel_name: str) -> ScrapeCheckpoint | None:
+        path = self.path(tracer_id, job_id, channel_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            checkpoint = ScrapeCheckpoint.model_validate_json(f.read())
+        if os.path.exists(f"{path}.journal"):
+            with open(f"{path}.journal", "r") as f:
+                lines = f.read().splitlines()
+            for index, line in enumerate(lines):
+                try:
+                    changes = CheckpointChanges.model_validate_json(line)
+                except ValueError:
+                    if index < len(lines) - 1:
+                        raise
+                    self.logger.warning(f"{job_id}: Ignoring the last line of the journal of {path}, cut short")
+                    break
+                changes.apply(checkpoint)
+        return checkpoint
+
+    def prepare(self, checkpoint: ScrapeCheckpoint) -> CheckpointWrite:
+        """
+        Serialize the changes to a checkpoint since it was last saved, or the whole checkpoint if the journal outgrew it.
+
+        This is the only step reading the checkpoint: the write can then run in another thread while the job goes on.
+        """
+        checkpoint.updated_at = datetime.now()
+        checkpoint.saves += 1
+        path = self.path(checkpoint.tracer_id, checkpoint.job_id, checkpoint.channel_name)
+        with self._lock:
+            saved = self._saved.get(path)
+            if saved is not None and saved.journal_bytes <= saved.checkpoint_bytes:
+                changes = CheckpointChanges(
+                    saves=checkpoint.saves,
+                    last_message_id=checkpoint.last_message_id,
+                    processed_messages=checkpoint.processed_messages,
+                    registered_media=[
+                        message_id
+                        for message_id in checkpoint.registered_media
+                        if message_id not in saved.registered_media
+                    ],
+                    augmented_rows=dict(islice(checkpoint.augmented_rows.items(), saved.augmented_rows, None)),
+                    source_data_list=checkpoint.source_data_list[saved.source_data_list :],
+                    image_transforms=checkpoint.image_transforms[saved.image_transforms :],
+                    deferred_media=checkpoint.deferred_media[saved.deferred_media :],
+                    duplicate_messages={
+                        original: duplicates[saved.duplicate_messages.get(original, 0) :]
+                        for original, duplicates in checkpoint.duplicate_messages.items()
+                        if len(duplicates) > saved.duplicate_messages.get(original, 0)
+                    },
+                    llm_usage=checkpoint.llm_usage,
+                    albums={
+                        grouped_id: album
+                        for grouped_id, album in checkpoint.albums.items()
+                        if saved.albums.get(grouped_id) != (len(album.message_ids), len(album.source_data_list))
+                    },
+                    updated_at=checkpoint.updated_at,
+                )
+                data = f"{changes.model_dump_json(exclude_defaults=True)}\n"
+                saved.journal_bytes += len(data)
+                journal = True
+            else:
+                data = checkpoint.model_dump_json()
+                saved = self._saved[path] = _Saved(checkpoint_bytes=len(data))
+                journal = False
+            saved.registered_media.update(checkpoint.registered_media)
+            saved.augmented_rows = len(checkpoint.augmented_rows)
+            saved.source_data_list = len(checkpoint.source_data_list)
+            saved.image_transforms = len(checkpoint.image_transforms)
+            saved.deferred_media = len(checkpoint.deferred_media)
+            saved.duplicate_messages = {
+                original: len(duplicates) for original, duplicates in checkpoint.duplicate_messages.items()
+            }
+            saved.albums = {
+                grouped_id: (len(album.message_ids), len(album.source_data_list))
+                for grouped_id, album in checkpoint.albums.items()
+            }
+        return CheckpointWrite(path=path, data=data, journal=journal)
+
+    def write(self, pending: CheckpointWrite) -> None:
+        """
+        Append prepared changes to the journal of their checkpoint, or rewrite it.
+        """
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            if pending.journal:
+                with open(f"{pending.path}.journal", "a") as f:
+                    f.write(pending.data)
+            else:
+                tmp_path = f"{pending.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(pending.data)
+                os.replace(tmp_path, pending.path)
+                if os.path.exists(f"{pending.path}.journal"):
+                    os.remove(f"{pending.path}.journal")
+        except BaseException:
+            # what was not written is not known to be saved: the next save rewrites the checkpoint
+            with self._lock:
+                self._saved.pop(pending.path, None)
+            raise
+        self.logger.debug("Saved checkpoint%s to %s", " changes" if pending.journal else "", pending.path)
+
+    def save(self, checkpoint: ScrapeCheckpoint) -> None:
+        self.write(self.prepare(checkpoint))
+
+    def delete(self, tracer_id: str, job_id: int, channel_name: str) -> None:
+        path = self.path(tracer_id, job_id, channel_name)
+        with self._lock:
+            self._saved.pop(path, None)
+        for file in (path, f"{path}.journal"):
+            if os.path.exists(file):
+                os.remove(file)
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+from telethon import TelegramClient
+
+from app.sdk.metrics import REGISTRY, record_bytes, snapshot_stages, summarize_stages, track_stage
+from app.sdk.models import BaseJobState, DeferredMediaRecord, JobOutput, KernelPlancksterSourceData
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+
+
+MATERIALIZED_MEDIA = REGISTRY.counter(
+    "scraper_materialized_media_total",
+    "Number of deferred media materialized, per outcome (uploaded, missing or failed).",
+    ("outcome",),
+)
+
+# Telegram returns at most this many messages per request
+GET_MESSAGES_BATCH = 100
+
+
+class MaterializeFilter(BaseModel):
+    """
+    Which deferred media to materialize; all of them by default.
+
+    @attr message_ids: only the media of these messages
+    @attr relevant_only: only the media of messages, or albums, judged relevant by the scrape job
+    @attr media_types: only these media types, "photo" or "video"
+    @attr max_bytes: only media up to this size, in bytes
+    """
+
+    message_ids: List[int] | None = None
+    relevant_only: bool = False
+    media_types: List[str] | None = None
+    max_bytes: int | None = None
+
+    def matches(self, record: DeferredMediaRecord) -> bool:
+        if self.message_ids is not None and record.message_id not in self.message_ids:
+            return False
+        if self.relevant_only and not record.relevant:
+            return False
+        if self.media_types is not None and record.media_type not in self.media_types:
+            return False
+        if self.max_bytes is not None and record.bytes is not None and record.bytes > self.max_bytes:
+            return False
+        return True
+
+
+async def materialize_media(
+    job_id: int,
+    tracer_id: str,
+    deferred_media: List[DeferredMediaRecord],
+    telegram_client: TelegramClient,
+    scraped_data_repository: ScrapedDataRepository,
+    media_filter: MaterializeFilter | None = None,
+    concurrency: int = 4,
+) -> JobOutput:
+    """
+    Download the deferred media matching the filter from Telegram, and upload and register them at the relative path
+    they were given by the scrape job.
+
+    Messages are fetched again, in batches, since the file references of their media expire. Media whose message was
+    deleted, or that could not be uploaded, are listed as still deferred in the job output.
+
+    The records of the uploaded media are marked as materialized, and records already marked are skipped, so that
+    materializing the media of a scrape job again only uploads the ones left.
+
+    :param concurrency: the number of media downloaded and uploaded at the same time.
+    """
+    logger = logging.getLogger(__name__)
+    metrics_baseline = snapshot_stages()
+    media_filter = media_filter or MaterializeFilter()
+    selected = [record for record in deferred_media if not record.materialized and media_filter.matches(record)]
+    logger.info(f"{job_id}: Materializing {len(selected)} of {len(deferred_media)} deferred media")
+
+    by_channel: Dict[str, List[DeferredMediaRecord]] = {}
+    for record in selected:
+        by_channel.setdefault(record.channel_name, []).append(record)
+
+    source_data_list: List[KernelPlancksterSourceData] = []
+    still_deferred: List[DeferredMediaRecord] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def materialize(client: TelegramClient, record: DeferredMediaRecord, message: Any) -> None:
+        media = getattr(message, "media", None) if message else None
+        media_object = getattr(media, "photo", None) or getattr(media, "document", None)
+        if media_object is None:
+            MATERIALIZED_MEDIA.inc(outcome="missing")
+            logger.warning(f"{job_id}: The media of message {record.message_id} of {record.channel_name} is gone")
+            still_deferred.append(record)
+            return
+        async with semaphore:
+            try:
+                with tempfile.NamedTemporaryFile() as tmp:
+                    with track_stage("telegram_download_media"):
+                        await client.download_media(media_object, file=tmp.name)
+                    record_bytes("telegram_download_media", os.path.getsize(tmp.name))
+                    source_data = KernelPlancksterSourceData(
+                        name=os.path.splitext(os.path.basename(record.relative_path))[0],
+                        protocol=scraped_data_repository.protocol,
+                        relative_path=record.relative_path,
+                    )
+                    register = (
+                        scraped_data_repository.register_scraped_photo
+                        if record.media_type == "photo"
+                        else scraped_data_repository.register_scraped_video_or_document
+                    )
+                    # uploads are blocking: keep the other downloads going meanwhile
+                    await asyncio.to_thread(
+                        register, job_id=job_id, source_data=source_data, local_file_name=tmp.name
+                    )
+            except Exception as error:
+                MATERIALIZED_MEDIA.inc(outcome="failed")
+                logger.error(f"{job_id}: Could not materialize the media of message {record.message_id}. Error:\n{error}")
+                still_deferred.append(record)
+                return
+        MATERIALIZED_MEDIA.inc(outcome="uploaded")
+        record.materialized = True
+        source_data_list.append(source_data)
+
+    job_state = BaseJobState.FINISHED
+    try:
+        async with telegram_client as client:
+            for channel_name, records in by_channel.items():
+                for start in range(0, len(records), GET_MESSAGES_BATCH):
+                    batch = records[start : start + GET_MESSAGES_BATCH]
+                    with track_stage("telegram_get_messages"):
+                        messages = await client.get_messages(
+                            f"https://t.me/{channel_name}", ids=[record.message_id for record in batch]
+                        )
+                    await asyncio.gather(
+                        *(materialize(client, record, message) for record, message in zip(batch, messages))
+                    )
+    except Exception as error:
+        job_state = BaseJobState.FAILED
+        logger.error(f"{job_id}: Unable to materialize media. Job with tracer_id {tracer_id} failed. Error:\n{error}")
+        done = {source_data.relative_path for source_data in source_data_list}
+        still_deferred = [
+            record for record in selected if record.relative_path not in done
+        ]
+
+    logger.info(f"{job_id}: Materialized {len(source_data_list)} media, {len(still_deferred)} left deferred")
+    return JobOutput(
+        job_state=job_state,
+        tracer_id=tracer_id,
+        source_data_list=source_data_list,
+        metrics=summarize_stages(since=metrics_baseline),
+        deferred_media=still_deferred,
+    )
@@ -0,0 +1,165 @@
+import re
+import unicodedata
+from typing import List, NamedTuple
+
+from pydantic import BaseModel
+
+from app.sdk.keyword_automaton import KeywordAutomaton
+from app.sdk.metrics import REGISTRY
+
+
+PREFILTER_DECISIONS = REGISTRY.counter(
+    "scraper_prefilter_decisions_total",
+    "Number of messages evaluated by the lexical pre-filter, per decision reason.",
+    ("reason",),
+)
+
+# Stems and phrases about wildfires, in the languages of the channels we follow. They are matched inside words, so
+# stems also match their inflections ("πυρκαγι" matches "πυρκαγιά" and "πυρκαγιές").
+DEFAULT_KEYWORDS = [
+    # English
+    "wildfire", "wild fire", "forest fire", "bushfire", "bush fire", "brush fire", "grass fire", "firefight",
+    "blaze", "flames", "burning", "burned", "burnt", "smoke", "evacuat", "hectare",
+    # Greek
+    "πυρκαγι", "φωτια", "φωτιε", "πυροσβεστ", "καπν", "αναζωπυρ", "εκκενω",
+    # Spanish
+    "incendio", "fuego", "bombero",
+    # Portuguese
+    "incendio", "fogo", "queimad", "bombeiro", "fumaca",
+    # French
+    "incendie", "feu de foret", "feux de foret", "pompier", "fumee", "flammes",
+    # Italian
+    "incendi", "fuoco", "roghi", "fiamme", "fumo",
+    # German
+    "waldbrand", "flachenbrand", "buschbrand", "feuerwehr", "flammen", "rauchwolke", "rauchsaule", "rauchschwaden",
+    "rauchentwicklung",
+    # Turkish
+    "yangın", "alev", "itfaiye", "duman",
+    # Russian and Ukrainian
+    "пожар", "пожеж", "возгоран", "огонь", "вогонь",
+    # Arabic
+    "حريق", "حرائق", "الإطفاء",
+]
+
+# Short or ambiguous keywords, only matched as whole words: as stems, "fire" would match "ceasefire" and "Firefox",
+# "rauch" "Verbrauch", "humo" "humor" and "дим" "Володимир". Their relevant inflections are listed instead.
+DEFAULT_WHOLE_WORD_KEYWORDS = [
+    # English
+    "fire", "fires",
+    # Spanish
+    "humo", "en llamas",
+    # Italian
+    "rogo",
+    # German
+    "rauch",
+    # Russian and Ukrainian
+    "огня", "огнем", "огне", "вогню", "вогнем",
+    "дым", "дыма", "дыму", "дымом", "дыме", "дим", "диму", "димом", "димі",
+]
+
+# Phrases of posts that are noise even when they mention a keyword, e.g. a "fire sale".
+DEFAULT_NEGATIVE_KEYWORDS = [
+    "promo code", "discount code", "coupon", "giveaway", "casino", "betting", "cashback", "fire sale",
+    "% off", "codigo de descuento", "code promo", "gutschein", "rabattcode",
+]
+
+_URL = re.compile(r"(?:https?://|www\.)\S+|\bt\.me/\S+", re.IGNORECASE)
+_MENTION = re.compile(r"@\w+")
+_SYMBOLS = re.compile(
+    "["
+    "\U0001F000-\U0001FAFF"  # emoji, pictographs, flags
+    "\u2600-\u27BF"  # miscellaneous symbols, dingbats
+    "\u2B00-\u2BFF"  # arrows, stars
+    "\uFE0F\u200D\u20E3"  # variation selector, zero width joiner, keycap
+    "]+"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def strip_noise(text: str) -> str:
+    """
+    Remove URLs, mentions and emoji, and collapse whitespace.
+    """
+    text = _URL.sub(" ", text)
+    text = _MENTION.sub(" ", text)
+    text = _SYMBOLS.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def normalize(text: str) -> str:
+    """
+    Casefold and strip accents, so that "Incêndio" and "INCENDIO" match the same keywords.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class LexicalPrefilterConfig(BaseModel):
+    """
+    @attr keywords: the stems and phrases of which at least one must appear in a candidate message
+    @attr whole_word_keywords: keywords that only count as whole words, not inside longer words
+    @attr negative_keywords: the phrases that reject a message, even if it contains keywords
+    @attr min_length: the minimum length of a candidate message, once URLs, mentions and emoji are stripped
+    """
+
+    keywords: List[str] = DEFAULT_KEYWORDS
+    whole_word_keywords: List[str] = DEFAULT_WHOLE_WORD_KEYWORDS
+    negative_keywords: List[str] = DEFAULT_NEGATIVE_KEYWORDS
+    min_length: int = 10
+
+
+class PrefilterDecision(NamedTuple):
+    candidate: bool
+    # "candidate", "too_short", "negative_keyword" or "no_keyword"
+    reason: str
+    keywords: List[str]
+
+
+class LexicalPrefilter:
+    """
+    Decides locally, in microseconds, whether a message could be relevant, so that only plausible candidates are sent
+    to the LLM relevance check.
+
+    A message is a candidate if, once URLs, mentions and emoji are stripped, it is long enough, contains at least one
+    keyword and no negative keyword. Keywords and texts are casefolded and stripped of accents before matching.
+    """
+
+    def __init__(self, config: LexicalPrefilterConfig | None = None) -> None:
+        self._config = config or LexicalPrefilterConfig()
+        self._keywords = KeywordAutomaton(normalize(keyword) for keyword in self._config.keywords)
+        self._whole_word_keywords = KeywordAutomaton(
+            (normalize(keyword) for keyword in self._config.whole_word_keywords), whole_words=True
+        )
+        self._negative_keywords = KeywordAutomaton(
+            normalize(keyword) for keyword in self._config.negative_keywords
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "LexicalPrefilter":
+        """
+        Load the configuration from a JSON file with the fields of `LexicalPrefilterConfig`.
+        """
+        with open(path, "r") as f:
+            return cls(LexicalPrefilterConfig.model_validate_json(f.read()))
+
+    @property
+    def config(self) -> LexicalPrefilterConfig:
+        return self._config
+
+    def evaluate(self, text: str) -> PrefilterDecision:
+        stripped = strip_noise(text or "")
+        if len(stripped) < self._config.min_length:
+            decision = PrefilterDecision(False, "too_short", [])
+        else:
+            normalized = normalize(stripped)
+            negative = self._negative_keywords.findall(normalized)
+            if negative:
+                decision = PrefilterDecision(False, "negative_keyword", negative)
+            else:
+                keywords = self._keywords.findall(normalized) + self._whole_word_keywords.findall(normalized)
+                decision = PrefilterDecision(bool(keywords), "candidate" if keywords else "no_keyword", keywords)
+        PREFILTER_DECISIONS.inc(reason=decision.reason)
+        return decision
+
+    def is_candidate(self, text: str) -> bool:
+        return self.evaluate(text).candidate
@@ -0,0 +1,140 @@
+from typing import Dict, Iterable, List, NamedTuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.prefilter import strip_noise
+from app.sdk.embeddings import EmbeddingBackend, EmbeddingCache, normalize_rows
+from app.sdk.metrics import REGISTRY, track_stage
+
+
+RELEVANCE_DECISIONS = REGISTRY.counter(
+    "scraper_relevance_decisions_total",
+    "Number of messages scored by embedding similarity, per decision.",
+    ("decision",),
+)
+
+# Descriptions of the messages we are looking for; a message is scored by its similarity to the closest one.
+DEFAULT_PROTOTYPES = [
+    "A forest wildfire is burning near a town, firefighters are fighting the flames.",
+    "Evacuations ordered as a wildfire spreads, smoke visible from the city.",
+    "Firefighting aircraft and fire crews battle a large forest fire, hectares burned.",
+    "Μεγάλη πυρκαγιά στο δάσος, εκκενώνονται χωριά, επιχειρούν πυροσβεστικές δυνάμεις.",
+    "Incendio forestal cerca del pueblo, los bomberos luchan contra las llamas.",
+    "Incêndio florestal perto da cidade, bombeiros combatem as chamas.",
+    "Incendie de forêt près du village, les pompiers luttent contre les flammes.",
+    "Waldbrand in der Nähe des Ortes, die Feuerwehr kämpft gegen die Flammen.",
+    "Лесной пожар рядом с городом, пожарные тушат огонь, идет эвакуация.",
+]
+
+
+class EmbeddingRelevanceConfig(BaseModel):
+    """
+    @attr prototypes: descriptions of relevant messages, embedded once per scorer
+    @attr irrelevant_below: the similarity under which a message is irrelevant, without asking the LLM
+    @attr relevant_above: the similarity from which a message is relevant, without asking the LLM
+    @attr batch_size: the number of messages embedded together
+    """
+
+    prototypes: List[str] = DEFAULT_PROTOTYPES
+    irrelevant_below: float = 0.3
+    relevant_above: float = 0.55
+    batch_size: int = 64
+
+
+class RelevanceScore(NamedTuple):
+    score: float
+    # "relevant", "irrelevant" or "borderline"
+    decision: str
+
+
+class EmbeddingRelevanceScorer:
+    """
+    Scores messages by the cosine similarity of their embedding to the closest topic prototype.
+
+    Clear scores decide relevance on their own; only borderline messages, between `irrelevant_below` and
+    `relevant_above`, are left to the LLM relevance check. Embeddings are computed in batches and cached by text hash,
+    so that a message seen again, e.g. forwarded or scraped again, is not embedded twice.
+
+    :param backend: computes the embeddings; the thresholds depend on it.
+    :param cache: where embeddings are cached, in memory by default.
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        config: EmbeddingRelevanceConfig | None = None,
+        cache: EmbeddingCache | None = None,
+    ) -> None:
+        self._backend = backend
+        self._config = config or EmbeddingRelevanceConfig()
+        self._cache = cache or EmbeddingCache()
+        self._prototypes: np.ndarray | None = None
+
+    @classmethod
+    def from_file(
+        cls, backend: EmbeddingBackend, path: str, cache: EmbeddingCache | None = None
+    ) -> "EmbeddingRelevanceScorer":
+        """
+        Load the configuration from a JSON file with the fields of `EmbeddingRelevanceConfig`.
+        """
+        with open(path, "r") as f:
+            return cls(backend, EmbeddingRelevanceConfig.model_validate_json(f.read()), cache)
+
+    @property
+    def config(self) -> EmbeddingRelevanceConfig:
+        return self._config
+
+    @property
+    def backend(self) -> EmbeddingBackend:
+        return self._backend
+
+    def _prototype_matrix(self) -> np.ndarray:
+        if self._prototypes is None:
+            self._prototypes = normalize_rows(self._cache.embed(self._backend, self._config.prototypes))
+        return self._prototypes
+
+    def score_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        The similarity of each text to its closest prototype, between -1 and 1.
+        """
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        stripped = [strip_noise(text) for text in texts]
+        with track_stage("embedding_relevance"):
+            vectors = normalize_rows(self._cache.embed(self._backend, stripped))
+            return (vectors @ self._prototype_matrix().T).max(axis=1)
+
+    def decide(self, score: float) -> str:
+        if score >= self._config.relevant_above:
+            return "relevant"
+        if score < self._config.irrelevant_below:
+            return "irrelevant"
+        return "borderline"
+
+    def prime(self, texts: Iterable[str]) -> Dict[str, float]:
+        """
+        Score texts ahead of their evaluation, `batch_size` at a time.
+
+        A scorer is shared by the jobs of the server: the scores are returned to the caller, to pass to `evaluate`,
+        rather than kept by the scorer.
+
+        :return: the score of each text.
+        """
+        primed: Dict[str, float] = {}
+        pending = list(dict.fromkeys(text for text in texts if text))
+        for start in range(0, len(pending), self._config.batch_size):
+            batch = pending[start : start + self._config.batch_size]
+            primed.update(zip(batch, self.score_batch(batch).tolist()))
+        return primed
+
+    def evaluate(self, text: str, primed: Dict[str, float] | None = None) -> RelevanceScore:
+        """
+        :param primed: scores returned by `prime`; the score of `text` is taken from them, if there.
+        """
+        score = primed.pop(text, None) if primed is not None else None
+        if score is None:
+            score = float(self.score_batch([text])[0])
+        result = RelevanceScore(score, self.decide(score))
+        RELEVANCE_DECISIONS.inc(decision=result.decision)
+        return result
@@ -0,0 +1,210 @@
+import datetime
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.prefilter import normalize, strip_noise
+from app.sdk.keyword_automaton import KeywordAutomaton
+from app.sdk.metrics import REGISTRY
+
+
+EXTRACTION_PATHS = REGISTRY.counter(
+    "scraper_extraction_paths_total",
+    "Number of extractions, per path: all fields from rules, some from rules and the rest from the LLM, or all from the LLM.",
+    ("path",),
+)
+
+# spelled like the `month` field of `messageData`
+MONTHS = [
+    "January", "Febuary", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+
+# month names, without accents, in the languages of the channels we follow; Greek months are in the genitive, as in
+# dates
+MONTH_NAMES: Dict[str, int] = {}
+for _names in [
+    ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"],
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"],
+    ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"],
+    ["janeiro", "fevereiro", "marco", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"],
+    ["janvier", "fevrier", "mars", "avril", "mai", "juin", "juillet", "aout", "septembre", "octobre", "novembre", "decembre"],
+    ["gennaio", "febbraio", "marzo", "aprile", "maggio", "giugno", "luglio", "agosto", "settembre", "ottobre", "novembre", "dicembre"],
+    ["januar", "februar", "marz", "april", "mai", "juni", "juli", "august", "september", "oktober", "november", "dezember"],
+    ["ιανουαριου", "φεβρουαριου", "μαρτιου", "απριλιου", "μαιου", "ιουνιου", "ιουλιου", "αυγουστου", "σεπτεμβριου", "οκτωβριου", "νοεμβριου", "δεκεμβριου"],
+]:
+    for _number, _name in enumerate(_names, start=1):
+        MONTH_NAMES[_name] = _number
+
+_MONTH = "|".join(sorted(MONTH_NAMES, key=len, reverse=True))
+# not part of a longer number, e.g. a version or a phone number; a trailing full stop is fine
+_NUMERIC_DATE = re.compile(r"(?<!\d)(?<!\d[./-])(\d{1,2})[./-](\d{1,2})[./-](\d{4})(?!\d)(?![./-]\d)")
+_ISO_DATE = re.compile(r"(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)")
+_DAY_MONTH_YEAR = re.compile(rf"(?<!\d)(\d{{1,2}})(?:st|nd|rd|th)?\.?\s+(?:de\s+)?({_MONTH})\.?,?\s+(?:de\s+)?(\d{{4}})(?!\d)")
+_MONTH_DAY_YEAR = re.compile(rf"\b({_MONTH})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})(?!\d)")
+
+
+class KnownPlace(BaseModel):
+    """
+    @attr city: the city, as extracted in `messageData`
+    @attr country: the country of the city
+    @attr aliases: other names of the city, e.g. in other languages or declined
+    """
+
+    city: str
+    country: str
+    aliases: List[str] = []
+
+
+DEFAULT_PLACES = [
+    KnownPlace(city="Athens", country="Greece", aliases=["Αθήνα", "Αθήνας", "Athen", "Atenas", "Atene"]),
+    KnownPlace(city="Patras", country="Greece", aliases=["Πάτρα", "Πάτρας", "Patra"]),
+    KnownPlace(city="Chania", country="Greece", aliases=["Χανιά", "Χανίων"]),
+    KnownPlace(city="Heraklion", country="Greece", aliases=["Ηράκλειο", "Ηρακλείου", "Iraklio"]),
+    KnownPlace(city="Thessaloniki", country="Greece", aliases=["Θεσσαλονίκη", "Θεσσαλονίκης"]),
+    KnownPlace(city="Rhodes", country="Greece", aliases=["Ρόδος", "Ρόδου", "Rodos"]),
+    KnownPlace(city="Evia", country="Greece", aliases=["Εύβοια", "Εύβοιας", "Euboea"]),
+    KnownPlace(city="Corinth", country="Greece", aliases=["Κόρινθος", "Κορίνθου", "Korinthos"]),
+    KnownPlace(city="Alexandroupolis", country="Greece", aliases=["Αλεξανδρούπολη", "Αλεξανδρούπολης"]),
+    KnownPlace(city="Tenerife", country="Spain"),
+    KnownPlace(city="Valencia", country="Spain"),
+    KnownPlace(city="Madrid", country="Spain"),
+    KnownPlace(city="Lisbon", country="Portugal", aliases=["Lisboa"]),
+    KnownPlace(city="Madeira", country="Portugal"),
+    KnownPlace(city="Marseille", country="France", aliases=["Marseilles"]),
+    KnownPlace(city="Bordeaux", country="France"),
+    KnownPlace(city="Palermo", country="Italy"),
+    KnownPlace(city="Antalya", country="Turkey"),
+    KnownPlace(city="Izmir", country="Turkey", aliases=["İzmir"]),
+    KnownPlace(city="Limassol", country="Cyprus", aliases=["Λεμεσός", "Λεμεσού"]),
+    KnownPlace(city="Sydney", country="Australia"),
+    KnownPlace(city="Los Angeles", country="United States"),
+]
+
+DEFAULT_COUNTRIES = {
+    "Greece": ["Ελλάδα", "Ελλάδας", "Grecia", "Grèce", "Griechenland", "Grécia", "Yunanistan", "Греция"],
+    "Spain": ["España", "Espagne", "Spanien", "Spagna", "Espanha", "İspanya", "Испания"],
+    "Portugal": ["Portogallo", "Португалия"],
+    "France": ["Francia", "Frankreich", "França", "Fransa", "Франция"],
+    "Italy": ["Italia", "Italie", "Italien", "Itália", "İtalya", "Италия"],
+    "Turkey": ["Türkiye", "Turquía", "Turquie", "Türkei", "Турция"],
+    "Cyprus": ["Κύπρος", "Κύπρου", "Chipre", "Chypre", "Zypern", "Kıbrıs"],
+    "Australia": ["Australie", "Australien", "Австралия"],
+    "Canada": ["Canadá", "Kanada", "Канада"],
+    "United States": ["USA", "United States of America", "Estados Unidos", "États-Unis", "США"],
+}
+
+DEFAULT_WILDFIRE_KEYWORDS = [
+    "wildfire", "wild fire", "forest fire", "bushfire", "bush fire", "brush fire",
+    "πυρκαγι", "δασικη πυρκαγι", "incendio forestal", "incendio florestal", "incendie de foret", "feux de foret",
+    "incendio boschivo", "waldbrand", "orman yangın", "лесной пожар", "лесные пожары",
+]
+
+
+class RuleExtractorConfig(BaseModel):
+    """
+    @attr places: the cities recognized in messages
+    @attr countries: other names of countries, keyed by the name extracted in `messageData`
+    @attr wildfire_keywords: the stems and phrases from which a message is about a wildfire
+    @attr day_first: whether ambiguous numeric dates, like 05.08.2024, are day first
+    """
+
+    places: List[KnownPlace] = DEFAULT_PLACES
+    countries: Dict[str, List[str]] = DEFAULT_COUNTRIES
+    wildfire_keywords: List[str] = DEFAULT_WILDFIRE_KEYWORDS
+    day_first: bool = True
+
+
+class RuleBasedExtractor:
+    """
+    Extracts the fields of `messageData` that a message states explicitly, in microseconds: a date written out in
+    full, a known city or country, and whether the message is about a wildfire.
+
+    A field is only extracted when the message is unambiguous about it, e.g. a single date or a single known city;
+    the other fields are left to the LLM.
+    """
+
+    def __init__(self, config: RuleExtractorConfig | None = None) -> None:
+        self._config = config or RuleExtractorConfig()
+        self._cities: Dict[str, KnownPlace] = {}
+        for place in self._config.places:
+            for alias in [place.city, *place.aliases]:
+                self._cities[normalize(alias)] = place
+        self._countries: Dict[str, str] = {}
+        for country, aliases in self._config.countries.items():
+            for alias in [country, *aliases]:
+                self._countries[normalize(alias)] = country
+        self._city_automaton = KeywordAutomaton(self._cities, whole_words=True)
+        self._country_automaton = KeywordAutomaton(self._countries, whole_words=True)
+        self._wildfire_automaton = KeywordAutomaton(
+            normalize(keyword) for keyword in self._config.wildfire_keywords
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleBasedExtractor":
+        """
+        Load the configuration from a JSON file with the fields of `RuleExtractorConfig`.
+        """
+        with open(path, "r") as f:
+            return cls(RuleExtractorConfig.model_validate_json(f.read()))
+
+    @property
+    def config(self) -> RuleExtractorConfig:
+        return self._config
+
+    def _numeric_date(self, first: int, second: int) -> Tuple[int, int]:
+        # (month, day) of a numeric date, swapped if only one order is a valid date
+        if first > 12 or (self._config.day_first and second <= 12):
+            return second, first
+        return first, second
+
+    def dates(self, text: str) -> Set[datetime.date]:
+        """
+        The valid dates written in the text.
+        """
+        candidates: List[Tuple[int, int, int]] = []
+        for day, month, year in _NUMERIC_DATE.findall(text):
+            candidates.append((int(year), *self._numeric_date(int(day), int(month))))
+        for year, month, day in _ISO_DATE.findall(text):
+            candidates.append((int(year), int(month), int(day)))
+        for day, month, year in _DAY_MONTH_YEAR.findall(text):
+            candidates.append((int(year), MONTH_NAMES[month], int(day)))
+        for month, day, year in _MONTH_DAY_YEAR.findall(text):
+            candidates.append((int(year), MONTH_NAMES[month], int(day)))
+
+        dates = set()
+        for year, month, day in candidates:
+            try:
+                dates.add(datetime.date(year, month, day))
+            except ValueError:
+                continue
+        return dates
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """
+        :return: the `messageData` fields resolved from the text, possibly none.
+        """
+        normalized = normalize(strip_noise(text or ""))
+        fields: Dict[str, Any] = {}
+
+        dates = self.dates(normalized)
+        if len(dates) == 1:
+            date = dates.pop()
+            fields.update(year=date.year, month=MONTHS[date.month - 1], day=f"{date.day:02d}")
+
+        places = {
+            (self._cities[alias].city, self._cities[alias].country)
+            for alias in self._city_automaton.findall(normalized)
+        }
+        countries = {self._countries[alias] for alias in self._country_automaton.findall(normalized)}
+        if len(places) == 1:
+            city, country = places.pop()
+            if not countries or countries == {country}:
+                fields.update(city=city, country=country)
+        elif not places and len(countries) == 1:
+            fields.update(country=countries.pop())
+
+        if self._wildfire_automaton.search(normalized):
+            fields["disaster_type"] = "Wildfire"
+        return fields
@@ -1,18 +1,80 @@
+import asyncio
+import contextlib
+from functools import lru_cache
+import json
 from logging import Logger
 import logging
 import os
 import tempfile
-from typing import List
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, NamedTuple, Tuple
 from telethon import TelegramClient
-from app.sdk.models import KernelPlancksterSourceData, BaseJobState, JobOutput
+from app.checkpoint import CheckpointStore, ScrapeCheckpoint
+from app.prefilter import LexicalPrefilter, normalize, strip_noise
+from app.relevance import EmbeddingRelevanceScorer
+from app.rule_extraction import EXTRACTION_PATHS, RuleBasedExtractor
+from app.sdk.artifact_writer import ArtifactConfig, artifact_source_data, write_rows
+from app.sdk.event_log import EventLogger, configure_logging
+from app.sdk.metrics import (
+    REGISTRY,
+    record_bytes,
+    snapshot_stages,
+    summarize_stages,
+    track_async_iterator,
+    track_stage,
+)
+from app.sdk.image_transform import MIME_TYPES, ImageTransformConfig, transform_image
+from app.sdk.llm_ledger import LedgerClient, LLMBudget, TokenLedger
+from app.sdk.minhash import MinHashIndex, minhash
+from app.sdk.models import (
+    BaseJobState,
+    DeferredMediaRecord,
+    DuplicateMessageCluster,
+    ImageTransformRecord,
+    JobOutput,
+    KernelPlancksterSourceData,
+    MediaAlbum,
+)
+from app.sdk.perceptual_hash import PerceptualHashIndex, image_hash
+from app.sdk.pipeline import Pipeline, Stage, StageConfig
+from app.sdk.process_pool import run_in_process
+from app.sdk.rate_limiter import RateLimitedClient, RateLimiter
 from app.sdk.scraped_data_repository import ScrapedDataRepository
-from pydantic import BaseModel
-from typing import Literal
+from app.sdk.tracing import Tracer, get_tracer, start_span
+from app.sdk.video_reduction import VideoReductionConfig, reduce_video
+from app.streaming import MicroBatcher, StreamConfig, subscribe
+from pydantic import BaseModel, Field, create_model
 import instructor
 from instructor import Instructor
 from openai import OpenAI
 from geopy.geocoders import Nominatim
-import pandas as pd
+from geopy.geocoders.base import Geocoder
+
+
+DUPLICATE_PHOTOS = REGISTRY.counter(
+    "scraper_duplicate_photos_total",
+    "Number of photos not uploaded because a near-duplicate was already stored, per policy.",
+    ("policy",),
+)
+REDUCED_VIDEOS = REGISTRY.counter(
+    "scraper_reduced_videos_total",
+    "Number of videos uploaded as keyframes or a proxy, per policy for the original.",
+    ("original",),
+)
+IMAGE_BYTES_SAVED = REGISTRY.counter(
+    "scraper_image_bytes_saved_total",
+    "Number of bytes not uploaded thanks to downscaling and re-encoding photos.",
+)
+DUPLICATE_MESSAGES = REGISTRY.counter(
+    "scraper_duplicate_messages_total",
+    "Number of messages not augmented because their text is a near-duplicate of an earlier message, per relevance.",
+    ("relevant",),
+)
+LLM_ESCALATIONS = REGISTRY.counter(
+    "scraper_llm_escalations_total",
+    "Number of relevance checks passed on from a model to the next one of the cascade because of low confidence.",
+    ("model",),
+)
 
 
 class messageData(BaseModel):
@@ -69,6 +131,17 @@ class messageData(BaseModel):
     disaster_type: Literal["Wildfire", "Other"]
 
 
+@lru_cache(maxsize=None)
+def partial_message_data(fields: Tuple[str, ...]) -> type[BaseModel]:
+    """
+    A response model with only the given fields of `messageData`, to ask the LLM for the fields the rules left out.
+    """
+    return create_model(  # type: ignore
+        "partialMessageData",
+        **{name: (messageData.model_fields[name].annotation, ...) for name in fields},
+    )
+
+
 # Potential alternate prompting
 # class messageDataAlternate(BaseModel):
 #     city: str
@@ -83,6 +156,45 @@ class filterData(BaseModel):
     relevant: bool
 
 
+class scoredFilterData(filterData):
+    confidence: float = Field(
+        ge=0,
+        le=1,
+        description="How confident you are in your answer, from 0 (a guess) to 1 (certain).",
+    )
+
+
+class ModelCascadeConfig(BaseModel):
+    """
+    @attr filter_models: the models asked whether a message is relevant, cheapest first. Each model but the last also
+        rates its confidence, and the next model is asked if it is below `min_confidence`
+    @attr min_confidence: the confidence from which the answer of a model is kept
+    @attr extraction_model: the model extracting the location and date of relevant messages
+    """
+
+    filter_models: List[str] = Field(default=["gpt-4o"], min_length=1)
+    min_confidence: float = 0.8
+    extraction_model: str = "gpt-4o"
+
+
+class ScrapePipelineConfig(BaseModel):
+    """
+    @attr read_ahead: the number of messages fetched ahead of their augmentation, augmented ahead of the media
+        downloads, and uploaded ahead of the message being processed
+    @attr augment_concurrency: the number of messages augmented at the same time; with an LLM budget, the LLM is called
+        for one of them at a time
+    @attr download_concurrency: the number of messages whose media are downloaded at the same time
+    @attr download_ahead: the number of messages whose media are downloaded, or being downloaded, ahead of their upload
+    @attr upload_concurrency: the number of messages whose media are uploaded and registered at the same time
+    """
+
+    read_ahead: int = Field(default=16, ge=1)
+    augment_concurrency: int = Field(default=4, ge=1)
+    download_concurrency: int = Field(default=4, ge=1)
+    download_ahead: int = Field(default=8, ge=1)
+    upload_concurrency: int = Field(default=2, ge=1)
+
+
 class TwitterScrapeRequestModel(BaseModel):
     query: str
     outfile: str
@@ -97,176 +209,827 @@ async def scrape(
     telegram_client: TelegramClient,
     openai_api_key: str,
     log_level: Logger,
+    tracer: Tracer | None = None,
+    instructor_client: Instructor | None = None,
+    geolocator: Geocoder | None = None,
+    checkpoint_store: CheckpointStore | None = None,
+    resume: bool = False,
+    photo_index: PerceptualHashIndex | None = None,
+    duplicate_photos: Literal["skip", "link"] = "link",
+    image_transform: ImageTransformConfig | None = None,
+    video_reduction: VideoReductionConfig | None = None,
+    prefilter: LexicalPrefilter | None = None,
+    relevance_scorer: EmbeddingRelevanceScorer | None = None,
+    text_index: MinHashIndex | None = None,
+    model_cascade: ModelCascadeConfig | None = None,
+    rule_extractor: RuleBasedExtractor | None = None,
+    rate_limiter: RateLimiter | None = None,
+    llm_budget: LLMBudget | None = None,
+    defer_media: bool = False,
+    stream: StreamConfig | None = None,
+    stop: asyncio.Event | None = None,
+    pipeline: ScrapePipelineConfig | None = None,
+    artifact: ArtifactConfig | None = None,
 ) -> JobOutput:
+    """
+    Scrape a channel, augment its messages and upload its media.
+
+    Photos within `photo_index.max_distance` of an already stored photo are not uploaded again. With
+    `duplicate_photos="link"`, the source data of the stored photo is added to the job output instead; with "skip", the
+    photo is left out.
+
+    With `image_transform`, photos are downscaled and re-encoded before upload; the original and uploaded dimensions
+    and sizes are listed in the job output.
+
+    With `video_reduction`, keyframes or a low-bitrate proxy of each video are uploaded, and the original is uploaded
+    after them, deferred (listed in the job output) or dropped, depending on `video_reduction.original`.
+
+    With `prefilter`, only the messages it considers candidates are sent to the LLM relevance check.
+
+    With `relevance_scorer`, messages are embedded in batches as they are fetched and scored against topic prototypes;
+    only borderline messages are sent to the LLM relevance check.
+
+    With `text_index`, messages whose text is a near-duplicate of an already augmented message, in any job sharing the
+    index, reuse its relevance and augmentation instead of asking the LLM again. They are listed in the job output,
+    grouped by original message.
+
+    `model_cascade` sets the models used for the relevance check and the extraction; gpt-4o for both by default.
+
+    With `rule_extractor`, the dates and places stated explicitly in relevant messages are extracted locally, and the
+    LLM is only asked for the fields it could not resolve, if any.
+
+    With `rate_limiter`, LLM calls are queued until the requests-per-minute and tokens-per-minute budgets it shares
+    with other jobs allow them, and calls rejected with a 429 anyway are retried.
+
+    The requests, tokens, latency and cost of the LLM calls are reported per model in the job output. Once a cap of
+    `llm_budget` is hit, later messages are not sent to the LLM anymore: they are listed in the job output, all of them
+    or only the pre-filter candidates depending on `llm_budget.degraded_mode`, to be augmented later.
+
+    With `defer_media`, media are not downloaded: the references needed to fetch them later, their size and MIME type,
+    and whether their message was judged relevant, are listed in the job output, and registered as a JSON manifest, to
+    be materialized on demand with `app.materializer.materialize_media`.
+
+    With `stream`, the channel is not crawled: new messages are processed as they are posted, until `stop` is set or a
+    limit of `stream` is reached, and their augmented rows are registered in micro-batches. The latency from the posting
+    of each message to the registration of its micro-batch is summarized in the job output. Streaming jobs are not
+    checkpointed.
+
+    Messages go through a pipeline: they are fetched, augmented, their media downloaded, then uploaded and registered,
+    several at a time in each step as set by `pipeline`, each step running ahead of the next. Their outcomes are then
+    processed one at a time in channel order, for the albums, the checkpoint and the duplicates to be the same as in a
+    serial run; a near-duplicate waits for the augmentation, or upload, of the earlier message in flight. The blocking
+    calls (LLM, geocoding, uploads, registrations) run in threads, so that the other steps keep going meanwhile.
+    The items, busy time, utilization and queue depth of each step are reported in the job output.
+
+    The augmented data is written as compact JSON, compressed as set by `artifact`, whose encoding is appended to the
+    name and relative path of its source data, e.g. `augmented/data.json.gz`.
+    """
 
     try:
         logger = logging.getLogger(__name__)
-        logging.basicConfig(level=log_level)
+        configure_logging(log_level)
+        events = EventLogger(logger)
+
+        tracer = tracer or get_tracer()
 
         job_state = BaseJobState.CREATED
         current_data: KernelPlancksterSourceData | None = None
         last_successful_data: KernelPlancksterSourceData | None = None
 
         protocol = scraped_data_repository.protocol
+        metrics_baseline = snapshot_stages()
 
         output_data_list: List[KernelPlancksterSourceData] = []
+
+        if stream is not None:
+            # new messages are not ordered by id like a crawl, so there is no position to resume from
+            checkpoint_store = None
+        batcher = MicroBatcher(stream) if stream is not None else None
+        artifact = artifact or ArtifactConfig()
+
+        checkpoint: ScrapeCheckpoint | None = None
+        if checkpoint_store and resume:
+            checkpoint = checkpoint_store.load(tracer_id, job_id, channel_name)
+            if checkpoint:
+                logger.info(
+                    f"{job_id}: Resuming from checkpoint after message {checkpoint.last_message_id} ({checkpoint.processed_messages} messages already processed)"
+                )
+            else:
+                logger.info(f"{job_id}: No checkpoint found, starting from the first message")
+        if checkpoint is None:
+            checkpoint = ScrapeCheckpoint(
+                job_id=job_id, tracer_id=tracer_id, channel_name=channel_name
+            )
+        output_data_list.extend(checkpoint.source_data_list)
+        registered_media = set(checkpoint.registered_media)
+        image_transforms = checkpoint.image_transforms
+        deferred_media = checkpoint.deferred_media
+        duplicate_messages = checkpoint.duplicate_messages
+        albums = checkpoint.albums
+        # a resumed job goes on with the usage, and the budget, left by its previous runs
+        ledger = TokenLedger(llm_budget, usage=checkpoint.llm_usage)
+        degraded_prefilter: LexicalPrefilter | None = None
+        budget_logged = False
+
         async with telegram_client as client:
-            assert isinstance(client, TelegramClient)  # for typing
 
             # Set the job state to running
             logger.info(f"{job_id}: Starting Job")
             job_state = BaseJobState.RUNNING
             # job.touch()
 
-            data = []
-            augmented_data = []
+            messages_read = 0
+            augmented_rows = checkpoint.augmented_rows
+            # relevance scores of the messages read ahead, kept by the job as the scorer is shared by the server's jobs
+            primed_scores: Dict[str, float] = {}
             filter = "forest wildfire"
-            # Enables `response_model`
-            instructor_client = instructor.from_openai(OpenAI(api_key=openai_api_key))
+            if instructor_client is None:
+                # Enables `response_model`
+                instructor_client = instructor.from_openai(
+                    OpenAI(api_key=openai_api_key)
+                )
+            # every attempt is accounted for, including the ones retried by the rate limiter
+            instructor_client = LedgerClient(instructor_client, ledger)  # type: ignore
+            if rate_limiter is not None:
+                instructor_client = RateLimitedClient(instructor_client, rate_limiter)  # type: ignore
+            if geolocator is None:
+                geolocator = Nominatim(user_agent="location_to_lat_long")
 
-            try:
-                async for message in client.iter_messages(
-                    f"https://t.me/{channel_name}"
+            if stream is not None:
+                groups = _stream_groups(
+                    subscribe(client, f"https://t.me/{channel_name}", stream, stop)
+                )
+            else:
+                messages = track_async_iterator(
+                    "telegram_iter_messages",
+                    client.iter_messages(
+                        f"https://t.me/{channel_name}",
+                        offset_id=checkpoint.last_message_id or 0,
+                    ),
+                )
+                if relevance_scorer is not None:
+                    messages = _prefetch(
+                        messages,
+                        relevance_scorer.config.batch_size,
+                        lambda batch: primed_scores.update(
+                            relevance_scorer.prime(  # type: ignore
+                                message.text
+                                for message in batch
+                                if message.text and message.id not in augmented_rows
+                            )
+                        ),
+                    )
+                groups = _group_albums(messages)
+
+            # the near-duplicates being augmented, and the photos being uploaded, for a later one to wait for them
+            texts_in_flight = _InFlight(
+                lambda signature, other: (signature == other).mean() >= text_index.threshold  # type: ignore
+            )
+            photos_in_flight = _InFlight(
+                lambda photo_hash, other: (photo_hash ^ other).bit_count() <= photo_index.max_distance  # type: ignore
+            )
+
+            # the augmentations not yet recorded, by message id
+            augmenting: Dict[int, asyncio.Future] = {}
+            # with a budget, the LLM is called for one message at a time, for the budget to be checked against the calls
+            # made for all the earlier messages
+            budget = ledger.budget
+            llm_lock = (
+                asyncio.Lock()
+                if any(cap is not None for cap in (budget.max_tokens, budget.max_cost, budget.max_requests))
+                else contextlib.nullcontext()
+            )
+
+            async def augment(group: Tuple[Any, List | None]) -> Tuple[Any, List | None, _Augmentation | None]:
+                """
+                Check the relevance of a message and augment it, unless it was already augmented in a previous run. An
+                album is augmented once, from its caption.
+                """
+                message, album = group
+                augmentation = None
+                if (
+                    message is not None
+                    and message.text
+                    and message.id not in augmented_rows
+                    and (not album or message.id == _caption_message_id(album))
                 ):
-                    ############################################################
-                    # IF YOU CAN ALREADY VALIDATE YOUR DATA HERE
-                    # YOU MIGHT NOT NEED A LLM TO FIX ISSUES WITH THE DATA
-                    ############################################################
-                    logger.info(f"message: {message}")
-                    data.append(
-                        [
-                            message.sender_id,
-                            message.text,
-                            message.date,
-                            message.id,
-                            message.post_author,
-                            message.views,
-                            message.peer_id.channel_id,
-                        ]
+                    with tracer.start_span(
+                        "telegram.augment",
+                        attributes={
+                            "tracer_id": tracer_id,
+                            "job_id": job_id,
+                            "channel_name": channel_name,
+                            "message_id": message.id,
+                        },
+                    ):
+                        # shielded, for an augmentation made ahead of a failure to still be checkpointed
+                        augmenting[message.id] = asyncio.ensure_future(augment_message(message))
+                        augmentation = await asyncio.shield(augmenting[message.id])
+                if message is not None and message.text:
+                    # the score of a message that was not evaluated, e.g. a duplicate, is not kept
+                    primed_scores.pop(message.text, None)
+                return message, album, augmentation
+
+            async def augment_message(message: Any) -> _Augmentation:
+                """
+                Pre-filter a message, then reuse the augmentation of a near-duplicate or augment it with the LLM.
+                """
+                decision = prefilter.evaluate(message.text) if prefilter else None
+                if decision and not decision.candidate:
+                    events.debug(
+                        "prefiltered",
+                        job_id=job_id,
+                        message_id=message.id,
+                        reason=decision.reason,
+                        keywords=decision.keywords,
                     )
-                    if message.text:
-                        augmented_data.append(
-                            augment_telegram(instructor_client, message, filter)
+                    return _Augmentation(None, None, False)
+
+                signature = minhash(normalize(strip_noise(message.text))) if text_index is not None else None
+                duplicate = text_index.find(signature) if signature is not None else None  # type: ignore
+                # looked up before the first wait, so in channel order whatever the concurrency
+                in_flight = signature is not None and not duplicate
+                earlier = texts_in_flight.start(message.id, signature) if in_flight else None
+                try:
+                    if earlier is not None:
+                        # a near-duplicate is being augmented: its relevance and augmentation are reused
+                        await earlier.wait()
+                        duplicate = text_index.find(signature)  # type: ignore
+                    if duplicate:
+                        entry, similarity = duplicate
+                        DUPLICATE_MESSAGES.inc(relevant=str(entry["relevant"]).lower())
+                        events.info(
+                            "duplicate_message",
+                            job_id=job_id,
+                            message_id=message.id,
+                            duplicate_of=entry["message"],
+                            similarity=round(similarity, 3),
                         )
+                        row = [message.peer_id.channel_id, message.text, *entry["row"]] if entry["row"] else None
+                        return _Augmentation(row, entry["message"], False)
 
-                    # Check if the message has media (photo or video)
-                    if message.media:
+                    async with llm_lock:
+                        return await augment_with_llm(message, signature)
+                finally:
+                    if in_flight:
+                        texts_in_flight.finish(message.id)
 
-                        if (
-                            hasattr(message.media, "photo")
-                            and message.media.photo is not None
-                        ):
+            async def augment_with_llm(message: Any, signature: Any) -> _Augmentation:
+                """
+                Check the relevance of a message and augment it with the LLM, unless the budget is exceeded.
+                """
+                nonlocal budget_logged, degraded_prefilter
+                if ledger.exceeded():
+                    if not budget_logged:
+                        budget_logged = True
+                        logger.warning(
+                            f"{job_id}: LLM budget exceeded ({ledger.usage.budget_exceeded}), going on without augmentation ({ledger.budget.degraded_mode})"
+                        )
+                    candidate = True
+                    # configured, the pre-filter already let the message through
+                    if ledger.budget.degraded_mode == "prefilter_only" and prefilter is None:
+                        degraded_prefilter = degraded_prefilter or LexicalPrefilter()
+                        candidate = degraded_prefilter.evaluate(message.text).candidate
+                    events.debug(
+                        "unaugmented",
+                        job_id=job_id,
+                        message_id=message.id,
+                        candidate=candidate,
+                    )
+                    return _Augmentation(None, None, candidate)
 
-                            # Download photo
-                            with tempfile.NamedTemporaryFile() as tmp:
-                                logger.info(
-                                    f"{job_id}: Downloading photo to {tmp.name}"
-                                )
-                                file_location = await client.download_media(
-                                    message.media.photo, file=tmp.name
-                                )
+                relevant: bool | None = None
+                if relevance_scorer is not None:
+                    score = await asyncio.to_thread(relevance_scorer.evaluate, message.text, primed_scores)
+                    events.debug(
+                        "relevance_score",
+                        job_id=job_id,
+                        message_id=message.id,
+                        score=round(score.score, 4),
+                        decision=score.decision,
+                    )
+                    # borderline messages are left to the LLM
+                    relevant = {"relevant": True, "irrelevant": False}.get(score.decision)
+                # LLM calls block, and may wait for the rate limiter: they run in a thread, so that the other jobs
+                # of the server, and its endpoints, keep going meanwhile
+                if relevant is None and signature is not None:
+                    # known separately from a failed augmentation, so that it can be reused
+                    relevant = await asyncio.to_thread(
+                        check_relevance, instructor_client, message.text, filter, model_cascade
+                    )
+                augmented_row = None
+                if relevant is not False:
+                    augmented_row = await asyncio.to_thread(
+                        augment_telegram,
+                        instructor_client,
+                        message,
+                        filter,
+                        geolocator,
+                        relevant=relevant,
+                        models=model_cascade,
+                        extractor=rule_extractor,
+                    )
+                # failed augmentations are not reused, they are tried again for duplicates
+                if signature is not None and (relevant is False or augmented_row):
+                    text_index.add(  # type: ignore
+                        signature,
+                        {
+                            "message": f"{channel_name}/{message.id}",
+                            "relevant": bool(augmented_row),
+                            "row": augmented_row[2:] if augmented_row else None,
+                        },
+                    )
+                # irrelevant or failed messages are not part of the output
+                return _Augmentation(augmented_row or None, None, False)
+
+            async def download(
+                item: Tuple[Any, List | None, _Augmentation | None]
+            ) -> Tuple[Any, List | None, _Augmentation | None, Dict[int, Any], Dict[int, int]]:
+                """
+                Download the media of a message, or of a whole album with its first message, and hash its photos, ahead
+                of their upload.
+                """
+                message, album, augmentation = item
+                files: Dict[int, Any] = {}
+                photo_hashes: Dict[int, int] = {}
+                if message is None or defer_media:
+                    return message, album, augmentation, files, photo_hashes
+                with tracer.start_span(
+                    "telegram.prefetch",
+                    attributes={
+                        "tracer_id": tracer_id,
+                        "job_id": job_id,
+                        "channel_name": channel_name,
+                        "message_id": message.id,
+                    },
+                ):
+                    if album:
+                        if message is album[0]:
+                            files = await _download_album(
+                                job_id,
+                                client,
+                                [item for item in album if item.id not in registered_media],
+                                tracer,
+                            )
+                    elif message.id not in registered_media and (media := _message_media(message)) is not None:
+                        media_object, media_type = media
+                        tmp = tempfile.NamedTemporaryFile()
+                        try:
+                            events.debug(
+                                "download_start",
+                                job_id=job_id,
+                                message_id=message.id,
+                                media_type=media_type,
+                                file=tmp.name,
+                            )
+                            await _download_media(client, media_object, tmp.name, media_type, tracer)
+                        except BaseException:
+                            tmp.close()
+                            raise
+                        files[message.id] = tmp
+                    if photo_index is not None:
+                        try:
+                            for item in album or [message]:
+                                if item.id in files and _message_media(item)[1] == "photo":  # type: ignore
+                                    photo_hash = await _hash_photo(job_id, item.id, files[item.id].name, photo_index, tracer)
+                                    if photo_hash is not None:
+                                        photo_hashes[item.id] = photo_hash
+                        except BaseException:
+                            _close_files(files)
+                            raise
+                return message, album, augmentation, files, photo_hashes
 
-                                logger.info(
-                                    f"{job_id}: Downloaded photo: {file_location}"
+            async def upload(
+                item: Tuple[Any, List | None, _Augmentation | None, Dict[int, Any], Dict[int, int]]
+            ) -> Tuple[Any, List | None, _Augmentation | None, Dict[int, _Upload]]:
+                """
+                Upload and register the media of a message, or of a whole album with its first message, unless they were
+                already in a previous run, and release their downloaded files.
+                """
+                message, album, augmentation, files, photo_hashes = item
+                uploads: Dict[int, _Upload] = {}
+                try:
+                    if message is None or defer_media or (album and message is not album[0]):
+                        return message, album, augmentation, uploads
+                    members = [
+                        member for member in album or [message] if member.media and member.id not in registered_media
+                    ]
+                    # looked up before the first wait, so in channel order whatever the concurrency
+                    in_flight: Dict[int, asyncio.Event | None] = {}
+                    for member in members:
+                        photo_hash = photo_hashes.get(member.id)
+                        if photo_hash is not None and not photo_index.find(photo_hash):  # type: ignore
+                            in_flight[member.id] = photos_in_flight.start(member.id, photo_hash)
+                    try:
+                        with tracer.start_span(
+                            "telegram.upload",
+                            attributes={
+                                "tracer_id": tracer_id,
+                                "job_id": job_id,
+                                "channel_name": channel_name,
+                                "message_id": message.id,
+                            },
+                        ):
+                            for member in members:
+                                uploaded = await upload_media(
+                                    member,
+                                    album,
+                                    files.pop(member.id, None),
+                                    photo_hashes.get(member.id),
+                                    in_flight.get(member.id),
                                 )
+                                if uploaded is not None:
+                                    uploads[member.id] = uploaded
+                    finally:
+                        for member_id in in_flight:
+                            photos_in_flight.finish(member_id)
+                finally:
+                    _close_files(files)
+                return message, album, augmentation, uploads
 
-                                file_name = f"{os.path.basename(tmp.name)}"
-                                relative_path = f"telegram/{tracer_id}/{job_id}/photos/{channel_name}-{file_name}.photo"
+            async def upload_media(
+                message: Any,
+                album: List | None,
+                downloaded: Any,
+                photo_hash: int | None,
+                earlier: asyncio.Event | None,
+            ) -> _Upload | None:
+                """
+                Upload and register the photo or video of a message, downloading it unless downloaded ahead.
 
-                                data_name = os.path.splitext(file_name)[0]
+                :return: what was registered, or None if the media is neither a photo nor a video.
+                """
+                nonlocal current_data
+                # the media of an album share its reference
+                media_name = f"{channel_name}-album-{message.grouped_id}" if album else channel_name
 
-                                media_data = KernelPlancksterSourceData(
-                                    name=data_name,
-                                    protocol=protocol,
-                                    relative_path=relative_path,
-                                )
+                if hasattr(message.media, "photo") and message.media.photo is not None:
+                    with downloaded or tempfile.NamedTemporaryFile() as tmp:
+                        file_location = tmp.name
+                        if downloaded is None:
+                            events.debug(
+                                "download_start",
+                                job_id=job_id,
+                                message_id=message.id,
+                                media_type="photo",
+                                file=tmp.name,
+                            )
+                            file_location = await _download_media(
+                                client, message.media.photo, tmp.name, "photo", tracer
+                            )
+                            if photo_index is not None:
+                                photo_hash = await _hash_photo(job_id, message.id, tmp.name, photo_index, tracer)
 
-                                current_data = media_data
+                        events.info(
+                            "downloaded",
+                            job_id=job_id,
+                            message_id=message.id,
+                            media_type="photo",
+                            file=file_location,
+                        )
 
-                                scraped_data_repository.register_scraped_photo(
-                                    job_id=job_id,
-                                    source_data=media_data,
-                                    local_file_name=tmp.name,
-                                )
+                        duplicate = None
+                        if photo_hash is not None:
+                            if earlier is not None:
+                                # a near-duplicate is being uploaded: it is linked to once stored
+                                await earlier.wait()
+                            duplicate = photo_index.find(photo_hash)  # type: ignore
 
-                                output_data_list.append(media_data)
-                                # job.touch()
+                        if duplicate:
+                            stored_data, distance = duplicate
+                            DUPLICATE_PHOTOS.inc(policy=duplicate_photos)
+                            events.info(
+                                "duplicate_photo",
+                                job_id=job_id,
+                                message_id=message.id,
+                                duplicate_of=stored_data.relative_path,
+                                distance=distance,
+                            )
+                            return _Upload([stored_data] if duplicate_photos == "link" else [], [], None)
 
-                                last_successful_data = media_data
+                        file_name = f"{os.path.basename(tmp.name)}"
+                        relative_path = f"telegram/{tracer_id}/{job_id}/photos/{media_name}-{file_name}.photo"
 
-                        elif (
-                            hasattr(message.media, "document")
-                            and message.media.document is not None
-                        ):
+                        data_name = os.path.splitext(file_name)[0]
 
-                            # Download video (or other documents)
-                            with tempfile.NamedTemporaryFile() as tmp:
+                        media_data = KernelPlancksterSourceData(
+                            name=data_name,
+                            protocol=protocol,
+                            relative_path=relative_path,
+                        )
 
-                                file_location = await client.download_media(
-                                    message.media.document,
-                                    file=tmp.name,
-                                )
-                                logger.info(
-                                    f"{job_id}: Downloaded video: {file_location}"
-                                )
+                        current_data = media_data
 
-                                file_name = f"{os.path.basename(tmp.name)}"
-                                relative_path = f"telegram/{tracer_id}/{job_id}/videos/{channel_name}-{file_name}.video"
-                                data_name = os.path.splitext(file_name)[0]
+                        transforms: List[ImageTransformRecord] = []
+                        upload_file, mime_type = tmp.name, None
+                        if image_transform is not None:
+                            upload_file, mime_type = await _transform_photo(
+                                job_id,
+                                tmp.name,
+                                media_data,
+                                image_transform,
+                                transforms,
+                                tracer,
+                            )
 
-                                document_data = KernelPlancksterSourceData(
-                                    name=data_name,
-                                    protocol=protocol,
-                                    relative_path=relative_path,
-                                )
+                        # uploads and registrations block: they run in a thread, so that the next messages are fetched
+                        # and their media downloaded meanwhile
+                        try:
+                            await asyncio.to_thread(
+                                scraped_data_repository.register_scraped_photo,
+                                job_id=job_id,
+                                source_data=media_data,
+                                local_file_name=upload_file,
+                                mime_type=mime_type,
+                            )
+                        finally:
+                            if upload_file != tmp.name:
+                                os.remove(upload_file)
+
+                        if photo_hash is not None:
+                            photo_index.add(photo_hash, media_data)  # type: ignore
+
+                        return _Upload([media_data], transforms, None)
+
+                if hasattr(message.media, "document") and message.media.document is not None:
+                    with downloaded or tempfile.NamedTemporaryFile() as tmp:
+                        file_location = tmp.name
+                        if downloaded is None:
+                            file_location = await _download_media(
+                                client, message.media.document, tmp.name, "video", tracer
+                            )
+                        events.info(
+                            "downloaded",
+                            job_id=job_id,
+                            message_id=message.id,
+                            media_type="video",
+                            file=file_location,
+                        )
+
+                        file_name = f"{os.path.basename(tmp.name)}"
+                        relative_path = f"telegram/{tracer_id}/{job_id}/videos/{media_name}-{file_name}.video"
+                        data_name = os.path.splitext(file_name)[0]
+
+                        document_data = KernelPlancksterSourceData(
+                            name=data_name,
+                            protocol=protocol,
+                            relative_path=relative_path,
+                        )
+
+                        current_data = document_data
+
+                        source_data_list: List[KernelPlancksterSourceData] = []
+                        deferred: DeferredMediaRecord | None = None
+                        upload_original = True
+                        mime_type = getattr(message.media.document, "mime_type", None)
+                        if video_reduction is not None and (mime_type or "").startswith("video/"):
+                            reduced_data = await _reduce_video(
+                                job_id,
+                                tmp.name,
+                                f"telegram/{tracer_id}/{job_id}",
+                                f"{media_name}-{file_name}",
+                                video_reduction,
+                                scraped_data_repository,
+                                tracer,
+                            )
+                            if reduced_data:
+                                source_data_list.extend(reduced_data)
+                                upload_original = video_reduction.original == "upload"
+                                if video_reduction.original == "defer":
+                                    deferred = DeferredMediaRecord(
+                                        message_id=message.id,
+                                        channel_name=channel_name,
+                                        relative_path=relative_path,
+                                        mime_type=mime_type,
+                                        bytes=os.path.getsize(tmp.name),
+                                        media_type="video",
+                                        grouped_id=message.grouped_id if album else None,
+                                    )
+
+                        if upload_original:
+                            await asyncio.to_thread(
+                                scraped_data_repository.register_scraped_video_or_document,
+                                job_id=job_id,
+                                source_data=document_data,
+                                local_file_name=tmp.name,
+                            )
+                            source_data_list.append(document_data)
+
+                        return _Upload(source_data_list, [], deferred)
+
+                return None
 
-                                current_data = document_data
+            # the deferred media whose relevance was settled, when the state of their micro-batch was dropped
+            settled_media = 0
 
-                                scraped_data_repository.register_scraped_video_or_document(
-                                    job_id=job_id,
-                                    source_data=document_data,
-                                    local_file_name=tmp.name,
+            async def register_batch(evict: bool = True) -> None:
+                """
+                Register the current micro-batch of a streaming job, then drop the state of its messages, so that the
+                memory of the job does not grow with the stream. Everything dropped is registered by then.
+                """
+                nonlocal settled_media
+                message_ids = await asyncio.to_thread(
+                    _register_batch,
+                    job_id,
+                    tracer_id,
+                    batcher,  # type: ignore
+                    augmented_rows,
+                    scraped_data_repository,
+                    output_data_list,
+                    artifact,
+                )
+                if not evict:
+                    return
+                # the relevance of deferred media is read from the augmented rows, before they are dropped
+                _settle_relevance(deferred_media[settled_media:], augmented_rows, albums)
+                settled_media = len(deferred_media)
+                for message_id in message_ids:
+                    augmented_rows.pop(message_id, None)
+                    registered_media.discard(message_id)
+                # the albums of the stream are received whole, so all of them are in registered micro-batches
+                albums.clear()
+                output_data_list.clear()
+                image_transforms.clear()
+                duplicate_messages.clear()
+
+            pipeline = pipeline or ScrapePipelineConfig()
+            scrape_pipeline = Pipeline(
+                "scrape",
+                [
+                    Stage(
+                        "augment",
+                        augment,
+                        StageConfig(concurrency=pipeline.augment_concurrency, queue_size=pipeline.read_ahead),
+                    ),
+                    Stage(
+                        "download",
+                        download,
+                        StageConfig(concurrency=pipeline.download_concurrency, queue_size=pipeline.read_ahead),
+                        discard=lambda item: _close_files(item[3]),
+                    ),
+                    Stage(
+                        "upload",
+                        upload,
+                        StageConfig(concurrency=pipeline.upload_concurrency, queue_size=pipeline.download_ahead),
+                    ),
+                ],
+                source="fetch",
+                sink="process",
+                sink_queue_size=pipeline.read_ahead,
+            )
+            items = scrape_pipeline.run(groups)
+
+            def record_augmentation(message_id: int, augmentation: _Augmentation) -> None:
+                if augmentation.row:
+                    augmented_rows[message_id] = augmentation.row
+                if augmentation.duplicate_of:
+                    duplicate_messages.setdefault(augmentation.duplicate_of, []).append(f"{channel_name}/{message_id}")
+
+            # the uploads of the album being processed, made with its first message
+            album_uploads: Dict[int, _Upload] = {}
+            # a checkpoint is saved between albums, since all the media of an album are uploaded with its first message
+            checkpoint_saved_at = checkpoint.processed_messages
+
+            fetch_started = time.time_ns()
+            try:
+                async for message, album, augmentation, uploads in items:
+                    if message is None:
+                        # no new message for a while: do not hold back the ones received so far
+                        if batcher.due():  # type: ignore
+                            await register_batch()
+                        fetch_started = time.time_ns()
+                        continue
+
+                    with tracer.start_span(
+                        "telegram.message",
+                        attributes={
+                            "tracer_id": tracer_id,
+                            "job_id": job_id,
+                            "channel_name": channel_name,
+                            "message_id": message.id,
+                        },
+                        start_time_unix_nano=fetch_started,
+                    ):
+                        tracer.record_span(
+                            "telegram.fetch", fetch_started, time.time_ns()
+                        )
+
+                        ############################################################
+                        # IF YOU CAN ALREADY VALIDATE YOUR DATA HERE
+                        # YOU MIGHT NOT NEED A LLM TO FIX ISSUES WITH THE DATA
+                        ############################################################
+                        events.info(
+                            "message",
+                            job_id=job_id,
+                            message_id=message.id,
+                            has_text=bool(message.text),
+                            has_media=message.media is not None,
+                        )
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("message: %s", message)
+                        if album and message is album[0]:
+                            media_album = albums.setdefault(
+                                message.grouped_id,
+                                MediaAlbum(
+                                    grouped_id=message.grouped_id,
+                                    channel_name=channel_name,
+                                    caption_message_id=_caption_message_id(album),
+                                ),
+                            )
+                        if album:
+                            media_album.message_ids.append(message.id)  # type: ignore
+                        source_data_count = len(output_data_list)
+                        messages_read += 1
+
+                        # the augmentation, and the uploads, ran ahead: their outcomes are recorded in channel order
+                        augmenting.pop(message.id, None)
+                        if augmentation is not None:
+                            record_augmentation(message.id, augmentation)
+                            if augmentation.unaugmented:
+                                ledger.usage.unaugmented_messages.append(message.id)
+
+                        media = _message_media(message) if defer_media else None
+                        if media is not None and message.id not in registered_media:
+                            media_object, media_type = media
+                            media_name = f"{channel_name}-album-{message.grouped_id}" if album else channel_name
+                            deferred_media.append(
+                                DeferredMediaRecord(
+                                    message_id=message.id,
+                                    channel_name=channel_name,
+                                    relative_path=f"telegram/{tracer_id}/{job_id}/{media_type}s/{media_name}-{message.id}.{media_type}",
+                                    mime_type=getattr(media_object, "mime_type", None)
+                                    or ("image/jpeg" if media_type == "photo" else None),
+                                    bytes=_media_size(media_object),
+                                    media_type=media_type,
+                                    grouped_id=message.grouped_id if album else None,
                                 )
+                            )
+                            registered_media.add(message.id)
 
-                                output_data_list.append(document_data)
-                                # job.touch()
-                                last_successful_data = document_data
-
-                with tempfile.NamedTemporaryFile() as tmp:
-                    df = pd.DataFrame(
-                        augmented_data,
-                        columns=[
-                            "Title",
-                            "Telegram",
-                            "Extracted_Location",
-                            "Resolved_Latitude",
-                            "Resolved_Longitude",
-                            "Month",
-                            "Day",
-                            "Year",
-                            "Disaster_Type",
-                        ],
-                    )
-                    file_name = f"{os.path.basename(tmp.name)}"
-                    df.to_json(
-                        f"{tmp.name}",
-                        orient="index",
-                        indent=4,
+                        album_uploads.update(uploads)
+                        uploaded = album_uploads.pop(message.id, None)
+                        if uploaded is not None:
+                            output_data_list.extend(uploaded.source_data_list)
+                            image_transforms.extend(uploaded.image_transforms)
+                            if uploaded.deferred is not None:
+                                deferred_media.append(uploaded.deferred)
+                            registered_media.add(message.id)
+                            if uploaded.source_data_list:
+                                last_successful_data = uploaded.source_data_list[-1]
+
+                    if album:
+                        media_album.source_data_list.extend(output_data_list[source_data_count:])  # type: ignore
+
+                    checkpoint.last_message_id = message.id
+                    checkpoint.processed_messages += 1
+                    if (
+                        checkpoint_store
+                        and checkpoint.processed_messages - checkpoint_saved_at >= checkpoint_store.every
+                        and (not album or message is album[-1])
+                    ):
+                        checkpoint_saved_at = checkpoint.processed_messages
+                        await _save_checkpoint(
+                            checkpoint_store,
+                            checkpoint,
+                            registered_media,
+                            output_data_list,
+                        )
+                        if photo_index is not None:
+                            await asyncio.to_thread(photo_index.flush)
+                        if text_index is not None:
+                            await asyncio.to_thread(text_index.flush)
+
+                    if batcher is not None:
+                        batcher.add(message)
+                        # the messages of an album are registered in the same micro-batch
+                        if batcher.due() and (not album or message is album[-1]):
+                            await register_batch()
+
+                    fetch_started = time.time_ns()
+
+                _settle_relevance(deferred_media[settled_media:], augmented_rows, albums)
+                if deferred_media:
+                    await asyncio.to_thread(
+                        _register_deferred_media, job_id, tracer_id, deferred_media, scraped_data_repository
                     )
 
-                    final_augmented_data = KernelPlancksterSourceData(
-                        name=f"telegram_all_augmented",
-                        protocol=protocol,
-                        relative_path=f"telegram/{tracer_id}/{job_id}/augmented/data.json",
+                if batcher is not None:
+                    # the last micro-batch, however small; its state is kept for the job output
+                    if len(batcher):
+                        await register_batch(evict=False)
+                else:
+                    await asyncio.to_thread(
+                        _register_augmented_rows,
+                        job_id,
+                        list(augmented_rows.values()),
+                        KernelPlancksterSourceData(
+                            name=f"telegram_all_augmented",
+                            protocol=protocol,
+                            relative_path=f"telegram/{tracer_id}/{job_id}/augmented/data.json",
+                        ),
+                        scraped_data_repository,
+                        artifact,
                     )
-                    try:
-                        scraped_data_repository.register_scraped_json(
-                            final_augmented_data,
-                            job_id,
-                            f"{tmp.name}",
-                        )
-                    except Exception as e:
-                        logger.info(f"Could not register file. Error:\n{e}")
 
             except Exception as error:
                 job_state = BaseJobState.FAILED
@@ -277,14 +1040,51 @@ async def scrape(
                 # job.touch()
 
                 # continue to scrape data if possible
+                if checkpoint_store:
+                    # the messages augmented ahead are not augmented again on resume, like those whose media failed
+                    await items.aclose()
+                    await asyncio.gather(*augmenting.values(), return_exceptions=True)
+                    for message_id, augmentation in augmenting.items():
+                        if not augmentation.cancelled() and augmentation.exception() is None:
+                            if augmentation.result().row:
+                                record_augmentation(message_id, augmentation.result())
+                    await _save_checkpoint(
+                        checkpoint_store, checkpoint, registered_media, output_data_list
+                    )
+                    logger.error(
+                        f"{job_id}: Saved checkpoint after message {checkpoint.last_message_id}, rerun with resume to continue from there"
+                    )
+
+            await items.aclose()
+            if photo_index is not None:
+                await asyncio.to_thread(photo_index.flush)
+            if text_index is not None:
+                await asyncio.to_thread(text_index.flush)
 
-            job_state = BaseJobState.FINISHED
+            if job_state != BaseJobState.FAILED:
+                job_state = BaseJobState.FINISHED
+                if checkpoint_store:
+                    checkpoint_store.delete(tracer_id, job_id, channel_name)
             # job.touch()
-            logger.info(f"{job_id}: Job finished")
+            tracer.flush()
+            logger.info(f"{job_id}: Job finished, {messages_read} messages read")
             return JobOutput(
                 job_state=job_state,
                 tracer_id=tracer_id,
                 source_data_list=output_data_list,
+                metrics=summarize_stages(since=metrics_baseline),
+                image_transforms=image_transforms if image_transform is not None else None,
+                deferred_media=deferred_media if video_reduction is not None or defer_media else None,
+                message_latency=batcher.latency_summary() if batcher is not None else None,
+                pipeline=scrape_pipeline.stats(),
+                duplicate_messages=[
+                    DuplicateMessageCluster(original=original, duplicates=duplicates)
+                    for original, duplicates in duplicate_messages.items()
+                ]
+                if text_index is not None
+                else None,
+                llm_usage=ledger.usage,
+                albums=list(albums.values()) or None,
             )
 
     except Exception as error:
@@ -296,7 +1096,490 @@ async def scrape(
         # job.messages.append(f"Status: FAILED. Unable to scrape data. {e}")
 
 
-def augment_telegram(client: Instructor, message: any, filter: str):
+class _Augmentation(NamedTuple):
+    """
+    The outcome of the augmentation of a message, recorded in channel order.
+    """
+
+    row: List | None
+    # the message it is a near-duplicate of, if any
+    duplicate_of: str | None
+    # not augmented since the LLM budget is exceeded, while a candidate
+    unaugmented: bool
+
+
+class _Upload(NamedTuple):
+    """
+    What was registered for the media of a message, recorded in channel order.
+    """
+
+    source_data_list: List[KernelPlancksterSourceData]
+    image_transforms: List[ImageTransformRecord]
+    deferred: DeferredMediaRecord | None
+
+
+class _InFlight:
+    """
+    The items being processed concurrently, for a later near-duplicate to wait for the earliest of them rather than
+    process it again. Items are started in channel order, so that the outcome is the one of a serial run.
+    """
+
+    def __init__(self, duplicates: Callable[[Any, Any], bool]):
+        self._duplicates = duplicates
+        self._items: Dict[int, Tuple[Any, asyncio.Event]] = {}
+
+    def start(self, item_id: int, key: Any) -> asyncio.Event | None:
+        """
+        :return: the event set once the earliest near-duplicate in flight is done, if any.
+        """
+        earlier = next((event for other, event in self._items.values() if self._duplicates(key, other)), None)
+        self._items[item_id] = (key, asyncio.Event())
+        return earlier
+
+    def finish(self, item_id: int) -> None:
+        _, event = self._items.pop(item_id)
+        event.set()
+
+
+def _caption_message_id(album: List) -> int | None:
+    # the caption is on one message of the album, usually the first sent
+    return min((item.id for item in album if item.text), default=None)
+
+
+async def _hash_photo(
+    job_id: int, message_id: int, file_name: str, photo_index: PerceptualHashIndex, tracer: Tracer
+) -> int | None:
+    """
+    The perceptual hash of a downloaded photo, computed in the process pool.
+
+    :return: the hash, or None if the photo could not be hashed, in which case it is uploaded.
+    """
+    try:
+        with track_stage("photo_hash"), tracer.start_span("photo.hash"):
+            return await run_in_process(image_hash, file_name, photo_index.algorithm)
+    except Exception as error:
+        logging.getLogger(__name__).warning(
+            f"{job_id}: Could not hash the photo of message {message_id}, uploading it. Error: {error}"
+        )
+        return None
+
+
+async def _transform_photo(
+    job_id: int,
+    file_name: str,
+    source_data: KernelPlancksterSourceData,
+    config: ImageTransformConfig,
+    image_transforms: List[ImageTransformRecord],
+    tracer: Tracer,
+) -> Tuple[str, str | None]:
+    """
+    Downscale and re-encode a downloaded photo in the process pool.
+
+    :return: the file to upload, the transformed photo or the original if it could not be made smaller, and its content
+        type if it was transformed.
+    """
+    transformed_file = f"{file_name}.{config.format.lower()}"
+    try:
+        with track_stage("image_transform"), tracer.start_span("photo.transform"):
+            result = await run_in_process(transform_image, file_name, transformed_file, config)
+    except Exception as error:
+        logging.getLogger(__name__).warning(
+            f"{job_id}: Could not transform photo {source_data.relative_path}, uploading the original. Error: {error}"
+        )
+        if os.path.exists(transformed_file):
+            os.remove(transformed_file)
+        return file_name, None
+
+    if not result.transformed:
+        return file_name, None
+
+    record = ImageTransformRecord(
+        relative_path=source_data.relative_path,
+        original_width=result.original_width,
+        original_height=result.original_height,
+        original_bytes=os.path.getsize(file_name),
+        width=result.width,
+        height=result.height,
+        bytes=os.path.getsize(transformed_file),
+        format=result.format,
+    )
+    image_transforms.append(record)
+    record_bytes("image_transform", record.bytes)
+    IMAGE_BYTES_SAVED.inc(max(0, record.bytes_saved))
+    return transformed_file, MIME_TYPES[result.format]
+
+
+async def _reduce_video(
+    job_id: int,
+    file_name: str,
+    relative_prefix: str,
+    base_name: str,
+    config: VideoReductionConfig,
+    scraped_data_repository: ScrapedDataRepository,
+    tracer: Tracer,
+) -> List[KernelPlancksterSourceData]:
+    """
+    Extract keyframes from, or transcode a proxy of, a downloaded video in the process pool, and register them.
+
+    :return: the registered keyframes or proxy, or an empty list if the video could not be reduced.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        with track_stage("video_reduction"), tracer.start_span(
+            "video.reduce", attributes={"mode": config.mode}
+        ):
+            reduced = await run_in_process(reduce_video, file_name, file_name, config)
+    except Exception as error:
+        logger.warning(
+            f"{job_id}: Could not reduce video {base_name}, uploading the original. Error: {error}"
+        )
+        return []
+
+    reduced_data: List[KernelPlancksterSourceData] = []
+    try:
+        for index, reduced_file in enumerate(reduced.files):
+            record_bytes("video_reduction", os.path.getsize(reduced_file))
+            if config.mode == "proxy":
+                source_data = KernelPlancksterSourceData(
+                    name=f"{base_name}-proxy",
+                    protocol=scraped_data_repository.protocol,
+                    relative_path=f"{relative_prefix}/videos/{base_name}.proxy.video",
+                )
+                await asyncio.to_thread(
+                    scraped_data_repository.register_scraped_video_or_document,
+                    job_id=job_id,
+                    source_data=source_data,
+                    local_file_name=reduced_file,
+                )
+            else:
+                source_data = KernelPlancksterSourceData(
+                    name=f"{base_name}-keyframe-{index:03d}",
+                    protocol=scraped_data_repository.protocol,
+                    relative_path=f"{relative_prefix}/keyframes/{base_name}-{index:03d}.photo",
+                )
+                await asyncio.to_thread(
+                    scraped_data_repository.register_scraped_photo,
+                    job_id=job_id,
+                    source_data=source_data,
+                    local_file_name=reduced_file,
+                )
+            reduced_data.append(source_data)
+    finally:
+        for reduced_file in reduced.files:
+            if os.path.exists(reduced_file):
+                os.remove(reduced_file)
+
+    REDUCED_VIDEOS.inc(original=config.original)
+    return reduced_data
+
+
+async def _stream_groups(batches: AsyncIterator[List[Any]]) -> AsyncIterator[Tuple[Any, List | None]]:
+    """
+    Yield each streamed message with its album, like `_group_albums`, and (None, None) whenever no message arrived for a
+    while.
+    """
+    async for batch in batches:
+        if not batch:
+            yield None, None
+        for message in batch:
+            yield message, batch if len(batch) > 1 else None
+
+
+async def _group_albums(messages: AsyncIterator) -> AsyncIterator[Tuple[Any, List | None]]:
+    """
+    Yield each message with its album, the consecutive messages sharing its `grouped_id`, or None if it is not part of
+    an album. The messages of an album are read before its first message is yielded.
+    """
+    album: List = []
+    async for message in messages:
+        grouped_id = getattr(message, "grouped_id", None)
+        if album and grouped_id != album[0].grouped_id:
+            for item in album:
+                yield item, album if len(album) > 1 else None
+            album = []
+        if grouped_id is None:
+            yield message, None
+        else:
+            album.append(message)
+    for item in album:
+        yield item, album if len(album) > 1 else None
+
+
+def _message_media(message: Any) -> Tuple[Any, str] | None:
+    """
+    The photo or document of a message, and its media type, if any.
+    """
+    media = message.media
+    if media is None:
+        return None
+    if getattr(media, "photo", None) is not None:
+        return media.photo, "photo"
+    if getattr(media, "document", None) is not None:
+        return media.document, "video"
+    return None
+
+
+async def _download_media(client: TelegramClient, media: Any, file: str, media_type: str, tracer: Tracer) -> str:
+    with track_stage("telegram_download_media"), tracer.start_span(
+        "telegram.download", attributes={"media_type": media_type}
+    ):
+        file_location = await client.download_media(media, file=file)
+    record_bytes("telegram_download_media", os.path.getsize(file))
+    return file_location
+
+
+async def _download_album(job_id: int, client: TelegramClient, album: List, tracer: Tracer) -> Dict[int, Any]:
+    """
+    Download the media of the messages of an album concurrently.
+
+    :return: the temporary file of each message with media, by message id; the caller closes them.
+    """
+    files: Dict[int, Any] = {}
+    downloads: List[asyncio.Task] = []
+    try:
+        for message in album:
+            media = _message_media(message)
+            if media is not None:
+                files[message.id] = tempfile.NamedTemporaryFile()
+                downloads.append(
+                    asyncio.create_task(
+                        _download_media(client, media[0], files[message.id].name, media[1], tracer)
+                    )
+                )
+        with track_stage("telegram_download_album"):
+            await asyncio.gather(*downloads)
+    except BaseException:
+        # the other downloads may still be writing to their files: they are cancelled, and awaited, first
+        for download in downloads:
+            download.cancel()
+        await asyncio.gather(*downloads, return_exceptions=True)
+        _close_files(files)
+        raise
+    logging.getLogger(__name__).debug(f"{job_id}: Downloaded the {len(files)} media of album {album[0].grouped_id}")
+    return files
+
+
+def _media_size(media: Any) -> int | None:
+    """
+    The size of a document, or of the largest size of a photo, as reported by Telegram.
+    """
+    size = getattr(media, "size", None)
+    if isinstance(size, int):
+        return size
+    sizes = []
+    for photo_size in getattr(media, "sizes", None) or []:
+        # progressive photo sizes list the size of each of their progressive parts
+        progressive = getattr(photo_size, "sizes", None)
+        sizes.append(max(progressive) if progressive else getattr(photo_size, "size", 0) or 0)
+    return max(sizes) if sizes else None
+
+
+AUGMENTED_COLUMNS = [
+    "Title",
+    "Telegram",
+    "Extracted_Location",
+    "Resolved_Latitude",
+    "Resolved_Longitude",
+    "Month",
+    "Day",
+    "Year",
+    "Disaster_Type",
+]
+
+
+def _register_augmented_rows(
+    job_id: int,
+    rows: List[List[Any]],
+    source_data: KernelPlancksterSourceData,
+    scraped_data_repository: ScrapedDataRepository,
+    artifact: ArtifactConfig,
+) -> KernelPlancksterSourceData | None:
+    """
+    Write augmented rows as JSON, compressed as set by `artifact`, and upload and register the file.
+
+    :return: the registered source data, named after its encoding, or None if it could not be registered.
+    """
+    source_data = artifact_source_data(source_data, artifact)
+    with tempfile.NamedTemporaryFile() as tmp:
+        try:
+            write_rows(rows, AUGMENTED_COLUMNS, tmp.name, artifact)
+            scraped_data_repository.register_scraped_json(
+                source_data,
+                job_id,
+                f"{tmp.name}",
+            )
+        except Exception as e:
+            logging.getLogger(__name__).info(f"Could not register file. Error:\n{e}")
+            return None
+    return source_data
+
+
+def _register_batch(
+    job_id: int,
+    tracer_id: str,
+    batcher: MicroBatcher,
+    augmented_rows: Dict[int, List[Any]],
+    scraped_data_repository: ScrapedDataRepository,
+    output_data_list: List[KernelPlancksterSourceData],
+    artifact: ArtifactConfig,
+) -> List[int]:
+    """
+    Register the augmented rows of the messages of the current micro-batch of a streaming job, if any, and close it.
+
+    :return: the ids of the messages of the micro-batch.
+    """
+    rows = [augmented_rows[message_id] for message_id in batcher.pending_ids if message_id in augmented_rows]
+    if rows:
+        source_data = KernelPlancksterSourceData(
+            name=f"telegram_augmented_batch_{batcher.batches:05d}",
+            protocol=scraped_data_repository.protocol,
+            relative_path=f"telegram/{tracer_id}/{job_id}/augmented/batch-{batcher.batches:05d}.json",
+        )
+        registered = _register_augmented_rows(job_id, rows, source_data, scraped_data_repository, artifact)
+        if registered:
+            output_data_list.append(registered)
+    return batcher.take()
+
+
+def _settle_relevance(
+    deferred_media: List[DeferredMediaRecord],
+    augmented_rows: Dict[int, List[Any]],
+    albums: Dict[int, MediaAlbum],
+) -> None:
+    """
+    Set whether each deferred media not checked yet is relevant: augmented rows are only kept for relevant messages, and
+    an album is relevant if its caption is.
+    """
+    captions = {album.grouped_id: album.caption_message_id for album in albums.values()}
+    for record in deferred_media:
+        if record.relevant is None:
+            record.relevant = record.message_id in augmented_rows or (
+                captions.get(record.grouped_id) in augmented_rows  # type: ignore
+            )
+
+
+def _register_deferred_media(
+    job_id: int,
+    tracer_id: str,
+    deferred_media: List[DeferredMediaRecord],
+    scraped_data_repository: ScrapedDataRepository,
+) -> None:
+    """
+    Register the deferred media of the job as a JSON manifest, next to the augmented data.
+    """
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".json") as tmp:
+        tmp.write(
+            json.dumps([record.model_dump(mode="json") for record in deferred_media])
+        )
+        tmp.flush()
+        try:
+            scraped_data_repository.register_scraped_json(
+                KernelPlancksterSourceData(
+                    name="telegram_deferred_media",
+                    protocol=scraped_data_repository.protocol,
+                    relative_path=f"telegram/{tracer_id}/{job_id}/deferred/media.json",
+                ),
+                job_id,
+                tmp.name,
+            )
+        except Exception as error:
+            logging.getLogger(__name__).warning(
+                f"{job_id}: Could not register the deferred media manifest. Error:\n{error}"
+            )
+
+
+def _close_files(files: Dict[int, Any]) -> None:
+    for file in files.values():
+        file.close()
+    files.clear()
+
+
+async def _prefetch(
+    messages: AsyncIterator, size: int, prime: Callable[[List], None]
+) -> AsyncIterator:
+    """
+    Read messages `size` at a time, calling `prime` on each batch, in a thread, before yielding its messages.
+    """
+    batch: List = []
+    async for message in messages:
+        batch.append(message)
+        if len(batch) >= size:
+            await asyncio.to_thread(prime, batch)
+            for buffered in batch:
+                yield buffered
+            batch = []
+    if batch:
+        await asyncio.to_thread(prime, batch)
+        for buffered in batch:
+            yield buffered
+
+
+async def _save_checkpoint(
+    checkpoint_store: CheckpointStore,
+    checkpoint: ScrapeCheckpoint,
+    registered_media: set[int],
+    output_data_list: List[KernelPlancksterSourceData],
+) -> None:
+    checkpoint.registered_media = sorted(registered_media)
+    checkpoint.source_data_list = list(output_data_list)
+    try:
+        # the changes since the last save are read from the job's state on the event loop, and written in a thread
+        await asyncio.to_thread(checkpoint_store.write, checkpoint_store.prepare(checkpoint))
+    except Exception as error:
+        logging.getLogger(__name__).error(
+            f"{checkpoint.job_id}: Could not save checkpoint. Error:\n{error}"
+        )
+
+
+def check_relevance(
+    client: Instructor,
+    content: str,
+    filter: str,
+    models: ModelCascadeConfig | None = None,
+) -> bool:
+    """
+    Ask the LLM whether a message is describing `filter`, going up the cascade of models while they are not confident.
+
+    Each model's calls are timed in the `openai_filter:<model>` stage.
+    """
+    models = models or ModelCascadeConfig()
+    with track_stage("openai_filter"):
+        for tier, model in enumerate(models.filter_models):
+            last = tier == len(models.filter_models) - 1
+            with track_stage(f"openai_filter:{model}"), start_span(
+                "openai.filter", attributes={"model": model, "tier": tier}
+            ):
+                filter_data = client.chat.completions.create(
+                    model=model,
+                    response_model=filterData if last else scoredFilterData,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": f"Examine this telegram message: {content}. Is this telegram message describing {filter}? ",
+                        },
+                    ],
+                )
+            if last or filter_data.confidence >= models.min_confidence:  # type: ignore
+                return filter_data.relevant
+            LLM_ESCALATIONS.inc(model=model)
+    return False
+
+
+def augment_telegram(
+    client: Instructor,
+    message: any,
+    filter: str,
+    geolocator: Geocoder | None = None,
+    relevant: bool | None = None,
+    models: ModelCascadeConfig | None = None,
+    extractor: RuleBasedExtractor | None = None,
+):
+    """
+    :param relevant: whether the message is already known to be relevant; if None, the LLM is asked.
+    :param models: the models used for the relevance check and the extraction.
+    :param extractor: extracts the fields stated explicitly in the message, before asking the LLM for the others.
+    """
+    models = models or ModelCascadeConfig()
     logger = logging.getLogger(__name__)
     if message:
         if len(message.text) > 5:
@@ -304,29 +1587,41 @@ def augment_telegram(client: Instructor, message: any, filter: str):
             title = message.peer_id.channel_id
             content = message.text
 
-            # relvancy filter with gpt-4o
-            filter_data = client.chat.completions.create(
-                model="gpt-4o",
-                response_model=filterData,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Examine this telegram message: {content}. Is this telegram message describing {filter}? ",
-                    },
-                ],
-            )
+            if relevant is None:
+                relevant = check_relevance(client, content, filter, models)
 
-            if filter_data.relevant == True:
+            if relevant == True:
                 aug_data = None
                 try:
-                    # location extraction with gpt-4o
-                    logger.info("Extracting location and date from content")
-                    aug_data = client.chat.completions.create(
-                        model="gpt-4o",
-                        response_model=messageData,
-                        messages=[
-                            {"role": "user", "content": f"Extract: {content}"},
-                        ],
+                    extracted = {}
+                    if extractor is not None:
+                        with track_stage("rule_extraction"):
+                            extracted = extractor.extract(content)
+                    missing = tuple(name for name in messageData.model_fields if name not in extracted)
+                    if missing:
+                        # location extraction with gpt-4o
+                        logger.debug("Extracting location and date from content: %s", missing)
+                        with track_stage("openai_extract"), start_span(
+                            "openai.extract", attributes={"model": models.extraction_model}
+                        ):
+                            llm_data = client.chat.completions.create(
+                                model=models.extraction_model,
+                                response_model=messageData
+                                if len(missing) == len(messageData.model_fields)
+                                else partial_message_data(missing),
+                                messages=[
+                                    {"role": "user", "content": f"Extract: {content}"},
+                                ],
+                            )
+                        # the fields stated in the message take precedence
+                        extracted = {**llm_data.model_dump(), **extracted}
+                    aug_data = messageData(**extracted)
+                    EXTRACTION_PATHS.inc(
+                        path="rules"
+                        if not missing
+                        else "llm"
+                        if len(missing) == len(messageData.model_fields)
+                        else "partial"
                     )
                 except Exception as e:
                     logger.error(f"Could not augment tweet. Error:\n{e}")
@@ -356,7 +1651,7 @@ def augment_telegram(client: Instructor, message: any, filter: str):
 
                 # NLP-informed geolocation
                 try:
-                    coordinates = get_lat_long(extracted_location)
+                    coordinates = get_lat_long(extracted_location, geolocator)
                 except Exception as e:
                     logger.error(f"Could not get latitude and longitude. Error:\n{e}\n\nRetrying with just city...")
                     coordinates = None
@@ -383,11 +1678,13 @@ def augment_telegram(client: Instructor, message: any, filter: str):
 
 
 # utility function for augmenting tweets with geolocation
-def get_lat_long(location_name):
+def get_lat_long(location_name, geolocator: Geocoder | None = None):
     logger = logging.getLogger(__name__)
-    geolocator = Nominatim(user_agent="location_to_lat_long")
+    if geolocator is None:
+        geolocator = Nominatim(user_agent="location_to_lat_long")
     try:
-        location = geolocator.geocode(location_name)
+        with track_stage("nominatim_geocode"), start_span("nominatim.geocode"):
+            location = geolocator.geocode(location_name)
         if location:
             latitude = location.latitude
             longitude = location.longitude
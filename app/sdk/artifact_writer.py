@@ -0,0 +1,101 @@
+import gzip
+from typing import Any, Dict, List, Literal, Sequence
+
+import orjson
+import zstandard
+from pydantic import BaseModel
+
+from app.sdk.metrics import REGISTRY, record_bytes, track_stage
+from app.sdk.models import KernelPlancksterSourceData
+
+
+ARTIFACT_BYTES = REGISTRY.counter(
+    "scraper_artifact_bytes_total",
+    "Number of bytes of the artifacts written by the scraper, before (raw) and after (encoded) compression.",
+    ("encoding", "kind"),
+)
+
+# appended to the relative path of the artifacts written with each encoding
+ENCODING_SUFFIXES: Dict[str, str] = {"identity": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+class ArtifactConfig(BaseModel):
+    """
+    @attr encoding: the content encoding of the artifacts: "identity" (not compressed), "gzip" or "zstd"
+    @attr level: the compression level; 3 for both gzip and zstd by default, about as fast as the serialization
+    """
+
+    encoding: Literal["identity", "gzip", "zstd"] = "identity"
+    level: int | None = None
+
+
+def encode_rows(rows: Sequence[Sequence[Any]], columns: Sequence[str]) -> bytes:
+    """
+    Serialize rows as a JSON object keyed by row number, each row an object keyed by column, the layout of
+    `pandas.DataFrame.to_json(orient="index")`. NaN and infinite numbers are written as null.
+    """
+    return orjson.dumps(
+        {str(index): dict(zip(columns, row)) for index, row in enumerate(rows)},
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+def compress(payload: bytes, config: ArtifactConfig) -> bytes:
+    """
+    Compress a payload with the encoding of `config`.
+    """
+    match config.encoding:
+        case "identity":
+            return payload
+        case "gzip":
+            # no timestamp in the header, so that the same rows give the same bytes
+            return gzip.compress(payload, compresslevel=config.level if config.level is not None else 3, mtime=0)
+        case "zstd":
+            return zstandard.ZstdCompressor(level=config.level if config.level is not None else 3).compress(payload)
+    raise ValueError(f"Unknown artifact encoding '{config.encoding}'")
+
+
+def decompress(payload: bytes, encoding: str) -> bytes:
+    """
+    The inverse of `compress`, for the readers of the artifacts.
+    """
+    match encoding:
+        case "identity":
+            return payload
+        case "gzip":
+            return gzip.decompress(payload)
+        case "zstd":
+            return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown artifact encoding '{encoding}'")
+
+
+def artifact_source_data(source_data: KernelPlancksterSourceData, config: ArtifactConfig) -> KernelPlancksterSourceData:
+    """
+    The source data of an artifact written with `config`: the encoding is appended to its name, and its suffix to its
+    relative path, e.g. `data.json.gz`. Unchanged when not compressed.
+    """
+    if config.encoding == "identity":
+        return source_data
+    return source_data.model_copy(
+        update={
+            "name": f"{source_data.name}_{config.encoding}",
+            "relative_path": f"{source_data.relative_path}{ENCODING_SUFFIXES[config.encoding]}",
+        }
+    )
+
+
+def write_rows(rows: List[List[Any]], columns: Sequence[str], file: str, config: ArtifactConfig) -> int:
+    """
+    Serialize and compress rows to `file`.
+
+    :return: the number of bytes written.
+    """
+    with track_stage("artifact_encode"):
+        payload = encode_rows(rows, columns)
+        encoded = compress(payload, config)
+        with open(file, "wb") as f:
+            f.write(encoded)
+    record_bytes("artifact_encode", len(encoded))
+    ARTIFACT_BYTES.inc(len(payload), encoding=config.encoding, kind="raw")
+    ARTIFACT_BYTES.inc(len(encoded), encoding=config.encoding, kind="encoded")
+    return len(encoded)
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Protocol, Sequence
+
+import numpy as np
+
+from app.sdk.metrics import REGISTRY, track_stage
+
+
+EMBEDDING_CACHE = REGISTRY.counter(
+    "scraper_embedding_cache_total",
+    "Number of embedding cache lookups, per result (hit or miss).",
+    ("result",),
+)
+
+
+class EmbeddingBackend(Protocol):
+    """
+    Embeds texts as vectors. Implementations must be deterministic for a given `name`, which keys the cache.
+    """
+
+    @property
+    def name(self) -> str:
+        ...
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        :return: a float32 array with one row per text.
+        """
+        ...
+
+
+class OpenAIEmbeddingBackend:
+    """
+    Embeds texts with the OpenAI embeddings API, `batch_size` texts per request.
+    """
+
+    def __init__(self, client, model: str = "text-embedding-3-small", batch_size: int = 256) -> None:  # type: ignore
+        self._client = client
+        self._model = model
+        self._batch_size = batch_size
+
+    @property
+    def name(self) -> str:
+        return f"openai:{self._model}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self._batch_size):
+            batch = list(texts[start : start + self._batch_size])
+            with track_stage("openai_embed"):
+                response = self._client.embeddings.create(model=self._model, input=batch)
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddingBackend:
+    """
+    A local, deterministic embedding: word unigrams and character trigrams hashed into a fixed number of dimensions.
+
+    It only captures lexical overlap, not meaning, but needs no network access: a stand-in for tests and benchmarks.
+    """
+
+    def __init__(self, dimensions: int = 512) -> None:
+        self._dimensions = dimensions
+        self.calls = 0
+        self.embedded_texts = 0
+
+    @property
+    def name(self) -> str:
+        return f"hashing:{self._dimensions}"
+
+    def _index(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little") % self._dimensions
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        self.calls += 1
+        self.embedded_texts += len(texts)
+        vectors = np.zeros((len(texts), self._dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _TOKEN.findall(text.casefold()):
+                vectors[row, self._index(token)] += 1.0
+                padded = f" {token} "
+                for i in range(len(padded) - 2):
+                    vectors[row, self._index(padded[i : i + 3])] += 0.5
+        return vectors
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingCache:
+    """
+    Caches embeddings by backend and text hash, in memory or in a SQLite file that persists across runs.
+
+    :param path: the SQLite file, or ":memory:".
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._connection.commit()
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    @staticmethod
+    def key(backend_name: str, text: str) -> bytes:
+        return hashlib.sha256(f"{backend_name}\0{text}".encode()).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            # stay below SQLite's limit on the number of parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    list(chunk),
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+            self._connection.commit()
+
+    def embed(self, backend: EmbeddingBackend, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts, computing only those not cached yet, in a single backend call.
+        """
+        keys = [self.key(backend.name, text) for text in texts]
+        cached = self.get_many(list(dict.fromkeys(keys)))
+        EMBEDDING_CACHE.inc(sum(1 for key in keys if key in cached), result="hit")
+
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing[key] = text
+        if missing:
+            EMBEDDING_CACHE.inc(len(missing), result="miss")
+            vectors = backend.embed(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.put_many(computed)
+            cached.update(computed)
+
+        return np.vstack([cached[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
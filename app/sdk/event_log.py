@@ -0,0 +1,146 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Any, Dict
+
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_listener: logging.handlers.QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records over to the background thread as they are, so that messages are formatted there rather than on the
+    calling thread (usually the event loop). Records are not pickled, so deferring is safe.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(level: int | str = logging.WARNING) -> None:
+    """
+    Route all logging through a queue to a background thread, which formats the records and writes them to stderr.
+
+    Safe to call more than once: the handlers are installed on the first call, later calls only change the level.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_DeferredQueueHandler(log_queue))
+
+
+def shutdown_logging() -> None:
+    """
+    Flush the queued records and stop the background thread.
+    """
+    global _listener
+
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+
+
+class _Event:
+    """
+    A structured log message, rendered as `event key=value ...` only if and when a handler formats it.
+    """
+
+    __slots__ = ("event_type", "fields")
+
+    def __init__(self, event_type: str, fields: Dict[str, Any]) -> None:
+        self.event_type = event_type
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join(
+            [self.event_type] + [f"{key}={value!r}" for key, value in self.fields.items()]
+        )
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse sample rates from a string such as `message=0.01,download=0.1`.
+    """
+    rates: Dict[str, float] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event_type, _, rate = item.partition("=")
+        rates[event_type.strip()] = float(rate)
+    return rates
+
+
+class EventLogger:
+    """
+    Logs structured events on the hot path at near-zero cost when they are filtered out.
+
+    - The level check happens before anything else, so disabled events only cost a method call.
+    - Fields are formatted lazily, by the handler, in the logging thread.
+    - Each event type can be sampled: with a rate of 0.01, only every 100th event of that type is logged. Sampling is
+      deterministic, and the number of events skipped since the last one logged is added as `sampled_out`.
+
+    Sample rates default to the LOG_SAMPLE_RATES environment variable, e.g. `message=0.01`.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_rates: Dict[str, float] | None = None) -> None:
+        self._logger = logger
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+        self._sample_every = {
+            event_type: max(1, round(1 / rate)) if rate > 0 else 0
+            for event_type, rate in sample_rates.items()
+        }
+        self._counters: Dict[str, Any] = {}
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    def event(self, event_type: str, level: int = logging.INFO, **fields: Any) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+
+        every = self._sample_every.get(event_type, 1)
+        if every != 1:
+            if every == 0:
+                return
+            counter = self._counters.get(event_type)
+            if counter is None:
+                counter = self._counters[event_type] = itertools.count()
+            seen = next(counter)
+            if seen % every:
+                return
+            if seen:
+                fields["sampled_out"] = every - 1
+
+        self._logger.log(level, _Event(event_type, fields))
+
+    def debug(self, event_type: str, **fields: Any) -> None:
+        self.event(event_type, logging.DEBUG, **fields)
+
+    def info(self, event_type: str, **fields: Any) -> None:
+        self.event(event_type, logging.INFO, **fields)
@@ -1,9 +1,31 @@
 import logging
 import os
 import shutil
+import threading
+from contextlib import contextmanager
+
+from typing import Dict, Iterator, Set
 
 import requests
+import urllib3
+from minio import Minio
+from minio.error import S3Error, ServerError
+from app.sdk.metrics import record_bytes, track_stage
 from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.retry import (
+    HTTPStatusError,
+    RetryableError,
+    RetryPolicy,
+    call_with_retry,
+    get_retry_policy,
+    load_retry_policies,
+    raise_for_status,
+)
+from app.sdk.tracing import start_span
+
+
+# S3 error codes worth retrying
+RETRYABLE_S3_CODES = {"InternalError", "RequestTimeout", "ServiceUnavailable", "SlowDown"}
 
 
 class FileRepository:
@@ -11,10 +33,14 @@ class FileRepository:
             self,
             protocol: ProtocolEnum,
             data_dir: str = "data",  # can be used for config
+            retry_policies: Dict[str, RetryPolicy] | None = None,
     ) -> None:
         self._protocol = protocol
         self._data_dir = data_dir
         self._logger = logging.getLogger(__name__)
+        self._retry_policies = retry_policies or load_retry_policies()
+        # keeps connections to the storage alive across uploads
+        self._session = requests.Session()
 
     @property
     def protocol(self) -> ProtocolEnum:
@@ -47,12 +73,12 @@ class FileRepository:
         """
         
         file_name = self.source_data_to_file_name(source_data)
-        self.logger.info(f"Saving {file_type} '{source_data}' to '{file_name}'.")
+        self.logger.debug("Saving %s '%s' to '%s'.", file_type, source_data, file_name)
 
         os.makedirs(os.path.dirname(file_name), exist_ok=True)
         shutil.copy(file_to_save, file_name)
 
-        self.logger.info(f"Saved {file_type} '{source_data}' to '{file_name}'.")
+        self.logger.info("Saved %s '%s' to '%s'.", file_type, source_data, file_name)
 
         pfn = self.file_name_to_pfn(file_name)
 
@@ -61,15 +87,222 @@ class FileRepository:
         
     def public_upload(self, signed_url: str, file_path: str) -> None:
         """
-        Upload a file to a signed url.
+        Upload a file to a signed url, retrying transient errors.
+
+        Uploading to the same signed url again overwrites the object, so retries are safe.
 
         :param signed_url: The signed url to upload to.
         :param file_path: The path to the file to upload.
         """
+        policy = get_retry_policy(self._retry_policies, "public_upload")
+
+        def attempt(attempt_number: int) -> None:
+            with track_stage("storage_public_upload"), start_span("storage.upload"), open(file_path, "rb") as f:
+                upload_res = self._session.put(signed_url, data=f, verify=False, timeout=policy.timeout)
+
+            raise_for_status(upload_res, "Failed to upload file to signed url")
+
+        call_with_retry("public_upload", policy, attempt)
+
+        record_bytes("storage_public_upload", os.path.getsize(file_path))
+
+
+@contextmanager
+def _classify_minio_errors() -> Iterator[None]:
+    """
+    Raise the transient errors of the MinIO client as errors that `call_with_retry` retries.
+    """
+    try:
+        yield
+    except S3Error as error:
+        if error.code in RETRYABLE_S3_CODES:
+            raise RetryableError(str(error)) from error
+        raise
+    except ServerError as error:
+        raise HTTPStatusError(str(error), error.status_code) from error
+    except urllib3.exceptions.HTTPError as error:
+        raise RetryableError(str(error)) from error
+
+
+def _transport_retry(policy: RetryPolicy) -> urllib3.Retry:
+    """
+    Retry single requests to MinIO, notably each part of a multipart upload, on connection errors, read timeouts and the
+    transient statuses of the policy. The last response is returned rather than raised, for the client to report it.
+    POST requests, that start and complete multipart uploads, are not retried on their own.
+    """
+    return urllib3.Retry(
+        total=policy.max_attempts - 1,
+        backoff_factor=policy.base_delay,
+        backoff_max=policy.max_delay,
+        backoff_jitter=policy.base_delay * policy.jitter,
+        status_forcelist=policy.retry_on_status,
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE"}),
+        raise_on_status=False,
+    )
+
+
+class MinIORepository:
+    """
+    Uploads files straight to a MinIO, or any S3-compatible, bucket, instead of through signed URLs.
+
+    Files larger than `part_size` are sent as multipart uploads, `max_workers` parts at a time, by the client's
+    `put_object`: parts are read from the file as workers free up, so that about `max_workers + 1` parts are held in
+    memory whatever the size of the file. The pool of HTTP connections is shared by all the uploads of the repository.
+    Each request is retried on its own with the `minio_upload_part` policy, and a whole upload with the `minio_upload`
+    one. Buckets are created on first use.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: str | int,
+        access_key: str,
+        secret_key: str,
+        bucket: str = "default",
+        secure: bool = False,
+        region: str | None = None,
+        part_size: int = 16 * 1024 * 1024,
+        max_workers: int = 4,
+        retry_policies: Dict[str, RetryPolicy] | None = None,
+    ) -> None:
+        """
+        :param host: the host of the MinIO server, optionally prefixed with http:// or https://, which sets `secure`.
+        :param part_size: the size of the parts of multipart uploads, at least 5 MiB, the minimum S3 allows.
+        :param max_workers: the number of parts of an upload sent at the same time.
+        """
+        if part_size < 5 * 1024 * 1024:
+            raise ValueError("The parts of multipart uploads must be at least 5 MiB")
+        if host.startswith("https://"):
+            host, secure = host[len("https://") :], True
+        elif host.startswith("http://"):
+            host = host[len("http://") :]
+        self._logger = logging.getLogger(__name__)
+        self._bucket = bucket
+        self._part_size = part_size
+        self._max_workers = max_workers
+        self._retry_policies = retry_policies or load_retry_policies()
+        policy = get_retry_policy(self._retry_policies, "minio_upload_part")
+        # keep one connection per worker, and a few for other calls
+        self._http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=max_workers + 2,
+            block=True,
+            timeout=urllib3.Timeout(connect=10.0, read=policy.timeout),
+            retries=_transport_retry(policy),
+        )
+        self._client = Minio(
+            f"{host}:{port}",
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=secure,
+            region=region,
+            http_client=self._http,
+        )
+        self._buckets: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "MinIORepository | None":
+        """
+        Build a repository from the MINIO_HOST, MINIO_PORT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY and MINIO_BUCKET
+        environment variables, and optionally MINIO_SECURE, MINIO_REGION, MINIO_PART_SIZE_MB and MINIO_UPLOAD_WORKERS.
+
+        :return: None if MINIO_HOST is not set.
+        """
+        if not os.getenv("MINIO_HOST"):
+            return None
+        required = ["MINIO_PORT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET"]
+        missing = [name for name in required if not os.getenv(name)]
+        if missing:
+            raise ValueError(f"Environment variables {', '.join(missing)} must be set along with MINIO_HOST.")
+        return cls(
+            host=os.environ["MINIO_HOST"],
+            port=os.environ["MINIO_PORT"],
+            access_key=os.environ["MINIO_ACCESS_KEY"],
+            secret_key=os.environ["MINIO_SECRET_KEY"],
+            bucket=os.environ["MINIO_BUCKET"],
+            secure=os.getenv("MINIO_SECURE", "") == "1",
+            region=os.getenv("MINIO_REGION") or None,
+            part_size=int(float(os.getenv("MINIO_PART_SIZE_MB", "16")) * 1024 * 1024),
+            max_workers=int(os.getenv("MINIO_UPLOAD_WORKERS", "4")),
+        )
+
+    @property
+    def bucket(self) -> str:
+        return self._bucket
+
+    @property
+    def client(self) -> Minio:
+        return self._client
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    def create_bucket_if_not_exists(self, bucket: str | None = None) -> None:
+        """
+        Create the bucket, the repository's by default, unless it exists. Checked once per bucket.
+        """
+        bucket = bucket or self._bucket
+        if bucket in self._buckets:
+            return
+        with self._lock:
+            if bucket in self._buckets:
+                return
+            policy = get_retry_policy(self._retry_policies, "minio_bucket")
+
+            def attempt(attempt_number: int) -> None:
+                with _classify_minio_errors():
+                    if self._client.bucket_exists(bucket):
+                        return
+                    try:
+                        self._client.make_bucket(bucket)
+                        self.logger.info("Created bucket '%s'", bucket)
+                    except S3Error as error:
+                        # created meanwhile by another client
+                        if error.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                            raise
+
+            call_with_retry("minio_bucket", policy, attempt)
+            self._buckets.add(bucket)
+
+    def upload_file(
+        self,
+        object_name: str,
+        file_path: str,
+        content_type: str = "application/octet-stream",
+        bucket: str | None = None,
+    ) -> int:
+        """
+        Upload a file, creating the bucket, the repository's by default, if needed.
+
+        Retries are safe: an object uploaded again is overwritten, and a failed multipart upload is aborted.
+
+        :return: the size of the file, in bytes.
+        """
+        bucket = bucket or self._bucket
+        self.create_bucket_if_not_exists(bucket)
+        size = os.path.getsize(file_path)
+        policy = get_retry_policy(self._retry_policies, "minio_upload")
 
-        with open(file_path, "rb") as f:
-            upload_res = requests.put(signed_url, data=f, verify=False)
+        def attempt(attempt_number: int) -> None:
+            with _classify_minio_errors(), open(file_path, "rb") as f:
+                self._client.put_object(
+                    bucket,
+                    object_name,
+                    f,
+                    size,
+                    content_type=content_type,
+                    part_size=self._part_size,
+                    num_parallel_uploads=self._max_workers,
+                )
 
-        if upload_res.status_code != 200:
-            raise ValueError(f"Failed to upload file to signed url: {upload_res.text}")
+        with track_stage("storage_minio_upload"), start_span(
+            "storage.upload", attributes={"backend": "minio", "bytes": size}
+        ):
+            call_with_retry("minio_upload", policy, attempt)
+        record_bytes("storage_minio_upload", size)
+        return size
 
+    def close(self) -> None:
+        self._http.clear()
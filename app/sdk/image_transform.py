@@ -0,0 +1,67 @@
+import os
+from typing import Literal, NamedTuple
+
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+
+
+class ImageTransformConfig(BaseModel):
+    """
+    How to downscale and re-encode photos before upload.
+
+    @attr max_dimension: the maximum width and height, in pixels; larger photos are downscaled, keeping their aspect ratio
+    @attr format: the format to re-encode to
+    @attr quality: the encoder quality, from 1 to 100 (JPEG and WebP)
+    """
+
+    max_dimension: int = 1600
+    format: Literal["JPEG", "WEBP", "PNG"] = "JPEG"
+    quality: int = 85
+
+
+# the content type of the photos re-encoded to each format
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class TransformedImage(NamedTuple):
+    original_width: int
+    original_height: int
+    width: int
+    height: int
+    format: str
+    # False if the original was kept, because re-encoding it would not have made it smaller
+    transformed: bool
+
+
+def transform_image(source: str, destination: str, config: ImageTransformConfig) -> TransformedImage:
+    """
+    Downscale and re-encode the image at `source` to `destination`. A module-level function, so that it can run in a
+    process pool.
+
+    Photos that already fit are still re-encoded, but if that does not make them smaller the original is kept and
+    nothing is written to `destination`.
+    """
+    with Image.open(source) as image:
+        original_format = image.format or ""
+        original_width, original_height = image.size
+        needs_resize = max(original_width, original_height) > config.max_dimension
+        if needs_resize and original_format == "JPEG":
+            # decode at the smallest scale that is still larger than the target
+            image.draft("RGB", (config.max_dimension, config.max_dimension))
+
+        transformed = ImageOps.exif_transpose(image)
+        if needs_resize:
+            transformed.thumbnail((config.max_dimension, config.max_dimension), Image.LANCZOS)
+        if config.format == "JPEG" and transformed.mode not in ("RGB", "L"):
+            transformed = transformed.convert("RGB")
+
+        transformed.save(destination, format=config.format, quality=config.quality, optimize=True)
+
+    if not needs_resize and os.path.getsize(destination) >= os.path.getsize(source):
+        os.remove(destination)
+        return TransformedImage(
+            original_width, original_height, original_width, original_height, original_format, False
+        )
+
+    width, height = transformed.size
+    return TransformedImage(original_width, original_height, width, height, config.format, True)
@@ -15,45 +15,30 @@ class JobManagerFastAPIRouter:
         self.register_endpoints()
         self.app.include_router(self.router)
         self.worker = worker
-        MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
-        MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
-        MINIO_HOST = os.getenv("MINIO_HOST")
-        MINIO_PORT = os.getenv("MINIO_PORT")
-        MINIO_BUCKET = os.getenv("MINIO_BUCKET")
         STORAGE_PROTOCOL_CONFIG = os.getenv("STORAGE_PROTOCOL", "S3")
 
         self.STORAGE_PROTOCOL = ProtocolEnum(STORAGE_PROTOCOL_CONFIG.lower())
-        if self.STORAGE_PROTOCOL == ProtocolEnum.S3:
-            if not (
-                MINIO_ACCESS_KEY
-                and MINIO_SECRET_KEY
-                and MINIO_HOST
-                and MINIO_PORT
-                and MINIO_BUCKET
-            ):
-                raise ValueError(
-                    "Environment Variables MINIO_ACCESS_KEY, MINIO_SECRET_KEY, MINIO_HOST and MINIO_PORT and MINIO_BUCKET must be set."
-                )
-            self.minio_repository = MinIORepository(
-                host=MINIO_HOST,
-                port=MINIO_PORT,
-                access_key=MINIO_ACCESS_KEY,
-                secret_key=MINIO_SECRET_KEY,
-            )
+        # with the S3 protocol, files are uploaded straight to MinIO when MINIO_HOST is set, else through the signed
+        # URLs of Kernel Planckster
+        self.minio_repository = (
+            MinIORepository.from_env() if self.STORAGE_PROTOCOL == ProtocolEnum.S3 else None
+        )
 
-        KP_HOST = os.getenv("KERNEL_PLANKSTER_HOST", "http://localhost")
-        KP_PORT = os.getenv("KERNEL_PLANKSTER_PORT", "8000")
+        # KERNEL_PLANKSTER_* are the former, misspelled names
+        KP_HOST = os.getenv("KERNEL_PLANCKSTER_HOST", os.getenv("KERNEL_PLANKSTER_HOST", "localhost"))
+        KP_PORT = os.getenv("KERNEL_PLANCKSTER_PORT", os.getenv("KERNEL_PLANKSTER_PORT", "8000"))
+        KP_AUTH_TOKEN = os.getenv("KERNEL_PLANCKSTER_AUTH_TOKEN", "")
+        KP_SCHEME = os.getenv("KERNEL_PLANCKSTER_SCHEME", "http")
 
         if not (KP_HOST and KP_PORT):
             raise ValueError(
-                "Environment Variables KERNEL_PLANKSTER_HOST and KERNEL_PLANKSTER_PORT must be set."
-            )
-        if "http" not in KP_HOST:
-            raise ValueError(
-                "Environment Variable KERNEL_PLANKSTER_HOST must start with http:// or https://"
+                "Environment Variables KERNEL_PLANCKSTER_HOST and KERNEL_PLANCKSTER_PORT must be set."
             )
+        # the host used to include the scheme, e.g. http://localhost
+        if "://" in KP_HOST:
+            KP_SCHEME, KP_HOST = KP_HOST.split("://", 1)
         self.kernel_plankster_gateway = KernelPlancksterGateway(
-            host=KP_HOST, port=KP_PORT
+            host=KP_HOST, port=KP_PORT, auth_token=KP_AUTH_TOKEN, scheme=KP_SCHEME
         )
 
     def register_endpoints(self):
@@ -85,10 +70,9 @@ class JobManagerFastAPIRouter:
                 job = job_manager.get_job(job_id)
             except KeyError:
                 raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
-            if self.STORAGE_PROTOCOL == ProtocolEnum.S3:
+            if self.minio_repository is not None:
                 try:
-                    bucket = self.minio_repository.bucket
-                    self.minio_repository.create_bucket_if_not_exists(bucket)
+                    self.minio_repository.create_bucket_if_not_exists()
                 except Exception as e:
                     raise HTTPException(
                         status_code=500, detail=f"Failed to connect to MinIO: {e}"
@@ -1,116 +1,199 @@
 import logging
-import json
+from collections import OrderedDict
+from typing import Dict, List
 import httpx
 
+from app.sdk.metrics import track_stage
 from app.sdk.models import KernelPlancksterSourceData
+from app.sdk.retry import (
+    RetryPolicy,
+    RetryableError,
+    call_with_retry,
+    get_retry_policy,
+    load_retry_policies,
+    raise_for_status,
+)
+from app.sdk.tracing import start_span
 
 
+# how many registrations to remember, to make repeated registrations of the same source data no-ops
+REGISTERED_CACHE_SIZE = 10_000
+
 
 class KernelPlancksterGateway:
-    def __init__(self, host: str, port: str, auth_token: str, scheme: str) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: str,
+        auth_token: str,
+        scheme: str,
+        retry_policies: Dict[str, RetryPolicy] | None = None,
+    ) -> None:
         self._host = host
         self._port = port
         self._client_id = 1  # NOTE: this should match the default client for this project
         self._auth_token = auth_token
         self._scheme = scheme
         self._logger = logging.getLogger(__name__)
+        self._retry_policies = retry_policies or load_retry_policies()
+        # keeps connections alive across calls
+        self._http = httpx.Client()
+        self._registered: OrderedDict[str, dict[str, str]] = OrderedDict()
 
     @property
     def url(self) -> str:
         return f"{self._scheme}://{self._host}:{self._port}"
 
-    @property   
+    @property
     def logger(self) -> logging.Logger:
         return self._logger
 
+    @property
+    def headers(self) -> dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "x-auth-token": self._auth_token,
+        }
+
     def ping(self) -> bool:
-        self.logger.info(f"Pinging Kernel Plankster Gateway at {self.url}")
-        res = httpx.get(f"{self.url}/ping")
-        self.logger.info(f"Ping response: {res.text}")
+        self.logger.debug("Pinging Kernel Plankster Gateway at %s", self.url)
+        res = self._http.get(f"{self.url}/ping", timeout=10.0)
+        self.logger.debug("Ping response: %s", res.status_code)
         return res.status_code == 200
 
-    def generate_signed_url(self, source_data: KernelPlancksterSourceData) -> str:
+    def _ensure_reachable(self) -> None:
         if not self.ping():
             self.logger.error(f"Failed to ping Kernel Plankster Gateway at {self.url}")
-            raise Exception("Failed to ping Kernel Plankster Gateway")
+            raise RetryableError("Failed to ping Kernel Plankster Gateway")
+
+    def generate_signed_url(self, source_data: KernelPlancksterSourceData) -> str:
+        """
+        Generates a signed url to upload the source data to, retrying transient errors.
 
-        self.logger.info(f"Generating signed url for {source_data.relative_path}")
+        Args:
+        - source_data: KernelPlancksterSourceData
+        """
+        policy = get_retry_policy(self._retry_policies, "generate_signed_url")
 
-        endpoint = f"{self.url}/client/{self._client_id}/upload-credentials"
+        def attempt(attempt_number: int) -> str:
+            self._ensure_reachable()
 
-        params = {
-            "protocol": source_data.protocol.value,
-            "relative_path": source_data.relative_path,
-        }
+            self.logger.info("Generating signed url for %s", source_data.relative_path)
 
-        headers = {
-            "Content-Type": "application/json",
-            "x-auth-token": self._auth_token,
+            endpoint = f"{self.url}/client/{self._client_id}/upload-credentials"
+
+            params = {
+                "protocol": source_data.protocol.value,
+                "relative_path": source_data.relative_path,
             }
 
-        res = httpx.get(
-            url=endpoint,
-            params=params,
-            headers=headers,
-        )
+            with track_stage("kp_generate_signed_url"), start_span("kp.generate_signed_url"):
+                res = self._http.get(
+                    url=endpoint,
+                    params=params,
+                    headers=self.headers,
+                    timeout=policy.timeout,
+                )
+
+            # the response body holds the signed url; only log it when debugging
+            self.logger.debug("Generate signed url response: %s", res.text)
+            raise_for_status(res, "Failed to generate signed url")
 
-        self.logger.info(f"Generate signed url response: {res.text}")
-        if res.status_code != 200:
-            raise ValueError(f"Failed to generate signed url: {res.text}")
+            res_json = res.json()
 
-        res_json = res.json()
+            signed_url = res_json.get("signed_url")
 
-        signed_url = res_json.get("signed_url")
+            if not signed_url:
+                raise ValueError(f"Failed to generate signed url. Signed URL not found in response. Dumping raw response:\n{res_json}")
 
-        if not signed_url:
-            raise ValueError(f"Failed to generate signed url. Signed URL not found in response. Dumping raw response:\n{res_json}")
+            return signed_url
 
-        return signed_url
-        
+        return call_with_retry("generate_signed_url", policy, attempt)
+
+    def list_source_data(self) -> List[dict[str, str]]:
+        """
+        Lists the source data registered for this client.
+        """
+        res = self._http.get(
+            url=f"{self.url}/client/{self._client_id}/source",
+            headers=self.headers,
+            timeout=get_retry_policy(self._retry_policies, "register_new_source_data").timeout,
+        )
+        raise_for_status(res, "Failed to list source data")
+        return res.json().get("source_data_list") or []
+
+    def _find_registered_source_data(self, source_data: KernelPlancksterSourceData) -> dict[str, str] | None:
+        try:
+            for kp_source_data in self.list_source_data():
+                if kp_source_data.get("relative_path") == source_data.relative_path:
+                    return kp_source_data
+        except Exception as error:
+            self.logger.warning(
+                f"Could not check whether {source_data.relative_path} is already registered. Error: {error}"
+            )
+        return None
 
     def register_new_source_data(self, source_data: KernelPlancksterSourceData) -> dict[str, str]:
         """
-        Registers new source data with Kernel Plankster Gateway.
-        
+        Registers new source data with Kernel Plankster Gateway, retrying transient errors.
+
+        Registration is idempotent: source data already registered through this gateway is not registered again, and
+        before retrying, Kernel Planckster is checked for a registration made by an attempt whose response was lost.
+
         Args:
         - source_data: KernelPlancksterSourceData
 
         """
-        if not self.ping():
-            self.logger.error(f"Failed to ping Kernel Plankster Gateway at {self.url}")
-            raise Exception("Failed to ping Kernel Plankster Gateway")
+        registered = self._registered.get(source_data.relative_path)
+        if registered:
+            self.logger.info("%s is already registered, skipping", source_data.relative_path)
+            return registered
 
-        self.logger.info(f"Registering new data with Kernel Plankster Gateway at {self.url}")
+        policy = get_retry_policy(self._retry_policies, "register_new_source_data")
 
-        params = {
-            "source_data_name": source_data.name,
-            "source_data_protocol": source_data.protocol.value,
-            "source_data_relative_path": source_data.relative_path,
-        }
+        def attempt(attempt_number: int) -> dict[str, str]:
+            self._ensure_reachable()
 
-        endpoint = f"{self.url}/client/{self._client_id}/source"
+            if attempt_number > 1:
+                # a previous attempt may have succeeded on the server side
+                existing = self._find_registered_source_data(source_data)
+                if existing:
+                    self.logger.info("%s was registered by a previous attempt", source_data.relative_path)
+                    return existing
 
-        headers = {
-            "Content-Type": "application/json",
-            "x-auth-token": self._auth_token,
+            self.logger.info("Registering new data with Kernel Plankster Gateway at %s", self.url)
+
+            params = {
+                "source_data_name": source_data.name,
+                "source_data_protocol": source_data.protocol.value,
+                "source_data_relative_path": source_data.relative_path,
             }
 
-        res = httpx.post(
-            url=endpoint,
-            params=params,
-            headers=headers,
-        )
+            endpoint = f"{self.url}/client/{self._client_id}/source"
 
-        self.logger.info(f"Register new data response: {res.text}")
-        if res.status_code != 200:
-            raise ValueError(
-                f"Failed to register new data with Kernel Plankster Gateway: {res.text}"
-            )
+            with track_stage("kp_register_source_data"), start_span("kp.register_source_data"):
+                res = self._http.post(
+                    url=endpoint,
+                    params=params,
+                    headers=self.headers,
+                    timeout=policy.timeout,
+                )
 
-        kp_source_data = res.json().get("source_data")
+            self.logger.debug("Register new data response: %s", res.text)
+            if res.status_code == 409:
+                existing = self._find_registered_source_data(source_data)
+                if existing:
+                    return existing
+            raise_for_status(res, "Failed to register new data with Kernel Plankster Gateway")
 
-        if not kp_source_data:
-            raise ValueError(f"Failed to register new data. Source Data not returned. Dumping raw response:\n{res.json()}")
+            kp_source_data = res.json().get("source_data")
+
+            if not kp_source_data:
+                raise ValueError(f"Failed to register new data. Source Data not returned. Dumping raw response:\n{res.json()}")
+
+            return kp_source_data
+
+        kp_source_data = call_with_retry("register_new_source_data", policy, attempt)
 
         res_name = kp_source_data.get("name")
         res_protocol = kp_source_data.get("protocol")
@@ -121,4 +204,8 @@ class KernelPlancksterGateway:
 
         assert res_name == source_data.name
 
+        self._registered[source_data.relative_path] = kp_source_data
+        if len(self._registered) > REGISTERED_CACHE_SIZE:
+            self._registered.popitem(last=False)
+
         return kp_source_data
@@ -0,0 +1,100 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """
+    An Aho-Corasick automaton: finds every occurrence of any of a set of keywords in a single pass over a text,
+    whatever the number of keywords.
+
+    Matching is exact; normalize keywords and texts the same way beforehand (e.g. casefold them).
+
+    :param keywords: the keywords and phrases to find.
+    :param whole_words: only report matches delimited by non-alphanumeric characters, so that "fire" matches neither
+        "campfire" nor "fires". By default, keywords also match inside words, which suits stems ("wildfire" matches
+        "wildfires").
+    """
+
+    def __init__(self, keywords: Iterable[str], whole_words: bool = False) -> None:
+        self._whole_words = whole_words
+        # node 0 is the root; each node has its transitions, its failure link and the keywords ending there
+        self._transitions: List[Dict[str, int]] = [{}]
+        self._failure: List[int] = [0]
+        self._outputs: List[Tuple[str, ...]] = [()]
+        self._keywords: List[str] = []
+
+        for keyword in keywords:
+            if keyword:
+                self._add(keyword)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._keywords)
+
+    def _add(self, keyword: str) -> None:
+        node = 0
+        for char in keyword:
+            next_node = self._transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self._transitions)
+                self._transitions.append({})
+                self._failure.append(0)
+                self._outputs.append(())
+                self._transitions[node][char] = next_node
+            node = next_node
+        if keyword not in self._outputs[node]:
+            self._outputs[node] += (keyword,)
+            self._keywords.append(keyword)
+
+    def _build(self) -> None:
+        queue = deque(self._transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._transitions[node].items():
+                queue.append(child)
+                failure = self._failure[node]
+                while failure and char not in self._transitions[failure]:
+                    failure = self._failure[failure]
+                target = self._transitions[failure].get(char, 0)
+                self._failure[child] = target if target != child else 0
+                # keywords that end at the failure node also end here
+                self._outputs[child] += self._outputs[self._failure[child]]
+
+    def _is_boundary(self, text: str, index: int) -> bool:
+        return index < 0 or index >= len(text) or not text[index].isalnum()
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield `(start, keyword)` for every occurrence of a keyword in the text, in order of their end.
+        """
+        transitions = self._transitions
+        failure = self._failure
+        outputs = self._outputs
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in transitions[node]:
+                node = failure[node]
+            node = transitions[node].get(char, 0)
+            for keyword in outputs[node]:
+                start = index - len(keyword) + 1
+                if self._whole_words and not (
+                    self._is_boundary(text, start - 1) and self._is_boundary(text, index + 1)
+                ):
+                    continue
+                yield start, keyword
+
+    def search(self, text: str) -> str | None:
+        """
+        The first keyword found in the text, or None.
+        """
+        return next((keyword for _, keyword in self.finditer(text)), None)
+
+    def findall(self, text: str) -> List[str]:
+        """
+        The distinct keywords found in the text, in order of the end of their first occurrence.
+        """
+        return list(dict.fromkeys(keyword for _, keyword in self.finditer(text)))
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Literal
+
+from pydantic import BaseModel
+
+from app.sdk.metrics import REGISTRY
+from app.sdk.models import LLMModelUsage, LLMUsage
+from app.sdk.rate_limiter import estimate_prompt_tokens
+
+
+LLM_REQUESTS = REGISTRY.counter(
+    "scraper_llm_requests_total",
+    "Number of LLM calls, per model.",
+    ("model",),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "scraper_llm_tokens_total",
+    "Number of LLM tokens used, per model and kind (prompt or completion).",
+    ("model", "kind"),
+)
+LLM_COST = REGISTRY.counter(
+    "scraper_llm_cost_usd_total",
+    "Cost of the LLM tokens used, in USD, per model.",
+    ("model",),
+)
+LLM_BUDGET_EXCEEDED = REGISTRY.counter(
+    "scraper_llm_budget_exceeded_total",
+    "Number of jobs that hit an LLM budget cap, per cap.",
+    ("cap",),
+)
+
+
+class ModelPrice(BaseModel):
+    """
+    @attr prompt: the price of a million prompt tokens, in USD
+    @attr completion: the price of a million completion tokens, in USD
+    """
+
+    prompt: float
+    completion: float
+
+
+DEFAULT_PRICES: Dict[str, ModelPrice] = {
+    "gpt-4o": ModelPrice(prompt=2.5, completion=10.0),
+    "gpt-4o-mini": ModelPrice(prompt=0.15, completion=0.6),
+    "gpt-4-turbo": ModelPrice(prompt=10.0, completion=30.0),
+}
+
+
+class LLMBudget(BaseModel):
+    """
+    The LLM budget of a job. Once a cap is hit, the job goes on in `degraded_mode` without LLM calls.
+
+    @attr max_tokens: the maximum number of prompt and completion tokens
+    @attr max_cost: the maximum cost, in USD
+    @attr max_requests: the maximum number of calls
+    @attr degraded_mode: "skip_augmentation" leaves every later message unaugmented; "prefilter_only" only keeps the
+        ones the lexical pre-filter considers candidates. Either way, they are listed in the job output, and media are
+        still uploaded
+    @attr prices: the price of each model, to compute costs; models without a price cost nothing
+    """
+
+    max_tokens: int | None = None
+    max_cost: float | None = None
+    max_requests: int | None = None
+    degraded_mode: Literal["skip_augmentation", "prefilter_only"] = "skip_augmentation"
+    prices: Dict[str, ModelPrice] = DEFAULT_PRICES
+
+
+class TokenLedger:
+    """
+    Accounts for the LLM calls of one job, per model, and checks them against its budget.
+    """
+
+    def __init__(self, budget: LLMBudget | None = None, usage: LLMUsage | None = None) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._budget = budget or LLMBudget()
+        self._usage = usage or LLMUsage()
+        self._lock = threading.Lock()
+
+    @property
+    def budget(self) -> LLMBudget:
+        return self._budget
+
+    @property
+    def usage(self) -> LLMUsage:
+        return self._usage
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        seconds: float,
+        error: bool = False,
+    ) -> None:
+        price = self._budget.prices.get(model)
+        cost = (
+            (prompt_tokens * price.prompt + completion_tokens * price.completion) / 1_000_000 if price else 0.0
+        )
+        with self._lock:
+            usage = self._usage.models.setdefault(model, LLMModelUsage())
+            usage.requests += 1
+            usage.errors += int(error)
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+            usage.seconds += seconds
+            usage.cost += cost
+        LLM_REQUESTS.inc(model=model)
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+        LLM_COST.inc(cost, model=model)
+
+    def exceeded(self) -> str | None:
+        """
+        The budget cap that was hit, if any. The first time a cap is hit, the job switches to the degraded mode.
+        """
+        if self._usage.budget_exceeded:
+            return self._usage.budget_exceeded
+        budget = self._budget
+        cap = None
+        if budget.max_tokens is not None and self._usage.total_tokens >= budget.max_tokens:
+            cap = "max_tokens"
+        elif budget.max_cost is not None and self._usage.cost >= budget.max_cost:
+            cap = "max_cost"
+        elif budget.max_requests is not None and self._usage.requests >= budget.max_requests:
+            cap = "max_requests"
+        if cap:
+            self._usage.budget_exceeded = cap
+            self._usage.degraded_mode = budget.degraded_mode
+            LLM_BUDGET_EXCEEDED.inc(cap=cap)
+        return cap
+
+
+class LedgerClient:
+    """
+    Wraps an instructor client, so that every chat completion is recorded in a ledger with its model, usage and
+    latency. Calls whose response does not report its usage are recorded with an estimate of their prompt tokens. Any
+    other attribute is the wrapped client's.
+    """
+
+    def __init__(self, client: Any, ledger: TokenLedger) -> None:
+        self._client = client
+        self._ledger = ledger
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @property
+    def ledger(self) -> TokenLedger:
+        return self._ledger
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def _create(self, **kwargs: Any) -> Any:
+        model = kwargs.get("model", "")
+        start = time.perf_counter()
+        try:
+            response = self._client.chat.completions.create(**kwargs)
+        except Exception:
+            # failed calls may still have been billed; their usage is unknown
+            self._ledger.record(model, 0, 0, time.perf_counter() - start, error=True)
+            raise
+        seconds = time.perf_counter() - start
+        usage = getattr(getattr(response, "_raw_response", None), "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+            prompt_tokens = estimate_prompt_tokens(list(kwargs.get("messages", [])), kwargs.get("response_model"))
+            completion_tokens = 0
+        self._ledger.record(model, prompt_tokens, completion_tokens, seconds)
+        return response
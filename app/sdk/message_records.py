@@ -0,0 +1,157 @@
+import datetime
+import math
+from array import array
+from typing import Any, Dict, Hashable, Iterator, List
+
+
+class Interner:
+    """
+    Maps values repeated across messages, such as channel, sender and author ids, to small consecutive indices, so
+    that each value is stored once.
+    """
+
+    def __init__(self) -> None:
+        self._indices: Dict[Hashable, int] = {}
+        self._values: List[Hashable] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def intern(self, value: Hashable) -> int:
+        index = self._indices.get(value)
+        if index is None:
+            index = len(self._values)
+            self._indices[value] = index
+            self._values.append(value)
+        return index
+
+    def value(self, index: int) -> Hashable:
+        return self._values[index]
+
+
+class MessageRecord:
+    """
+    The metadata kept for a message once it was processed, without the Telethon message itself.
+    """
+
+    __slots__ = ("message_id", "channel_id", "sender_id", "post_author", "date", "views", "text")
+
+    def __init__(
+        self,
+        message_id: int,
+        channel_id: int | None,
+        sender_id: int | None,
+        post_author: str | None,
+        date: datetime.datetime | None,
+        views: int | None,
+        text: str,
+    ) -> None:
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.sender_id = sender_id
+        self.post_author = post_author
+        self.date = date
+        self.views = views
+        self.text = text
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, MessageRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"MessageRecord(message_id={self.message_id}, channel_id={self.channel_id}, date={self.date})"
+
+    def to_row(self) -> List[Any]:
+        """
+        The record in the column order of the scraper's raw data: sender, text, date, id, author, views, channel.
+        """
+        return [
+            self.sender_id,
+            self.text,
+            self.date,
+            self.message_id,
+            self.post_author,
+            self.views,
+            self.channel_id,
+        ]
+
+
+class MessageBuffer:
+    """
+    An append-only, column-backed store of message metadata.
+
+    Numbers are kept in typed arrays, repeated ids and authors are interned, and texts are stored back to back as
+    UTF-8, which takes a few dozen bytes per message on top of its text, against several hundred for a list of Python
+    objects. Records are rebuilt on access.
+    """
+
+    def __init__(self) -> None:
+        self._interner = Interner()
+        self._message_ids = array("q")
+        self._dates = array("d")
+        self._views = array("q")
+        self._channels = array("I")
+        self._senders = array("I")
+        self._authors = array("I")
+        self._text = bytearray()
+        self._text_ends = array("Q")
+
+    def __len__(self) -> int:
+        return len(self._message_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The size of the columns, in bytes, not counting the interned values.
+        """
+        columns = (
+            self._message_ids,
+            self._dates,
+            self._views,
+            self._channels,
+            self._senders,
+            self._authors,
+            self._text_ends,
+        )
+        return sum(column.itemsize * len(column) for column in columns) + len(self._text)
+
+    def append(self, message: Any) -> None:
+        """
+        Keep the metadata of a Telethon message, or of anything with the same attributes.
+        """
+        peer_id = getattr(message, "peer_id", None)
+        date = message.date
+        views = message.views
+        self._message_ids.append(message.id)
+        self._dates.append(date.timestamp() if date is not None else math.nan)
+        self._views.append(views if views is not None else -1)
+        self._channels.append(self._interner.intern(getattr(peer_id, "channel_id", None)))
+        self._senders.append(self._interner.intern(message.sender_id))
+        self._authors.append(self._interner.intern(message.post_author))
+        self._text.extend((message.text or "").encode("utf-8"))
+        self._text_ends.append(len(self._text))
+
+    def __getitem__(self, index: int) -> MessageRecord:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message buffer index out of range")
+        start = self._text_ends[index - 1] if index else 0
+        timestamp = self._dates[index]
+        views = self._views[index]
+        return MessageRecord(
+            message_id=self._message_ids[index],
+            channel_id=self._interner.value(self._channels[index]),  # type: ignore
+            sender_id=self._interner.value(self._senders[index]),  # type: ignore
+            post_author=self._interner.value(self._authors[index]),  # type: ignore
+            date=datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+            if not math.isnan(timestamp)
+            else None,
+            views=views if views >= 0 else None,
+            text=self._text[start : self._text_ends[index]].decode("utf-8"),
+        )
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,334 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], lock: threading.Lock) -> None:
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = labelnames
+        self._lock = lock
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self._labelnames):
+            raise ValueError(
+                f"Metric '{self.name}' expects labels {self._labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self._labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self._documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], lock: threading.Lock) -> None:
+        super().__init__(name, documentation, labelnames, lock)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self._labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...],
+        lock: threading.Lock,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames, lock)
+        self._buckets = tuple(sorted(buckets)) + (math.inf,)
+        # per label set: [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    @property
+    def buckets(self) -> Tuple[float, ...]:
+        return self._buckets
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self._buckets) + 2)
+                self._values[key] = state
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def get(self, **labels: str) -> Tuple[float, int]:
+        """
+        Returns the (sum, count) pair observed for the given labels.
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return 0.0, 0
+            return state[-2], int(state[-1])
+
+    def values(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {key: list(state) for key, state in self._values.items()}
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, state in sorted(self.values().items()):
+            cumulative = 0.0
+            for index, bound in enumerate(self._buckets):
+                cumulative += state[index]
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self._labelnames, key, le)} {_format_value(cumulative)}"
+                )
+            labels = _format_labels(self._labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    A minimal, thread-safe metrics registry that renders the Prometheus text exposition format (version 0.0.4).
+
+    Metrics are created once per registry, and looked up by name afterwards.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls: type, name: str, documentation: str, labelnames: Tuple[str, ...], **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, tuple(labelnames), threading.Lock(), **kwargs)
+                self._metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric '{name}' is already registered as a {metric.metric_type}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "scraper_stage_duration_seconds",
+    "Latency of a single call to an external stage of the scraper.",
+    ("stage",),
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "scraper_stage_errors_total",
+    "Number of calls to an external stage of the scraper that raised.",
+    ("stage",),
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    "scraper_stage_in_flight",
+    "Number of calls to an external stage of the scraper currently in progress.",
+    ("stage",),
+)
+STAGE_BYTES = REGISTRY.counter(
+    "scraper_stage_bytes_total",
+    "Number of bytes transferred by an external stage of the scraper.",
+    ("stage",),
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """
+    Time the enclosed block as one call to `stage`, keeping the in-flight gauge and the error counter up to date.
+
+    :param stage: The name of the stage, used as the `stage` label.
+    """
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_FLIGHT.dec(stage=stage)
+
+
+def record_bytes(stage: str, num_bytes: int) -> None:
+    STAGE_BYTES.inc(num_bytes, stage=stage)
+
+
+async def track_async_iterator(stage: str, iterator: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """
+    Re-yield the items of an async iterator, timing each fetch as one call to `stage`.
+
+    The time spent by the consumer between two items is not counted.
+    """
+    while True:
+        with track_stage(stage):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+def snapshot_stages() -> Dict[str, Dict[str, float]]:
+    """
+    Take a snapshot of the per-stage totals, to be passed to `summarize_stages` later.
+    """
+    snapshot: Dict[str, Dict[str, float]] = {}
+    for (stage,), state in STAGE_DURATION.values().items():
+        snapshot.setdefault(stage, {})["count"] = state[-1]
+        snapshot[stage]["total_seconds"] = state[-2]
+    for (stage,), value in STAGE_ERRORS.values().items():
+        snapshot.setdefault(stage, {})["errors"] = value
+    for (stage,), value in STAGE_BYTES.values().items():
+        snapshot.setdefault(stage, {})["bytes"] = value
+    return snapshot
+
+
+def summarize_stages(since: Dict[str, Dict[str, float]] | None = None) -> Dict[str, Dict[str, float]]:
+    """
+    Summarize the per-stage totals recorded since the given snapshot (or since process start).
+
+    NOTE: the registry is process-wide, so jobs running concurrently in the same process are counted together.
+    """
+    since = since or {}
+    summary: Dict[str, Dict[str, float]] = {}
+    for stage, totals in snapshot_stages().items():
+        previous = since.get(stage, {})
+        delta = {
+            key: totals.get(key, 0.0) - previous.get(key, 0.0)
+            for key in ("count", "total_seconds", "errors", "bytes")
+        }
+        if not any(delta.values()):
+            continue
+        count = int(delta["count"])
+        summary[stage] = {
+            "count": count,
+            "errors": int(delta["errors"]),
+            "total_seconds": round(delta["total_seconds"], 6),
+            "mean_seconds": round(delta["total_seconds"] / count, 6) if count else 0.0,
+            "bytes": int(delta["bytes"]),
+        }
+    return summary
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, TypeVar
+from typing import Dict, List, TypeVar
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -51,6 +51,81 @@ class KernelPlancksterSourceData(BaseModel):
         return cls.model_validate_json(json_data=json_str)
 
 
+class LLMModelUsage(BaseModel):
+    """
+    The LLM calls of a job to one model.
+
+    @attr requests: the number of calls, including failed ones
+    @attr errors: the number of failed calls
+    @attr prompt_tokens: the prompt tokens used
+    @attr completion_tokens: the completion tokens used
+    @attr seconds: the total latency of the calls
+    @attr cost: the cost of the tokens, in USD
+    """
+    requests: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+    cost: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.requests if self.requests else 0.0
+
+
+class LLMUsage(BaseModel):
+    """
+    The LLM usage of a job, and whether it hit its budget.
+
+    @attr models: the usage per model
+    @attr budget_exceeded: the budget cap that was hit ("max_tokens", "max_cost" or "max_requests"), if any
+    @attr degraded_mode: the mode the job switched to once the budget was hit
+    @attr unaugmented_messages: ids of the messages left unaugmented because of the budget
+    """
+    models: Dict[str, LLMModelUsage] = {}
+    budget_exceeded: str | None = None
+    degraded_mode: str | None = None
+    unaugmented_messages: List[int] = []
+
+    @property
+    def requests(self) -> int:
+        return sum(usage.requests for usage in self.models.values())
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(usage.prompt_tokens + usage.completion_tokens for usage in self.models.values())
+
+    @property
+    def cost(self) -> float:
+        return sum(usage.cost for usage in self.models.values())
+
+
+class DeferredMediaRecord(BaseModel):
+    """
+    A media file that was not uploaded by the job, and can be fetched from Telegram and uploaded later.
+
+    @attr message_id: the id of the message the media belongs to
+    @attr channel_name: the channel the message was posted in
+    @attr relative_path: the relative path the media is stored at once uploaded
+    @attr mime_type: the mime type of the media
+    @attr bytes: the size of the media
+    @attr media_type: "photo" or "video" (any other document is a "video", as when uploaded), if known
+    @attr relevant: whether the message, or its album, was augmented as relevant; None if not checked
+    @attr grouped_id: the album the message belongs to, if any
+    @attr materialized: whether the media was uploaded since, by a materialization
+    """
+    message_id: int
+    channel_name: str
+    relative_path: str
+    mime_type: str | None = None
+    bytes: int | None = None
+    media_type: str | None = None
+    relevant: bool | None = None
+    grouped_id: int | None = None
+    materialized: bool = False
+
+
 class BaseJob(BaseModel):
     """
     NOTE: deprecated.
@@ -67,6 +142,8 @@ class BaseJob(BaseModel):
     messages: List[str] = []
     output_source_data_list: List[KernelPlancksterSourceData] = []
     input_source_data_list: List[KernelPlancksterSourceData] = []
+    llm_usage: LLMUsage | None = None
+    deferred_media: List[DeferredMediaRecord] = []
 
     def touch(self) -> None:
         self.heartbeat = datetime.now()
@@ -75,6 +152,64 @@ class BaseJob(BaseModel):
 TBaseJob = TypeVar("TBaseJob", bound=BaseJob)
 
 
+class ImageTransformRecord(BaseModel):
+    """
+    How a photo was downscaled or transcoded before upload.
+
+    @attr relative_path: the relative path of the uploaded photo
+    @attr original_width: the width of the downloaded photo, in pixels
+    @attr original_height: the height of the downloaded photo, in pixels
+    @attr original_bytes: the size of the downloaded photo
+    @attr width: the width of the uploaded photo, in pixels
+    @attr height: the height of the uploaded photo, in pixels
+    @attr bytes: the size of the uploaded photo
+    @attr format: the format of the uploaded photo
+    """
+    relative_path: str
+    original_width: int
+    original_height: int
+    original_bytes: int
+    width: int
+    height: int
+    bytes: int
+    format: str
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.bytes
+
+
+class DuplicateMessageCluster(BaseModel):
+    """
+    Messages whose text is a near-duplicate of an earlier message, and were not augmented again.
+
+    Messages are referred to as "channel_name/message_id".
+
+    @attr original: the message whose augmentation results were reused
+    @attr duplicates: the near-duplicates of the original, in this job
+    """
+    original: str
+    duplicates: List[str] = []
+
+
+class MediaAlbum(BaseModel):
+    """
+    Messages sent together as an album, sharing a `grouped_id`. An album is augmented once, from its caption, and its
+    media are downloaded concurrently and stored under a shared name, "<channel_name>-album-<grouped_id>-...".
+
+    @attr grouped_id: the id Telegram groups the messages of the album by
+    @attr channel_name: the channel the album was posted in
+    @attr message_ids: the ids of the messages of the album
+    @attr caption_message_id: the id of the message holding the caption of the album, if any
+    @attr source_data_list: the source data of the media of the album
+    """
+    grouped_id: int
+    channel_name: str
+    message_ids: List[int] = []
+    caption_message_id: int | None = None
+    source_data_list: List[KernelPlancksterSourceData] = []
+
+
 class JobOutput(BaseModel):
     """
     This class is used to represent the output of a scraper job.
@@ -83,9 +218,27 @@ class JobOutput(BaseModel):
     - job_state: BaseJobState
     - trace_id: str
     - source_data_list: List[KernelPlancksterSourceData] | None
+    - metrics: per-stage summary (count, errors, total_seconds, mean_seconds, bytes), keyed by stage name
+    - image_transforms: the original and uploaded dimensions and sizes of the photos downscaled before upload
+    - deferred_media: the media not uploaded by the job, to be materialized later, with the references to fetch them
+    - duplicate_messages: the messages not augmented because their text is a near-duplicate of an earlier message
+    - llm_usage: the LLM requests, tokens, latency and cost of the job per model, and whether it hit its budget
+    - albums: the albums of the channel, with the source data of their media
+    - message_latency: for streaming jobs, the count, mean, p50, p95 and maximum seconds from the posting of a message
+      to the registration of its micro-batch
+    - pipeline: per step of the job (fetch, download, process), the items, busy and blocked seconds, utilization and
+      largest queue depth
     """
 
     job_state: BaseJobState
     tracer_id: str
     source_data_list: List[KernelPlancksterSourceData] | None
+    metrics: Dict[str, Dict[str, int | float]] | None = None
+    image_transforms: List[ImageTransformRecord] | None = None
+    deferred_media: List[DeferredMediaRecord] | None = None
+    duplicate_messages: List[DuplicateMessageCluster] | None = None
+    llm_usage: LLMUsage | None = None
+    albums: List[MediaAlbum] | None = None
+    message_latency: Dict[str, float] | None = None
+    pipeline: Dict[str, Dict[str, int | float]] | None = None
 
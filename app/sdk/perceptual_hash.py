@@ -0,0 +1,269 @@
+import logging
+import os
+import threading
+from typing import List, Literal, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.sdk.models import KernelPlancksterSourceData
+
+
+HashAlgorithm = Literal["phash", "dhash"]
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+# beyond this many bands, bands are too narrow to narrow down the candidates and lookups compare every hash
+_MAX_BANDS = 16
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    k = np.arange(size)[:, None]
+    i = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).flatten()).tobytes(), "big")
+
+
+def _grayscale(path: str, size: Tuple[int, int]) -> np.ndarray:
+    with Image.open(path) as image:
+        image.draft("L", (size[0] * 4, size[1] * 4))  # lets JPEG decode at a reduced scale
+        return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def phash(path: str) -> int:
+    """
+    The 64-bit DCT perceptual hash of an image: robust to re-encoding, resizing and small edits.
+    """
+    pixels = _grayscale(path, (32, 32))
+    low_frequencies = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].flatten()
+    # the DC term is left out of the median, it only reflects the average brightness
+    return _bits_to_int(low_frequencies > np.median(low_frequencies[1:]))
+
+
+def dhash(path: str) -> int:
+    """
+    The 64-bit difference hash of an image: cheaper than the perceptual hash, less robust to crops and watermarks.
+    """
+    pixels = _grayscale(path, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def image_hash(path: str, algorithm: HashAlgorithm = "phash") -> int:
+    """
+    Hash an image with the given algorithm. A module-level function, so that it can run in a process pool.
+    """
+    if algorithm == "dhash":
+        return dhash(path)
+    return phash(path)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def hamming_distances(hashes: np.ndarray, image_hash: int) -> np.ndarray:
+    """
+    The Hamming distance between a hash and each of an array of hashes, with a branch-free popcount.
+    """
+    x = np.bitwise_xor(hashes, np.uint64(image_hash))
+    x -= (x >> np.uint64(1)) & _M1
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+def _bands(max_distance: int) -> List[Tuple[np.uint64, np.uint64]]:
+    # at least 4 bands, so that band values fit in 16 bits
+    count = max(max_distance + 1, 4)
+    if count > _MAX_BANDS:
+        return []
+    bands = []
+    shift = 0
+    for band in range(count):
+        width = 64 // count + (1 if band < 64 % count else 0)
+        bands.append((np.uint64(shift), np.uint64((1 << width) - 1)))
+        shift += width
+    return bands
+
+
+class PerceptualHashIndex:
+    """
+    An index of 64-bit image hashes and the source data they were stored as, for near-duplicate lookups.
+
+    Lookups use multi-index hashing: the 64 bits are split into `max_distance + 1` bands, and two hashes within
+    `max_distance` of each other have at least one identical band. Each band is kept sorted, so only the hashes sharing
+    a band with the query are compared, and a lookup in an index of millions of images takes about a millisecond.
+    Recently added hashes are compared directly until the next re-sort. Each hash costs 8 bytes of memory, 6 more per band,
+    plus its source data.
+
+    The index is persisted in a directory, as a binary file of hashes and a JSON lines file of source data, both
+    append-only: `flush()` writes the hashes added since the last flush.
+
+    :param directory: the directory where the index is persisted, or None to keep it in memory.
+    :param max_distance: the maximum Hamming distance between the hashes of two images considered duplicates.
+    :param algorithm: the hash algorithm. Hashes of different algorithms are not comparable, so an index sticks to one.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_distance: int = 6,
+        algorithm: HashAlgorithm = "phash",
+    ) -> None:
+        self._directory = directory
+        self._max_distance = max_distance
+        self._algorithm = algorithm
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._size = 0
+        self._sources: List[str] = []
+        self._flushed = 0
+
+        self._bands = _bands(max_distance)
+        # per band, the band values of the first `_sorted_size` hashes in ascending order, and their positions
+        self._band_values: List[np.ndarray] = []
+        self._band_positions: List[np.ndarray] = []
+        self._sorted_size = 0
+
+        if directory:
+            self._load()
+
+    @property
+    def max_distance(self) -> int:
+        return self._max_distance
+
+    @property
+    def algorithm(self) -> HashAlgorithm:
+        return self._algorithm
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _paths(self) -> Tuple[str, str]:
+        assert self._directory
+        return (
+            os.path.join(self._directory, f"{self._algorithm}.u64"),
+            os.path.join(self._directory, f"{self._algorithm}.sources.jsonl"),
+        )
+
+    def _load(self) -> None:
+        hashes_path, sources_path = self._paths()
+        if not os.path.exists(hashes_path) or not os.path.exists(sources_path):
+            return
+
+        hashes = np.fromfile(hashes_path, dtype="<u8")
+        with open(sources_path, "r") as f:
+            sources = f.read().splitlines()
+
+        # an interrupted flush can leave one file longer than the other
+        size = min(len(hashes), len(sources))
+        if size != len(hashes) or size != len(sources):
+            self.logger.warning(
+                f"Perceptual hash index in {self._directory} is inconsistent, keeping its first {size} entries"
+            )
+            hashes.astype("<u8")[:size].tofile(hashes_path)
+            with open(sources_path, "w") as f:
+                f.writelines(f"{source}\n" for source in sources[:size])
+
+        self._reserve(size)
+        self._hashes[:size] = hashes[:size]
+        self._size = self._flushed = size
+        self._sources = sources[:size]
+        self._sort_bands()
+        self.logger.info(f"Loaded {size} perceptual hashes from {self._directory}")
+
+    def _reserve(self, size: int) -> None:
+        if size <= len(self._hashes):
+            return
+        capacity = len(self._hashes)
+        while capacity < size:
+            capacity *= 2
+        hashes = np.zeros(capacity, dtype=np.uint64)
+        hashes[: self._size] = self._hashes[: self._size]
+        self._hashes = hashes
+
+    def _sort_bands(self) -> None:
+        hashes = self._hashes[: self._size]
+        self._band_values = []
+        self._band_positions = []
+        for shift, mask in self._bands:
+            values = ((hashes >> shift) & mask).astype(np.uint16)
+            order = np.argsort(values, kind="stable").astype(np.uint32)
+            self._band_values.append(values[order])
+            self._band_positions.append(order)
+        self._sorted_size = self._size
+
+    def _candidates(self, image_hash: int) -> np.ndarray:
+        if not self._bands:
+            return np.arange(self._size)
+        query = np.uint64(image_hash)
+        candidates = [np.arange(self._sorted_size, self._size)]
+        for (shift, mask), values, positions in zip(self._bands, self._band_values, self._band_positions):
+            band = np.uint16((query >> shift) & mask)
+            candidates.append(positions[np.searchsorted(values, band, "left") : np.searchsorted(values, band, "right")])
+        # a hash sharing several bands with the query is a candidate more than once, which is harmless
+        return np.concatenate(candidates)
+
+    def find(self, image_hash: int) -> Tuple[KernelPlancksterSourceData, int] | None:
+        """
+        Find the closest stored image within the maximum distance of the hash.
+
+        :return: the source data of the stored image and its distance, or None if there is none.
+        """
+        with self._lock:
+            candidates = self._candidates(image_hash)
+            if not len(candidates):
+                return None
+            distances = hamming_distances(self._hashes[candidates], image_hash)
+            closest = int(np.argmin(distances))
+            if distances[closest] > self._max_distance:
+                return None
+            source = self._sources[int(candidates[closest])]
+        return KernelPlancksterSourceData.model_validate_json(source), int(distances[closest])
+
+    def add(self, image_hash: int, source_data: KernelPlancksterSourceData) -> None:
+        with self._lock:
+            self._reserve(self._size + 1)
+            self._hashes[self._size] = image_hash
+            self._sources.append(source_data.model_dump_json())
+            self._size += 1
+            # re-sort once the unsorted tail is large enough to slow lookups down; amortized over the adds
+            if self._bands and self._size - self._sorted_size > max(4096, self._sorted_size // 16):
+                self._sort_bands()
+
+    def flush(self) -> None:
+        """
+        Append the hashes added since the last flush to the index files.
+        """
+        if not self._directory:
+            return
+        with self._lock:
+            if self._flushed == self._size:
+                return
+            os.makedirs(self._directory, exist_ok=True)
+            hashes_path, sources_path = self._paths()
+            with open(sources_path, "a") as f:
+                f.writelines(f"{source}\n" for source in self._sources[self._flushed : self._size])
+            with open(hashes_path, "ab") as f:
+                f.write(self._hashes[self._flushed : self._size].astype("<u8").tobytes())
+            self.logger.debug(
+                "Flushed %s perceptual hashes to %s", self._size - self._flushed, self._directory
+            )
+            self._flushed = self._size
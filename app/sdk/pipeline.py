@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set
+
+from pydantic import BaseModel
+
+from app.sdk.metrics import REGISTRY
+
+
+PIPELINE_QUEUE_DEPTH = REGISTRY.gauge(
+    "scraper_pipeline_queue_depth",
+    "Number of items waiting in front of a pipeline stage.",
+    ("pipeline", "stage"),
+)
+PIPELINE_BUSY = REGISTRY.counter(
+    "scraper_pipeline_busy_seconds_total",
+    "Time spent by the workers of a pipeline stage on items.",
+    ("pipeline", "stage"),
+)
+PIPELINE_BLOCKED = REGISTRY.counter(
+    "scraper_pipeline_blocked_seconds_total",
+    "Time a pipeline stage waited for room in the queue of the next stage, i.e. was held back by backpressure.",
+    ("pipeline", "stage"),
+)
+PIPELINE_UTILIZATION = REGISTRY.gauge(
+    "scraper_pipeline_utilization",
+    "Share of the time the workers of a pipeline stage were busy during the latest run, between 0 and 1.",
+    ("pipeline", "stage"),
+)
+
+# marks the end of the items in a queue
+_DONE = object()
+
+
+class StageConfig(BaseModel):
+    """
+    @attr concurrency: the number of items the stage works on at the same time
+    @attr queue_size: the number of items waiting in front of the stage, after which the stages before it wait
+    """
+
+    concurrency: int = 1
+    queue_size: int = 8
+
+
+class Stage:
+    """
+    A named step of a pipeline, turning each item into the item passed to the next stage.
+
+    :param discard: called with the results of the stage that were not taken by the next one, e.g. because the pipeline
+        stopped early, to release what they hold.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        config: StageConfig | None = None,
+        discard: Callable[[Any], None] | None = None,
+    ) -> None:
+        self._name = name
+        self._handler = handler
+        self._config = config or StageConfig()
+        self._discard = discard
+        if self._config.concurrency < 1 or self._config.queue_size < 1:
+            raise ValueError(f"Stage '{name}' needs a concurrency and a queue size of at least 1")
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def handler(self) -> Callable[[Any], Awaitable[Any]]:
+        return self._handler
+
+    @property
+    def config(self) -> StageConfig:
+        return self._config
+
+    @property
+    def discard(self) -> Callable[[Any], None] | None:
+        return self._discard
+
+
+class _StageStats:
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue_depth = 0
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues: the items of a source go through the stages in turn, each stage working on up
+    to `concurrency` items at a time, and come out in the order of the source.
+
+    A stage only takes an item once there is room for its result in the queue of the next stage, so that a slow stage
+    holds back the ones before it, down to the source, instead of letting items pile up in memory. The consumer of
+    `run()` is the last stage, the sink: the time it spends on each item is accounted for like a stage of its own.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stages: List[Stage],
+        source: str = "source",
+        sink: str = "sink",
+        sink_queue_size: int = 8,
+        discard: Callable[[Any], None] | None = None,
+    ) -> None:
+        """
+        :param source: the name under which the iteration of the source is accounted for.
+        :param sink: the name under which the consumer of `run()` is accounted for.
+        :param sink_queue_size: the number of items waiting for the consumer of `run()`.
+        :param discard: called with the items that went through all the stages but were not consumed, e.g. because the
+            consumer stopped early or failed, to release what they hold.
+        """
+        if sink_queue_size < 1:
+            raise ValueError("The sink of a pipeline needs a queue size of at least 1")
+        self._logger = logging.getLogger(__name__)
+        self._name = name
+        self._stages = stages
+        self._source = source
+        self._sink = sink
+        self._sink_queue_size = sink_queue_size
+        self._discard = discard
+        self._stats: Dict[str, _StageStats] = {}
+        self._elapsed = 0.0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def stats(self) -> Dict[str, Dict[str, int | float]]:
+        """
+        Per stage, in pipeline order, of the latest run: the number of items, the seconds its workers were busy and
+        blocked by the next stage, their utilization, and the largest number of items that waited in front of it.
+        """
+        summary: Dict[str, Dict[str, int | float]] = {}
+        for stage, stats in self._stats.items():
+            summary[stage] = {
+                "items": stats.items,
+                "concurrency": stats.concurrency,
+                "busy_seconds": round(stats.busy_seconds, 6),
+                "blocked_seconds": round(stats.blocked_seconds, 6),
+                "utilization": round(self._utilization(stats), 4),
+                "max_queue_depth": stats.max_queue_depth,
+            }
+        return summary
+
+    def _utilization(self, stats: _StageStats) -> float:
+        if self._elapsed <= 0:
+            return 0.0
+        return min(1.0, stats.busy_seconds / (self._elapsed * stats.concurrency))
+
+    async def _put(self, queue: asyncio.Queue, entry: Any, producer: str, consumer: str) -> None:
+        started = time.perf_counter()
+        await queue.put(entry)
+        blocked = time.perf_counter() - started
+        self._stats[producer].blocked_seconds += blocked
+        PIPELINE_BLOCKED.inc(blocked, pipeline=self._name, stage=producer)
+        self._observe_depth(queue, consumer)
+
+    def _observe_depth(self, queue: asyncio.Queue, stage: str) -> None:
+        depth = queue.qsize()
+        stats = self._stats[stage]
+        stats.max_queue_depth = max(stats.max_queue_depth, depth)
+        PIPELINE_QUEUE_DEPTH.set(depth, pipeline=self._name, stage=stage)
+
+    async def _feed(self, source: AsyncIterator[Any], outbox: asyncio.Queue, consumer: str) -> None:
+        stats = self._stats[self._source]
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = await source.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    busy = time.perf_counter() - started
+                    stats.busy_seconds += busy
+                    PIPELINE_BUSY.inc(busy, pipeline=self._name, stage=self._source)
+                stats.items += 1
+                entry = loop.create_future()
+                entry.set_result(item)
+                await self._put(outbox, entry, self._source, consumer)
+        except Exception as error:
+            # raised to the consumer once it reaches this point of the source
+            entry = loop.create_future()
+            entry.set_exception(error)
+            await self._put(outbox, entry, self._source, consumer)
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        await self._put(outbox, _DONE, self._source, consumer)
+
+    async def _work(self, stage: Stage, item: Any, semaphore: asyncio.Semaphore) -> Any:
+        stats = self._stats[stage.name]
+        started = time.perf_counter()
+        try:
+            return await stage.handler(item)
+        finally:
+            busy = time.perf_counter() - started
+            stats.busy_seconds += busy
+            stats.items += 1
+            PIPELINE_BUSY.inc(busy, pipeline=self._name, stage=stage.name)
+            semaphore.release()
+
+    async def _dispatch(
+        self,
+        stage: Stage,
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue,
+        consumer: str,
+        tasks: Set[asyncio.Future],
+    ) -> None:
+        semaphore = asyncio.Semaphore(stage.config.concurrency)
+        while True:
+            entry = await inbox.get()
+            self._observe_depth(inbox, stage.name)
+            if entry is _DONE:
+                break
+            try:
+                item = await entry
+            except Exception:
+                # failed upstream: passed on as is, to be raised to the consumer in order
+                await self._put(outbox, entry, stage.name, consumer)
+                continue
+            await semaphore.acquire()
+            task = asyncio.ensure_future(self._work(stage, item, semaphore))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            # results are queued in the order of the source, whichever finishes first
+            await self._put(outbox, task, stage.name, consumer)
+        await self._put(outbox, _DONE, stage.name, consumer)
+
+    async def run(self, source: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """
+        Yield the items of `source` once they went through all the stages, in the order of `source`.
+
+        The first error raised by the source or a stage is raised here, once the items before it were yielded; the
+        pipeline is then stopped.
+        """
+        self._stats = {self._source: _StageStats(1)}
+        for stage in self._stages:
+            self._stats[stage.name] = _StageStats(stage.config.concurrency)
+        self._stats[self._sink] = _StageStats(1)
+        self._elapsed = 0.0
+
+        names = [stage.name for stage in self._stages] + [self._sink]
+        queues = [asyncio.Queue(maxsize=stage.config.queue_size) for stage in self._stages]
+        queues.append(asyncio.Queue(maxsize=self._sink_queue_size))
+        tasks: Set[asyncio.Future] = set()
+        workers = [asyncio.ensure_future(self._feed(source, queues[0], names[0]))]
+        for index, stage in enumerate(self._stages):
+            workers.append(
+                asyncio.ensure_future(
+                    self._dispatch(stage, queues[index], queues[index + 1], names[index + 1], tasks)
+                )
+            )
+
+        outbox = queues[-1]
+        sink = self._stats[self._sink]
+        started = time.perf_counter()
+        try:
+            while True:
+                entry = await outbox.get()
+                self._observe_depth(outbox, self._sink)
+                if entry is _DONE:
+                    break
+                item = await entry
+                consumed = time.perf_counter()
+                yield item
+                busy = time.perf_counter() - consumed
+                sink.busy_seconds += busy
+                sink.items += 1
+                PIPELINE_BUSY.inc(busy, pipeline=self._name, stage=self._sink)
+        finally:
+            for future in [*workers, *tasks]:
+                future.cancel()
+            await asyncio.gather(*workers, *tasks, return_exceptions=True)
+            for stage, queue in zip(self._stages, queues[1:]):
+                discard = self._discard if queue is outbox and self._discard is not None else stage.discard
+                if discard is not None:
+                    self._discard_pending(queue, discard)
+            if not self._stages and self._discard is not None:
+                self._discard_pending(outbox, self._discard)
+            self._elapsed = time.perf_counter() - started
+            for stage, stats in self._stats.items():
+                PIPELINE_UTILIZATION.set(self._utilization(stats), pipeline=self._name, stage=stage)
+                PIPELINE_QUEUE_DEPTH.set(0, pipeline=self._name, stage=stage)
+
+    def _discard_pending(self, queue: asyncio.Queue, discard: Callable[[Any], None]) -> None:
+        while not queue.empty():
+            entry = queue.get_nowait()
+            if entry is _DONE or not entry.done() or entry.cancelled() or entry.exception() is not None:
+                continue
+            try:
+                discard(entry.result())
+            except Exception as error:
+                self._logger.warning(f"Could not discard an item of pipeline {self._name}. Error: {error}")
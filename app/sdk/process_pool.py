@@ -0,0 +1,51 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, TypeVar
+
+
+T = TypeVar("T")
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    The process pool shared by the CPU-bound media stages (hashing, resizing, transcoding).
+
+    It is created on first use, with MEDIA_WORKERS processes (defaults to the number of CPUs). Workers are spawned
+    rather than forked, so they do not inherit the locks of the logging thread or of the event loop.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            max_workers = int(os.getenv("MEDIA_WORKERS", "0")) or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(shutdown_process_pool)
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            return
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def run_in_process(func: Callable[..., T], *args: Any) -> T:
+    """
+    Run a picklable, module-level function in the shared process pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
@@ -0,0 +1,241 @@
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+
+from pydantic import BaseModel
+
+from app.sdk.metrics import REGISTRY, track_stage
+from app.sdk.retry import RetryableError, RetryPolicy, call_with_retry, get_retry_policy, load_retry_policies
+
+
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "scraper_rate_limit_wait_seconds",
+    "Time a request was queued by a client-side rate limiter before being sent, per limiter.",
+    ("limiter",),
+)
+RATE_LIMIT_QUEUED = REGISTRY.gauge(
+    "scraper_rate_limit_queued",
+    "Number of requests of this process currently queued by a client-side rate limiter, per limiter.",
+    ("limiter",),
+)
+RATE_LIMIT_ERRORS = REGISTRY.counter(
+    "scraper_rate_limit_errors_total",
+    "Number of requests rejected by the API with a 429 despite the client-side rate limiter, per limiter.",
+    ("limiter",),
+)
+
+# requests available, tokens available, time of the last update
+_STATE = struct.Struct("<ddd")
+
+
+class RateLimitConfig(BaseModel):
+    """
+    @attr requests_per_minute: the requests-per-minute budget, shared by every client of the limiter
+    @attr tokens_per_minute: the tokens-per-minute budget, prompt and completion tokens together
+    @attr completion_tokens: the completion tokens expected per request when `max_tokens` is not set
+    @attr chars_per_token: the number of characters of a prompt per token, to estimate prompt tokens
+    """
+
+    requests_per_minute: float
+    tokens_per_minute: float
+    completion_tokens: int = 200
+    chars_per_token: float = 4.0
+
+
+class RateLimiter:
+    """
+    A token bucket for both the request and the token budgets of an API.
+
+    Each request reserves one request and its estimated tokens, which may take the buckets below zero: the request then
+    waits until the buckets have refilled up to its reservation, so requests are served in the order they arrived,
+    without polling. Both buckets hold at most one minute of budget, allowing bursts up to it.
+
+    The buckets are shared by all threads using the limiter. With `path`, they are kept in that file and updated under
+    an exclusive lock on it, so that every process using the same file shares them too.
+    """
+
+    def __init__(
+        self,
+        config: RateLimitConfig,
+        path: str | None = None,
+        name: str = "openai",
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._config = config
+        self._name = name
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._state: Tuple[float, float, float] | None = None
+        self._fd: int | None = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    @property
+    def config(self) -> RateLimitConfig:
+        return self._config
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _update(self, requests: float, tokens: float) -> float:
+        """
+        Refill the buckets, take the given amounts from them, and return the delay until the buckets cover them.
+        """
+        rpm = self._config.requests_per_minute
+        tpm = self._config.tokens_per_minute
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = self._clock()
+                state = self._read()
+                available_requests, available_tokens, updated = state or (rpm, tpm, now)
+                elapsed = max(0.0, now - updated)
+                available_requests = min(rpm, available_requests + elapsed * rpm / 60) - requests
+                available_tokens = min(tpm, available_tokens + elapsed * tpm / 60) - tokens
+                self._write((available_requests, available_tokens, max(now, updated)))
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return max(0.0, -available_requests * 60 / rpm, -available_tokens * 60 / tpm)
+
+    def _read(self) -> Tuple[float, float, float] | None:
+        if self._fd is None:
+            return self._state
+        data = os.pread(self._fd, _STATE.size, 0)
+        # a new or truncated file starts with full buckets
+        return _STATE.unpack(data) if len(data) == _STATE.size else None
+
+    def _write(self, state: Tuple[float, float, float]) -> None:
+        if self._fd is None:
+            self._state = state
+        else:
+            os.pwrite(self._fd, _STATE.pack(*state), 0)
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Reserve a request of `tokens` estimated tokens, and wait until the budgets allow it.
+
+        A request estimated at more than the tokens-per-minute budget only waits for a full bucket.
+
+        :return: the time waited, in seconds.
+        """
+        delay = self._update(1, min(tokens, self._config.tokens_per_minute))
+        RATE_LIMIT_WAIT.observe(delay, limiter=self._name)
+        if delay > 0:
+            self._logger.debug(f"{self._name}: queuing a request of {tokens} tokens for {delay:.2f}s")
+            RATE_LIMIT_QUEUED.inc(limiter=self._name)
+            try:
+                with track_stage(f"{self._name}_rate_limit_wait"):
+                    self._sleep(delay)
+            finally:
+                RATE_LIMIT_QUEUED.dec(limiter=self._name)
+        return delay
+
+    def adjust(self, tokens: int) -> None:
+        """
+        Correct the tokens taken by a request once its actual usage is known: positive if it used more tokens than
+        estimated, negative if fewer.
+        """
+        if tokens:
+            self._update(0, tokens)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+@lru_cache(maxsize=None)
+def _schema_length(response_model: type[BaseModel]) -> int:
+    # instructor sends the schema of the response model as a tool definition
+    return len(json.dumps(response_model.model_json_schema()))
+
+
+def estimate_prompt_tokens(
+    messages: List[Dict[str, Any]],
+    response_model: type[BaseModel] | None = None,
+    chars_per_token: float = 4.0,
+) -> int:
+    """
+    Estimate the prompt tokens of a chat completion from the length of its messages and response schema.
+    """
+    characters = sum(len(str(message.get("content", ""))) for message in messages)
+    if response_model is not None:
+        characters += _schema_length(response_model)
+    # a few tokens of formatting per message
+    return int(characters / chars_per_token) + 4 * len(messages)
+
+
+def estimate_tokens(
+    messages: List[Dict[str, Any]],
+    config: RateLimitConfig,
+    response_model: type[BaseModel] | None = None,
+    max_tokens: int | None = None,
+) -> int:
+    """
+    Estimate the tokens of a chat completion from the length of its prompt, plus its expected completion.
+    """
+    prompt_tokens = estimate_prompt_tokens(messages, response_model, config.chars_per_token)
+    return prompt_tokens + (max_tokens or config.completion_tokens)
+
+
+class RateLimitedClient:
+    """
+    Wraps an instructor client, so that chat completions wait for a rate limiter before being sent.
+
+    Requests are estimated before being sent, and corrected with their actual usage when the response reports it.
+    Requests still rejected with a 429, e.g. because of other users of the API key, are retried with the `openai`
+    retry policy. Any other attribute is the wrapped client's.
+    """
+
+    def __init__(self, client: Any, limiter: RateLimiter, retry_policy: RetryPolicy | None = None) -> None:
+        self._client = client
+        self._limiter = limiter
+        self._retry_policy = retry_policy or get_retry_policy(load_retry_policies(), "openai")
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return self._limiter
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def _create(self, **kwargs: Any) -> Any:
+        messages = list(kwargs.get("messages", []))
+        estimate = estimate_tokens(
+            messages, self._limiter.config, kwargs.get("response_model"), kwargs.get("max_tokens")
+        )
+
+        def attempt(_: int) -> Any:
+            self._limiter.acquire(estimate)
+            try:
+                return self._client.chat.completions.create(**kwargs)
+            except Exception as error:
+                if getattr(error, "status_code", None) == 429:
+                    RATE_LIMIT_ERRORS.inc(limiter=self._limiter.name)
+                    raise RetryableError(str(error)) from error
+                raise
+
+        response = call_with_retry(self._limiter.name, self._retry_policy, attempt)
+        # instructor keeps the completion, and its usage, on the response model
+        usage = getattr(getattr(response, "_raw_response", None), "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if isinstance(total_tokens, int):
+            self._limiter.adjust(total_tokens - estimate)
+        return response
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, TypeVar
+
+import httpx
+import requests
+from pydantic import BaseModel
+
+from app.sdk.metrics import REGISTRY
+
+
+T = TypeVar("T")
+
+RETRIES = REGISTRY.counter(
+    "scraper_retries_total",
+    "Number of calls retried after a retryable error, per endpoint.",
+    ("endpoint",),
+)
+RETRIES_EXHAUSTED = REGISTRY.counter(
+    "scraper_retries_exhausted_total",
+    "Number of calls that failed after exhausting their retry policy, per endpoint.",
+    ("endpoint",),
+)
+
+
+class HTTPStatusError(ValueError):
+    """
+    An unexpected HTTP status code. Subclasses ValueError, which callers caught before it existed.
+    """
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RetryableError(Exception):
+    """
+    Raise to mark an error as transient, whatever its cause.
+    """
+
+
+class RetryPolicy(BaseModel):
+    """
+    How to retry calls to one endpoint.
+
+    @attr max_attempts: the maximum number of attempts, including the first one
+    @attr base_delay: the delay before the first retry, in seconds; it doubles on every retry
+    @attr max_delay: the upper bound of the delay between two attempts, in seconds
+    @attr jitter: the fraction of each delay that is randomized (0 for none, 1 for "full jitter")
+    @attr timeout: the timeout of a single attempt, in seconds
+    @attr deadline: the time budget of the whole call across attempts, in seconds; no retry is started past it
+    @attr retry_on_status: the HTTP status codes considered transient
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    jitter: float = 1.0
+    timeout: float = 30.0
+    deadline: float = 120.0
+    retry_on_status: List[int] = [408, 425, 429, 500, 502, 503, 504]
+
+    def delay(self, retry: int) -> float:
+        """
+        The delay before the given retry (1 for the first retry).
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+DEFAULT_RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "generate_signed_url": RetryPolicy(timeout=10.0, deadline=60.0),
+    "register_new_source_data": RetryPolicy(timeout=10.0, deadline=60.0),
+    # uploads can be large: allow more time per attempt
+    "public_upload": RetryPolicy(max_attempts=5, timeout=300.0, deadline=1200.0),
+    # direct uploads to MinIO: single objects and multipart control calls, each part of a multipart upload, and buckets
+    "minio_upload": RetryPolicy(max_attempts=5, timeout=300.0, deadline=1200.0),
+    "minio_upload_part": RetryPolicy(max_attempts=5, timeout=300.0, deadline=600.0),
+    "minio_bucket": RetryPolicy(timeout=10.0, deadline=60.0),
+    # 429s left over by the client-side rate limiter: back off long enough for the per-minute budgets to refill
+    "openai": RetryPolicy(max_attempts=5, base_delay=2.0, max_delay=30.0, deadline=300.0),
+}
+
+
+def load_retry_policies(overrides: str | None = None) -> Dict[str, RetryPolicy]:
+    """
+    Get the retry policy of every endpoint: the defaults, updated with the overrides.
+
+    :param overrides: JSON mapping endpoint names to policy fields, e.g. '{"public_upload": {"max_attempts": 8}}'.
+        Defaults to the RETRY_POLICIES environment variable.
+    """
+    if overrides is None:
+        overrides = os.getenv("RETRY_POLICIES", "")
+    policies = dict(DEFAULT_RETRY_POLICIES)
+    if overrides:
+        for endpoint, fields in json.loads(overrides).items():
+            base = policies.get(endpoint, RetryPolicy())
+            policies[endpoint] = base.model_copy(update=fields)
+    return policies
+
+
+def is_retryable(error: BaseException, policy: RetryPolicy) -> bool:
+    """
+    Classify an error: transient network errors and the policy's status codes are retryable, anything else is not.
+    """
+    if isinstance(error, RetryableError):
+        return True
+    if isinstance(error, HTTPStatusError):
+        return error.status_code in policy.retry_on_status
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return False
+
+
+def call_with_retry(
+    endpoint: str,
+    policy: RetryPolicy,
+    call: Callable[[int], T],
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """
+    Call `call(attempt)` until it succeeds, the error is not retryable, or the policy is exhausted.
+
+    The attempt number (starting from 1) is passed to the call, so that it can check whether an earlier attempt
+    already took effect before doing it again.
+
+    :param endpoint: the name of the endpoint, for logs and metrics.
+    :param policy: the retry policy of the endpoint.
+    :param call: the call to retry.
+    :param sleep: the function used to wait between attempts.
+    """
+    logger = logging.getLogger(__name__)
+    start = time.monotonic()
+    attempt = 1
+    while True:
+        try:
+            return call(attempt)
+        except Exception as error:
+            if not is_retryable(error, policy):
+                raise
+            if attempt >= policy.max_attempts:
+                RETRIES_EXHAUSTED.inc(endpoint=endpoint)
+                logger.error(f"{endpoint}: giving up after {attempt} attempts. Error:\n{error}")
+                raise
+            delay = policy.delay(attempt)
+            if time.monotonic() - start + delay > policy.deadline:
+                RETRIES_EXHAUSTED.inc(endpoint=endpoint)
+                logger.error(f"{endpoint}: giving up, the {policy.deadline}s deadline would be exceeded. Error:\n{error}")
+                raise
+            RETRIES.inc(endpoint=endpoint)
+            logger.warning(
+                f"{endpoint}: attempt {attempt}/{policy.max_attempts} failed, retrying in {delay:.2f}s. Error: {error}"
+            )
+            sleep(delay)
+            attempt += 1
+
+
+def get_retry_policy(policies: Dict[str, RetryPolicy], endpoint: str) -> RetryPolicy:
+    return policies.get(endpoint) or RetryPolicy()
+
+
+def raise_for_status(response: Any, message: str, expected: int = 200) -> None:
+    """
+    Raise an HTTPStatusError if an httpx or requests response does not have the expected status code.
+    """
+    if response.status_code != expected:
+        raise HTTPStatusError(f"{message}: {response.text}", response.status_code)
@@ -1,5 +1,6 @@
 import logging
-from app.sdk.file_repository import FileRepository
+import os
+from app.sdk.file_repository import FileRepository, MinIORepository
 from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
 from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
 
@@ -11,10 +12,16 @@ class ScrapedDataRepository:
             protocol: ProtocolEnum,
             kernel_planckster: KernelPlancksterGateway,
             file_repository: FileRepository,
+            minio_repository: MinIORepository | None = None,
     ) -> None:
+        """
+        :param minio_repository: with the S3 protocol, upload straight to this MinIO bucket instead of through the
+            signed URLs of Kernel Planckster; the source data is registered with Kernel Planckster either way.
+        """
         self.protocol = protocol
         self.kernel_planckster = kernel_planckster
         self.file_repository = file_repository
+        self.minio_repository = minio_repository
         self._logger = logging.getLogger(__name__)
 
     @property
@@ -27,91 +34,80 @@ class ScrapedDataRepository:
         return self._logger
 
 
-    def register_scraped_photo(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+    def _upload_to_object_store(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str, file_type: str, mime_type: str | None = None) -> None:
 
-        match self.protocol:
-
-            case ProtocolEnum.S3:
+        self.logger.info("%s: Uploading %s to object store", job_id, file_type)
 
-                signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data) 
-                
-                self.logger.info(f"{job_id}: Uploading photo to object store")
-
-                self.file_repository.public_upload(signed_url, local_file_name)
-                
-                self.logger.info(
-                f"{job_id}: Uploaded photo to {signed_url}"
-                )
+        if self.minio_repository is not None:
+            self.minio_repository.upload_file(
+                object_name=source_data.relative_path,
+                file_path=local_file_name,
+                content_type=content_type(source_data, file_type, mime_type),
+            )
+            self.logger.debug("%s: Uploaded %s to %s/%s", job_id, file_type, self.minio_repository.bucket, source_data.relative_path)
 
-                self.kernel_planckster.register_new_source_data(source_data=source_data)
+        else:
+            signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data)
 
+            self.file_repository.public_upload(signed_url, local_file_name)
 
-            case ProtocolEnum.LOCAL:
-                # If local, then we don't use kernel planckster at all
-                # NOTE: local is deprecated, use this only for quick tests
-                self.file_repository.save_file_locally(
-                file_to_save=local_file_name,
-                source_data=source_data,
-                file_type="photo",
-                )                                    
+            # the signed url grants write access; only log it when debugging
+            self.logger.debug("%s: Uploaded %s to %s", job_id, file_type, signed_url)
 
-        return source_data
+        self.kernel_planckster.register_new_source_data(source_data=source_data)
 
 
-    def register_scraped_video_or_document(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+    def _register(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str, file_type: str, mime_type: str | None = None) -> KernelPlancksterSourceData:
 
         match self.protocol:
 
             case ProtocolEnum.S3:
-
-                signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data) 
-                
-                self.logger.info(f"{job_id}: Uploading video to object store")
-
-                self.file_repository.public_upload(signed_url, local_file_name)
-                
-                self.logger.info(
-                f"{job_id}: Uploaded video to {signed_url}"
-                )
-
-                self.kernel_planckster.register_new_source_data(source_data=source_data)
+                self._upload_to_object_store(source_data, job_id, local_file_name, file_type, mime_type)
 
             case ProtocolEnum.LOCAL:
                 # If local, then we don't use kernel planckster at all
-                # NOTE: local is deprecated
+                # NOTE: local is deprecated, use this only for quick tests
                 self.file_repository.save_file_locally(
                 file_to_save=local_file_name,
                 source_data=source_data,
-                file_type="video",
+                file_type=file_type,
                 )
 
         return source_data
-    
-    def register_scraped_json(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
 
-        match self.protocol:
 
-            case ProtocolEnum.S3:
+    def register_scraped_photo(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str, mime_type: str | None = None) -> KernelPlancksterSourceData:
+        """
+        :param mime_type: the content type of the photo, if not JPEG, e.g. once re-encoded by an image transform.
+        """
+        return self._register(source_data, job_id, local_file_name, "photo", mime_type)
 
-                signed_url = self.kernel_planckster.generate_signed_url(source_data=source_data) 
-                
-                self.logger.info(f"{job_id}: Uploading json to object store")
 
-                self.file_repository.public_upload(signed_url, local_file_name)
-                
-                self.logger.info(
-                f"{job_id}: Uploaded json to {signed_url}"
-                )
+    def register_scraped_video_or_document(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+        return self._register(source_data, job_id, local_file_name, "video")
 
-                self.kernel_planckster.register_new_source_data(source_data=source_data)
 
-            case ProtocolEnum.LOCAL:
-                # If local, then we don't use kernel planckster at all
-                # NOTE: local is deprecated
-                self.file_repository.save_file_locally(
-                file_to_save=local_file_name,
-                source_data=source_data,
-                file_type="json",
-                )
+    def register_scraped_json(self, source_data: KernelPlancksterSourceData, job_id: int, local_file_name: str) -> KernelPlancksterSourceData:
+        return self._register(source_data, job_id, local_file_name, "json")
+
+
+CONTENT_TYPES = {
+    "photo": "image/jpeg",
+    "video": "application/octet-stream",
+    "json": "application/json",
+}
+
+# compressed artifacts, see app.sdk.artifact_writer
+COMPRESSED_CONTENT_TYPES = {".gz": "application/gzip", ".zst": "application/zstd"}
+
+
+def content_type(source_data: KernelPlancksterSourceData, file_type: str, mime_type: str | None = None) -> str:
+    """
+    The content type of a file uploaded to the object store, from the suffix of its relative path: the local files are
+    often unnamed temporary files.
 
-        return source_data
\ No newline at end of file
+    :param mime_type: the content type of the file, if known, rather than the default one of its file type.
+    """
+    return COMPRESSED_CONTENT_TYPES.get(
+        os.path.splitext(source_data.relative_path)[1], mime_type or CONTENT_TYPES[file_type]
+    )
@@ -0,0 +1,336 @@
+import contextvars
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+import orjson
+
+
+# OTLP enums, see opentelemetry/proto/trace/v1/trace.proto
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_UNSET = 0
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+# Attributes copied from a parent span to its children, so that any span can be found by them
+PROPAGATED_ATTRIBUTES = ("tracer_id", "job_id")
+
+
+def trace_id_from_tracer_id(tracer_id: str) -> str:
+    """
+    Derive a stable 128-bit OpenTelemetry trace id from an SDA tracer id.
+    """
+    return hashlib.sha256(tracer_id.encode()).hexdigest()[:32]
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """
+    A single unit of work, modelled after the OpenTelemetry span data model.
+    """
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+        "start_time_unix_nano",
+        "end_time_unix_nano",
+        "attributes",
+        "status_code",
+        "status_message",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_span_id: str,
+        attributes: Dict[str, Any],
+        start_time_unix_nano: int,
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_span_id = parent_span_id
+        self.start_time_unix_nano = start_time_unix_nano
+        self.end_time_unix_nano = 0
+        self.attributes = attributes
+        self.status_code = STATUS_CODE_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status_code = STATUS_CODE_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_seconds(self) -> float:
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        Serialize the span following the OTLP/JSON encoding.
+        """
+        otlp: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time_unix_nano),
+            "endTimeUnixNano": str(self.end_time_unix_nano),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status_code},
+        }
+        if self.parent_span_id:
+            otlp["parentSpanId"] = self.parent_span_id
+        if self.status_message:
+            otlp["status"]["message"] = self.status_message
+        return otlp
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class SpanExporter:
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Buffers finished spans and appends them to a local file in batches, one OTLP/JSON `TracesData` object per line.
+
+    The file can be read back by the OpenTelemetry Collector's `otlpjsonfile` receiver.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        service_name: str = "mpi-sda-telegram-scraper",
+        batch_size: int = 512,
+    ) -> None:
+        self._path = path
+        self._batch_size = batch_size
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._resource = {
+            "attributes": [
+                {"key": "service.name", "value": {"stringValue": service_name}}
+            ]
+        }
+        self._logger = logging.getLogger(__name__)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) < self._batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: List[Span]) -> None:
+        traces_data = {
+            "resourceSpans": [
+                {
+                    "resource": self._resource,
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in batch],
+                        }
+                    ],
+                }
+            ]
+        }
+        try:
+            with open(self._path, "ab") as f:
+                f.write(orjson.dumps(traces_data) + b"\n")
+        except OSError as error:
+            self._logger.error(f"Could not export {len(batch)} spans to {self._path}. Error:\n{error}")
+
+
+class Tracer:
+    """
+    Creates spans and hands them to an exporter once they end.
+
+    The active span is tracked in a context variable, so spans started in nested calls (and in tasks spawned from them)
+    become its children, and inherit its `tracer_id` and `job_id` attributes.
+    """
+
+    def __init__(self, exporter: SpanExporter | None = None) -> None:
+        self._exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self._exporter is not None
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        attributes: Dict[str, Any] | None = None,
+        start_time_unix_nano: int | None = None,
+    ) -> Iterator[Span | None]:
+        """
+        Start a span as a child of the active span, and make it the active span within the block.
+
+        Root spans with a `tracer_id` attribute get a trace id derived from it.
+        If the tracer has no exporter, nothing is recorded and None is yielded.
+        """
+        if self._exporter is None:
+            yield None
+            return
+
+        span = self._new_span(name, attributes, start_time_unix_nano)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.set_error(error)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._end(span)
+
+    def record_span(
+        self,
+        name: str,
+        start_time_unix_nano: int,
+        end_time_unix_nano: int,
+        attributes: Dict[str, Any] | None = None,
+    ) -> None:
+        """
+        Record an already finished span, as a child of the active span.
+        """
+        if self._exporter is None:
+            return
+        span = self._new_span(name, attributes, start_time_unix_nano)
+        self._end(span, end_time_unix_nano)
+
+    def flush(self) -> None:
+        if self._exporter is not None:
+            self._exporter.flush()
+
+    def _new_span(self, name: str, attributes: Dict[str, Any] | None, start_time_unix_nano: int | None) -> Span:
+        parent = _current_span.get()
+        span_attributes: Dict[str, Any] = {}
+        if parent is not None:
+            trace_id = parent.trace_id
+            parent_span_id = parent.span_id
+            for key in PROPAGATED_ATTRIBUTES:
+                if key in parent.attributes:
+                    span_attributes[key] = parent.attributes[key]
+        else:
+            parent_span_id = ""
+            trace_id = ""
+        if attributes:
+            span_attributes.update(attributes)
+        if not trace_id:
+            tracer_id = span_attributes.get("tracer_id")
+            trace_id = trace_id_from_tracer_id(str(tracer_id)) if tracer_id else f"{random.getrandbits(128):032x}"
+        return Span(
+            tracer=self,
+            name=name,
+            trace_id=trace_id,
+            parent_span_id=parent_span_id,
+            attributes=span_attributes,
+            start_time_unix_nano=start_time_unix_nano or time.time_ns(),
+        )
+
+    def _end(self, span: Span, end_time_unix_nano: int | None = None) -> None:
+        span.end_time_unix_nano = end_time_unix_nano or time.time_ns()
+        assert self._exporter is not None
+        self._exporter.export(span)
+
+
+_NOOP_TRACER = Tracer()
+_default_tracer: Tracer | None = None
+
+
+def get_tracer() -> Tracer:
+    """
+    Get the process-wide tracer.
+
+    Spans are exported to the file set in the TRACE_EXPORT_PATH environment variable; if it is not set, tracing is disabled.
+    """
+    global _default_tracer
+    if _default_tracer is None:
+        path = os.getenv("TRACE_EXPORT_PATH")
+        _default_tracer = Tracer(FileSpanExporter(path)) if path else _NOOP_TRACER
+    return _default_tracer
+
+
+def set_tracer(tracer: Tracer | None) -> None:
+    """
+    Replace the process-wide tracer. Passing None makes `get_tracer` read the environment again.
+    """
+    global _default_tracer
+    _default_tracer = tracer
+
+
+@contextmanager
+def start_span(name: str, attributes: Dict[str, Any] | None = None) -> Iterator[Span | None]:
+    """
+    Start a child of the active span, using the active span's tracer.
+
+    Outside of an active trace this is a no-op, so SDK code can be instrumented unconditionally.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with parent.tracer.start_span(name, attributes) as span:
+        yield span
@@ -0,0 +1,142 @@
+import os
+import re
+import shutil
+import subprocess
+from typing import List, Literal, NamedTuple
+
+from pydantic import BaseModel
+
+
+class VideoReductionConfig(BaseModel):
+    """
+    How to reduce videos before upload.
+
+    @attr mode: "keyframes" extracts still frames, "proxy" transcodes a small, low-bitrate copy
+    @attr keyframes: the number of frames to extract, evenly spread over the video
+    @attr max_dimension: the maximum width and height of the frames or of the proxy, in pixels
+    @attr proxy_bitrate: the video bitrate of the proxy, in ffmpeg notation
+    @attr original: what to do with the full video: "upload" it after the reduced version, "defer" it (it is listed in
+        the job output, to be materialized later), or "drop" it
+    @attr timeout: the maximum time to reduce one video, in seconds
+    """
+
+    mode: Literal["keyframes", "proxy"] = "keyframes"
+    keyframes: int = 5
+    max_dimension: int = 640
+    proxy_bitrate: str = "300k"
+    original: Literal["upload", "defer", "drop"] = "defer"
+    timeout: float = 300.0
+
+
+class ReducedVideo(NamedTuple):
+    duration: float
+    # the extracted frames (JPEG) or the proxy (MP4), in order
+    files: List[str]
+
+
+def ffmpeg_binary() -> str:
+    """
+    The ffmpeg executable: the FFMPEG_BINARY environment variable, ffmpeg on the PATH, or the one bundled with the
+    optional imageio-ffmpeg package.
+    """
+    binary = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        raise RuntimeError("ffmpeg not found: install it, or set FFMPEG_BINARY") from None
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def _run(arguments: List[str], timeout: float) -> str:
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-nostdin", *arguments],
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {result.returncode}: {result.stderr[-2000:]}")
+    return result.stderr
+
+
+def video_duration(source: str, timeout: float = 60.0) -> float:
+    """
+    The duration of a video in seconds, read from its container without decoding it.
+    """
+    # without an output, ffmpeg prints the input information and exits with an error
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-nostdin", "-i", source],
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    match = re.search(r"Duration: (\d+):(\d{2}):(\d{2}(?:\.\d+)?)", result.stderr)
+    if not match:
+        raise RuntimeError(f"Could not read the duration of {source}: {result.stderr[-2000:]}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _scale_filter(max_dimension: int) -> str:
+    # fit within max_dimension x max_dimension, never upscale, keep dimensions even for the encoder
+    return (
+        f"scale='min({max_dimension},iw)':'min({max_dimension},ih)':force_original_aspect_ratio=decrease,"
+        "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    )
+
+
+def reduce_video(source: str, output_prefix: str, config: VideoReductionConfig) -> ReducedVideo:
+    """
+    Extract keyframes from, or transcode a proxy of, the video at `source`. Output files are named after
+    `output_prefix`. A module-level function, so that it can run in a process pool.
+    """
+    duration = video_duration(source, config.timeout)
+    files: List[str] = []
+
+    if config.mode == "proxy":
+        output = f"{output_prefix}.proxy.mp4"
+        _run(
+            [
+                "-y",
+                "-i", source,
+                "-vf", _scale_filter(config.max_dimension),
+                "-c:v", "libx264",
+                "-preset", "veryfast",
+                "-b:v", config.proxy_bitrate,
+                "-maxrate", config.proxy_bitrate,
+                "-bufsize", config.proxy_bitrate,
+                "-pix_fmt", "yuv420p",
+                "-an",
+                "-movflags", "+faststart",
+                output,
+            ],
+            config.timeout,
+        )
+        files.append(output)
+        return ReducedVideo(duration, files)
+
+    for index in range(config.keyframes):
+        # the middle of each of `keyframes` equal slices of the video
+        timestamp = duration * (index + 0.5) / config.keyframes
+        output = f"{output_prefix}.keyframe-{index:03d}.jpg"
+        _run(
+            [
+                "-y",
+                # seeking before the input jumps to the closest keyframe instead of decoding from the start
+                "-ss", f"{timestamp:.3f}",
+                "-i", source,
+                "-frames:v", "1",
+                "-vf", _scale_filter(config.max_dimension),
+                "-q:v", "3",
+                output,
+            ],
+            config.timeout,
+        )
+        if os.path.exists(output):
+            files.append(output)
+
+    if not files:
+        raise RuntimeError(f"No frame could be extracted from {source}")
+    return ReducedVideo(duration, files)
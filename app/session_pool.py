@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+from typing import Any, Callable, List
+
+from telethon import TelegramClient
+from telethon.sessions import SQLiteSession, StringSession
+
+from app.sdk.metrics import track_stage
+
+
+class TelegramSessionPool:
+    """
+    Keeps authenticated Telegram clients warm across jobs in a long-running process.
+
+    All clients share one authorization, held in memory as a `StringSession`: it is either passed in, or read once from
+    the `.session` file created by `generate-session.py` (or by a first interactive run). Clients never write to the
+    SQLite session file, so concurrent jobs do not lock it.
+
+    Jobs get a client through a lease (see `lease`). Clients are created and connected lazily, up to `max_clients`;
+    further jobs wait for a lease to be released. A released client stays connected for the next job, and is
+    reconnected on its next lease if the connection dropped in the meantime.
+    """
+
+    def __init__(
+        self,
+        telegram_api_id: str,
+        telegram_api_hash: str,
+        session_string: str | None = None,
+        session_name: str = "sda-telegram-scraper",
+        max_clients: int = 4,
+        client_factory: Callable[[str], Any] | None = None,
+    ) -> None:
+        if not all([telegram_api_id, telegram_api_hash]):
+            raise ValueError("telegram_api_id and telegram_api_hash must both be passed in.")
+        if max_clients < 1:
+            raise ValueError("max_clients must be at least 1.")
+
+        self._telegram_api_id = telegram_api_id
+        self._telegram_api_hash = telegram_api_hash
+        self._session_string = session_string
+        self._session_name = session_name
+        self._max_clients = max_clients
+        self._client_factory = client_factory or self._new_client
+        self._idle: List[Any] = []
+        self._clients: List[Any] = []
+        self._semaphore = asyncio.Semaphore(max_clients)
+        self._logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls) -> "TelegramSessionPool":
+        """
+        Build a pool from the TELEGRAM_API_ID, TELEGRAM_API_HASH, TELEGRAM_SESSION_STRING (optional) and
+        TELEGRAM_SESSION_POOL_SIZE (optional, 4 by default) environment variables.
+        """
+        return cls(
+            telegram_api_id=os.getenv("TELEGRAM_API_ID", ""),
+            telegram_api_hash=os.getenv("TELEGRAM_API_HASH", ""),
+            session_string=os.getenv("TELEGRAM_SESSION_STRING") or None,
+            max_clients=int(os.getenv("TELEGRAM_SESSION_POOL_SIZE", "4")),
+        )
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    @property
+    def size(self) -> int:
+        """
+        The number of clients created so far.
+        """
+        return len(self._clients)
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _load_session_string(self) -> str:
+        if self._session_string is None:
+            session_file = f"{self._session_name}.session"
+            if not os.path.exists(session_file):
+                raise ValueError(
+                    f"No session string was passed in and the session file '{session_file}' does not exist. Generate it with generate-session.py."
+                )
+            sqlite_session = SQLiteSession(self._session_name)
+            try:
+                self._session_string = StringSession.save(sqlite_session)
+            finally:
+                sqlite_session.close()
+        return self._session_string
+
+    def _new_client(self, session_string: str) -> TelegramClient:
+        return TelegramClient(
+            StringSession(session_string),
+            self._telegram_api_id,
+            self._telegram_api_hash,
+        )
+
+    async def _acquire(self, job_id: int) -> Any:
+        with track_stage("telegram_session_lease"):
+            await self._semaphore.acquire()
+            try:
+                if self._idle:
+                    client = self._idle.pop()
+                else:
+                    self.logger.info(f"{job_id}: Creating Telegram client {len(self._clients) + 1}/{self._max_clients}")
+                    client = self._client_factory(self._load_session_string())
+                    self._clients.append(client)
+
+                if not client.is_connected():
+                    self.logger.info(f"{job_id}: Connecting Telegram client")
+                    await client.connect()
+                    if not await client.is_user_authorized():
+                        self._clients.remove(client)
+                        await client.disconnect()
+                        raise ValueError("The Telegram session is not authorized. Generate it with generate-session.py.")
+
+            except BaseException:
+                self._semaphore.release()
+                raise
+
+        return client
+
+    def _release(self, client: Any) -> None:
+        self._idle.append(client)
+        self._semaphore.release()
+
+    def lease(self, job_id: int) -> "TelegramClientLease":
+        """
+        Get a lease on a client, to be used as an async context manager: entering it waits for a connected client,
+        exiting it hands the client back to the pool, still connected.
+
+        The lease can be passed to `scrape()` in place of a `TelegramClient`.
+        """
+        return TelegramClientLease(self, job_id)
+
+    async def close(self) -> None:
+        """
+        Disconnect all clients. Leases still held are not waited for.
+        """
+        for client in self._clients:
+            await client.disconnect()
+        self._clients.clear()
+        self._idle.clear()
+
+
+class TelegramClientLease:
+    def __init__(self, pool: TelegramSessionPool, job_id: int) -> None:
+        self._pool = pool
+        self._job_id = job_id
+        self._client: Any = None
+
+    async def __aenter__(self) -> Any:
+        if self._client is not None:
+            raise RuntimeError("This lease is already held.")
+        self._client = await self._pool._acquire(self._job_id)
+        return self._client
+
+    async def __aexit__(self, *args: Any) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            self._pool._release(client)
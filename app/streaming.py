@@ -0,0 +1,167 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+from telethon import TelegramClient, events
+
+from app.sdk.metrics import REGISTRY
+
+
+STREAM_LATENCY = REGISTRY.histogram(
+    "scraper_stream_latency_seconds",
+    "Time from the posting of a streamed message to the registration of the micro-batch it belongs to.",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+STREAMED_MESSAGES = REGISTRY.counter(
+    "scraper_streamed_messages_total",
+    "Number of new messages received by streaming jobs.",
+)
+
+
+class StreamConfig(BaseModel):
+    """
+    @attr batch_size: the number of messages after which their augmented rows are registered as a micro-batch
+    @attr batch_seconds: the time after which a micro-batch is registered, however few messages it holds
+    @attr max_messages: stop after this many messages; runs until stopped by default
+    @attr max_seconds: stop after this long, in seconds; runs until stopped by default
+    """
+
+    batch_size: int = 20
+    batch_seconds: float = 10.0
+    max_messages: int | None = None
+    max_seconds: float | None = None
+
+
+async def subscribe(
+    client: TelegramClient,
+    entity: Any,
+    config: StreamConfig,
+    stop: asyncio.Event | None = None,
+) -> AsyncIterator[List[Any]]:
+    """
+    Yield the new messages posted to `entity` as they arrive, as a list holding one message, or all the messages of an
+    album. An empty list is yielded whenever no message arrived for `config.batch_seconds`, so that the caller can flush
+    its micro-batch.
+
+    Stops once `stop` is set and the messages received so far are yielded, or after `config.max_messages` messages or `config.max_seconds`.
+    """
+    logger = logging.getLogger(__name__)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_message(event: Any) -> None:
+        # the messages of an album are received together by `on_album`
+        if getattr(event.message, "grouped_id", None) is None:
+            queue.put_nowait([event.message])
+
+    async def on_album(event: Any) -> None:
+        queue.put_nowait(list(event.messages))
+
+    new_message = events.NewMessage(chats=entity)
+    album = events.Album(chats=entity)
+    client.add_event_handler(on_message, new_message)
+    client.add_event_handler(on_album, album)
+    logger.info(f"Subscribed to the new messages of {entity}")
+
+    started = time.monotonic()
+    received = 0
+    try:
+        # the messages received before `stop` was set are still yielded
+        while not (stop is not None and stop.is_set() and queue.empty()):
+            if config.max_messages is not None and received >= config.max_messages:
+                break
+            timeout = config.batch_seconds
+            if config.max_seconds is not None:
+                remaining = config.max_seconds - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                timeout = min(timeout, remaining)
+
+            get = asyncio.ensure_future(queue.get())
+            waiters = {get}
+            if stop is not None:
+                waiters.add(asyncio.ensure_future(stop.wait()))
+            done, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+
+            if get in done:
+                messages = get.result()
+                received += len(messages)
+                STREAMED_MESSAGES.inc(len(messages))
+                yield messages
+            else:
+                yield []
+    finally:
+        client.remove_event_handler(on_message, new_message)
+        client.remove_event_handler(on_album, album)
+        logger.info(f"Unsubscribed from the new messages of {entity} after {received} messages")
+
+
+class MicroBatcher:
+    """
+    Collects the messages processed by a streaming job until their micro-batch is due, and keeps the latency of the
+    latest ones.
+    """
+
+    def __init__(self, config: StreamConfig, clock: Any = time.time) -> None:
+        self._config = config
+        self._clock = clock
+        self._pending: List[Tuple[int, float]] = []
+        self._opened_at: float | None = None
+        self._latencies: Deque[float] = collections.deque(maxlen=10_000)
+        self.batches = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def pending_ids(self) -> List[int]:
+        return [message_id for message_id, _ in self._pending]
+
+    def add(self, message: Any) -> None:
+        if self._opened_at is None:
+            self._opened_at = self._clock()
+        date = getattr(message, "date", None)
+        self._pending.append((message.id, date.timestamp() if date else self._clock()))
+
+    def due(self) -> bool:
+        if not self._pending:
+            return False
+        return (
+            len(self._pending) >= self._config.batch_size
+            or self._clock() - self._opened_at >= self._config.batch_seconds  # type: ignore
+        )
+
+    def take(self) -> List[int]:
+        """
+        Close the current micro-batch, once registered, recording the latency of its messages, and return their ids.
+        """
+        now = self._clock()
+        for _, posted_at in self._pending:
+            latency = max(0.0, now - posted_at)
+            STREAM_LATENCY.observe(latency)
+            self._latencies.append(latency)
+        ids = [message_id for message_id, _ in self._pending]
+        self._pending = []
+        self._opened_at = None
+        self.batches += 1
+        return ids
+
+    def latency_summary(self) -> Dict[str, float] | None:
+        """
+        Count, mean, median, 95th percentile and maximum of the latency of the latest messages, in seconds.
+        """
+        if not self._latencies:
+            return None
+        latencies = np.fromiter(self._latencies, dtype=np.float64)
+        return {
+            "count": float(len(latencies)),
+            "mean_seconds": float(latencies.mean()),
+            "p50_seconds": float(np.percentile(latencies, 50)),
+            "p95_seconds": float(np.percentile(latencies, 95)),
+            "max_seconds": float(latencies.max()),
+        }
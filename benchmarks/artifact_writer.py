@@ -0,0 +1,89 @@
+"""
+Benchmark of the writing of the augmented data: serialization time and bytes uploaded.
+
+Compares the previous `DataFrame.to_json(orient="index", indent=4)` path with the artifact writer, orjson with no
+compression, gzip and zstd, on synthetic augmented rows, including the time to upload the file at a given bandwidth.
+
+Usage:
+    python -m benchmarks.artifact_writer [--rows 100000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Any, Callable, List
+
+import pandas as pd
+
+from app.scraper import AUGMENTED_COLUMNS
+from app.sdk.artifact_writer import ArtifactConfig, write_rows
+from benchmarks.stand_ins import WILDFIRE_TEXTS
+
+PLACES = ["Patras, Greece", "Evia, Greece", "Attica, Greece", "Madeira, Portugal", "Tenerife, Spain", "Sicily, Italy"]
+
+
+def synthetic_rows(num_rows: int, seed: int = 0) -> List[List[Any]]:
+    rng = random.Random(seed)
+    rows = []
+    for index in range(num_rows):
+        rows.append(
+            [
+                1_234_567_890,
+                f"{rng.choice(WILDFIRE_TEXTS)} #{index}",
+                rng.choice(PLACES),
+                rng.uniform(34.0, 42.0),
+                rng.uniform(-18.0, 28.0),
+                rng.randint(1, 12),
+                rng.randint(1, 28),
+                rng.choice([2023, 2024]),
+                "Wildfire",
+            ]
+        )
+    return rows
+
+
+def measure(write: Callable[[str], None], repeat: int) -> tuple:
+    with tempfile.NamedTemporaryFile() as tmp:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            write(tmp.name)
+            best = min(best, time.perf_counter() - start)
+        return best, os.path.getsize(tmp.name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--upload-mb-per-second", type=float, default=10.0)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+
+    def to_json(file: str) -> None:
+        pd.DataFrame(rows, columns=AUGMENTED_COLUMNS).to_json(file, orient="index", indent=4)
+
+    candidates = [("df.to_json indent=4", to_json)]
+    for encoding in ("identity", "gzip", "zstd"):
+        config = ArtifactConfig(encoding=encoding)  # type: ignore
+        candidates.append((f"orjson {encoding}", lambda file, config=config: write_rows(rows, AUGMENTED_COLUMNS, file, config)))
+
+    baseline_seconds, baseline_bytes = measure(to_json, args.repeat)
+    print(f"{args.rows} rows")
+    print(
+        f"{'writer':24s} {'seconds':>9s} {'speedup':>8s} {'bytes':>12s} {'of to_json':>11s} "
+        f"{'+ upload at ' + str(args.upload_mb_per_second) + ' MB/s':>24s}"
+    )
+    for name, write in candidates:
+        seconds, size = measure(write, args.repeat)
+        upload_seconds = size / (args.upload_mb_per_second * 1e6)
+        print(
+            f"{name:24s} {seconds:9.3f} {baseline_seconds / seconds:7.1f}x {size:12d} {size / baseline_bytes:10.1%} "
+            f"{seconds + upload_seconds:23.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Microbenchmark of the per-message cost of logging in the scraper's hot path, at each log level.
+
+Compares the previous eager `logger.info(f"message: {message}")` on a Telethon message with the structured, lazily
+formatted event log, with and without sampling. Output goes through the queue-backed handler to /dev/null.
+
+Usage:
+    python -m benchmarks.logging_overhead [--messages 20000]
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import time
+from typing import Callable
+
+from telethon.tl.types import Message, MessageMediaPhoto, PeerChannel, Photo
+
+from app.sdk.event_log import EventLogger, configure_logging, shutdown_logging
+
+
+def build_message(message_id: int) -> Message:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return Message(
+        id=message_id,
+        peer_id=PeerChannel(1234567890),
+        date=now,
+        message="Forest wildfire spreading near Patras, Greece. " * 5,
+        views=1000,
+        media=MessageMediaPhoto(
+            photo=Photo(
+                id=message_id,
+                access_hash=1,
+                file_reference=b"\x00" * 32,
+                date=now,
+                sizes=[],
+                dc_id=4,
+            )
+        ),
+    )
+
+
+def measure(log: Callable[[Message], None], message: Message, num_messages: int) -> float:
+    start = time.perf_counter()
+    for _ in range(num_messages):
+        log(message)
+    return (time.perf_counter() - start) / num_messages * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    # send everything the background thread writes to /dev/null
+    devnull = open(os.devnull, "w")
+    sys.stderr, stderr = devnull, sys.stderr
+    configure_logging(logging.WARNING)
+
+    logger = logging.getLogger("benchmark")
+    events = EventLogger(logger, sample_rates={})
+    sampled_events = EventLogger(logger, sample_rates={"message": 0.01})
+    message = build_message(1)
+
+    def eager(message: Message) -> None:
+        logger.info(f"message: {message}")
+
+    def structured(message: Message) -> None:
+        events.info("message", job_id=1, message_id=message.id, has_media=message.media is not None)
+
+    def sampled(message: Message) -> None:
+        sampled_events.info("message", job_id=1, message_id=message.id, has_media=message.media is not None)
+
+    results = []
+    for level in ("DEBUG", "INFO", "WARNING"):
+        logging.getLogger().setLevel(level)
+        results.append(
+            (
+                level,
+                measure(eager, message, args.messages),
+                measure(structured, message, args.messages),
+                measure(sampled, message, args.messages),
+            )
+        )
+
+    shutdown_logging()
+    sys.stderr = stderr
+    devnull.close()
+
+    print(f"per-message cost in microseconds ({args.messages} messages)")
+    print(f"{'level':8s} {'eager f-string':>16s} {'structured':>12s} {'sampled 1%':>12s}")
+    for level, eager_cost, structured_cost, sampled_cost in results:
+        print(f"{level:8s} {eager_cost:16.2f} {structured_cost:12.2f} {sampled_cost:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Memory benchmark of the representations of per-message metadata on very large channels.
+
+Streams synthetic messages and keeps their metadata the way the scraper used to, as a list of Python values per
+message, as `__slots__` records, and in the column-backed `MessageBuffer`. Each representation is measured in its own
+process, and the peak RSS is reported against the peak before the first message.
+
+Usage:
+    python -m benchmarks.message_memory [--messages 1000000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from app.sdk.message_records import MessageBuffer, MessageRecord
+from benchmarks.scrape_throughput import peak_rss_mb
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient
+
+MODES = ("rows", "records", "buffer")
+
+
+def keep(mode: str, num_messages: int) -> Dict[str, Any]:
+    client = SyntheticTelegramClient(MessageMix(num_messages=num_messages))
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+
+    kept: Any = MessageBuffer() if mode == "buffer" else []
+    for message_id in range(1, num_messages + 1):
+        message = client.build_message(message_id)
+        if mode == "rows":
+            kept.append(
+                [
+                    message.sender_id,
+                    message.text,
+                    message.date,
+                    message.id,
+                    message.post_author,
+                    message.views,
+                    message.peer_id.channel_id,
+                ]
+            )
+        elif mode == "records":
+            kept.append(
+                MessageRecord(
+                    message_id=message.id,
+                    channel_id=message.peer_id.channel_id,
+                    sender_id=message.sender_id,
+                    post_author=message.post_author,
+                    date=message.date,
+                    views=message.views,
+                    text=message.text,
+                )
+            )
+        else:
+            kept.append(message)
+
+    return {
+        "mode": mode,
+        "messages": len(kept),
+        "seconds": round(time.perf_counter() - start, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "kept_mb": round(peak_rss_mb() - baseline, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(keep(args.mode, args.messages)))
+        return
+
+    results: List[Dict[str, Any]] = []
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.message_memory", "--messages", str(args.messages), "--mode", mode],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        results.append(json.loads(output.stdout))
+
+    print(f"{'representation':16s} {'messages':>10s} {'peak RSS':>10s} {'kept':>10s} {'per message':>12s}")
+    for result in results:
+        per_message = result["kept_mb"] * 1024 * 1024 / result["messages"]
+        print(
+            f"{result['mode']:16s} {result['messages']:>10d} {result['peak_rss_mb']:>8.1f}MB "
+            f"{result['kept_mb']:>8.1f}MB {per_message:>10.0f}B"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Upload throughput benchmark of `MinIORepository` on large videos.
+
+Uploads a synthetic video to the local MinIO-compatible stand-in with 1, 2, 4 and 8 workers, and reports MB/s. Each
+request is throttled to `--link-mb-per-second`, like a single connection to a remote object store, so that the gain
+of parallel parts shows without a real network; with 1 worker, the parts are uploaded one after the other, as a single
+stream would be.
+
+Usage:
+    python -m benchmarks.minio_upload [--video-mb 256] [--part-mb 16] [--link-mb-per-second 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from app.sdk.file_repository import MinIORepository
+from benchmarks.stand_ins import LocalS3Server
+
+WORKERS = (1, 2, 4, 8)
+
+
+def upload(video: str, workers: int, part_mb: int, link_mb_per_second: float | None) -> Dict[str, Any]:
+    with LocalS3Server(bytes_per_second=link_mb_per_second * 1e6 if link_mb_per_second else None) as server:
+        repository = MinIORepository(
+            host=server.host,
+            port=server.port,
+            access_key="bench",
+            secret_key="bench",
+            bucket="bench",
+            part_size=part_mb * 1024 * 1024,
+            max_workers=workers,
+        )
+        try:
+            repository.create_bucket_if_not_exists()
+            start = time.perf_counter()
+            size = repository.upload_file("videos/bench.video", video)
+            elapsed = time.perf_counter() - start
+        finally:
+            repository.close()
+        parts = server.state.requests.get("part", 0)
+    return {"workers": workers, "seconds": elapsed, "mb_per_second": size / elapsed / 1e6, "parts": parts}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video-mb", type=int, default=256)
+    parser.add_argument("--part-mb", type=int, default=16)
+    parser.add_argument("--link-mb-per-second", type=float, default=50.0, help="0 for no throttling")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".video") as video:
+        for _ in range(args.video_mb):
+            video.write(os.urandom(1024 * 1024))
+        video.flush()
+
+        print(f"{args.video_mb} MB video, {args.part_mb} MB parts, {args.link_mb_per_second or 'unthrottled'} MB/s per connection")
+        print(f"{'workers':>8s} {'parts':>6s} {'seconds':>9s} {'MB/s':>8s} {'speedup':>8s}")
+        baseline = None
+        for workers in WORKERS:
+            result = upload(video.name, workers, args.part_mb, args.link_mb_per_second)
+            baseline = baseline or result["seconds"]
+            print(
+                f"{result['workers']:>8d} {result['parts']:>6d} {result['seconds']:9.2f} "
+                f"{result['mb_per_second']:8.1f} {baseline / result['seconds']:7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measure the lookup, insert and reload cost of the perceptual hash index at a given size.
+
+Usage:
+    python -m benchmarks.phash_index [--hashes 1000000] [--lookups 200]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.perceptual_hash import PerceptualHashIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hashes", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 1 << 63, size=args.hashes, dtype=np.uint64) * np.uint64(2)
+    source_data = KernelPlancksterSourceData(
+        name="photo", protocol=ProtocolEnum.S3, relative_path="telegram/bench/1/photos/photo.photo"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = PerceptualHashIndex(directory=tmp_dir)
+
+        start = time.perf_counter()
+        for image_hash in hashes.tolist():
+            index.add(image_hash, source_data)
+        index.flush()
+        insert = (time.perf_counter() - start) / args.hashes * 1e6
+
+        queries = rng.integers(0, 1 << 63, size=args.lookups, dtype=np.uint64).tolist()
+        start = time.perf_counter()
+        for query in queries:
+            index.find(query)
+        lookup = (time.perf_counter() - start) / args.lookups * 1e3
+
+        start = time.perf_counter()
+        reloaded = PerceptualHashIndex(directory=tmp_dir)
+        reload = time.perf_counter() - start
+
+    print(f"hashes:      {len(reloaded):12d}")
+    print(f"insert:      {insert:12.2f} us/hash (including flush)")
+    print(f"lookup:      {lookup:12.2f} ms/lookup")
+    print(f"reload:      {reload:12.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Report the recall and precision of the lexical pre-filter against a labeled set of messages, and the share of
+messages it would still send to the LLM.
+
+Usage:
+    python -m benchmarks.prefilter_report [--fixture benchmarks/fixtures/relevance_labeled.jsonl] [--config prefilter.json]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from app.prefilter import LexicalPrefilter
+
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "relevance_labeled.jsonl")
+
+
+def load_labeled(path: str = DEFAULT_FIXTURE) -> List[Dict[str, Any]]:
+    """
+    Load labeled messages: one JSON object per line, with `text`, `relevant` and `language`.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate_prefilter(prefilter: LexicalPrefilter, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts = {"true_positives": 0, "false_positives": 0, "false_negatives": 0, "true_negatives": 0}
+    missed: List[str] = []
+    false_alarms: List[str] = []
+
+    start = time.perf_counter()
+    for record in records:
+        candidate = prefilter.is_candidate(record["text"])
+        if record["relevant"]:
+            counts["true_positives" if candidate else "false_negatives"] += 1
+            if not candidate:
+                missed.append(record["text"])
+        else:
+            counts["false_positives" if candidate else "true_negatives"] += 1
+            if candidate:
+                false_alarms.append(record["text"])
+    elapsed = time.perf_counter() - start
+
+    candidates = counts["true_positives"] + counts["false_positives"]
+    relevant = counts["true_positives"] + counts["false_negatives"]
+    return {
+        **counts,
+        "recall": round(counts["true_positives"] / relevant, 4) if relevant else 1.0,
+        "precision": round(counts["true_positives"] / candidates, 4) if candidates else 1.0,
+        # the share of messages still sent to the LLM
+        "pass_rate": round(candidates / len(records), 4) if records else 0.0,
+        "microseconds_per_message": round(elapsed / max(1, len(records)) * 1e6, 2),
+        "missed": missed,
+        "false_alarms": false_alarms,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", type=str, default=DEFAULT_FIXTURE)
+    parser.add_argument("--config", type=str, default="")
+    args = parser.parse_args()
+
+    prefilter = LexicalPrefilter.from_file(args.config) if args.config else LexicalPrefilter()
+    report = evaluate_prefilter(prefilter, load_labeled(args.fixture))
+
+    for key in ("true_positives", "false_positives", "false_negatives", "true_negatives", "recall", "precision", "pass_rate", "microseconds_per_message"):
+        print(f"{key:26s} {report[key]}")
+    for text in report["missed"]:
+        print(f"missed:      {text}")
+    for text in report["false_alarms"]:
+        print(f"false alarm: {text}")
+
+
+if __name__ == "__main__":
+    main()
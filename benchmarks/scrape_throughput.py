@@ -0,0 +1,207 @@
+"""
+Offline end-to-end throughput benchmark of `scrape()`.
+
+Drives the real scraper, Kernel Planckster gateway and file repository against local stand-ins, and reports
+messages/s, MB/s, peak RSS and the time spent per stage. No network access is needed.
+
+Usage:
+    python -m benchmarks.scrape_throughput --messages 2000 --llm-latency-ms 5
+    python -m benchmarks.scrape_throughput --min-messages-per-second 100  # exits with 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import sys
+import time
+import uuid
+from typing import Any, Dict
+
+from app.scraper import scrape
+from app.sdk.file_repository import FileRepository, MinIORepository
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.models import BaseJobState, ProtocolEnum
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from benchmarks.stand_ins import (
+    FakeGeocoder,
+    FakeInstructorClient,
+    LocalKernelPlancksterServer,
+    MessageMix,
+    SyntheticTelegramClient,
+)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(
+    mix: MessageMix,
+    llm_latency: float = 0.0,
+    geocode_latency: float = 0.0,
+    iter_latency: float = 0.0,
+    download_bytes_per_second: float | None = None,
+    telegram_client: Any = None,
+    instructor_client: FakeInstructorClient | None = None,
+    tracer_id: str | None = None,
+    minio_repository: MinIORepository | None = None,
+    **scrape_kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Run one scrape job over a synthetic channel and return the report.
+
+    `telegram_client` replaces the synthetic client built from the mix, e.g. to wrap it or to replay an archive; it
+    must hold `mix.num_messages` messages. `instructor_client` replaces the default `FakeInstructorClient`. With `minio_repository`, files are uploaded to it
+    instead of to the signed URLs of the local Kernel Planckster. Extra keyword arguments are passed on to `scrape()`.
+    """
+    with LocalKernelPlancksterServer() as server:
+        kernel_planckster = KernelPlancksterGateway(
+            host=server.host,
+            port=str(server.port),
+            auth_token="bench",
+            scheme="http",
+        )
+        scraped_data_repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=kernel_planckster,
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+            minio_repository=minio_repository,
+        )
+        if telegram_client is None:
+            telegram_client = SyntheticTelegramClient(
+                mix,
+                iter_latency=iter_latency,
+                download_bytes_per_second=download_bytes_per_second,
+            )
+        if instructor_client is None:
+            instructor_client = FakeInstructorClient(latency=llm_latency)
+
+        start = time.perf_counter()
+        job_output = asyncio.run(
+            scrape(
+                job_id=1,
+                channel_name="benchmark",
+                tracer_id=tracer_id or f"bench-{uuid.uuid4()}",
+                scraped_data_repository=scraped_data_repository,
+                telegram_client=telegram_client,  # type: ignore
+                openai_api_key="",
+                log_level=logging.WARNING,  # type: ignore
+                instructor_client=instructor_client,  # type: ignore
+                geolocator=FakeGeocoder(latency=geocode_latency),  # type: ignore
+                **scrape_kwargs,
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        uploaded_bytes = sum(server.state.uploaded.values())
+        registered = len(server.state.registered)
+        registered_paths = [source_data["relative_path"] for source_data in server.state.registered]
+        uploaded_sizes = dict(server.state.uploaded)
+
+    return {
+        "job_state": job_output.job_state.value if job_output else BaseJobState.FAILED.value,
+        "messages": mix.num_messages,
+        "elapsed_seconds": round(elapsed, 4),
+        "messages_per_second": round(mix.num_messages / elapsed, 2),
+        "downloaded_mb_per_second": round(getattr(telegram_client, "downloaded_bytes", 0) / elapsed / 1e6, 2),
+        "uploaded_mb_per_second": round(uploaded_bytes / elapsed / 1e6, 2),
+        "uploaded_bytes": uploaded_bytes,
+        "registered_source_data": registered,
+        "registered_paths": registered_paths,
+        "uploaded_sizes": uploaded_sizes,
+        "llm_calls": dict(instructor_client.calls),
+        "llm_model_calls": dict(instructor_client.model_calls),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": job_output.metrics if job_output else {},
+        "pipeline": job_output.pipeline if job_output else {},
+        "job_output": job_output,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"job state:            {report['job_state']}")
+    print(f"messages:             {report['messages']} in {report['elapsed_seconds']:.2f}s")
+    print(f"throughput:           {report['messages_per_second']:.1f} messages/s")
+    print(f"download:             {report['downloaded_mb_per_second']:.2f} MB/s")
+    print(f"upload:               {report['uploaded_mb_per_second']:.2f} MB/s")
+    print(f"registered:           {report['registered_source_data']} source data")
+    print(f"llm calls:            {report['llm_calls']}")
+    print(f"llm calls per model:  {report['llm_model_calls']}")
+    print(f"peak RSS:             {report['peak_rss_mb']:.1f} MB")
+    if report["pipeline"]:
+        print("pipeline:")
+        for stage, stage_stats in report["pipeline"].items():
+            print(
+                f"  {stage:28s} items={stage_stats['items']:<7d} busy={stage_stats['busy_seconds']:8.3f}s "
+                f"blocked={stage_stats['blocked_seconds']:8.3f}s utilization={stage_stats['utilization']:.2f} "
+                f"max queue={stage_stats['max_queue_depth']}"
+            )
+    print("per-stage time:")
+    for stage, stage_metrics in sorted(report["stages"].items()):
+        print(
+            f"  {stage:28s} count={stage_metrics['count']:<7d} total={stage_metrics['total_seconds']:8.3f}s "
+            f"mean={stage_metrics['mean_seconds'] * 1000:8.3f}ms bytes={stage_metrics['bytes']}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--text-ratio", type=float, default=0.8)
+    parser.add_argument("--photo-ratio", type=float, default=0.2)
+    parser.add_argument("--video-ratio", type=float, default=0.05)
+    parser.add_argument("--photo-kb", type=int, default=200)
+    parser.add_argument("--video-kb", type=int, default=5 * 1024)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--geocode-latency-ms", type=float, default=0.0)
+    parser.add_argument("--iter-latency-ms", type=float, default=0.0)
+    parser.add_argument("--download-mb-per-second", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument(
+        "--min-messages-per-second",
+        type=float,
+        default=None,
+        help="Exit with status 1 if the throughput is below this value",
+    )
+    args = parser.parse_args()
+
+    mix = MessageMix(
+        num_messages=args.messages,
+        text_ratio=args.text_ratio,
+        photo_ratio=args.photo_ratio,
+        video_ratio=args.video_ratio,
+        photo_bytes=args.photo_kb * 1024,
+        video_bytes=args.video_kb * 1024,
+        seed=args.seed,
+    )
+    report = run_benchmark(
+        mix,
+        llm_latency=args.llm_latency_ms / 1000,
+        geocode_latency=args.geocode_latency_ms / 1000,
+        iter_latency=args.iter_latency_ms / 1000,
+        download_bytes_per_second=args.download_mb_per_second * 1e6 if args.download_mb_per_second else None,
+    )
+    report.pop("job_output")
+    report.pop("registered_paths")
+    report.pop("uploaded_sizes")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if report["job_state"] != BaseJobState.FINISHED.value:
+        sys.exit(1)
+    if args.min_messages_per_second and report["messages_per_second"] < args.min_messages_per_second:
+        print(
+            f"Regression: {report['messages_per_second']} messages/s is below {args.min_messages_per_second}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,642 @@
+"""
+Local, network-free stand-ins for the services the scraper talks to: Telegram, OpenAI (through instructor), Nominatim,
+Kernel Planckster together with the object store behind its signed URLs, and a MinIO-compatible object store.
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+import zlib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from pydantic import BaseModel
+
+
+@dataclass
+class MessageMix:
+    """
+    The shape of a synthetic channel.
+
+    Ratios are per message and independent of each other; a message can have text and media at the same time.
+    """
+
+    num_messages: int = 1000
+    text_ratio: float = 0.8
+    photo_ratio: float = 0.2
+    video_ratio: float = 0.05
+    photo_bytes: int = 200 * 1024
+    video_bytes: int = 5 * 1024 * 1024
+    channel_id: int = 1234567890
+    seed: int = 42
+    # if set, photos are real JPEG images, each a resized and re-encoded copy of one of this many distinct images
+    photo_images: int = 0
+    # if set, videos are copies of this video file
+    video_file: str | None = None
+    # the share of albums among blocks of `album_size` consecutive messages; the messages of an album all have a
+    # photo, and only the first one has a caption
+    album_ratio: float = 0.0
+    album_size: int = 4
+
+
+WILDFIRE_TEXTS = [
+    "Forest wildfire spreading near Patras, Greece on 12.08.2024, firefighters on site.",
+    "Huge wildfire in the forest close to Chania, Greece. Evacuations ordered.",
+    "Smoke from the forest fire is visible from Athens, Greece this morning.",
+]
+NOISE_TEXTS = [
+    "Good morning everyone!",
+    "Subscribe to our channel for more news https://t.me/example",
+    "Promo code SALE20 for 20% off today only",
+    "Weather forecast: sunny with light winds for the weekend.",
+]
+
+
+class SyntheticTelegramClient:
+    """
+    Mimics the subset of `telethon.TelegramClient` that `scrape()` uses.
+
+    Messages are generated deterministically from the mix, newest first like Telegram does, and media downloads write
+    the configured number of bytes, optionally throttled.
+    """
+
+    def __init__(
+        self,
+        mix: MessageMix,
+        iter_latency: float = 0.0,
+        download_bytes_per_second: float | None = None,
+    ) -> None:
+        self._mix = mix
+        self._iter_latency = iter_latency
+        self._download_bytes_per_second = download_bytes_per_second
+        self._payloads: Dict[int, bytes] = {}
+        self._handlers: List[tuple] = []
+        self.downloaded_bytes = 0
+
+    async def __aenter__(self) -> "SyntheticTelegramClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        return None
+
+    def _payload(self, size: int) -> bytes:
+        payload = self._payloads.get(size)
+        if payload is None:
+            payload = random.Random(size).randbytes(size)
+            self._payloads[size] = payload
+        return payload
+
+    def build_message(self, message_id: int) -> SimpleNamespace:
+        mix = self._mix
+        rng = random.Random(mix.seed * 1_000_003 + message_id)
+
+        text = ""
+        if rng.random() < mix.text_ratio:
+            pool = WILDFIRE_TEXTS if rng.random() < 0.5 else NOISE_TEXTS
+            text = f"{rng.choice(pool)} #{message_id}"
+
+        media = None
+        media_roll = rng.random()
+        if media_roll < mix.photo_ratio:
+            media = SimpleNamespace(
+                photo=SimpleNamespace(id=message_id, size=mix.photo_bytes),
+            )
+            if mix.photo_images:
+                media.photo.image = rng.randrange(mix.photo_images)
+        elif media_roll < mix.photo_ratio + mix.video_ratio:
+            media = SimpleNamespace(
+                document=SimpleNamespace(
+                    id=message_id, size=mix.video_bytes, mime_type="video/mp4"
+                ),
+            )
+
+        grouped_id = None
+        if mix.album_ratio:
+            block = (message_id - 1) // mix.album_size
+            if random.Random(mix.seed * 1_000_033 + block).random() < mix.album_ratio:
+                grouped_id = 10**12 + block
+                if message_id != block * mix.album_size + 1:
+                    text = ""
+                media = SimpleNamespace(photo=SimpleNamespace(id=message_id, size=mix.photo_bytes))
+                if mix.photo_images:
+                    media.photo.image = rng.randrange(mix.photo_images)
+
+        return SimpleNamespace(
+            id=message_id,
+            sender_id=None,
+            text=text,
+            message=text,
+            date=datetime.datetime(2024, 8, 12, tzinfo=datetime.timezone.utc)
+            - datetime.timedelta(minutes=message_id),
+            post_author=None,
+            views=rng.randint(0, 10_000),
+            peer_id=SimpleNamespace(channel_id=mix.channel_id),
+            grouped_id=grouped_id,
+            media=media,
+        )
+
+    async def iter_messages(self, entity: Any, **kwargs: Any) -> AsyncIterator[SimpleNamespace]:
+        offset_id = kwargs.get("offset_id") or 0
+        first_id = self._mix.num_messages if not offset_id else min(offset_id - 1, self._mix.num_messages)
+        for message_id in range(first_id, 0, -1):
+            if self._iter_latency:
+                await asyncio.sleep(self._iter_latency)
+            yield self.build_message(message_id)
+
+    async def get_messages(self, entity: Any, ids: List[int], **kwargs: Any) -> List[SimpleNamespace | None]:
+        if self._iter_latency:
+            await asyncio.sleep(self._iter_latency)
+        return [
+            self.build_message(message_id) if 1 <= message_id <= self._mix.num_messages else None
+            for message_id in ids
+        ]
+
+    def add_event_handler(self, callback: Callable, event: Any) -> None:
+        self._handlers.append((callback, event))
+
+    def remove_event_handler(self, callback: Callable, event: Any = None) -> None:
+        self._handlers = [
+            (c, e) for c, e in self._handlers if not (c is callback and (event is None or e is event))
+        ]
+
+    async def publish(self, message_ids: List[int]) -> None:
+        """
+        Post the given messages now, delivering them to the event handlers like Telegram does: one `NewMessage` event
+        per message, and one `Album` event for the messages sharing a `grouped_id`.
+        """
+        from telethon import events
+
+        messages = [self.build_message(message_id) for message_id in message_ids]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        albums: Dict[int, List[SimpleNamespace]] = {}
+        for message in messages:
+            message.date = now
+            if message.grouped_id is not None:
+                albums.setdefault(message.grouped_id, []).append(message)
+        for callback, event in list(self._handlers):
+            if isinstance(event, events.Album):
+                for album in albums.values():
+                    await callback(SimpleNamespace(messages=album))
+            elif isinstance(event, events.NewMessage):
+                for message in messages:
+                    await callback(SimpleNamespace(message=message))
+
+    async def download_media(self, media: Any, file: str, **kwargs: Any) -> str:
+        image = getattr(media, "image", None)
+        if image is not None:
+            payload = synthetic_jpeg(image, variant=media.id)
+        elif self._mix.video_file and getattr(media, "mime_type", "").startswith("video/"):
+            with open(self._mix.video_file, "rb") as f:
+                payload = f.read()
+        else:
+            payload = self._payload(media.size)
+        if self._download_bytes_per_second:
+            await asyncio.sleep(len(payload) / self._download_bytes_per_second)
+        with open(file, "wb") as f:
+            f.write(payload)
+        self.downloaded_bytes += len(payload)
+        return file
+
+
+def synthetic_jpeg(image: int, variant: int = 0, size: int = 256) -> bytes:
+    """
+    A JPEG rendering of the `image`-th synthetic image. Variants are resized and re-encoded at different qualities, so
+    their bytes differ while they look the same.
+    """
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(image)
+    coarse = rng.integers(0, 256, size=(6, 6, 3), dtype=np.uint8)
+    base = Image.fromarray(coarse).resize((size, size), Image.BICUBIC)
+
+    variant_rng = random.Random(variant)
+    scale = variant_rng.uniform(0.5, 1.0)
+    resized = base.resize((int(size * scale), int(size * scale)), Image.BILINEAR)
+    buffer = io.BytesIO()
+    resized.save(buffer, format="JPEG", quality=variant_rng.randint(50, 95))
+    return buffer.getvalue()
+
+
+class _Completions:
+    def __init__(self, backend: "FakeInstructorClient") -> None:
+        self._backend = backend
+
+    def create(self, model: str, response_model: type[BaseModel], messages: List[Dict[str, str]], **kwargs: Any) -> BaseModel:
+        return self._backend.respond(model, response_model, messages)
+
+
+class FakeInstructorClient:
+    """
+    Mimics `instructor.Instructor.chat.completions.create` for the `filterData` and `messageData` response models.
+
+    Answers are deterministic: a message is relevant if it is one of the synthetic wildfire reports. Response models with
+    a `confidence` field get `confidence(model, content)`, 1.0 by default. Each call blocks for `latency` seconds, or
+    `model_latencies[model]`, like the real synchronous client does.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        model_latencies: Dict[str, float] | None = None,
+        confidence: Callable[[str, str], float] | None = None,
+    ) -> None:
+        self._latency = latency
+        self._model_latencies = model_latencies or {}
+        self._confidence = confidence
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.calls: Dict[str, int] = {}
+        self.model_calls: Dict[str, int] = {}
+
+    def respond(self, model: str, response_model: type[BaseModel], messages: List[Dict[str, str]]) -> BaseModel:
+        latency = self._model_latencies.get(model, self._latency)
+        if latency:
+            time.sleep(latency)
+        name = response_model.__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.model_calls[model] = self.model_calls.get(model, 0) + 1
+        content = messages[-1]["content"]
+        if "relevant" in response_model.model_fields:
+            relevant = any(text in content for text in WILDFIRE_TEXTS)
+            if "confidence" in response_model.model_fields:
+                confidence = self._confidence(model, content) if self._confidence else 1.0
+                response = response_model(relevant=relevant, confidence=confidence)
+            else:
+                response = response_model(relevant=relevant)
+        else:
+            fields = dict(city="Patras", country="Greece", year=2024, month="August", day="12", disaster_type="Wildfire")
+            response = response_model(**{name: fields[name] for name in response_model.model_fields})
+        # like instructor, keep the completion and its usage: a token per 4 characters of prompt, 10 per field
+        prompt_tokens = len(content) // 4
+        completion_tokens = 10 * len(response_model.model_fields)
+        response._raw_response = SimpleNamespace(  # type: ignore
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            )
+        )
+        return response
+
+
+class FakeGeocoder:
+    """
+    Mimics `geopy.geocoders.Nominatim.geocode`, returning a stable location per query.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self._latency = latency
+        self.calls = 0
+
+    def geocode(self, query: str, **kwargs: Any) -> SimpleNamespace:
+        if self._latency:
+            time.sleep(self._latency)
+        self.calls += 1
+        checksum = zlib.crc32(query.encode())
+        return SimpleNamespace(
+            latitude=(checksum % 18000) / 100 - 90,
+            longitude=(checksum // 18000 % 36000) / 100 - 180,
+            address=query,
+        )
+
+
+@dataclass
+class LocalSinkState:
+    """
+    What the local Kernel Planckster received, and the faults it still has to inject.
+
+    `faults` maps a route ("ping", "upload-credentials", "upload", "register") to the status codes of its next
+    responses; status 0 drops the connection without answering. Faults of the "register" route are injected after the
+    source data is registered, like a response lost on the way back.
+    """
+
+    uploaded: Dict[str, int] = field(default_factory=dict)
+    registered: List[Dict[str, str]] = field(default_factory=list)
+    faults: Dict[str, List[int]] = field(default_factory=dict)
+    requests: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def next_fault(self, route: str) -> int | None:
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            faults = self.faults.get(route)
+            return faults.pop(0) if faults else None
+
+
+class _KernelPlancksterHandler(BaseHTTPRequestHandler):
+    server: "LocalKernelPlancksterServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _inject_fault(self, route: str) -> bool:
+        status = self.server.state.next_fault(route)
+        if status is None:
+            return False
+        if status == 0:
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+        else:
+            self._send_json(status, {"detail": "injected fault"})
+        return True
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        route = "ping" if url.path == "/ping" else url.path.rsplit("/", 1)[-1]
+        if self._inject_fault(route):
+            return
+        if url.path == "/ping":
+            self._send_json(200, {"ping": "pong"})
+        elif url.path.endswith("/source"):
+            state = self.server.state
+            with state.lock:
+                source_data_list = list(state.registered)
+            self._send_json(200, {"source_data_list": source_data_list})
+        elif url.path.endswith("/upload-credentials"):
+            relative_path = parse_qs(url.query)["relative_path"][0]
+            self._send_json(
+                200,
+                {"signed_url": f"{self.server.url}/upload/{quote(relative_path)}"},
+            )
+        else:
+            self._send_json(404, {"detail": "not found"})
+
+    def do_PUT(self) -> None:
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        remaining = length
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        if self._inject_fault("upload"):
+            return
+        state = self.server.state
+        with state.lock:
+            state.uploaded[unquote(url.path[len("/upload/"):])] = length
+        self._send_json(200, {})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if not url.path.endswith("/source"):
+            self._send_json(404, {"detail": "not found"})
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        source_data = {
+            "name": params["source_data_name"],
+            "protocol": params["source_data_protocol"],
+            "relative_path": params["source_data_relative_path"],
+        }
+        state = self.server.state
+        with state.lock:
+            state.registered.append(source_data)
+        if self._inject_fault("register"):
+            return
+        self._send_json(200, {"source_data": source_data})
+
+
+class LocalKernelPlancksterServer(ThreadingHTTPServer):
+    """
+    An in-process HTTP server implementing the Kernel Planckster endpoints used by `KernelPlancksterGateway`, and a
+    sink for uploads to the signed URLs it hands out. Uploaded bytes are counted and discarded.
+
+    Use as a context manager; it binds to a free port on the loopback interface.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler: type[BaseHTTPRequestHandler] = _KernelPlancksterHandler) -> None:
+        super().__init__(("127.0.0.1", 0), handler)
+        self.state = LocalSinkState()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return "127.0.0.1"
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self) -> "LocalKernelPlancksterServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+@dataclass
+class LocalS3State:
+    """
+    What the local object store holds, and the faults it still has to inject.
+
+    `faults` maps a route ("bucket", "put", "initiate", "part", "complete", "abort") to the status codes of its next
+    responses, answered with an S3 error: 503 is "SlowDown", 403 "AccessDenied", anything else "InternalError".
+    """
+
+    buckets: set = field(default_factory=set)
+    objects: Dict[tuple, bytes] = field(default_factory=dict)
+    content_types: Dict[tuple, str] = field(default_factory=dict)
+    uploads: Dict[str, Dict[int, bytes]] = field(default_factory=dict)
+    aborted: List[str] = field(default_factory=list)
+    faults: Dict[str, List[int]] = field(default_factory=dict)
+    requests: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def next_fault(self, route: str) -> int | None:
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            faults = self.faults.get(route)
+            return faults.pop(0) if faults else None
+
+
+S3_ERROR_CODES = {403: "AccessDenied", 404: "NoSuchKey", 503: "SlowDown"}
+
+
+class _S3Handler(BaseHTTPRequestHandler):
+    server: "LocalS3Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+    def _send(self, status: int, body: bytes = b"", headers: Dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_xml(self, root: ET.Element) -> None:
+        self._send(200, ET.tostring(root, xml_declaration=True, encoding="utf-8"))
+
+    def _send_error(self, status: int, code: str | None = None) -> None:
+        root = ET.Element("Error")
+        for tag, text in (
+            ("Code", code or S3_ERROR_CODES.get(status, "InternalError")),
+            ("Message", "injected fault" if code is None else code),
+            ("Resource", self.path),
+            ("RequestId", uuid.uuid4().hex),
+        ):
+            ET.SubElement(root, tag).text = text
+        self._send(status, ET.tostring(root, xml_declaration=True, encoding="utf-8"))
+
+    def _read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.server.bytes_per_second:
+            # each request is throttled on its own, like a connection on a saturated link
+            time.sleep(len(body) / self.server.bytes_per_second)
+        return body
+
+    def _parse(self) -> tuple:
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        return unquote(bucket), unquote(key), {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+
+    def _route(self, key: str, query: Dict[str, str]) -> str:
+        if not key:
+            return "bucket"
+        if "uploads" in query:
+            return "initiate"
+        if "partNumber" in query:
+            return "part"
+        if "uploadId" in query:
+            return "abort" if self.command == "DELETE" else "complete"
+        return "put" if self.command == "PUT" else "get"
+
+    def _handle(self) -> None:
+        bucket, key, query = self._parse()
+        body = self._read_body() if self.command in ("PUT", "POST") else b""
+        route = self._route(key, query)
+        state = self.server.state
+        status = state.next_fault(route)
+        if status is not None:
+            self._send_error(status)
+            return
+        with state.lock:
+            if route == "bucket":
+                if self.command == "PUT":
+                    if bucket in state.buckets:
+                        self._send_error(409, "BucketAlreadyOwnedByYou")
+                        return
+                    state.buckets.add(bucket)
+                    self._send(200, headers={"Location": f"/{bucket}"})
+                elif bucket not in state.buckets:
+                    self._send_error(404, "NoSuchBucket")
+                elif "location" in query:
+                    root = ET.Element("LocationConstraint")
+                    self._send_xml(root)
+                else:
+                    self._send(200)
+                return
+            if bucket not in state.buckets:
+                self._send_error(404, "NoSuchBucket")
+                return
+            if route == "put":
+                state.objects[(bucket, key)] = body
+                state.content_types[(bucket, key)] = self.headers.get("Content-Type", "")
+                self._send(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+            elif route == "get":
+                if (bucket, key) not in state.objects:
+                    self._send_error(404, "NoSuchKey")
+                    return
+                data = state.objects[(bucket, key)]
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command == "GET":
+                    self.wfile.write(data)
+            elif route == "initiate":
+                upload_id = uuid.uuid4().hex
+                state.uploads[upload_id] = {}
+                state.content_types[(bucket, key)] = self.headers.get("Content-Type", "")
+                root = ET.Element("InitiateMultipartUploadResult")
+                for tag, text in (("Bucket", bucket), ("Key", key), ("UploadId", upload_id)):
+                    ET.SubElement(root, tag).text = text
+                self._send_xml(root)
+            elif query["uploadId"] not in state.uploads:
+                self._send_error(404, "NoSuchUpload")
+            elif route == "part":
+                state.uploads[query["uploadId"]][int(query["partNumber"])] = body
+                self._send(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+            elif route == "abort":
+                del state.uploads[query["uploadId"]]
+                state.aborted.append(key)
+                self._send(204)
+            else:
+                parts = state.uploads.pop(query["uploadId"])
+                numbers = [int(element.text or 0) for element in ET.fromstring(body).iter() if element.tag.endswith("PartNumber")]
+                state.objects[(bucket, key)] = b"".join(parts[number] for number in numbers)
+                root = ET.Element("CompleteMultipartUploadResult")
+                for tag, text in (("Location", f"/{bucket}/{key}"), ("Bucket", bucket), ("Key", key), ("ETag", f'"{uuid.uuid4().hex}-{len(numbers)}"')):
+                    ET.SubElement(root, tag).text = text
+                self._send_xml(root)
+
+    do_HEAD = do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+
+class LocalS3Server(ThreadingHTTPServer):
+    """
+    An in-process HTTP server implementing the subset of the S3 API used by `MinIORepository`: buckets, single and
+    multipart uploads, and reads. Objects are kept in memory. Signatures are not checked.
+
+    With `bytes_per_second`, the body of each request is throttled to that rate, so that parallel uploads can be told
+    apart from sequential ones without a real network. Use as a context manager; it binds to a free port on the
+    loopback interface.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, bytes_per_second: float | None = None) -> None:
+        super().__init__(("127.0.0.1", 0), _S3Handler)
+        self.state = LocalS3State()
+        self.bytes_per_second = bytes_per_second
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return "127.0.0.1"
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self) -> "LocalS3Server":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
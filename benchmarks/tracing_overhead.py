@@ -0,0 +1,47 @@
+"""
+Measure the per-span overhead of the tracer, with tracing disabled and with the file exporter.
+
+Usage:
+    python -m benchmarks.tracing_overhead [--spans 100000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.sdk.tracing import FileSpanExporter, Tracer, start_span
+
+
+def measure(tracer: Tracer, num_spans: int) -> float:
+    """
+    Returns the average cost, in microseconds, of a message span with one nested child span.
+    """
+    start = time.perf_counter()
+    for i in range(num_spans):
+        with tracer.start_span(
+            "telegram.message", attributes={"tracer_id": "bench", "job_id": 1, "message_id": i}
+        ):
+            with start_span("openai.filter"):
+                pass
+    tracer.flush()
+    return (time.perf_counter() - start) / num_spans * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "spans.jsonl")
+        disabled = measure(Tracer(), args.spans)
+        enabled = measure(Tracer(FileSpanExporter(path)), args.spans)
+        size = os.path.getsize(path)
+
+    print(f"disabled tracer:      {disabled:8.2f} us/message")
+    print(f"file exporter:        {enabled:8.2f} us/message (2 spans)")
+    print(f"exported bytes/span:  {size / (2 * args.spans):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,40 @@
+import asyncio
 import os
+from typing import Any, Dict
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.checkpoint import CheckpointStore
+from app.materializer import MaterializeFilter, materialize_media
+from app.prefilter import LexicalPrefilter
+from app.relevance import EmbeddingRelevanceScorer
+from app.rule_extraction import RuleBasedExtractor
+from app.scraper import ModelCascadeConfig, ScrapePipelineConfig, scrape
+from app.sdk.artifact_writer import ArtifactConfig
+from app.sdk.embeddings import EmbeddingCache, OpenAIEmbeddingBackend
+from app.sdk.file_repository import FileRepository
 from app.sdk.job_manager import BaseJobManager
+from app.sdk.event_log import configure_logging
 from app.sdk.job_router import JobManagerFastAPIRouter
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.llm_ledger import LLMBudget
+from app.sdk.metrics import REGISTRY
+from app.sdk.image_transform import ImageTransformConfig
+from app.sdk.minhash import MinHashIndex
+from app.sdk.perceptual_hash import PerceptualHashIndex
+from app.sdk.rate_limiter import RateLimitConfig, RateLimiter
+from app.sdk.models import BaseJob, BaseJobState, DeferredMediaRecord, JobOutput, ProtocolEnum
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from app.sdk.video_reduction import VideoReductionConfig
+from app.session_pool import TelegramSessionPool
+from app.streaming import StreamConfig
+from openai import OpenAI
 
-from telegram_scraper import scrape
 import logging
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+configure_logging(logging.INFO)
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +46,285 @@ MODE = os.getenv("MODE", "production")
 app = FastAPI()
 app.job_manager = BaseJobManager()  # type: ignore
 
-job_manager_router = JobManagerFastAPIRouter(app, scrape)
+# Telegram clients are kept authenticated and connected across jobs
+telegram_session_pool = TelegramSessionPool.from_env()
+
+# near-duplicate photos are detected across all jobs of this server
+PHOTO_INDEX_DIR = os.getenv("PHOTO_INDEX_DIR", "")
+photo_index = (
+    PerceptualHashIndex(
+        directory=PHOTO_INDEX_DIR,
+        max_distance=int(os.getenv("PHOTO_MAX_DISTANCE", "6")),
+    )
+    if PHOTO_INDEX_DIR
+    else None
+)
+
+# the relevance check goes up FILTER_MODELS (comma-separated, cheapest first) while the models are not confident
+model_cascade = ModelCascadeConfig(
+    filter_models=[
+        model.strip() for model in os.getenv("FILTER_MODELS", "gpt-4o").split(",") if model.strip()
+    ],
+    min_confidence=float(os.getenv("FILTER_MIN_CONFIDENCE", "0.8")),
+    extraction_model=os.getenv("EXTRACTION_MODEL", "gpt-4o"),
+)
+
+# LLM calls of all jobs are queued within OPENAI_RPM requests and OPENAI_TPM tokens per minute, if both are set; with
+# RATE_LIMIT_STORE, the budgets are shared with every worker process using the same file
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "0"))
+rate_limiter = (
+    RateLimiter(
+        RateLimitConfig(requests_per_minute=OPENAI_RPM, tokens_per_minute=OPENAI_TPM),
+        path=os.getenv("RATE_LIMIT_STORE") or None,
+    )
+    if OPENAI_RPM and OPENAI_TPM
+    else None
+)
+
+# every job goes on without augmentation once it used LLM_MAX_TOKENS tokens, LLM_MAX_COST USD or LLM_MAX_REQUESTS
+# calls, if set; LLM_DEGRADED_MODE is "skip_augmentation" or "prefilter_only"
+llm_budget = LLMBudget(
+    max_tokens=int(os.environ["LLM_MAX_TOKENS"]) if os.getenv("LLM_MAX_TOKENS") else None,
+    max_cost=float(os.environ["LLM_MAX_COST"]) if os.getenv("LLM_MAX_COST") else None,
+    max_requests=int(os.environ["LLM_MAX_REQUESTS"]) if os.getenv("LLM_MAX_REQUESTS") else None,
+    degraded_mode=os.getenv("LLM_DEGRADED_MODE", "skip_augmentation"),  # type: ignore
+)
+
+# dates and known places are extracted locally if RULE_EXTRACTION is set to "1", or RULE_EXTRACTION_CONFIG to a
+# configuration file
+RULE_EXTRACTION_CONFIG = os.getenv("RULE_EXTRACTION_CONFIG", "")
+rule_extractor = (
+    RuleBasedExtractor.from_file(RULE_EXTRACTION_CONFIG)
+    if RULE_EXTRACTION_CONFIG
+    else RuleBasedExtractor()
+    if os.getenv("RULE_EXTRACTION", "") == "1"
+    else None
+)
+
+# near-duplicate messages reuse the augmentation of the first one, across all jobs of this server
+TEXT_INDEX_DIR = os.getenv("TEXT_INDEX_DIR", "")
+text_index = (
+    MinHashIndex(
+        directory=TEXT_INDEX_DIR,
+        threshold=float(os.getenv("TEXT_SIMILARITY", "0.6")),
+    )
+    if TEXT_INDEX_DIR
+    else None
+)
+
+# photos are downscaled and re-encoded before upload if IMAGE_MAX_DIMENSION is set
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "0"))
+image_transform = (
+    ImageTransformConfig(
+        max_dimension=IMAGE_MAX_DIMENSION,
+        format=os.getenv("IMAGE_FORMAT", "JPEG").upper(),  # type: ignore
+        quality=int(os.getenv("IMAGE_QUALITY", "85")),
+    )
+    if IMAGE_MAX_DIMENSION
+    else None
+)
+
+# videos are uploaded as keyframes or a proxy if VIDEO_MODE is set ("keyframes" or "proxy")
+VIDEO_MODE = os.getenv("VIDEO_MODE", "")
+video_reduction = (
+    VideoReductionConfig(
+        mode=VIDEO_MODE,  # type: ignore
+        keyframes=int(os.getenv("VIDEO_KEYFRAMES", "5")),
+        original=os.getenv("ORIGINAL_VIDEOS", "defer"),  # type: ignore
+    )
+    if VIDEO_MODE
+    else None
+)
+
+# only candidate messages reach the LLM if PREFILTER is set to "1", or PREFILTER_CONFIG to a configuration file
+PREFILTER_CONFIG = os.getenv("PREFILTER_CONFIG", "")
+prefilter = (
+    LexicalPrefilter.from_file(PREFILTER_CONFIG)
+    if PREFILTER_CONFIG
+    else LexicalPrefilter()
+    if os.getenv("PREFILTER", "") == "1"
+    else None
+)
+
+# relevance is scored by embedding similarity, asking the LLM only for borderline messages, if RELEVANCE is "embedding"
+relevance_scorer = None
+if os.getenv("RELEVANCE", "llm") == "embedding":
+    embedding_backend = OpenAIEmbeddingBackend(
+        OpenAI(api_key=os.getenv("OPENAI_API_KEY", "")),
+        model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+    )
+    embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE", "embeddings.sqlite"))
+    relevance_scorer = (
+        EmbeddingRelevanceScorer.from_file(embedding_backend, os.environ["RELEVANCE_CONFIG"], embedding_cache)
+        if os.getenv("RELEVANCE_CONFIG")
+        else EmbeddingRelevanceScorer(embedding_backend, cache=embedding_cache)
+    )
+
+
+# messages are fetched, and their media downloaded, ahead of the message being processed
+scrape_pipeline = ScrapePipelineConfig(
+    read_ahead=int(os.getenv("READ_AHEAD", "16")),
+    augment_concurrency=int(os.getenv("AUGMENT_CONCURRENCY", "4")),
+    download_concurrency=int(os.getenv("DOWNLOAD_CONCURRENCY", "4")),
+    download_ahead=int(os.getenv("DOWNLOAD_AHEAD", "8")),
+    upload_concurrency=int(os.getenv("UPLOAD_CONCURRENCY", "2")),
+)
+
+# the augmented data is compressed with ARTIFACT_ENCODING, "gzip" or "zstd"
+artifact = ArtifactConfig(
+    encoding=os.getenv("ARTIFACT_ENCODING", "identity"),  # type: ignore
+    level=int(os.environ["ARTIFACT_LEVEL"]) if os.getenv("ARTIFACT_LEVEL") else None,
+)
+
+# streaming jobs run until stopped through `/job/{job_id}/stop`
+stream_stops: Dict[int, asyncio.Event] = {}
+
+
+async def run_scrape_job(
+    job: BaseJob,
+    kernel_planckster: KernelPlancksterGateway,
+    **kwargs: Any,
+) -> JobOutput | None:
+    """
+    Run a scrape job with a client leased from the session pool.
+
+    Job args: `channel_name` (required), `openai_api_key` (defaults to the OPENAI_API_KEY environment variable),
+    `resume` (continue a failed job with the same id and tracer id from its last checkpoint), `duplicate_photos` ("link"
+    or "skip", see PHOTO_INDEX_DIR), `llm_budget` (fields of `LLMBudget` overriding the server's budget for this job),
+    `defer_media` (only record the media, to be materialized later; defaults to the DEFER_MEDIA environment variable),
+    `stream` (true, or the fields of `StreamConfig`: process new messages as they are posted, until the job is stopped).
+
+    Jobs with `task` set to "materialize" materialize deferred media instead, see `run_materialize_job`.
+
+    The LLM usage and the deferred media of the job are kept in the job record. Files are uploaded with the
+    `minio_repository` of the router, if MinIO is configured, else through signed URLs.
+    """
+    job.state = BaseJobState.RUNNING
+    job.touch()
+
+    protocol = ProtocolEnum(os.getenv("STORAGE_PROTOCOL", ProtocolEnum.S3.value).lower())
+    scraped_data_repository = ScrapedDataRepository(
+        protocol=protocol,
+        kernel_planckster=kernel_planckster,
+        file_repository=FileRepository(protocol=protocol),
+        minio_repository=kwargs.get("minio_repository"),
+    )
+
+    if job.args.get("task") == "materialize":
+        job_output = await run_materialize_job(job, scraped_data_repository)
+        job.state = job_output.job_state
+        job.output_source_data_list = job_output.source_data_list or []
+        job.deferred_media = job_output.deferred_media or []
+        job.touch()
+        return job_output
+
+    stream = job.args.get("stream")
+    stream_config = None
+    if stream:
+        stream_config = StreamConfig.model_validate(stream if isinstance(stream, dict) else {})
+        stream_stops[job.id] = asyncio.Event()
+
+    try:
+        job_output = await scrape(
+            job_id=job.id,
+            channel_name=job.args["channel_name"],
+            tracer_id=job.tracer_id,
+            scraped_data_repository=scraped_data_repository,
+            telegram_client=telegram_session_pool.lease(job.id),  # type: ignore
+            openai_api_key=job.args.get("openai_api_key", os.getenv("OPENAI_API_KEY", "")),
+            log_level=logging.INFO,  # type: ignore
+            checkpoint_store=CheckpointStore(
+                directory=os.getenv("CHECKPOINT_DIR", "checkpoints")
+            ),
+            resume=bool(job.args.get("resume", False)),
+            photo_index=photo_index,
+            duplicate_photos=job.args.get("duplicate_photos", "link"),
+            image_transform=image_transform,
+            video_reduction=video_reduction,
+            prefilter=prefilter,
+            relevance_scorer=relevance_scorer,
+            text_index=text_index,
+            model_cascade=model_cascade,
+            rule_extractor=rule_extractor,
+            rate_limiter=rate_limiter,
+            defer_media=bool(job.args.get("defer_media", os.getenv("DEFER_MEDIA", "") == "1")),
+            llm_budget=llm_budget.model_copy(update=job.args["llm_budget"])
+            if job.args.get("llm_budget")
+            else llm_budget,
+            stream=stream_config,
+            stop=stream_stops.get(job.id),
+            pipeline=scrape_pipeline,
+            artifact=artifact,
+        )
+    finally:
+        # a job that failed or was cancelled cannot be stopped anymore
+        stream_stops.pop(job.id, None)
+
+    job.state = job_output.job_state if job_output else BaseJobState.FAILED
+    if job_output and job_output.source_data_list:
+        job.output_source_data_list = job_output.source_data_list
+    if job_output:
+        job.llm_usage = job_output.llm_usage
+        job.deferred_media = job_output.deferred_media or []
+    job.touch()
+
+    return job_output
+
+
+async def run_materialize_job(job: BaseJob, scraped_data_repository: ScrapedDataRepository) -> JobOutput:
+    """
+    Upload the deferred media of earlier scrape jobs.
+
+    Job args: `source_job_ids` (the scrape jobs of this server whose deferred media to materialize) or `deferred_media`
+    (a list of `DeferredMediaRecord`, e.g. from the manifest of a scrape job), and `media_filter` (the fields of
+    `MaterializeFilter`, e.g. `{"relevant_only": true}`).
+    """
+    deferred_media = [DeferredMediaRecord.model_validate(record) for record in job.args.get("deferred_media", [])]
+    source_jobs = [app.job_manager.get_job(int(source_job_id)) for source_job_id in job.args.get("source_job_ids", [])]  # type: ignore
+    for source_job in source_jobs:
+        deferred_media.extend(source_job.deferred_media)
+    # the records of the source jobs are marked as materialized in place: a rerun skips the media uploaded by this one
+    job_output = await materialize_media(
+        job_id=job.id,
+        tracer_id=job.tracer_id,
+        deferred_media=deferred_media,
+        telegram_client=telegram_session_pool.lease(job.id),  # type: ignore
+        scraped_data_repository=scraped_data_repository,
+        media_filter=MaterializeFilter.model_validate(job.args.get("media_filter", {})),
+    )
+    for source_job in source_jobs:
+        source_job.touch()
+    return job_output
+
+
+job_manager_router = JobManagerFastAPIRouter(app, run_scrape_job)
+
+
+@app.on_event("shutdown")
+async def close_telegram_session_pool() -> None:
+    await telegram_session_pool.close()
+
+
+@app.post("/job/{job_id}/stop")
+async def stop_stream(job_id: int) -> Dict[str, Any]:
+    """
+    Stop a streaming job: it registers its last micro-batch and finishes.
+
+    Async, so that it runs on the event loop of the job: `asyncio.Event` is not thread-safe.
+    """
+    stop = stream_stops.get(job_id)
+    if stop is None:
+        raise HTTPException(status_code=404, detail=f"No streaming job {job_id} is running")
+    stop.set()
+    return {"job_id": job_id, "stopping": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
 
 
 if __name__ == "__main__":
@@ -1,11 +1,28 @@
 import logging
-from app.scraper import scrape
-from app.sdk.models import KernelPlancksterSourceData, BaseJobState
+from app.checkpoint import CheckpointStore
+from app.prefilter import LexicalPrefilter
+from app.relevance import EmbeddingRelevanceScorer
+from app.rule_extraction import RuleBasedExtractor
+from app.channel_archive import ArchiveReplayClient, RecordingTelegramClient
+from app.scraper import ModelCascadeConfig, ScrapePipelineConfig, scrape
+from app.sdk.artifact_writer import ArtifactConfig
+from app.sdk.embeddings import EmbeddingCache, OpenAIEmbeddingBackend
+from app.sdk.event_log import configure_logging
+from app.sdk.image_transform import ImageTransformConfig
+from app.sdk.llm_ledger import LLMBudget
+from app.sdk.minhash import MinHashIndex
+from app.sdk.perceptual_hash import PerceptualHashIndex
+from app.sdk.rate_limiter import RateLimitConfig, RateLimiter
+from app.sdk.models import JobOutput, KernelPlancksterSourceData, BaseJobState
 from app.sdk.scraped_data_repository import ScrapedDataRepository
+from app.sdk.tracing import FileSpanExporter, Tracer
+from app.sdk.video_reduction import VideoReductionConfig
 from app.setup import setup
+from app.streaming import StreamConfig
 
 
 from app.setup_scraping_client import get_scraping_client
+from openai import OpenAI
 
 
 def main(
@@ -23,10 +40,58 @@ def main(
     telegram_password: str | None = None,
     telegram_bot_token: str | None = None,
     log_level: str = "WARNING",
-) -> None:
+    trace_file: str | None = None,
+    record_archive: str | None = None,
+    archive_media: bool = False,
+    replay_archive: str | None = None,
+    resume: bool = False,
+    checkpoint_dir: str = "checkpoints",
+    checkpoint_every: int = 50,
+    photo_index_dir: str | None = None,
+    photo_max_distance: int = 6,
+    duplicate_photos: str = "link",
+    max_image_dimension: int = 0,
+    image_format: str = "JPEG",
+    image_quality: int = 85,
+    video_mode: str = "",
+    video_keyframes: int = 5,
+    original_videos: str = "defer",
+    prefilter: bool = False,
+    prefilter_config: str | None = None,
+    relevance: str = "llm",
+    embedding_model: str = "text-embedding-3-small",
+    embedding_cache: str = "embeddings.sqlite",
+    relevance_config: str | None = None,
+    text_index_dir: str | None = None,
+    text_similarity: float = 0.6,
+    filter_models: str = "gpt-4o",
+    min_confidence: float = 0.8,
+    extraction_model: str = "gpt-4o",
+    rule_extraction: bool = False,
+    rule_extraction_config: str | None = None,
+    openai_rpm: float = 0,
+    openai_tpm: float = 0,
+    rate_limit_store: str | None = None,
+    max_llm_tokens: int | None = None,
+    max_llm_cost: float | None = None,
+    max_llm_requests: int | None = None,
+    degraded_mode: str = "skip_augmentation",
+    defer_media: bool = False,
+    stream: bool = False,
+    stream_batch_size: int = 20,
+    stream_batch_seconds: float = 10.0,
+    stream_max_seconds: float | None = None,
+    read_ahead: int = 16,
+    augment_concurrency: int = 4,
+    download_concurrency: int = 4,
+    download_ahead: int = 8,
+    upload_concurrency: int = 2,
+    artifact_encoding: str = "identity",
+    artifact_level: int | None = None,
+) -> JobOutput | None:
 
     logger = logging.getLogger(__name__)
-    logging.basicConfig(level=log_level)
+    configure_logging(log_level)
 
     if not all([job_id, channel_name, tracer_id]):
         logger.error(f"{job_id}: job_id, tracer_id, and channel_name must all be set.")
@@ -47,34 +112,179 @@ def main(
         file_repository=file_repository,
     )
 
-    telegram_client = get_scraping_client(
-        job_id=job_id,
-        logger=logger,
-        telegram_api_id=telegram_api_id,
-        telegram_api_hash=telegram_api_hash,
-        telegram_phone_number=telegram_phone_number,
-        telegram_password=telegram_password,
-        telegram_bot_token=telegram_bot_token,
-    )
+    if replay_archive:
+        logger.info(f"{job_id}: Replaying channel archive {replay_archive}")
+        telegram_client = ArchiveReplayClient(replay_archive)
+
+    else:
+        telegram_client = get_scraping_client(
+            job_id=job_id,
+            logger=logger,
+            telegram_api_id=telegram_api_id,
+            telegram_api_hash=telegram_api_hash,
+            telegram_phone_number=telegram_phone_number,
+            telegram_password=telegram_password,
+            telegram_bot_token=telegram_bot_token,
+        )
+
+        if record_archive:
+            telegram_client = RecordingTelegramClient(
+                telegram_client,
+                archive_path=record_archive,
+                channel_name=channel_name,
+                include_media=archive_media,
+            )
+
+    relevance_scorer = None
+    if relevance == "embedding":
+        backend = OpenAIEmbeddingBackend(OpenAI(api_key=openai_api_key), model=embedding_model)
+        cache = EmbeddingCache(embedding_cache)
+        relevance_scorer = (
+            EmbeddingRelevanceScorer.from_file(backend, relevance_config, cache)
+            if relevance_config
+            else EmbeddingRelevanceScorer(backend, cache=cache)
+        )
 
     import asyncio
 
     loop = asyncio.get_event_loop()
 
-    loop.run_until_complete(
+    stop = None
+    if stream:
+        import signal
+
+        # Ctrl-C registers the last micro-batch and finishes the job
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+
+    job_output = loop.run_until_complete(
         scrape(
             job_id=job_id,
             channel_name=channel_name,
             tracer_id=tracer_id,
             scraped_data_repository=scraped_data_repository,
-            telegram_client=telegram_client,
+            telegram_client=telegram_client,  # type: ignore
             log_level=log_level,
             openai_api_key=openai_api_key,
+            tracer=Tracer(FileSpanExporter(trace_file)) if trace_file else None,
+            checkpoint_store=CheckpointStore(
+                directory=checkpoint_dir, every=checkpoint_every
+            ),
+            resume=resume,
+            photo_index=PerceptualHashIndex(
+                directory=photo_index_dir, max_distance=photo_max_distance
+            )
+            if photo_index_dir
+            else None,
+            duplicate_photos=duplicate_photos,  # type: ignore
+            image_transform=ImageTransformConfig(
+                max_dimension=max_image_dimension,
+                format=image_format,  # type: ignore
+                quality=image_quality,
+            )
+            if max_image_dimension
+            else None,
+            video_reduction=VideoReductionConfig(
+                mode=video_mode,  # type: ignore
+                keyframes=video_keyframes,
+                original=original_videos,  # type: ignore
+            )
+            if video_mode
+            else None,
+            prefilter=(
+                LexicalPrefilter.from_file(prefilter_config)
+                if prefilter_config
+                else LexicalPrefilter()
+            )
+            if prefilter or prefilter_config
+            else None,
+            relevance_scorer=relevance_scorer,
+            text_index=MinHashIndex(directory=text_index_dir, threshold=text_similarity)
+            if text_index_dir
+            else None,
+            model_cascade=ModelCascadeConfig(
+                filter_models=[model.strip() for model in filter_models.split(",") if model.strip()],
+                min_confidence=min_confidence,
+                extraction_model=extraction_model,
+            ),
+            rule_extractor=(
+                RuleBasedExtractor.from_file(rule_extraction_config)
+                if rule_extraction_config
+                else RuleBasedExtractor()
+            )
+            if rule_extraction or rule_extraction_config
+            else None,
+            rate_limiter=RateLimiter(
+                RateLimitConfig(requests_per_minute=openai_rpm, tokens_per_minute=openai_tpm),
+                path=rate_limit_store or None,
+            )
+            if openai_rpm and openai_tpm
+            else None,
+            llm_budget=LLMBudget(
+                max_tokens=max_llm_tokens,
+                max_cost=max_llm_cost,
+                max_requests=max_llm_requests,
+                degraded_mode=degraded_mode,  # type: ignore
+            ),
+            defer_media=defer_media,
+            stream=StreamConfig(
+                batch_size=stream_batch_size,
+                batch_seconds=stream_batch_seconds,
+                max_seconds=stream_max_seconds,
+            )
+            if stream
+            else None,
+            stop=stop,
+            pipeline=ScrapePipelineConfig(
+                read_ahead=read_ahead,
+                augment_concurrency=augment_concurrency,
+                download_concurrency=download_concurrency,
+                download_ahead=download_ahead,
+                upload_concurrency=upload_concurrency,
+            ),
+            artifact=ArtifactConfig(encoding=artifact_encoding, level=artifact_level),  # type: ignore
         )
     )
 
     loop.close()
 
+    if job_output and job_output.image_transforms:
+        saved = sum(record.bytes_saved for record in job_output.image_transforms)
+        logger.info(f"{job_id}: Downscaled {len(job_output.image_transforms)} photos, saving {saved} bytes")
+
+    if job_output and job_output.duplicate_messages:
+        duplicates = sum(len(cluster.duplicates) for cluster in job_output.duplicate_messages)
+        logger.info(f"{job_id}: Reused the augmentation of {duplicates} near-duplicate messages")
+
+    if job_output and job_output.llm_usage:
+        usage = job_output.llm_usage
+        logger.info(
+            f"{job_id}: {usage.requests} LLM calls, {usage.total_tokens} tokens, {usage.cost:.4f} USD"
+        )
+        for model, model_usage in usage.models.items():
+            logger.info(f"{job_id}: {model}: {model_usage}")
+        if usage.budget_exceeded:
+            logger.warning(
+                f"{job_id}: LLM budget exceeded ({usage.budget_exceeded}), {len(usage.unaugmented_messages)} messages left unaugmented"
+            )
+
+    if job_output and job_output.deferred_media:
+        logger.info(f"{job_id}: Deferred {len(job_output.deferred_media)} media")
+
+    if job_output and job_output.message_latency:
+        logger.info(f"{job_id}: Streamed message latency: {job_output.message_latency}")
+
+    if job_output and job_output.pipeline:
+        for stage, stage_stats in job_output.pipeline.items():
+            logger.info(f"{job_id}: pipeline {stage}: {stage_stats}")
+
+    if job_output and job_output.metrics:
+        for stage, stage_metrics in job_output.metrics.items():
+            logger.info(f"{job_id}: {stage}: {stage_metrics}")
+
+    return job_output
+
 
 if __name__ == "__main__":
 
@@ -180,6 +390,343 @@ if __name__ == "__main__":
         help="The OpenAI API Key",
     )
 
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        default="",
+        help="If set, export trace spans (OTLP/JSON lines) to this file. Defaults to the TRACE_EXPORT_PATH environment variable, if set.",
+    )
+
+    parser.add_argument(
+        "--record-archive",
+        type=str,
+        default="",
+        help="If set, record the fetched messages to a channel archive in this directory, for offline reprocessing with --replay-archive.",
+    )
+
+    parser.add_argument(
+        "--archive-media",
+        action="store_true",
+        help="When recording a channel archive, also store the downloaded media bytes.",
+    )
+
+    parser.add_argument(
+        "--replay-archive",
+        type=str,
+        default="",
+        help="If set, replay the messages of this channel archive instead of connecting to Telegram. The Telegram credentials are not needed.",
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume a failed job from its last checkpoint. The job id, tracer id and channel name must match the failed run.",
+    )
+
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default="checkpoints",
+        help="The directory where job checkpoints are saved. Set to 'checkpoints' by default.",
+    )
+
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=50,
+        help="Save a checkpoint every this many processed messages. Set to 50 by default.",
+    )
+
+    parser.add_argument(
+        "--photo-index-dir",
+        type=str,
+        default="",
+        help="If set, skip uploading photos that are near-duplicates of photos already stored, using the perceptual hash index persisted in this directory.",
+    )
+
+    parser.add_argument(
+        "--photo-max-distance",
+        type=int,
+        default=6,
+        help="The maximum Hamming distance (out of 64 bits) between the perceptual hashes of two photos considered duplicates. Set to 6 by default.",
+    )
+
+    parser.add_argument(
+        "--duplicate-photos",
+        type=str,
+        choices=["skip", "link"],
+        default="link",
+        help="What to do with near-duplicate photos: 'link' adds the already stored photo to the job output, 'skip' leaves it out. Set to 'link' by default.",
+    )
+
+    parser.add_argument(
+        "--max-image-dimension",
+        type=int,
+        default=0,
+        help="If set, downscale photos larger than this many pixels (width or height) and re-encode them before upload. Disabled by default.",
+    )
+
+    parser.add_argument(
+        "--image-format",
+        type=str,
+        choices=["JPEG", "WEBP", "PNG"],
+        default="JPEG",
+        help="The format photos are re-encoded to when --max-image-dimension is set. Set to JPEG by default.",
+    )
+
+    parser.add_argument(
+        "--image-quality",
+        type=int,
+        default=85,
+        help="The encoder quality (1-100) used when re-encoding photos. Set to 85 by default.",
+    )
+
+    parser.add_argument(
+        "--video-mode",
+        type=str,
+        choices=["keyframes", "proxy"],
+        default="",
+        help="If set, upload keyframes ('keyframes') or a low-bitrate copy ('proxy') of each video, extracted locally with ffmpeg. Disabled by default.",
+    )
+
+    parser.add_argument(
+        "--video-keyframes",
+        type=int,
+        default=5,
+        help="The number of keyframes extracted per video with --video-mode keyframes. Set to 5 by default.",
+    )
+
+    parser.add_argument(
+        "--original-videos",
+        type=str,
+        choices=["upload", "defer", "drop"],
+        default="defer",
+        help="With --video-mode, what to do with the full videos: 'upload' them after the reduced version, 'defer' them (listed in the job output, to be uploaded later), or 'drop' them. Set to 'defer' by default.",
+    )
+
+    parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="Only send messages that contain wildfire keywords, in any of the supported languages, to the LLM relevance check.",
+    )
+
+    parser.add_argument(
+        "--prefilter-config",
+        type=str,
+        default="",
+        help="A JSON file with the keywords, negative keywords and minimum length of the pre-filter. Implies --prefilter.",
+    )
+
+    parser.add_argument(
+        "--relevance",
+        type=str,
+        choices=["llm", "embedding"],
+        default="llm",
+        help="How messages are checked for relevance: by the LLM ('llm'), or by their embedding similarity to wildfire descriptions, asking the LLM only for borderline messages ('embedding'). Set to 'llm' by default.",
+    )
+
+    parser.add_argument(
+        "--embedding-model",
+        type=str,
+        default="text-embedding-3-small",
+        help="The OpenAI embedding model used with --relevance embedding. Set to 'text-embedding-3-small' by default.",
+    )
+
+    parser.add_argument(
+        "--embedding-cache",
+        type=str,
+        default="embeddings.sqlite",
+        help="The SQLite file where embeddings are cached across runs. Set to 'embeddings.sqlite' by default.",
+    )
+
+    parser.add_argument(
+        "--relevance-config",
+        type=str,
+        default="",
+        help="A JSON file with the prototypes, thresholds and batch size of --relevance embedding.",
+    )
+
+    parser.add_argument(
+        "--text-index-dir",
+        type=str,
+        default="",
+        help="A directory where the MinHash signatures of augmented messages are kept across runs. If set, near-duplicate messages reuse the relevance and augmentation of the first one instead of calling the LLM.",
+    )
+
+    parser.add_argument(
+        "--text-similarity",
+        type=float,
+        default=0.6,
+        help="The minimum estimated Jaccard similarity, between 0 and 1, of two messages considered near-duplicates. Set to 0.6 by default.",
+    )
+
+    parser.add_argument(
+        "--filter-models",
+        type=str,
+        default="gpt-4o",
+        help="Comma-separated models asked whether a message is relevant, cheapest first, e.g. 'gpt-4o-mini,gpt-4o'. The next model is only asked when the previous one is not confident enough. Set to 'gpt-4o' by default.",
+    )
+
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=0.8,
+        help="The confidence, between 0 and 1, from which the relevance answer of a model of --filter-models is kept. Set to 0.8 by default.",
+    )
+
+    parser.add_argument(
+        "--extraction-model",
+        type=str,
+        default="gpt-4o",
+        help="The model extracting the location and date of relevant messages. Set to 'gpt-4o' by default.",
+    )
+
+    parser.add_argument(
+        "--rule-extraction",
+        action="store_true",
+        help="Extract the dates and known places stated in relevant messages locally, and only ask the LLM for the fields left.",
+    )
+
+    parser.add_argument(
+        "--rule-extraction-config",
+        type=str,
+        default="",
+        help="A JSON file with the known places, country names and wildfire keywords of the rule-based extraction. Implies --rule-extraction.",
+    )
+
+    parser.add_argument(
+        "--openai-rpm",
+        type=float,
+        default=0,
+        help="The OpenAI requests-per-minute budget. With --openai-tpm, LLM calls are queued until both budgets allow them. Not limited by default.",
+    )
+
+    parser.add_argument(
+        "--openai-tpm",
+        type=float,
+        default=0,
+        help="The OpenAI tokens-per-minute budget, see --openai-rpm. Not limited by default.",
+    )
+
+    parser.add_argument(
+        "--rate-limit-store",
+        type=str,
+        default="",
+        help="A file holding the state of the OpenAI rate limiter, to share the budgets with other scrapers using the same file.",
+    )
+
+    parser.add_argument(
+        "--max-llm-tokens",
+        type=int,
+        default=None,
+        help="The LLM tokens budget of the job. Once used, later messages are not augmented, see --degraded-mode. Not limited by default.",
+    )
+
+    parser.add_argument(
+        "--max-llm-cost",
+        type=float,
+        default=None,
+        help="The LLM cost budget of the job, in USD. Not limited by default.",
+    )
+
+    parser.add_argument(
+        "--max-llm-requests",
+        type=int,
+        default=None,
+        help="The LLM calls budget of the job. Not limited by default.",
+    )
+
+    parser.add_argument(
+        "--degraded-mode",
+        type=str,
+        default="skip_augmentation",
+        choices=["skip_augmentation", "prefilter_only"],
+        help="What to do with the messages once an LLM budget is exceeded: list them all as unaugmented ('skip_augmentation', the default), or only the pre-filter candidates ('prefilter_only').",
+    )
+
+    parser.add_argument(
+        "--defer-media",
+        action="store_true",
+        help="Do not download media: list them, with the references to fetch them later, in the job output and a registered manifest.",
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Do not crawl the channel: process its new messages as they are posted, until interrupted.",
+    )
+
+    parser.add_argument(
+        "--stream-batch-size",
+        type=int,
+        default=20,
+        help="With --stream, register the augmented data every this many messages. Defaults to 20.",
+    )
+
+    parser.add_argument(
+        "--stream-batch-seconds",
+        type=float,
+        default=10.0,
+        help="With --stream, register the augmented data at least this often, in seconds. Defaults to 10.",
+    )
+
+    parser.add_argument(
+        "--stream-max-seconds",
+        type=float,
+        default=None,
+        help="With --stream, stop after this many seconds. Runs until interrupted by default.",
+    )
+
+    parser.add_argument(
+        "--read-ahead",
+        type=int,
+        default=16,
+        help="The number of messages fetched ahead of their augmentation, augmented ahead of the media downloads, and uploaded ahead of the message being processed. Defaults to 16.",
+    )
+
+    parser.add_argument(
+        "--augment-concurrency",
+        type=int,
+        default=4,
+        help="The number of messages augmented at the same time. With an LLM budget, the LLM is called for one message at a time. Defaults to 4.",
+    )
+
+    parser.add_argument(
+        "--download-concurrency",
+        type=int,
+        default=4,
+        help="The number of messages whose media are downloaded at the same time. Defaults to 4.",
+    )
+
+    parser.add_argument(
+        "--download-ahead",
+        type=int,
+        default=8,
+        help="The number of messages whose media are downloaded ahead of their upload. Defaults to 8.",
+    )
+
+    parser.add_argument(
+        "--upload-concurrency",
+        type=int,
+        default=2,
+        help="The number of messages whose media are uploaded and registered at the same time. Defaults to 2.",
+    )
+
+    parser.add_argument(
+        "--artifact-encoding",
+        type=str,
+        default="identity",
+        choices=["identity", "gzip", "zstd"],
+        help="Compress the augmented data with gzip or zstd (needs the zstandard package); its registered name and path end with the encoding. Not compressed by default.",
+    )
+
+    parser.add_argument(
+        "--artifact-level",
+        type=int,
+        default=None,
+        help="The compression level of the augmented data. Defaults to 3.",
+    )
+
     args = parser.parse_args()
 
     main(
@@ -197,4 +744,52 @@ if __name__ == "__main__":
         telegram_password=args.telegram_password,
         telegram_bot_token=args.telegram_bot_token,
         openai_api_key=args.openai_api_key,
+        trace_file=args.trace_file,
+        record_archive=args.record_archive,
+        archive_media=args.archive_media,
+        replay_archive=args.replay_archive,
+        resume=args.resume,
+        checkpoint_dir=args.checkpoint_dir,
+        checkpoint_every=args.checkpoint_every,
+        photo_index_dir=args.photo_index_dir,
+        photo_max_distance=args.photo_max_distance,
+        duplicate_photos=args.duplicate_photos,
+        max_image_dimension=args.max_image_dimension,
+        image_format=args.image_format,
+        image_quality=args.image_quality,
+        video_mode=args.video_mode,
+        video_keyframes=args.video_keyframes,
+        original_videos=args.original_videos,
+        prefilter=args.prefilter,
+        prefilter_config=args.prefilter_config,
+        relevance=args.relevance,
+        embedding_model=args.embedding_model,
+        embedding_cache=args.embedding_cache,
+        relevance_config=args.relevance_config,
+        text_index_dir=args.text_index_dir,
+        text_similarity=args.text_similarity,
+        filter_models=args.filter_models,
+        min_confidence=args.min_confidence,
+        extraction_model=args.extraction_model,
+        rule_extraction=args.rule_extraction,
+        rule_extraction_config=args.rule_extraction_config,
+        openai_rpm=args.openai_rpm,
+        openai_tpm=args.openai_tpm,
+        rate_limit_store=args.rate_limit_store,
+        max_llm_tokens=args.max_llm_tokens,
+        max_llm_cost=args.max_llm_cost,
+        max_llm_requests=args.max_llm_requests,
+        degraded_mode=args.degraded_mode,
+        defer_media=args.defer_media,
+        stream=args.stream,
+        stream_batch_size=args.stream_batch_size,
+        stream_batch_seconds=args.stream_batch_seconds,
+        stream_max_seconds=args.stream_max_seconds,
+        read_ahead=args.read_ahead,
+        augment_concurrency=args.augment_concurrency,
+        download_concurrency=args.download_concurrency,
+        download_ahead=args.download_ahead,
+        upload_concurrency=args.upload_concurrency,
+        artifact_encoding=args.artifact_encoding,
+        artifact_level=args.artifact_level,
     )
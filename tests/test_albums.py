@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Any
+
+import pytest
+
+from app.scraper import _download_album
+from app.sdk.tracing import Tracer
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient
+
+
+def test_albums_are_augmented_once_and_downloaded_together() -> None:
+    mix = MessageMix(
+        num_messages=48, photo_ratio=0.0, video_ratio=0.0, album_ratio=0.5, album_size=4, photo_bytes=64 * 1024
+    )
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    groups = {message.grouped_id for message in messages if message.grouped_id}
+    album_messages = [message for message in messages if message.grouped_id]
+    assert 3 <= len(groups) <= 10
+
+    # albums are downloaded concurrently: the same time as a single photo
+    report = run_benchmark(mix, download_bytes_per_second=64 * 1024 * 20)
+
+    texts = [message.text for message in messages if message.text]
+    assert report["llm_calls"]["filterData"] == len(texts)
+    # only the first message of an album has a caption
+    assert sum(1 for message in album_messages if message.text) <= len(groups)
+
+    albums = {album.grouped_id: album for album in report["job_output"].albums}
+    assert set(albums) == groups
+    for grouped_id, album in albums.items():
+        assert sorted(album.message_ids) == sorted(m.id for m in album_messages if m.grouped_id == grouped_id)
+        assert len(album.source_data_list) == mix.album_size
+        assert all(f"benchmark-album-{grouped_id}-" in data.relative_path for data in album.source_data_list)
+        caption = [m.id for m in album_messages if m.grouped_id == grouped_id and m.text]
+        assert album.caption_message_id == (caption[0] if caption else None)
+
+    stages = report["stages"]
+    assert stages["telegram_download_album"]["count"] == len(groups)
+    assert stages["telegram_download_media"]["count"] == len(album_messages)
+    # each album took about as long as one download, not four
+    assert stages["telegram_download_album"]["total_seconds"] < 0.6 * stages["telegram_download_media"]["total_seconds"]
+    assert len(report["registered_paths"]) == len(album_messages) + 1
+
+
+def test_album_captions_repeated_on_every_message_are_augmented_once() -> None:
+    mix = MessageMix(num_messages=8, text_ratio=1.0, photo_ratio=0.0, video_ratio=0.0, album_ratio=1.0, album_size=4)
+
+    class CaptionedAlbums(SyntheticTelegramClient):
+        def build_message(self, message_id: int):  # type: ignore
+            message = super().build_message(message_id)
+            first = super().build_message((message_id - 1) // 4 * 4 + 1)
+            message.text = message.message = first.text
+            return message
+
+    report = run_benchmark(mix, telegram_client=CaptionedAlbums(mix))
+
+    assert report["llm_calls"]["filterData"] == 2
+    assert all(album.caption_message_id for album in report["job_output"].albums)
+
+
+def test_failed_album_downloads_cancel_the_others_before_closing_their_files() -> None:
+    mix = MessageMix(num_messages=48, photo_ratio=0.0, video_ratio=0.0, album_ratio=1.0, album_size=4)
+    events = []
+
+    class FailingTelegramClient(SyntheticTelegramClient):
+        async def download_media(self, media: Any, file: str, **kwargs: Any) -> str:
+            if not events:
+                events.append("failed")
+                raise ConnectionError("network blip")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                events.append(("cancelled", os.path.exists(file)))
+                raise
+            return file
+
+    client = FailingTelegramClient(mix)
+    album = [client.build_message(message_id) for message_id in range(1, mix.album_size + 1)]
+    assert all(message.media is not None for message in album)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(asyncio.wait_for(_download_album(1, client, album, Tracer()), 5))  # type: ignore
+
+    # the other downloads were cancelled while their files were still open
+    assert events == ["failed"] + [("cancelled", True)] * (mix.album_size - 1)
@@ -0,0 +1,74 @@
+import json
+import math
+
+import pandas as pd
+import pytest
+
+from app.scraper import AUGMENTED_COLUMNS
+from app.sdk.artifact_writer import ArtifactConfig, artifact_source_data, decompress, write_rows
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from benchmarks.artifact_writer import synthetic_rows
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix
+
+
+def _rounded(data: dict) -> dict:
+    # pandas writes 10 significant digits
+    return {
+        key: {column: round(value, 6) if isinstance(value, float) else value for column, value in row.items()}
+        for key, row in data.items()
+    }
+
+
+def test_rows_have_the_layout_of_df_to_json(tmp_path) -> None:
+    rows = synthetic_rows(50)
+    rows[0][3] = math.nan
+    rows[1][2] = None
+    expected = tmp_path / "expected.json"
+    pd.DataFrame(rows, columns=AUGMENTED_COLUMNS).to_json(expected, orient="index", indent=4)
+
+    for encoding in ("identity", "gzip", "zstd"):
+        written = tmp_path / f"data.{encoding}"
+        size = write_rows(rows, AUGMENTED_COLUMNS, str(written), ArtifactConfig(encoding=encoding))  # type: ignore
+        assert size == written.stat().st_size
+        assert _rounded(json.loads(decompress(written.read_bytes(), encoding))) == _rounded(json.loads(expected.read_text()))
+
+    # compressed output is deterministic
+    again = tmp_path / "again.gzip"
+    write_rows(rows, AUGMENTED_COLUMNS, str(again), ArtifactConfig(encoding="gzip"))
+    assert again.read_bytes() == (tmp_path / "data.gzip").read_bytes()
+
+
+def test_zstd_round_trip(tmp_path) -> None:
+    rows = synthetic_rows(200)
+    file = tmp_path / "data.zst"
+
+    size = write_rows(rows, AUGMENTED_COLUMNS, str(file), ArtifactConfig(encoding="zstd"))
+
+    assert size == file.stat().st_size
+    assert decompress(file.read_bytes(), "identity")[:4] == b"\x28\xb5\x2f\xfd"  # zstd frame magic number
+    data = json.loads(decompress(file.read_bytes(), "zstd"))
+    assert len(data) == 200 and data["7"]["Telegram"] == rows[7][1]
+    plain = write_rows(rows, AUGMENTED_COLUMNS, str(tmp_path / "data.json"), ArtifactConfig())
+    assert size * 4 < plain
+
+
+def test_the_encoding_is_recorded_in_the_source_data() -> None:
+    source_data = KernelPlancksterSourceData(
+        name="telegram_all_augmented", protocol=ProtocolEnum.S3, relative_path="telegram/t/1/augmented/data.json"
+    )
+    assert artifact_source_data(source_data, ArtifactConfig()) == source_data
+    zstd = artifact_source_data(source_data, ArtifactConfig(encoding="zstd"))
+    assert (zstd.name, zstd.relative_path) == ("telegram_all_augmented_zstd", "telegram/t/1/augmented/data.json.zst")
+
+
+def test_scrape_uploads_compressed_augmented_data() -> None:
+    mix = MessageMix(num_messages=200, photo_ratio=0.0, video_ratio=0.0)
+
+    plain = run_benchmark(mix)
+    compressed = run_benchmark(mix, artifact=ArtifactConfig(encoding="gzip"))
+
+    [plain_path] = plain["registered_paths"]
+    [compressed_path] = compressed["registered_paths"]
+    assert plain_path.endswith("/augmented/data.json") and compressed_path.endswith("/augmented/data.json.gz")
+    assert compressed["uploaded_sizes"][compressed_path] * 4 < plain["uploaded_sizes"][plain_path]
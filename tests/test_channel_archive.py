@@ -0,0 +1,74 @@
+import asyncio
+import os
+import tempfile
+
+from app.channel_archive import ArchiveReplayClient, RecordingTelegramClient
+from app.sdk.models import BaseJobState
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient
+
+
+MIX = MessageMix(num_messages=30, photo_ratio=0.2, video_ratio=0.1, photo_bytes=512, video_bytes=2048)
+
+
+def _record(archive_path: str, include_media: bool) -> dict:
+    recording_client = RecordingTelegramClient(
+        SyntheticTelegramClient(MIX),
+        archive_path=archive_path,
+        channel_name="benchmark",
+        include_media=include_media,
+    )
+    return run_benchmark(MIX, telegram_client=recording_client)
+
+
+def test_replay_reproduces_recorded_messages() -> None:
+
+    async def read_all(client) -> list:
+        async with client:
+            return [message async for message in client.iter_messages("benchmark")]
+
+    with tempfile.TemporaryDirectory() as archive_path:
+        _record(archive_path, include_media=False)
+
+        original = asyncio.run(read_all(SyntheticTelegramClient(MIX)))
+        replayed = asyncio.run(read_all(ArchiveReplayClient(archive_path)))
+
+        assert ArchiveReplayClient(archive_path).manifest["messages"] == MIX.num_messages
+
+    assert [message.id for message in replayed] == [message.id for message in original]
+    for before, after in zip(original, replayed):
+        assert after.text == before.text
+        assert after.date == before.date
+        assert after.views == before.views
+        assert after.peer_id.channel_id == before.peer_id.channel_id
+        # without archived bytes, media are replayed as references only
+        assert after.media is None
+        assert (after.archived_media is None) == (before.media is None)
+
+
+def test_replay_with_media_runs_the_same_pipeline() -> None:
+
+    with tempfile.TemporaryDirectory() as archive_path:
+        recorded = _record(archive_path, include_media=True)
+        media_files = os.listdir(os.path.join(archive_path, "media"))
+
+        replayed = run_benchmark(MIX, telegram_client=ArchiveReplayClient(archive_path))
+
+    assert recorded["job_state"] == replayed["job_state"] == BaseJobState.FINISHED.value
+    assert len(media_files) == len(recorded["job_output"].source_data_list)
+    assert replayed["registered_source_data"] == recorded["registered_source_data"]
+    assert replayed["uploaded_bytes"] == recorded["uploaded_bytes"]
+    assert replayed["llm_calls"] == recorded["llm_calls"]
+
+
+def test_replay_honours_offset_id_and_limit() -> None:
+
+    async def read(client, **kwargs) -> list:
+        async with client:
+            return [message.id async for message in client.iter_messages("benchmark", **kwargs)]
+
+    with tempfile.TemporaryDirectory() as archive_path:
+        _record(archive_path, include_media=False)
+        ids = asyncio.run(read(ArchiveReplayClient(archive_path), offset_id=10, limit=3))
+
+    assert ids == [9, 8, 7]
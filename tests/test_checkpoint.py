@@ -0,0 +1,154 @@
+import os
+import tempfile
+from typing import Any
+
+from app.checkpoint import CheckpointStore, ScrapeCheckpoint
+from app.sdk.models import BaseJobState, KernelPlancksterSourceData, ProtocolEnum
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient
+
+
+MIX = MessageMix(num_messages=40, photo_ratio=0.3, video_ratio=0.1, photo_bytes=256, video_bytes=512)
+
+
+class FlakyTelegramClient(SyntheticTelegramClient):
+    """
+    Fails the download of one media item, once.
+    """
+
+    def __init__(self, mix: MessageMix, fail_on_media_id: int) -> None:
+        super().__init__(mix)
+        self._fail_on_media_id = fail_on_media_id
+
+    async def download_media(self, media: Any, file: str, **kwargs: Any) -> str:
+        if media.id == self._fail_on_media_id:
+            raise ConnectionError("network blip")
+        return await super().download_media(media, file, **kwargs)
+
+
+def _media_message_ids(mix: MessageMix) -> list[int]:
+    client = SyntheticTelegramClient(mix)
+    return [
+        message_id
+        for message_id in range(mix.num_messages, 0, -1)
+        if client.build_message(message_id).media is not None
+    ]
+
+
+def test_checkpoint_store_roundtrip() -> None:
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = CheckpointStore(directory=tmp_dir)
+        checkpoint = ScrapeCheckpoint(
+            job_id=1,
+            tracer_id="tracer/with/slashes",
+            channel_name="channel",
+            last_message_id=10,
+            registered_media=[12, 11],
+            augmented_rows={11: ["title", "content"]},
+            source_data_list=[
+                KernelPlancksterSourceData(name="a", protocol=ProtocolEnum.S3, relative_path="a/b")
+            ],
+        )
+        store.save(checkpoint)
+
+        loaded = store.load("tracer/with/slashes", 1, "channel")
+        assert loaded is not None
+        assert loaded.last_message_id == 10
+        assert loaded.augmented_rows == {11: ["title", "content"]}
+        assert loaded.source_data_list == checkpoint.source_data_list
+
+        store.delete("tracer/with/slashes", 1, "channel")
+        assert store.load("tracer/with/slashes", 1, "channel") is None
+
+
+def test_checkpoints_are_saved_as_a_journal_of_changes() -> None:
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = CheckpointStore(directory=tmp_dir)
+        checkpoint = ScrapeCheckpoint(job_id=1, tracer_id="tracer", channel_name="channel")
+        path = store.path("tracer", 1, "channel")
+        written = rewritten = 0
+        for message_id in range(1, 401):
+            checkpoint.last_message_id = message_id
+            checkpoint.processed_messages += 1
+            checkpoint.registered_media.append(message_id)
+            checkpoint.augmented_rows[message_id] = ["title", f"message {message_id}"]
+            checkpoint.source_data_list.append(
+                KernelPlancksterSourceData(name=f"{message_id}", protocol=ProtocolEnum.S3, relative_path=f"a/{message_id}")
+            )
+            checkpoint.duplicate_messages.setdefault("channel/1", []).append(f"other/{message_id}")
+            pending = store.prepare(checkpoint)
+            written += len(pending.data)
+            rewritten += len(checkpoint.model_dump_json())
+            store.write(pending)
+
+            loaded = store.load("tracer", 1, "channel")
+            assert loaded is not None
+            assert loaded.model_dump(exclude={"updated_at"}) == checkpoint.model_dump(exclude={"updated_at"})
+
+        # each save appends its changes, and the checkpoint is rewritten once its journal is larger than it
+        assert os.path.exists(f"{path}.journal")
+        print(f"{written} bytes written, {rewritten} if rewritten at each save")
+        assert written < 8 * len(checkpoint.model_dump_json())
+        assert written * 20 < rewritten
+
+        # a line cut short by a crash while appending is ignored
+        with open(f"{path}.journal", "a") as f:
+            f.write('{"saves": 1000, "last_mess')
+        assert store.load("tracer", 1, "channel").last_message_id == 400  # type: ignore
+
+        # after a crash between rewriting the checkpoint and removing its journal, the journal is already in it
+        with open(f"{path}.journal") as f:
+            journal = f.read()
+        store.save(ScrapeCheckpoint.model_validate_json(open(path).read()).model_copy(update={"saves": 10_000}))
+        with open(f"{path}.journal", "w") as f:
+            f.write(journal)
+        assert store.load("tracer", 1, "channel").registered_media == list(range(1, 401))  # type: ignore
+
+        store.delete("tracer", 1, "channel")
+        assert os.listdir(tmp_dir) == []
+
+
+def test_resume_continues_from_the_checkpoint() -> None:
+
+    media_ids = _media_message_ids(MIX)
+    # fail somewhere in the middle of the channel
+    failing_id = media_ids[len(media_ids) // 2]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = CheckpointStore(directory=tmp_dir, every=5)
+
+        failed = run_benchmark(
+            MIX,
+            telegram_client=FlakyTelegramClient(MIX, fail_on_media_id=failing_id),
+            checkpoint_store=store,
+        )
+        assert failed["job_state"] == BaseJobState.FAILED.value
+        checkpoint = store.load(failed["job_output"].tracer_id, 1, "benchmark")
+        assert checkpoint is not None
+        # the failing message was not fully processed
+        assert checkpoint.last_message_id == failing_id + 1
+
+        resumed = run_benchmark(
+            MIX,
+            checkpoint_store=store,
+            resume=True,
+            tracer_id=failed["job_output"].tracer_id,
+        )
+        assert resumed["job_state"] == BaseJobState.FINISHED.value
+        # a finished job does not leave its checkpoint behind
+        assert os.listdir(tmp_dir) == []
+
+    full = run_benchmark(MIX)
+
+    # every media item is registered exactly once across both runs, plus the augmented json
+    assert failed["registered_source_data"] + resumed["registered_source_data"] == len(media_ids) + 1
+    assert len(resumed["job_output"].source_data_list) == len(media_ids)
+    # no message is augmented twice
+    total_extractions = failed["llm_calls"].get("messageData", 0) + resumed["llm_calls"].get("messageData", 0)
+    assert total_extractions == full["llm_calls"]["messageData"]
+    # the output json of the resumed run holds the rows of both runs
+    [resumed_json] = [size for path, size in resumed["uploaded_sizes"].items() if path.endswith("data.json")]
+    [full_json] = [size for path, size in full["uploaded_sizes"].items() if path.endswith("data.json")]
+    assert resumed_json == full_json
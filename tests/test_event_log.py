@@ -0,0 +1,88 @@
+import logging
+
+import pytest
+
+from app.sdk import event_log
+from app.sdk.event_log import EventLogger, configure_logging, parse_sample_rates, shutdown_logging
+
+
+class CountingRepr:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __repr__(self) -> str:
+        self.calls += 1
+        return "expensive"
+
+
+def test_disabled_events_are_not_formatted(caplog: pytest.LogCaptureFixture) -> None:
+
+    logger = logging.getLogger("test_event_log.disabled")
+    events = EventLogger(logger, sample_rates={})
+    expensive = CountingRepr()
+
+    with caplog.at_level(logging.WARNING, logger=logger.name):
+        events.info("message", value=expensive)
+
+    assert caplog.records == []
+    assert expensive.calls == 0
+
+
+def test_events_are_rendered_as_key_values(caplog: pytest.LogCaptureFixture) -> None:
+
+    logger = logging.getLogger("test_event_log.enabled")
+    events = EventLogger(logger, sample_rates={})
+
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        events.info("message", job_id=1, message_id=42)
+
+    assert caplog.messages == ["message job_id=1 message_id=42"]
+
+
+def test_sampling_per_event_type(caplog: pytest.LogCaptureFixture) -> None:
+
+    logger = logging.getLogger("test_event_log.sampled")
+    events = EventLogger(logger, sample_rates={"message": 0.25, "noise": 0})
+
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        for i in range(8):
+            events.info("message", i=i)
+            events.info("noise", i=i)
+            events.info("download", i=i)
+
+    messages = [m for m in caplog.messages if m.startswith("message")]
+    assert messages == ["message i=0", "message i=4 sampled_out=3"]
+    assert not [m for m in caplog.messages if m.startswith("noise")]
+    assert len([m for m in caplog.messages if m.startswith("download")]) == 8
+
+
+def test_parse_sample_rates() -> None:
+
+    assert parse_sample_rates("message=0.01, download=0.5") == {"message": 0.01, "download": 0.5}
+    assert parse_sample_rates("") == {}
+
+
+def test_configure_logging_is_idempotent_and_queue_backed(capfd: pytest.CaptureFixture) -> None:
+
+    root = logging.getLogger()
+    previous_handlers, previous_level = list(root.handlers), root.level
+
+    try:
+        # start from a clean state, in case a previous test already configured logging
+        shutdown_logging()
+        configure_logging(logging.INFO)
+        configure_logging(logging.DEBUG)
+
+        queue_handlers = [h for h in root.handlers if isinstance(h, event_log._DeferredQueueHandler)]
+        assert len(queue_handlers) == 1
+        assert root.level == logging.DEBUG
+
+        logging.getLogger("test_event_log.queue").info("through the queue %s", 42)
+        shutdown_logging()
+
+        assert "through the queue 42" in capfd.readouterr().err
+
+    finally:
+        shutdown_logging()
+        root.handlers[:] = previous_handlers
+        root.setLevel(previous_level)
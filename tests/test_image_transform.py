@@ -0,0 +1,85 @@
+import numpy as np
+from PIL import Image
+
+from app.sdk.file_repository import MinIORepository
+from app.sdk.image_transform import ImageTransformConfig, transform_image
+from app.sdk.models import BaseJobState
+from app.sdk.process_pool import shutdown_process_pool
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import LocalS3Server, MessageMix, SyntheticTelegramClient, synthetic_jpeg
+
+
+def _noise_image(path, size: tuple[int, int], mode: str = "RGB") -> str:
+    pixels = np.random.default_rng(0).integers(0, 256, size=(size[1], size[0], len(mode)), dtype=np.uint8)
+    Image.fromarray(pixels, mode=mode).save(path)
+    return str(path)
+
+
+def test_transform_downscales_keeping_the_aspect_ratio(tmp_path) -> None:
+    source = _noise_image(tmp_path / "large.png", (2000, 1000), mode="RGBA")
+    destination = str(tmp_path / "large.jpeg")
+
+    result = transform_image(source, destination, ImageTransformConfig(max_dimension=500, format="JPEG", quality=80))
+
+    assert result.transformed
+    assert (result.original_width, result.original_height) == (2000, 1000)
+    assert (result.width, result.height) == (500, 250)
+    with Image.open(destination) as image:
+        assert image.format == "JPEG"
+        assert image.size == (500, 250)
+
+
+def test_transform_keeps_small_photos_that_would_not_shrink(tmp_path) -> None:
+    source = tmp_path / "small.jpg"
+    source.write_bytes(synthetic_jpeg(0, variant=1))
+    destination = tmp_path / "small.jpeg"
+
+    result = transform_image(str(source), str(destination), ImageTransformConfig(max_dimension=1600, quality=100))
+
+    assert not result.transformed
+    assert (result.width, result.height) == (result.original_width, result.original_height)
+    assert not destination.exists()
+
+
+def test_scrape_uploads_downscaled_photos() -> None:
+    mix = MessageMix(num_messages=20, photo_ratio=0.5, video_ratio=0.0, photo_images=4)
+    client = SyntheticTelegramClient(mix)
+    photo_count = sum(1 for i in range(1, mix.num_messages + 1) if client.build_message(i).media is not None)
+
+    try:
+        report = run_benchmark(mix, image_transform=ImageTransformConfig(max_dimension=64, format="WEBP", quality=60))
+    finally:
+        shutdown_process_pool()
+
+    assert report["job_state"] == BaseJobState.FINISHED.value
+    transforms = report["job_output"].image_transforms
+    assert len(transforms) == photo_count
+    for record in transforms:
+        assert max(record.width, record.height) <= 64
+        assert max(record.original_width, record.original_height) > 64
+        assert record.format == "WEBP"
+        assert record.bytes_saved > 0
+        assert report["uploaded_sizes"][record.relative_path] == record.bytes
+    assert report["stages"]["image_transform"]["count"] == photo_count
+
+
+def test_transformed_photos_are_uploaded_with_their_content_type() -> None:
+    mix = MessageMix(num_messages=10, photo_ratio=0.5, video_ratio=0.0, photo_images=4)
+    with LocalS3Server() as server:
+        repository = MinIORepository(
+            host=server.host, port=server.port, access_key="test", secret_key="test", bucket="media"
+        )
+        try:
+            report = run_benchmark(
+                mix,
+                minio_repository=repository,
+                image_transform=ImageTransformConfig(max_dimension=64, format="WEBP", quality=60),
+            )
+        finally:
+            repository.close()
+            shutdown_process_pool()
+
+        transforms = report["job_output"].image_transforms
+        assert transforms
+        for record in transforms:
+            assert server.state.content_types[("media", record.relative_path)] == "image/webp"
@@ -0,0 +1,67 @@
+import pytest
+
+from app.prefilter import LexicalPrefilter
+from app.sdk.llm_ledger import LLMBudget, ModelPrice, TokenLedger
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import FakeInstructorClient, MessageMix, SyntheticTelegramClient
+
+
+def test_ledger_accounts_per_model_and_checks_the_budget() -> None:
+    ledger = TokenLedger(LLMBudget(max_cost=0.01, prices={"small": ModelPrice(prompt=1.0, completion=2.0)}))
+
+    ledger.record("small", 1000, 500, 0.5)
+    ledger.record("small", 1000, 500, 1.5, error=True)
+    ledger.record("unpriced", 1_000_000, 0, 1.0)
+
+    small = ledger.usage.models["small"]
+    assert (small.requests, small.errors, small.prompt_tokens, small.completion_tokens) == (2, 1, 2000, 1000)
+    assert small.mean_seconds == 1.0
+    assert ledger.usage.cost == pytest.approx(0.004)
+    assert ledger.usage.total_tokens == 1_003_000
+    assert ledger.exceeded() is None
+
+    ledger.record("small", 5000, 1000, 0.5)
+    assert ledger.exceeded() == "max_cost"
+    assert ledger.usage.degraded_mode == "skip_augmentation"
+
+
+def test_job_output_reports_the_usage_per_model() -> None:
+    mix = MessageMix(num_messages=40, photo_ratio=0.0, video_ratio=0.0)
+    instructor_client = FakeInstructorClient()
+
+    report = run_benchmark(mix, instructor_client=instructor_client)
+
+    usage = report["job_output"].llm_usage
+    assert usage.requests == sum(instructor_client.model_calls.values())
+    # the stand-in reports 10 completion tokens per field of the response model
+    assert usage.models["gpt-4o"].completion_tokens == 10 * instructor_client.calls["filterData"] + 60 * instructor_client.calls["messageData"]
+    assert usage.models["gpt-4o"].cost > 0
+    assert usage.budget_exceeded is None and usage.unaugmented_messages == []
+
+
+@pytest.mark.parametrize("degraded_mode", ["skip_augmentation", "prefilter_only"])
+def test_job_stops_calling_the_llm_once_over_budget(degraded_mode: str) -> None:
+    mix = MessageMix(num_messages=60, photo_ratio=0.0, video_ratio=0.0)
+    client = SyntheticTelegramClient(mix)
+    texts = {i: client.build_message(i).text for i in range(1, mix.num_messages + 1)}
+    instructor_client = FakeInstructorClient()
+
+    report = run_benchmark(
+        mix,
+        instructor_client=instructor_client,
+        llm_budget=LLMBudget(max_requests=10, degraded_mode=degraded_mode),  # type: ignore
+    )
+
+    usage = report["job_output"].llm_usage
+    # the budget is checked before each message, which makes up to 2 calls
+    assert 10 <= usage.requests <= 11
+    assert usage.budget_exceeded == "max_requests" and usage.degraded_mode == degraded_mode
+    unaugmented = usage.unaugmented_messages
+    assert unaugmented and all(texts[message_id] for message_id in unaugmented)
+    prefilter = LexicalPrefilter()
+    candidates = [message_id for message_id in unaugmented if prefilter.evaluate(texts[message_id]).candidate]
+    if degraded_mode == "prefilter_only":
+        assert candidates == unaugmented
+    else:
+        assert len(candidates) < len(unaugmented)
+    assert sum(instructor_client.model_calls.values()) == usage.requests
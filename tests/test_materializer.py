@@ -0,0 +1,103 @@
+import asyncio
+
+from app.materializer import MaterializeFilter, materialize_media
+from app.sdk.file_repository import FileRepository
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.models import BaseJobState, DeferredMediaRecord, ProtocolEnum
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import LocalKernelPlancksterServer, MessageMix, SyntheticTelegramClient, WILDFIRE_TEXTS
+
+
+def test_filter() -> None:
+    photo = DeferredMediaRecord(
+        message_id=1, channel_name="news", relative_path="a.photo", media_type="photo", relevant=True, bytes=100
+    )
+    video = DeferredMediaRecord(
+        message_id=2, channel_name="news", relative_path="b.video", media_type="video", relevant=False, bytes=10_000
+    )
+
+    assert MaterializeFilter().matches(photo) and MaterializeFilter().matches(video)
+    assert [r.message_id for r in [photo, video] if MaterializeFilter(relevant_only=True).matches(r)] == [1]
+    assert [r.message_id for r in [photo, video] if MaterializeFilter(media_types=["video"]).matches(r)] == [2]
+    assert [r.message_id for r in [photo, video] if MaterializeFilter(max_bytes=1000).matches(r)] == [1]
+    assert [r.message_id for r in [photo, video] if MaterializeFilter(message_ids=[2]).matches(r)] == [2]
+
+
+def test_scrape_defers_media_and_materializes_the_relevant_ones() -> None:
+    mix = MessageMix(num_messages=40, photo_ratio=0.3, video_ratio=0.1, album_ratio=0.2, photo_bytes=4096, video_bytes=8192)
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    with_media = [message for message in messages if message.media]
+
+    report = run_benchmark(mix, telegram_client=client, defer_media=True)
+
+    assert client.downloaded_bytes == 0
+    deferred = report["job_output"].deferred_media
+    assert sorted(record.message_id for record in deferred) == sorted(message.id for message in with_media)
+    assert {record.media_type for record in deferred} == {"photo", "video"}
+    assert all(record.bytes in (4096, 8192) for record in deferred)
+    # only the augmented data and the manifest are uploaded
+    assert sorted(path.rsplit("/", 2)[-2] for path in report["registered_paths"]) == ["augmented", "deferred"]
+
+    def is_relevant(message) -> bool:
+        if message.grouped_id:
+            caption = min(m.id for m in messages if m.grouped_id == message.grouped_id)
+            message = messages[caption - 1]
+        return any(text in message.text for text in WILDFIRE_TEXTS)
+
+    relevant = {message.id for message in with_media if is_relevant(message)}
+    assert relevant and {record.message_id for record in deferred if record.relevant} == relevant
+
+    # a message deleted since then is left deferred
+    deferred.append(DeferredMediaRecord(message_id=1000, channel_name="benchmark", relative_path="gone.photo"))
+    with LocalKernelPlancksterServer() as server:
+        repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=KernelPlancksterGateway(
+                host=server.host, port=str(server.port), auth_token="bench", scheme="http"
+            ),
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+        )
+        output = asyncio.run(
+            materialize_media(
+                job_id=2,
+                tracer_id="materialize",
+                deferred_media=deferred,
+                telegram_client=client,  # type: ignore
+                scraped_data_repository=repository,
+                media_filter=MaterializeFilter(relevant_only=True),
+            )
+        )
+        registered = [source_data["relative_path"] for source_data in server.state.registered]
+
+    assert output.job_state == BaseJobState.FINISHED
+    assert output.deferred_media == []
+    paths = {record.relative_path for record in deferred if record.message_id in relevant}
+    assert {data.relative_path for data in output.source_data_list} == paths == set(registered)
+    assert client.downloaded_bytes == sum(record.bytes for record in deferred if record.message_id in relevant)
+    assert all(record.materialized == (record.message_id in relevant) for record in deferred)
+
+    # materialized media are not uploaded again
+    output = asyncio.run(
+        materialize_media(
+            job_id=4,
+            tracer_id="materialize",
+            deferred_media=[record for record in deferred if record.message_id in relevant],
+            telegram_client=client,  # type: ignore
+            scraped_data_repository=repository,
+        )
+    )
+    assert output.source_data_list == [] and output.deferred_media == []
+    assert client.downloaded_bytes == sum(record.bytes for record in deferred if record.message_id in relevant)
+
+    output = asyncio.run(
+        materialize_media(
+            job_id=3,
+            tracer_id="materialize",
+            deferred_media=deferred[-1:],
+            telegram_client=client,  # type: ignore
+            scraped_data_repository=repository,
+        )
+    )
+    assert [record.message_id for record in output.deferred_media] == [1000]  # type: ignore
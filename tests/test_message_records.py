@@ -0,0 +1,65 @@
+import tracemalloc
+
+import pytest
+
+from app.sdk.message_records import Interner, MessageBuffer
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient
+
+
+def test_records_round_trip_through_the_buffer() -> None:
+    client = SyntheticTelegramClient(MessageMix(num_messages=100))
+    messages = [client.build_message(i) for i in range(1, 101)]
+    messages[3].text = "Πυρκαγιά στην Πάτρα 🔥"
+    messages[4].post_author, messages[4].views, messages[4].date = "editor", None, None
+
+    buffer = MessageBuffer()
+    for message in messages:
+        buffer.append(message)
+
+    assert len(buffer) == 100
+    for record, message in zip(buffer, messages):
+        assert record.to_row() == [
+            message.sender_id,
+            message.text,
+            message.date,
+            message.id,
+            message.post_author,
+            message.views,
+            message.peer_id.channel_id,
+        ]
+    assert buffer[-1].message_id == 100
+    with pytest.raises(IndexError):
+        buffer[100]
+
+
+def test_repeated_values_are_interned() -> None:
+    interner = Interner()
+    assert [interner.intern(value) for value in (7, None, 7, "author", None)] == [0, 1, 0, 2, 1]
+    assert len(interner) == 3 and interner.value(2) == "author"
+
+
+def test_buffer_takes_a_fraction_of_the_memory_of_rows() -> None:
+    client = SyntheticTelegramClient(MessageMix(num_messages=20_000))
+
+    def allocated(keep) -> int:
+        tracemalloc.start()
+        try:
+            kept = keep()  # noqa: F841
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    def rows() -> list:
+        kept = []
+        for i in range(1, 20_001):
+            m = client.build_message(i)
+            kept.append([m.sender_id, m.text, m.date, m.id, m.post_author, m.views, m.peer_id.channel_id])
+        return kept
+
+    def buffer() -> MessageBuffer:
+        kept = MessageBuffer()
+        for i in range(1, 20_001):
+            kept.append(client.build_message(i))
+        return kept
+
+    assert allocated(buffer) * 2.5 < allocated(rows)
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.sdk.metrics import (
+    MetricsRegistry,
+    record_bytes,
+    snapshot_stages,
+    summarize_stages,
+    track_async_iterator,
+    track_stage,
+)
+
+
+def test_render_prometheus_text_format() -> None:
+
+    registry = MetricsRegistry()
+
+    histogram = registry.histogram(
+        "test_duration_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1.0)
+    )
+    counter = registry.counter("test_bytes_total", "Test counter.", ("stage",))
+    gauge = registry.gauge("test_in_flight", "Test gauge.", ("stage",))
+
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+    counter.inc(1024, stage="a")
+    gauge.inc(stage="a")
+    gauge.inc(stage="a")
+    gauge.dec(stage="a")
+
+    text = registry.render()
+
+    assert "# TYPE test_duration_seconds histogram" in text
+    assert 'test_duration_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_duration_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'test_duration_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'test_duration_seconds_count{stage="a"} 3' in text
+    assert 'test_bytes_total{stage="a"} 1024' in text
+    assert 'test_in_flight{stage="a"} 1' in text
+
+
+def test_registry_rejects_wrong_labels() -> None:
+
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test counter.", ("stage",))
+
+    with pytest.raises(ValueError):
+        counter.inc(other="a")
+
+
+def test_track_stage_summary_since_snapshot() -> None:
+
+    baseline = snapshot_stages()
+
+    with track_stage("test_stage"):
+        pass
+
+    with pytest.raises(RuntimeError):
+        with track_stage("test_stage"):
+            raise RuntimeError("boom")
+
+    record_bytes("test_stage", 10)
+
+    summary = summarize_stages(since=baseline)
+
+    assert summary["test_stage"]["count"] == 2
+    assert summary["test_stage"]["errors"] == 1
+    assert summary["test_stage"]["bytes"] == 10
+
+    # Nothing new since the latest snapshot
+    assert "test_stage" not in summarize_stages(since=snapshot_stages())
+
+
+def test_track_async_iterator() -> None:
+
+    async def numbers():
+        for i in range(3):
+            yield i
+
+    async def collect():
+        return [i async for i in track_async_iterator("test_iter", numbers())]
+
+    baseline = snapshot_stages()
+
+    assert asyncio.run(collect()) == [0, 1, 2]
+    # three items plus the final StopAsyncIteration fetch
+    assert summarize_stages(since=baseline)["test_iter"]["count"] == 4
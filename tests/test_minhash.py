@@ -0,0 +1,101 @@
+import itertools
+import os
+
+import numpy as np
+
+from app.prefilter import normalize, strip_noise
+from app.sdk.minhash import NUM_PERMUTATIONS, MinHashIndex, minhash
+from benchmarks.prefilter_report import load_labeled
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, NOISE_TEXTS, SyntheticTelegramClient, WILDFIRE_TEXTS
+
+
+def signature(text: str) -> np.ndarray:
+    return minhash(normalize(strip_noise(text)))  # type: ignore
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float((a == b).mean())
+
+
+def test_minhash_similarity_of_variants_and_different_texts() -> None:
+    texts = [record["text"] for record in load_labeled() if len(normalize(strip_noise(record["text"]))) >= 20]
+    signatures = [signature(text) for text in texts]
+
+    assert signatures[0].shape == (NUM_PERMUTATIONS,)
+    for text, text_signature in zip(texts, signatures):
+        assert similarity(text_signature, signature(f"🔥 {text} #1234 https://t.me/news/1")) >= 0.6
+    # texts that are not duplicates of one another
+    distinct = {normalize(strip_noise(text)) for text in texts}
+    distinct_signatures = [signature(text) for text in distinct]
+    assert max(similarity(a, b) for a, b in itertools.combinations(distinct_signatures, 2)) < 0.4
+
+    assert similarity(signature(WILDFIRE_TEXTS[0]), signature(WILDFIRE_TEXTS[0].upper())) == 1.0
+    assert minhash("too short") is None
+
+
+def test_index_finds_near_duplicates_and_evicts_the_oldest() -> None:
+    index = MinHashIndex(capacity=3)
+    for i, text in enumerate(WILDFIRE_TEXTS + NOISE_TEXTS[1:2]):
+        index.add(signature(text), {"text": i})
+
+    assert len(index) == 3
+    entry, score = index.find(signature(WILDFIRE_TEXTS[2] + " #42"))  # type: ignore
+    assert entry == {"text": 2} and score >= 0.6
+    # the first text was overwritten by the fourth
+    assert index.find(signature(WILDFIRE_TEXTS[0])) is None
+    assert index.find(signature(NOISE_TEXTS[3])) is None
+
+
+def test_index_is_persisted_and_compacted(tmp_path) -> None:
+    directory = str(tmp_path)
+    index = MinHashIndex(directory=directory, capacity=4)
+    texts = [f"{text} #{i}" for i, text in enumerate(WILDFIRE_TEXTS + NOISE_TEXTS[1:])]
+    for i, text in enumerate(texts[:4]):
+        index.add(signature(text), {"text": i})
+    index.flush()
+    for i, text in enumerate(texts[4:], start=4):
+        index.add(signature(text), {"text": i})
+        index.flush()
+
+    # 6 signatures written, within twice the capacity
+    assert os.path.getsize(os.path.join(directory, "minhash.u32")) == 6 * NUM_PERMUTATIONS * 4
+
+    reloaded = MinHashIndex(directory=directory, capacity=4)
+    assert len(reloaded) == 4
+    assert reloaded.find(signature(texts[5]))[0] == {"text": 5}  # type: ignore
+    assert reloaded.find(signature(texts[1])) is None
+
+    # an interrupted flush leaves a partial signature behind
+    with open(os.path.join(directory, "minhash.u32"), "ab") as f:
+        f.write(b"\0" * 10)
+    for i in range(3):
+        reloaded.add(signature(f"Another message about the weather, number {i}"), {"weather": i})
+    reloaded.flush()
+    assert len(MinHashIndex(directory=directory, capacity=4)) == 4
+    with open(os.path.join(directory, "minhash.entries.jsonl")) as f:
+        assert len(f.read().splitlines()) == 4
+
+
+def test_scrape_reuses_the_augmentation_of_near_duplicates(tmp_path) -> None:
+    mix = MessageMix(num_messages=80, photo_ratio=0.0, video_ratio=0.0)
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    texts = [message.text for message in messages if message.text]
+    relevant = sum(1 for text in texts if any(wildfire in text for wildfire in WILDFIRE_TEXTS))
+
+    without = run_benchmark(mix)
+    report = run_benchmark(mix, text_index=MinHashIndex(directory=str(tmp_path)))
+
+    assert without["llm_calls"]["filterData"] == len(texts)
+    # one relevance check per distinct text, one extraction per distinct relevant text
+    distinct = {text.split(" #")[0] for text in texts}
+    assert report["llm_calls"]["filterData"] == len(distinct)
+    assert report["llm_calls"]["messageData"] == len(distinct & set(WILDFIRE_TEXTS))
+    clusters = report["job_output"].duplicate_messages
+    assert sum(len(cluster.duplicates) for cluster in clusters) == len(texts) - len(distinct)
+    assert relevant > len(distinct & set(WILDFIRE_TEXTS))
+
+    # a later job reuses the persisted index
+    again = run_benchmark(mix, text_index=MinHashIndex(directory=str(tmp_path)))
+    assert again["llm_calls"] == {}
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from minio.error import S3Error
+
+from app.sdk.file_repository import FileRepository, MinIORepository
+from app.sdk.job_router import JobManagerFastAPIRouter
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.retry import RetryPolicy, load_retry_policies
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import LocalKernelPlancksterServer, LocalS3Server, MessageMix
+
+
+PART_SIZE = 5 * 1024 * 1024
+FAST_POLICY = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01, timeout=30.0, deadline=60.0)
+FAST_POLICIES = {"minio_upload": FAST_POLICY, "minio_upload_part": FAST_POLICY, "minio_bucket": FAST_POLICY}
+
+
+def _repository(server: LocalS3Server, max_workers: int = 4, retry_policies: dict = FAST_POLICIES) -> MinIORepository:
+    return MinIORepository(
+        host=server.host,
+        port=server.port,
+        access_key="test",
+        secret_key="test",
+        bucket="media",
+        part_size=PART_SIZE,
+        max_workers=max_workers,
+        retry_policies=retry_policies,
+    )
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory) -> str:
+    path = tmp_path_factory.mktemp("minio") / "video.mp4"
+    path.write_bytes(os.urandom(4 * PART_SIZE + 12345))
+    return str(path)
+
+
+def test_buckets_are_created_once_on_first_use(tmp_path) -> None:
+    file = tmp_path / "photo.jpg"
+    file.write_bytes(b"jpeg")
+    with LocalS3Server() as server:
+        repository = _repository(server)
+        assert server.state.buckets == set()
+        for index in range(3):
+            repository.upload_file(f"photos/{index}.jpg", str(file), "image/jpeg")
+        repository.close()
+
+        assert server.state.buckets == {"media"}
+        assert server.state.requests["bucket"] == 2  # exists, then created
+        assert server.state.requests["put"] == 3
+        assert "initiate" not in server.state.requests
+        assert server.state.content_types[("media", "photos/0.jpg")] == "image/jpeg"
+
+
+def test_large_videos_are_uploaded_in_parallel_parts(video_path) -> None:
+    size = os.path.getsize(video_path)
+    with open(video_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    seconds = {}
+    # each request at 20 MB/s, like a connection to a remote object store
+    for workers in (1, 4):
+        with LocalS3Server(bytes_per_second=20e6) as server:
+            repository = _repository(server, max_workers=workers)
+            start = time.perf_counter()
+            assert repository.upload_file("videos/video.mp4", video_path) == size
+            seconds[workers] = time.perf_counter() - start
+            repository.close()
+
+            assert server.state.requests["part"] == 5
+            assert hashlib.sha256(server.state.objects[("media", "videos/video.mp4")]).hexdigest() == digest
+            assert server.state.uploads == {}
+        print(f"{workers} workers: {size / seconds[workers] / 1e6:.1f} MB/s")
+
+    assert seconds[4] * 2 < seconds[1]
+
+
+def test_failed_parts_are_retried(video_path) -> None:
+    with LocalS3Server() as server:
+        server.state.faults["part"] = [503, 503]
+        repository = _repository(server)
+        repository.upload_file("videos/video.mp4", video_path)
+        repository.close()
+
+        assert server.state.requests["part"] == 7
+        assert len(server.state.objects[("media", "videos/video.mp4")]) == os.path.getsize(video_path)
+
+
+def test_parts_are_retried_with_their_own_policy(video_path) -> None:
+    # as set with RETRY_POLICIES: each part is sent at most twice, and the upload is not retried as a whole
+    policies = load_retry_policies(
+        json.dumps(
+            {
+                "minio_upload": {"max_attempts": 1},
+                "minio_upload_part": {"max_attempts": 2, "base_delay": 0.001},
+                "minio_bucket": {"base_delay": 0.001},
+            }
+        )
+    )
+    with LocalS3Server() as server:
+        repository = _repository(server, max_workers=1, retry_policies=policies)
+        server.state.faults["part"] = [503]
+        repository.upload_file("videos/one-retry.mp4", video_path)
+        server.state.faults["part"] = [503, 503]
+        with pytest.raises(Exception):
+            repository.upload_file("videos/two-retries.mp4", video_path)
+        repository.close()
+
+        assert ("media", "videos/one-retry.mp4") in server.state.objects
+        assert server.state.aborted == ["videos/two-retries.mp4"]
+
+
+def test_failed_uploads_are_aborted(video_path) -> None:
+    with LocalS3Server() as server:
+        server.state.faults["part"] = [403]
+        repository = _repository(server)
+        with pytest.raises(S3Error):
+            repository.upload_file("videos/video.mp4", video_path)
+        repository.close()
+
+        assert server.state.aborted == ["videos/video.mp4"]
+        assert server.state.uploads == {} and server.state.objects == {}
+
+
+def test_scraped_data_is_uploaded_to_minio_and_registered(tmp_path) -> None:
+    source_data = KernelPlancksterSourceData(
+        name="augmented", protocol=ProtocolEnum.S3, relative_path="telegram/t/1/augmented/data.json.gz"
+    )
+    file = tmp_path / "data"
+    file.write_bytes(b"compressed")
+    with LocalKernelPlancksterServer() as kernel_planckster, LocalS3Server() as server:
+        repository = _repository(server)
+        scraped_data_repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=KernelPlancksterGateway(
+                host=kernel_planckster.host, port=str(kernel_planckster.port), auth_token="test", scheme="http"
+            ),
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+            minio_repository=repository,
+        )
+        scraped_data_repository.register_scraped_json(source_data, 1, str(file))
+        repository.close()
+
+        assert server.state.objects[("media", source_data.relative_path)] == b"compressed"
+        assert server.state.content_types[("media", source_data.relative_path)] == "application/gzip"
+        assert "upload-credentials" not in kernel_planckster.state.requests
+        assert kernel_planckster.state.uploaded == {}
+        assert [registered["relative_path"] for registered in kernel_planckster.state.registered] == [
+            source_data.relative_path
+        ]
+
+
+def test_scrape_uploads_media_to_minio() -> None:
+    mix = MessageMix(num_messages=20, photo_ratio=0.5, video_ratio=0.2, video_bytes=6 * 1024 * 1024)
+    with LocalS3Server() as server:
+        repository = _repository(server)
+        report = run_benchmark(mix, minio_repository=repository)
+        repository.close()
+
+        assert report["job_state"] == "finished"
+        assert report["uploaded_sizes"] == {}
+        assert {key for _, key in server.state.objects} == set(report["registered_paths"])
+        assert server.state.requests.get("part", 0) > 0
+
+
+def test_router_uses_minio_when_configured(monkeypatch) -> None:
+    with LocalKernelPlancksterServer() as kernel_planckster, LocalS3Server() as server:
+        monkeypatch.setenv("STORAGE_PROTOCOL", "s3")
+        monkeypatch.setenv("KERNEL_PLANCKSTER_HOST", f"http://{kernel_planckster.host}")
+        monkeypatch.setenv("KERNEL_PLANCKSTER_PORT", str(kernel_planckster.port))
+        for name, value in {
+            "MINIO_HOST": server.host,
+            "MINIO_PORT": str(server.port),
+            "MINIO_ACCESS_KEY": "test",
+            "MINIO_SECRET_KEY": "test",
+            "MINIO_BUCKET": "jobs",
+        }.items():
+            monkeypatch.setenv(name, value)
+        workers = []
+
+        app = FastAPI()
+        router = JobManagerFastAPIRouter(app, lambda **kwargs: workers.append(kwargs))
+        app.job_manager = type("JobManager", (), {"get_job": staticmethod(lambda job_id: {"id": job_id})})()  # type: ignore
+
+        assert router.kernel_plankster_gateway.url == kernel_planckster.url
+        response = TestClient(app).get("/job/1/start")
+        router.minio_repository.close()
+
+        assert response.status_code == 200
+        assert server.state.buckets == {"jobs"}
+        assert workers[0]["minio_repository"] is router.minio_repository
+
+        monkeypatch.delenv("MINIO_HOST")
+        assert JobManagerFastAPIRouter(FastAPI(), lambda **kwargs: None).minio_repository is None
+        monkeypatch.delenv("MINIO_BUCKET")
+        monkeypatch.setenv("MINIO_HOST", server.host)
+        with pytest.raises(ValueError):
+            JobManagerFastAPIRouter(FastAPI(), lambda **kwargs: None)
@@ -0,0 +1,51 @@
+import pytest
+from pydantic import ValidationError
+
+from app.scraper import ModelCascadeConfig, check_relevance
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import FakeInstructorClient, MessageMix, SyntheticTelegramClient, WILDFIRE_TEXTS
+
+
+def test_cascade_escalates_only_when_not_confident() -> None:
+    client = FakeInstructorClient(confidence=lambda model, content: 0.5 if "Chania" in content else 0.9)
+    models = ModelCascadeConfig(filter_models=["small", "medium", "large"], min_confidence=0.8)
+
+    assert check_relevance(client, WILDFIRE_TEXTS[0], "forest wildfire", models)  # type: ignore
+    assert client.model_calls == {"small": 1}
+
+    assert check_relevance(client, WILDFIRE_TEXTS[1], "forest wildfire", models)  # type: ignore
+    # the last model is not asked for its confidence
+    assert client.model_calls == {"small": 2, "medium": 1, "large": 1}
+    assert client.calls == {"scoredFilterData": 3, "filterData": 1}
+
+
+def test_cascade_needs_a_filter_model() -> None:
+    with pytest.raises(ValidationError):
+        ModelCascadeConfig(filter_models=[])
+
+
+def test_scrape_with_a_cascade_keeps_the_relevant_messages() -> None:
+    mix = MessageMix(num_messages=60, photo_ratio=0.0, video_ratio=0.0)
+    client = SyntheticTelegramClient(mix)
+    texts = [client.build_message(i).text for i in range(1, mix.num_messages + 1)]
+    texts = [text for text in texts if text]
+    unsure = sum(1 for text in texts if "Chania" in text)
+    relevant = sum(1 for text in texts if any(wildfire in text for wildfire in WILDFIRE_TEXTS))
+
+    baseline = run_benchmark(mix)
+    report = run_benchmark(
+        mix,
+        instructor_client=FakeInstructorClient(
+            confidence=lambda model, content: 0.5 if "Chania" in content else 0.95
+        ),
+        model_cascade=ModelCascadeConfig(
+            filter_models=["gpt-4o-mini", "gpt-4o"], extraction_model="gpt-4o"
+        ),
+    )
+
+    assert baseline["llm_model_calls"] == {"gpt-4o": len(texts) + relevant}
+    assert report["llm_model_calls"] == {"gpt-4o-mini": len(texts), "gpt-4o": unsure + relevant}
+    assert report["llm_calls"]["messageData"] == baseline["llm_calls"]["messageData"] == relevant
+    assert report["stages"]["openai_filter:gpt-4o-mini"]["count"] == len(texts)
+    assert report["stages"]["openai_filter:gpt-4o"]["count"] == unsure
+    assert report["stages"]["openai_filter"]["count"] == len(texts)
@@ -0,0 +1,122 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from app.sdk.models import BaseJobState, KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.perceptual_hash import PerceptualHashIndex, dhash, hamming_distance, phash
+from app.sdk.process_pool import shutdown_process_pool
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient, synthetic_jpeg
+
+
+def _source_data(name: str) -> KernelPlancksterSourceData:
+    return KernelPlancksterSourceData(
+        name=name,
+        protocol=ProtocolEnum.S3,
+        relative_path=f"telegram/tracer/1/photos/{name}.photo",
+    )
+
+
+def _write(path, payload: bytes) -> str:
+    path.write_bytes(payload)
+    return str(path)
+
+
+def _watermarked(payload: bytes) -> bytes:
+    image = Image.open(io.BytesIO(payload)).convert("RGB")
+    ImageDraw.Draw(image).text((5, 5), "@some_channel", fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=70)
+    return buffer.getvalue()
+
+
+def test_hashes_match_reencoded_copies_and_differ_across_images(tmp_path) -> None:
+    original = _write(tmp_path / "original.jpg", synthetic_jpeg(1, variant=0))
+    resized = _write(tmp_path / "resized.jpg", synthetic_jpeg(1, variant=7))
+    watermarked = _write(tmp_path / "watermarked.jpg", _watermarked(synthetic_jpeg(1, variant=3)))
+    other = _write(tmp_path / "other.jpg", synthetic_jpeg(2, variant=0))
+
+    for algorithm in (phash, dhash):
+        assert hamming_distance(algorithm(original), algorithm(resized)) <= 6
+        assert hamming_distance(algorithm(original), algorithm(watermarked)) <= 6
+        assert hamming_distance(algorithm(original), algorithm(other)) > 12
+
+
+def test_index_finds_the_closest_hash_within_distance() -> None:
+    index = PerceptualHashIndex(max_distance=3)
+    index.add(0b1111, _source_data("a"))
+    index.add(0xFF00FF00FF00FF00, _source_data("b"))
+
+    assert index.find(0b1101) == (_source_data("a"), 1)
+    assert index.find(0xFF00FF00FF00FF07) == (_source_data("b"), 3)
+    assert index.find(0xFF00FF00FF00FF0F) is None
+    assert PerceptualHashIndex().find(0) is None
+
+
+def test_index_lookups_match_a_linear_scan() -> None:
+    rng = random.Random(0)
+    index = PerceptualHashIndex(max_distance=8)
+    hashes = [rng.getrandbits(64) for _ in range(5000)]
+    for i, image_hash in enumerate(hashes):
+        index.add(image_hash, _source_data(str(i)))
+
+    for _ in range(200):
+        query = rng.choice(hashes) ^ sum(1 << bit for bit in rng.sample(range(64), rng.randint(0, 10)))
+        closest = min(hamming_distance(query, image_hash) for image_hash in hashes)
+        found = index.find(query)
+        assert (found[1] if found else None) == (closest if closest <= 8 else None)
+
+
+def test_index_persists_across_runs(tmp_path) -> None:
+    index = PerceptualHashIndex(directory=str(tmp_path), max_distance=2)
+    for i in range(3000):
+        index.add(i * 0x9E3779B97F4A7C15 % (1 << 64), _source_data(str(i)))
+    index.flush()
+    index.add(0xDEADBEEF, _source_data("last"))
+    index.flush()
+
+    reloaded = PerceptualHashIndex(directory=str(tmp_path), max_distance=2)
+
+    assert len(reloaded) == 3001
+    assert reloaded.find(0xDEADBEEF) == (_source_data("last"), 0)
+    assert reloaded.find(1234 * 0x9E3779B97F4A7C15 % (1 << 64) ^ 0b11) == (_source_data("1234"), 2)
+
+
+def test_index_recovers_from_an_interrupted_flush(tmp_path) -> None:
+    index = PerceptualHashIndex(directory=str(tmp_path))
+    index.add(1, _source_data("a"))
+    index.add(2, _source_data("b"))
+    index.flush()
+    # the sources of a third entry were written, but not its hash
+    with open(tmp_path / "phash.sources.jsonl", "a") as f:
+        f.write(_source_data("c").model_dump_json() + "\n")
+
+    reloaded = PerceptualHashIndex(directory=str(tmp_path))
+    reloaded.add(3, _source_data("d"))
+    reloaded.flush()
+
+    assert len(PerceptualHashIndex(directory=str(tmp_path))) == 3
+    assert PerceptualHashIndex(directory=str(tmp_path), max_distance=0).find(3) == (_source_data("d"), 0)
+
+
+def test_scrape_uploads_each_distinct_photo_once(tmp_path) -> None:
+    mix = MessageMix(num_messages=30, photo_ratio=0.6, video_ratio=0.0, photo_images=3)
+    client = SyntheticTelegramClient(mix)
+    photos = [client.build_message(i).media for i in range(1, mix.num_messages + 1)]
+    distinct_images = {media.photo.image for media in photos if media is not None}
+    photo_count = sum(1 for media in photos if media is not None)
+
+    try:
+        linked = run_benchmark(mix, photo_index=PerceptualHashIndex(directory=str(tmp_path)), duplicate_photos="link")
+        assert linked["job_state"] == BaseJobState.FINISHED.value
+        # one upload per distinct image, plus the augmented json
+        assert linked["registered_source_data"] == len(distinct_images) + 1
+        assert len(linked["job_output"].source_data_list) == photo_count
+
+        # the index persists: the next job stores no photo again
+        skipped = run_benchmark(mix, photo_index=PerceptualHashIndex(directory=str(tmp_path)), duplicate_photos="skip")
+        assert skipped["registered_source_data"] == 1
+        assert skipped["job_output"].source_data_list == []
+    finally:
+        shutdown_process_pool()
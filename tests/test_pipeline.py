@@ -0,0 +1,204 @@
+import asyncio
+import random
+import re
+
+import pytest
+
+from app.scraper import ScrapePipelineConfig
+from app.sdk.file_repository import MinIORepository
+from app.sdk.pipeline import Pipeline, Stage, StageConfig
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import LocalS3Server, MessageMix
+
+
+async def numbers(count: int, read: list) -> object:
+    for number in range(count):
+        read.append(number)
+        yield number
+
+
+def test_items_come_out_in_order_with_concurrent_stages() -> None:
+    rng = random.Random(0)
+
+    async def square(number: int) -> int:
+        await asyncio.sleep(rng.random() / 200)
+        return number * number
+
+    async def increment(number: int) -> int:
+        await asyncio.sleep(rng.random() / 200)
+        return number + 1
+
+    pipeline = Pipeline(
+        "test",
+        [
+            Stage("square", square, StageConfig(concurrency=4, queue_size=2)),
+            Stage("increment", increment, StageConfig(concurrency=3, queue_size=2)),
+        ],
+    )
+
+    async def run() -> list:
+        return [item async for item in pipeline.run(numbers(50, []))]
+
+    assert asyncio.run(run()) == [number * number + 1 for number in range(50)]
+    stats = pipeline.stats()
+    assert list(stats) == ["source", "square", "increment", "sink"]
+    assert all(stage["items"] == 50 for stage in stats.values())
+    assert stats["square"]["concurrency"] == 4 and 0 < stats["square"]["utilization"] <= 1
+
+
+def test_a_slow_consumer_holds_back_the_source() -> None:
+    read: list = []
+    consumed: list = []
+
+    async def identity(number: int) -> int:
+        return number
+
+    pipeline = Pipeline(
+        "test",
+        [Stage("identity", identity, StageConfig(concurrency=2, queue_size=3))],
+        sink_queue_size=2,
+    )
+
+    async def run() -> None:
+        async for number in pipeline.run(numbers(100, read)):
+            consumed.append(number)
+            await asyncio.sleep(0.001)
+            # the queues, the workers and the item being put bound the items read ahead
+            assert len(read) - len(consumed) <= 3 + 2 + 2 + 2
+
+    asyncio.run(run())
+    assert consumed == list(range(100))
+    stats = pipeline.stats()
+    assert stats["source"]["blocked_seconds"] > 0
+    assert stats["identity"]["max_queue_depth"] <= 3 and stats["sink"]["max_queue_depth"] <= 2
+
+
+def test_errors_are_raised_in_order_and_pending_items_discarded() -> None:
+    discarded: list = []
+
+    async def negate(number: int) -> int:
+        return -number
+
+    async def fail_on_five(number: int) -> int:
+        if number == 5:
+            raise ValueError("five")
+        return number
+
+    pipeline = Pipeline(
+        "test",
+        [Stage("check", fail_on_five, StageConfig(concurrency=4))],
+        discard=discarded.append,
+    )
+    consumed: list = []
+
+    async def run() -> None:
+        async for number in pipeline.run(numbers(20, [])):
+            consumed.append(number)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert consumed == [0, 1, 2, 3, 4]
+    assert all(number > 5 for number in discarded)
+    discarded.clear()
+
+    pipeline = Pipeline("test", [Stage("check", fail_on_five)], discard=discarded.append)
+
+    async def stop_early() -> None:
+        items = pipeline.run(numbers(4, []))
+        await items.__anext__()
+        await asyncio.sleep(0.01)
+        await items.aclose()
+
+    asyncio.run(stop_early())
+    # the items downloaded, or computed, ahead are released
+    assert discarded == [1, 2, 3]
+
+    # the results of an earlier stage, not taken by the next one, are released by that stage
+    pipeline = Pipeline(
+        "test",
+        [
+            Stage("check", fail_on_five, discard=lambda number: discarded.append(("check", number))),
+            Stage("negate", negate, StageConfig(queue_size=1)),
+        ],
+        sink_queue_size=1,
+        discard=lambda number: discarded.append(("negate", number)),
+    )
+    discarded.clear()
+
+    asyncio.run(stop_early())
+    assert discarded and {stage for stage, _ in discarded} == {"check", "negate"}
+    assert all(number >= 0 for stage, number in discarded if stage == "check")
+    assert all(number < 0 for stage, number in discarded if stage == "negate")
+
+
+def _paths(paths: list) -> list:
+    return [re.sub(r"tmp\w+", "tmp", path) for path in paths]
+
+
+def test_pipelined_scrape_is_equivalent_to_a_serial_one() -> None:
+    mix = MessageMix(
+        num_messages=40, photo_ratio=0.4, video_ratio=0.1, album_ratio=0.2, photo_bytes=16 * 1024, video_bytes=16 * 1024
+    )
+    throttle = 16 * 1024 / 0.02
+
+    serial = run_benchmark(
+        mix,
+        download_bytes_per_second=throttle,
+        tracer_id="equivalence",
+        pipeline=ScrapePipelineConfig(
+            read_ahead=1, augment_concurrency=1, download_concurrency=1, download_ahead=1, upload_concurrency=1
+        ),
+    )
+    pipelined = run_benchmark(
+        mix,
+        download_bytes_per_second=throttle,
+        tracer_id="equivalence",
+        pipeline=ScrapePipelineConfig(
+            read_ahead=16, augment_concurrency=4, download_concurrency=8, download_ahead=16, upload_concurrency=4
+        ),
+    )
+
+    assert serial["job_state"] == pipelined["job_state"] == "finished"
+    assert serial["llm_calls"] == pipelined["llm_calls"]
+    # the media are uploaded concurrently, but listed in channel order
+    assert sorted(_paths(serial["registered_paths"])) == sorted(_paths(pipelined["registered_paths"]))
+    source_data_paths = lambda report: _paths(  # noqa: E731
+        [source_data.relative_path for source_data in report["job_output"].source_data_list]
+    )
+    assert source_data_paths(serial) == source_data_paths(pipelined)
+    assert sorted(serial["uploaded_sizes"].values()) == sorted(pipelined["uploaded_sizes"].values())
+    albums = lambda report: [(a.grouped_id, a.message_ids) for a in report["job_output"].albums]  # noqa: E731
+    assert albums(serial) == albums(pipelined)
+
+    stats = pipelined["job_output"].pipeline
+    assert list(stats) == ["fetch", "augment", "download", "upload", "process"]
+    assert {stage: stage_stats["items"] for stage, stage_stats in stats.items()} == dict.fromkeys(stats, mix.num_messages)
+    # the augmentations, downloads and uploads overlap with each other and with those of earlier messages
+    assert pipelined["elapsed_seconds"] < serial["elapsed_seconds"]
+
+
+class _LoopCheckingMinIORepository(MinIORepository):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.on_the_event_loop: list = []
+
+    def upload_file(self, object_name: str, *args, **kwargs) -> int:
+        try:
+            asyncio.get_running_loop()
+            self.on_the_event_loop.append(object_name)
+        except RuntimeError:
+            pass
+        return super().upload_file(object_name, *args, **kwargs)
+
+
+def test_uploads_do_not_block_the_event_loop() -> None:
+    mix = MessageMix(num_messages=20, photo_ratio=0.5, video_ratio=0.2, photo_bytes=16 * 1024, video_bytes=16 * 1024)
+    with LocalS3Server() as server:
+        repository = _LoopCheckingMinIORepository(server.host, server.port, "test", "test", bucket="media")
+        report = run_benchmark(mix, minio_repository=repository)
+        repository.close()
+
+    assert report["job_state"] == "finished"
+    assert len(server.state.objects) == len(report["registered_paths"]) > 1
+    # uploads run in threads, so that the fetch and download steps go on meanwhile
+    assert repository.on_the_event_loop == []
@@ -0,0 +1,88 @@
+import random
+
+from app.prefilter import LexicalPrefilter, LexicalPrefilterConfig, normalize, strip_noise
+from app.sdk.keyword_automaton import KeywordAutomaton
+from benchmarks.prefilter_report import evaluate_prefilter, load_labeled
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient, WILDFIRE_TEXTS
+
+
+def test_automaton_finds_the_same_matches_as_a_naive_search() -> None:
+    rng = random.Random(0)
+    keywords = ["he", "she", "his", "hers", "a", "ab", "bab", "abab", "b"]
+    automaton = KeywordAutomaton(keywords)
+
+    for _ in range(200):
+        text = "".join(rng.choice("abehirs") for _ in range(rng.randint(0, 30)))
+        expected = sorted(
+            (start, keyword)
+            for keyword in keywords
+            for start in range(len(text))
+            if text.startswith(keyword, start)
+        )
+        assert sorted(automaton.finditer(text)) == expected
+
+
+def test_automaton_whole_words() -> None:
+    automaton = KeywordAutomaton(["fire", "forest fire"], whole_words=True)
+
+    assert sorted(automaton.findall("forest fire near the campfire")) == ["fire", "forest fire"]
+    assert automaton.findall("ceasefire, fires") == []
+    assert KeywordAutomaton(["fire"]).findall("ceasefire") == ["fire"]
+
+
+def test_strip_noise_and_normalize() -> None:
+    assert strip_noise("🔥 Fire at https://t.me/news/1 via @reporter 🔥🔥") == "Fire at via"
+    assert strip_noise("https://example.com") == ""
+    assert normalize("Incêndio FLORESTAL") == "incendio florestal"
+    assert normalize("ΠΥΡΚΑΓΙΆ") == normalize("πυρκαγιά") == "πυρκαγια"
+
+
+def test_prefilter_decisions() -> None:
+    prefilter = LexicalPrefilter(
+        LexicalPrefilterConfig(keywords=["wildfire"], negative_keywords=["promo code"], min_length=10)
+    )
+
+    assert prefilter.evaluate("Wildfires near Athens").reason == "candidate"
+    assert prefilter.evaluate("Wildfire 🔥 https://t.me/x").reason == "too_short"
+    assert prefilter.evaluate("Wildfire sale, promo code FIRE").reason == "negative_keyword"
+    assert prefilter.evaluate("Good morning everyone!").reason == "no_keyword"
+
+
+def test_short_keywords_only_match_whole_words() -> None:
+    prefilter = LexicalPrefilter()
+
+    for noise in (
+        "Володимир Зеленський виступив сьогодні",
+        "Der Verbrauch ist gestiegen, ich brauche Hilfe",
+        "¿Cómo te llamas? Me llamo Ana",
+        "The ceasefire talks resumed in Cairo this morning.",
+        "Firefox update released today",
+        "The government fired the minister of health today.",
+    ):
+        assert prefilter.evaluate(noise).reason == "no_keyword", noise
+    for relevant in ("Густий дим над Києвом", "Rauch über Berlin sichtbar", "Casa en llamas en Madrid", "Fires near Athens"):
+        assert prefilter.evaluate(relevant).candidate, relevant
+
+
+def test_default_prefilter_keeps_every_relevant_labeled_message() -> None:
+    records = load_labeled()
+    report = evaluate_prefilter(LexicalPrefilter(), records)
+
+    assert report["recall"] == 1.0
+    noise = report["false_positives"] + report["true_negatives"]
+    assert report["true_negatives"] / noise >= 0.9
+    assert {record["language"] for record in records if record["relevant"]} >= {"en", "el", "es", "de", "ru"}
+
+
+def test_scrape_only_sends_candidates_to_the_llm() -> None:
+    mix = MessageMix(num_messages=60, photo_ratio=0.0, video_ratio=0.0)
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    relevant = sum(1 for message in messages if any(text in message.text for text in WILDFIRE_TEXTS))
+
+    without = run_benchmark(mix)
+    with_prefilter = run_benchmark(mix, prefilter=LexicalPrefilter())
+
+    assert with_prefilter["llm_calls"]["filterData"] == relevant < without["llm_calls"]["filterData"]
+    assert with_prefilter["llm_calls"]["messageData"] == without["llm_calls"]["messageData"] == relevant
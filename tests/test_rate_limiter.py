@@ -0,0 +1,160 @@
+import asyncio
+import multiprocessing
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+
+from app.sdk.rate_limiter import (
+    RATE_LIMIT_ERRORS,
+    RateLimitConfig,
+    RateLimitedClient,
+    RateLimiter,
+    estimate_tokens,
+)
+from app.sdk.retry import HTTPStatusError, RetryPolicy
+from app.scraper import filterData
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import FakeInstructorClient, MessageMix
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_requests_queue_in_order_once_a_budget_is_spent() -> None:
+    clock = FakeClock()
+    # one request and 100 tokens per second
+    limiter = RateLimiter(RateLimitConfig(requests_per_minute=60, tokens_per_minute=6000), clock=clock, sleep=lambda _: None)
+
+    assert [limiter.acquire(10) for _ in range(60)] == [0.0] * 60
+    # not sleeping: every request reserves its turn behind the previous ones
+    assert [limiter.acquire(10) for _ in range(3)] == pytest.approx([1.0, 2.0, 3.0])
+
+    clock.now += 60
+    assert limiter.acquire(5000) == 0.0
+    assert limiter.acquire(2000) == pytest.approx(10.0)
+    # an actual usage lower than estimated gives the tokens back
+    limiter.adjust(-2000)
+    clock.now += 10
+    assert limiter.acquire(1000) == pytest.approx(0.0)
+
+
+def test_limiters_sharing_a_file_share_the_budgets(tmp_path) -> None:
+    clock = FakeClock()
+    config = RateLimitConfig(requests_per_minute=60, tokens_per_minute=100_000)
+    path = str(tmp_path / "openai.limiter")
+    first = RateLimiter(config, path=path, clock=clock, sleep=clock.sleep)
+    second = RateLimiter(config, path=path, clock=clock, sleep=clock.sleep)
+
+    for _ in range(30):
+        first.acquire(10)
+        second.acquire(10)
+    assert clock.sleeps == []
+    second.acquire(10)
+    first.acquire(10)
+    assert clock.sleeps == pytest.approx([1.0, 1.0])
+
+
+def _acquire(path: str, count: int, delays: Any) -> None:
+    limiter = RateLimiter(
+        RateLimitConfig(requests_per_minute=60, tokens_per_minute=100_000), path=path, sleep=lambda _: None
+    )
+    for _ in range(count):
+        delays.put(limiter.acquire(10))
+
+
+def test_worker_processes_share_the_budgets(tmp_path) -> None:
+    path = str(tmp_path / "openai.limiter")
+    context = multiprocessing.get_context("fork")
+    delays = context.Queue()
+    workers = [context.Process(target=_acquire, args=(path, 20, delays)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    results = [delays.get(timeout=30) for _ in range(80)]
+    for worker in workers:
+        worker.join()
+
+    # the first 60 requests fit the budget, the other 20 are queued about one second apart
+    assert sum(1 for delay in results if delay == 0) in (60, 61)
+    assert max(results) > 18
+
+
+class FlakyClient:
+    """
+    Rejects the first call with a 429, then answers with the usage of the completion.
+    """
+
+    def __init__(self, total_tokens: int) -> None:
+        self.attempts = 0
+        self._total_tokens = total_tokens
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs: Any) -> Any:
+        self.attempts += 1
+        if self.attempts == 1:
+            raise HTTPStatusError("Rate limit reached", 429)
+        response = filterData(relevant=True)
+        return SimpleNamespace(
+            relevant=response.relevant,
+            _raw_response=SimpleNamespace(usage=SimpleNamespace(total_tokens=self._total_tokens)),
+        )
+
+
+def test_client_retries_429s_and_corrects_the_estimate() -> None:
+    clock = FakeClock()
+    config = RateLimitConfig(requests_per_minute=60, tokens_per_minute=6000)
+    limiter = RateLimiter(config, clock=clock, sleep=clock.sleep)
+    client = RateLimitedClient(FlakyClient(total_tokens=50), limiter, RetryPolicy(base_delay=0.0, jitter=0.0))
+    messages = [{"role": "user", "content": "x" * 400}]
+    estimate = estimate_tokens(messages, config, filterData)
+    assert estimate > 100 + config.completion_tokens
+    errors_before = RATE_LIMIT_ERRORS.get(limiter="openai")
+
+    response = client.chat.completions.create(model="gpt-4o", response_model=filterData, messages=messages)
+
+    assert response.relevant and client.attempts == 2  # type: ignore
+    assert RATE_LIMIT_ERRORS.get(limiter="openai") - errors_before == 1
+    # both attempts were estimated, the second one was corrected to the 50 tokens used
+    assert limiter.acquire(6000 - estimate - 50) == 0.0
+    assert limiter.acquire(100) == pytest.approx(1.0)
+
+
+def test_scrape_queues_llm_calls_within_the_budgets() -> None:
+    clock = FakeClock()
+    instructor_client = FakeInstructorClient()
+    mix = MessageMix(num_messages=40, photo_ratio=0.0, video_ratio=0.0)
+    waits_on_the_event_loop: List[float] = []
+
+    def sleep(seconds: float) -> None:
+        try:
+            asyncio.get_running_loop()
+            waits_on_the_event_loop.append(seconds)
+        except RuntimeError:
+            pass
+        clock.sleep(seconds)
+
+    report = run_benchmark(
+        mix,
+        instructor_client=instructor_client,
+        rate_limiter=RateLimiter(
+            RateLimitConfig(requests_per_minute=10, tokens_per_minute=100_000), clock=clock, sleep=sleep
+        ),
+    )
+
+    calls = sum(instructor_client.model_calls.values())
+    assert calls > 10
+    # 10 requests fit the budget, the others are sent every 6 seconds
+    assert report["stages"]["openai_rate_limit_wait"]["count"] == calls - 10
+    assert clock.now - 1000.0 == pytest.approx(6 * (calls - 10))
+    # the waits block a thread, not the event loop shared with the other jobs of the server
+    assert clock.sleeps and waits_on_the_event_loop == []
@@ -0,0 +1,122 @@
+import asyncio
+
+import numpy as np
+
+from app.relevance import EmbeddingRelevanceConfig, EmbeddingRelevanceScorer
+from app.sdk.embeddings import EmbeddingCache, HashingEmbeddingBackend
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, NOISE_TEXTS, SyntheticTelegramClient, WILDFIRE_TEXTS
+
+
+def test_hashing_backend_is_deterministic() -> None:
+    texts = ["Forest fire near Patras", "Good morning everyone!"]
+
+    first = HashingEmbeddingBackend().embed(texts)
+    second = HashingEmbeddingBackend().embed(texts)
+
+    assert first.shape == (2, 512) and first.dtype == np.float32
+    assert np.array_equal(first, second)
+
+
+def test_cache_persists_embeddings(tmp_path) -> None:
+    path = str(tmp_path / "embeddings.sqlite")
+    texts = ["Forest fire near Patras", "Good morning everyone!", "Forest fire near Patras"]
+
+    backend = HashingEmbeddingBackend()
+    cache = EmbeddingCache(path)
+    computed = cache.embed(backend, texts)
+    cache.close()
+    assert backend.calls == 1 and backend.embedded_texts == 2
+
+    backend = HashingEmbeddingBackend()
+    cached = EmbeddingCache(path).embed(backend, texts)
+    assert backend.calls == 0
+    assert np.array_equal(computed, cached)
+
+    # embeddings of other backends are not shared
+    backend = HashingEmbeddingBackend(dimensions=64)
+    EmbeddingCache(path).embed(backend, texts[:1])
+    assert backend.calls == 1
+
+
+def test_scorer_decisions() -> None:
+    scorer = EmbeddingRelevanceScorer(
+        HashingEmbeddingBackend(),
+        EmbeddingRelevanceConfig(prototypes=WILDFIRE_TEXTS, irrelevant_below=0.3, relevant_above=0.9),
+    )
+
+    assert scorer.evaluate(WILDFIRE_TEXTS[0]).decision == "relevant"
+    assert scorer.evaluate("Firefighters were called to a house fire in Patras last night.").decision == "borderline"
+    assert scorer.evaluate(NOISE_TEXTS[0]).decision == "irrelevant"
+    # URLs and emoji do not count
+    assert scorer.evaluate(f"🔥 {WILDFIRE_TEXTS[1]} https://t.me/news/1").decision == "relevant"
+
+
+def test_scrape_embeds_in_batches_and_only_asks_the_llm_about_borderline_messages() -> None:
+    mix = MessageMix(num_messages=100, photo_ratio=0.0, video_ratio=0.0)
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    texts = sum(1 for message in messages if message.text)
+    relevant = sum(1 for message in messages if any(text in message.text for text in WILDFIRE_TEXTS))
+
+    backend = HashingEmbeddingBackend()
+    clear = EmbeddingRelevanceScorer(
+        backend, EmbeddingRelevanceConfig(irrelevant_below=0.3, relevant_above=0.4, batch_size=32)
+    )
+    report = run_benchmark(mix, relevance_scorer=clear)
+
+    assert report["llm_calls"].get("filterData", 0) == 0
+    assert report["llm_calls"]["messageData"] == relevant
+    # the prototypes, then one call per batch of messages
+    assert backend.calls == 1 + (mix.num_messages + 31) // 32
+
+    undecided = EmbeddingRelevanceScorer(
+        HashingEmbeddingBackend(), EmbeddingRelevanceConfig(irrelevant_below=-1.0, relevant_above=2.0)
+    )
+    report = run_benchmark(mix, relevance_scorer=undecided)
+
+    assert report["llm_calls"]["filterData"] == texts
+    assert report["llm_calls"]["messageData"] == relevant
+
+
+class LoopCheckingBackend(HashingEmbeddingBackend):
+    """
+    Records whether texts were embedded on the event loop.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.on_event_loop = 0
+
+    def embed(self, texts):
+        try:
+            asyncio.get_running_loop()
+            self.on_event_loop += 1
+        except RuntimeError:
+            pass
+        return super().embed(texts)
+
+
+def test_primed_scores_are_kept_by_the_caller() -> None:
+    backend = LoopCheckingBackend()
+    scorer = EmbeddingRelevanceScorer(
+        backend,
+        EmbeddingRelevanceConfig(prototypes=WILDFIRE_TEXTS, irrelevant_below=0.3, relevant_above=0.9, batch_size=2),
+    )
+
+    # two jobs sharing the scorer
+    first = scorer.prime(WILDFIRE_TEXTS[:3])
+    second = scorer.prime(NOISE_TEXTS[:3])
+    calls = backend.calls
+
+    assert scorer.evaluate(WILDFIRE_TEXTS[0], first).decision == "relevant"
+    assert scorer.evaluate(NOISE_TEXTS[0], second).decision == "irrelevant"
+    assert backend.calls == calls
+    assert WILDFIRE_TEXTS[0] not in first
+
+    report = run_benchmark(
+        MessageMix(num_messages=50, photo_ratio=0.0, video_ratio=0.0),
+        relevance_scorer=EmbeddingRelevanceScorer(backend, EmbeddingRelevanceConfig(batch_size=8)),
+    )
+    assert report["job_state"] == "finished"
+    assert backend.on_event_loop == 0
@@ -0,0 +1,156 @@
+import pytest
+
+from app.sdk.file_repository import FileRepository
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.models import KernelPlancksterSourceData, ProtocolEnum
+from app.sdk.retry import (
+    HTTPStatusError,
+    RetryPolicy,
+    call_with_retry,
+    is_retryable,
+    load_retry_policies,
+)
+from benchmarks.stand_ins import LocalKernelPlancksterServer
+
+
+FAST_POLICY = RetryPolicy(max_attempts=4, base_delay=0.001, max_delay=0.01, timeout=5.0, deadline=30.0)
+FAST_POLICIES = {
+    "generate_signed_url": FAST_POLICY,
+    "register_new_source_data": FAST_POLICY,
+    "public_upload": FAST_POLICY,
+}
+
+
+def _source_data(name: str = "photo.jpg") -> KernelPlancksterSourceData:
+    return KernelPlancksterSourceData(
+        name=name,
+        protocol=ProtocolEnum.S3,
+        relative_path=f"telegram/tracer/1/photos/{name}",
+    )
+
+
+def _gateway(server: LocalKernelPlancksterServer) -> KernelPlancksterGateway:
+    return KernelPlancksterGateway(
+        host=server.host,
+        port=str(server.port),
+        auth_token="test123",
+        scheme="http",
+        retry_policies=FAST_POLICIES,
+    )
+
+
+def test_call_with_retry_retries_retryable_errors() -> None:
+    delays: list[float] = []
+    attempts: list[int] = []
+
+    def call(attempt: int) -> str:
+        attempts.append(attempt)
+        if attempt < 3:
+            raise HTTPStatusError("unavailable", 503)
+        return "ok"
+
+    assert call_with_retry("test", FAST_POLICY, call, sleep=delays.append) == "ok"
+    assert attempts == [1, 2, 3]
+    assert len(delays) == 2
+
+
+def test_call_with_retry_does_not_retry_other_errors() -> None:
+    attempts: list[int] = []
+
+    def call(attempt: int) -> None:
+        attempts.append(attempt)
+        raise HTTPStatusError("forbidden", 403)
+
+    with pytest.raises(HTTPStatusError):
+        call_with_retry("test", FAST_POLICY, call, sleep=lambda _: None)
+    assert attempts == [1]
+
+
+def test_call_with_retry_gives_up_after_max_attempts_or_deadline() -> None:
+    attempts: list[int] = []
+
+    def call(attempt: int) -> None:
+        attempts.append(attempt)
+        raise HTTPStatusError("unavailable", 503)
+
+    with pytest.raises(HTTPStatusError):
+        call_with_retry("test", FAST_POLICY, call, sleep=lambda _: None)
+    assert len(attempts) == FAST_POLICY.max_attempts
+
+    attempts.clear()
+    tight_deadline = FAST_POLICY.model_copy(update={"base_delay": 10.0, "max_delay": 10.0, "jitter": 0.0, "deadline": 5.0})
+    with pytest.raises(HTTPStatusError):
+        call_with_retry("test", tight_deadline, call, sleep=lambda _: None)
+    assert attempts == [1]
+
+
+def test_retry_delays_back_off_exponentially_up_to_the_cap() -> None:
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=0.0)
+    assert [policy.delay(retry) for retry in range(1, 6)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    jittered = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=1.0)
+    assert all(0.0 <= jittered.delay(3) <= 4.0 for _ in range(100))
+
+
+def test_load_retry_policies_overrides_per_endpoint() -> None:
+    policies = load_retry_policies('{"public_upload": {"max_attempts": 8}, "custom": {"timeout": 1}}')
+
+    assert policies["public_upload"].max_attempts == 8
+    assert policies["public_upload"].timeout == 300.0
+    assert policies["generate_signed_url"].max_attempts == 4
+    assert policies["custom"].timeout == 1.0
+    assert is_retryable(HTTPStatusError("too many requests", 429), policies["custom"])
+    assert not is_retryable(ValueError("bad response"), policies["custom"])
+
+
+def test_gateway_retries_flaky_signed_url_generation() -> None:
+    with LocalKernelPlancksterServer() as server:
+        server.state.faults = {"upload-credentials": [503, 0, 502]}
+        gateway = _gateway(server)
+
+        signed_url = gateway.generate_signed_url(_source_data())
+
+    assert signed_url.startswith(f"{server.url}/upload/")
+    assert server.state.requests["upload-credentials"] == 4
+
+
+def test_gateway_does_not_retry_client_errors() -> None:
+    with LocalKernelPlancksterServer() as server:
+        server.state.faults = {"upload-credentials": [403]}
+        gateway = _gateway(server)
+
+        with pytest.raises(ValueError):
+            gateway.generate_signed_url(_source_data())
+
+    assert server.state.requests["upload-credentials"] == 1
+
+
+def test_gateway_registers_once_when_the_response_is_lost() -> None:
+    source_data = _source_data()
+    with LocalKernelPlancksterServer() as server:
+        # the source data is registered, but the response of the first attempt is an error
+        server.state.faults = {"register": [503]}
+        gateway = _gateway(server)
+
+        registered = gateway.register_new_source_data(source_data)
+        registered_again = gateway.register_new_source_data(source_data)
+
+    assert registered["relative_path"] == source_data.relative_path
+    assert registered_again == registered
+    assert server.state.registered == [registered]
+    assert server.state.requests["register"] == 1
+
+
+def test_file_repository_retries_flaky_uploads(tmp_path) -> None:
+    file_path = tmp_path / "photo.jpg"
+    file_path.write_bytes(b"x" * 4096)
+
+    with LocalKernelPlancksterServer() as server:
+        server.state.faults = {"upload": [500, 0]}
+        gateway = _gateway(server)
+        file_repository = FileRepository(protocol=ProtocolEnum.S3, retry_policies=FAST_POLICIES)
+
+        file_repository.public_upload(gateway.generate_signed_url(_source_data()), str(file_path))
+
+    assert server.state.uploaded == {_source_data().relative_path: 4096}
+    assert server.state.requests["upload"] == 3
@@ -0,0 +1,57 @@
+import datetime
+
+from app.rule_extraction import EXTRACTION_PATHS, RuleBasedExtractor, RuleExtractorConfig
+from app.scraper import messageData
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient, WILDFIRE_TEXTS
+
+
+def test_dates() -> None:
+    extractor = RuleBasedExtractor()
+    august_12 = {datetime.date(2024, 8, 12)}
+
+    for text in [
+        "fire on 12.08.2024.",
+        "fire on 12/08/2024",
+        "fire on 2024-08-12",
+        "fire on 12 august 2024",
+        "fire on august 12th, 2024",
+        "incendio el 12 de agosto de 2024",
+        "πυρκαγια στις 12 αυγουστου 2024",
+    ]:
+        assert extractor.dates(text) == august_12, text
+
+    assert extractor.dates("on 13/08/2024 and 08/13/2024") == {datetime.date(2024, 8, 13)}
+    assert RuleBasedExtractor(RuleExtractorConfig(day_first=False)).dates("05.08.2024") == {datetime.date(2024, 5, 8)}
+    assert extractor.dates("31.02.2024, version 1.2.2024.5, call 12.08.20245") == set()
+
+
+def test_extract_only_unambiguous_fields() -> None:
+    extractor = RuleBasedExtractor()
+
+    fields = extractor.extract("Πυρκαγιά στις 12 Αυγούστου 2024 στην Πάτρα https://t.me/news/1")
+    assert messageData(**fields) == messageData(
+        city="Patras", country="Greece", year=2024, month="August", day="12", disaster_type="Wildfire"
+    )
+    assert extractor.extract("Fire in Palermo, Italy") == {"city": "Palermo", "country": "Italy"}
+    assert extractor.extract("Forest fire in the north of Greece") == {"country": "Greece", "disaster_type": "Wildfire"}
+    # two cities, two dates, or a country contradicting the city
+    assert extractor.extract("Smoke from Athens to Patras, 12.08.2024 or 13.08.2024") == {}
+    assert extractor.extract("Fire near Athens, Italy") == {}
+
+
+def test_scrape_only_asks_the_llm_for_unresolved_fields() -> None:
+    mix = MessageMix(num_messages=60, photo_ratio=0.0, video_ratio=0.0)
+    client = SyntheticTelegramClient(mix)
+    texts = [client.build_message(i).text for i in range(1, mix.num_messages + 1)]
+    # the first report states its date and place, the others have no date
+    stated = sum(1 for text in texts if WILDFIRE_TEXTS[0] in text)
+    partial = sum(1 for text in texts if any(wildfire in text for wildfire in WILDFIRE_TEXTS[1:]))
+    rules_before = EXTRACTION_PATHS.get(path="rules")
+
+    report = run_benchmark(mix, rule_extractor=RuleBasedExtractor())
+
+    assert "messageData" not in report["llm_calls"]
+    assert report["llm_calls"]["partialMessageData"] == partial
+    assert report["stages"]["rule_extraction"]["count"] == stated + partial
+    assert EXTRACTION_PATHS.get(path="rules") - rules_before == stated
@@ -0,0 +1,45 @@
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient, WILDFIRE_TEXTS
+from app.sdk.models import BaseJobState
+
+
+def _expected_counts(mix: MessageMix) -> tuple[int, int]:
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    media = sum(1 for message in messages if message.media is not None)
+    relevant = sum(
+        1
+        for message in messages
+        if message.text and any(text in message.text for text in WILDFIRE_TEXTS)
+    )
+    return media, relevant
+
+
+def test_scrape_offline_end_to_end() -> None:
+
+    mix = MessageMix(
+        num_messages=40,
+        photo_ratio=0.2,
+        video_ratio=0.1,
+        photo_bytes=1024,
+        video_bytes=4096,
+    )
+    expected_media, expected_relevant = _expected_counts(mix)
+
+    report = run_benchmark(mix)
+
+    assert report["job_state"] == BaseJobState.FINISHED.value
+    job_output = report["job_output"]
+    assert job_output.source_data_list is not None
+    assert len(job_output.source_data_list) == expected_media
+
+    # every media item, plus the augmented json, is uploaded and registered
+    assert report["registered_source_data"] == expected_media + 1
+    assert report["llm_calls"]["messageData"] == expected_relevant
+
+    stages = report["stages"]
+    assert stages["telegram_download_media"]["count"] == expected_media
+    assert stages["storage_public_upload"]["count"] == expected_media + 1
+    assert stages["telegram_iter_messages"]["count"] == mix.num_messages + 1
+    assert report["messages_per_second"] > 0
+    assert report["peak_rss_mb"] > 0
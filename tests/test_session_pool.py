@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from app.session_pool import TelegramSessionPool
+
+
+class FakeTelegramClient:
+    def __init__(self, session_string: str) -> None:
+        self.session_string = session_string
+        self.connected = False
+        self.connects = 0
+        self.authorized = True
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def connect(self) -> None:
+        await asyncio.sleep(0)
+        self.connects += 1
+        self.connected = True
+
+    async def is_user_authorized(self) -> bool:
+        return self.authorized
+
+    async def disconnect(self) -> None:
+        self.connected = False
+
+
+def _pool(max_clients: int = 2) -> tuple[TelegramSessionPool, list[FakeTelegramClient]]:
+    created: list[FakeTelegramClient] = []
+
+    def factory(session_string: str) -> FakeTelegramClient:
+        client = FakeTelegramClient(session_string)
+        created.append(client)
+        return client
+
+    pool = TelegramSessionPool(
+        telegram_api_id="1",
+        telegram_api_hash="hash",
+        session_string="session",
+        max_clients=max_clients,
+        client_factory=factory,
+    )
+    return pool, created
+
+
+def test_clients_are_reused_across_leases() -> None:
+
+    pool, created = _pool()
+
+    async def run() -> None:
+        async with pool.lease(job_id=1) as first:
+            assert first.is_connected()
+        async with pool.lease(job_id=2) as second:
+            assert second is first
+
+    asyncio.run(run())
+
+    assert len(created) == 1
+    assert created[0].connects == 1
+    assert created[0].session_string == "session"
+    assert pool.idle == 1
+
+
+def test_leases_are_bounded_and_exclusive() -> None:
+
+    pool, created = _pool(max_clients=2)
+    holders: dict[int, int] = {}
+    max_in_use = 0
+
+    async def job(job_id: int) -> None:
+        nonlocal max_in_use
+        async with pool.lease(job_id) as client:
+            assert id(client) not in holders.values()
+            holders[job_id] = id(client)
+            max_in_use = max(max_in_use, len(holders))
+            await asyncio.sleep(0.01)
+            del holders[job_id]
+
+    async def run() -> None:
+        await asyncio.gather(*(job(i) for i in range(6)))
+
+    asyncio.run(run())
+
+    assert len(created) == 2
+    assert max_in_use == 2
+
+
+def test_dropped_connections_are_reconnected_lazily() -> None:
+
+    pool, created = _pool()
+
+    async def run() -> None:
+        async with pool.lease(job_id=1) as client:
+            pass
+        await client.disconnect()
+        async with pool.lease(job_id=2) as client:
+            assert client.is_connected()
+
+    asyncio.run(run())
+
+    assert created[0].connects == 2
+
+
+def test_unauthorized_session_is_rejected_and_releases_the_slot() -> None:
+
+    pool, created = _pool(max_clients=1)
+
+    def unauthorized(session_string: str) -> FakeTelegramClient:
+        client = FakeTelegramClient(session_string)
+        client.authorized = False
+        created.append(client)
+        return client
+
+    pool._client_factory = unauthorized
+
+    async def run() -> None:
+        for job_id in range(2):
+            with pytest.raises(ValueError):
+                async with pool.lease(job_id):
+                    pass
+
+    asyncio.run(run())
+
+    assert pool.size == 0
+    assert len(created) == 2
+
+
+def test_missing_session_file_is_reported() -> None:
+
+    pool = TelegramSessionPool(
+        telegram_api_id="1",
+        telegram_api_hash="hash",
+        session_name="does-not-exist",
+    )
+
+    async def run() -> None:
+        async with pool.lease(job_id=1):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+
+from app.scraper import scrape
+from app.sdk.file_repository import FileRepository
+from app.sdk.kernel_plackster_gateway import KernelPlancksterGateway
+from app.sdk.models import BaseJobState, ProtocolEnum
+from app.sdk.scraped_data_repository import ScrapedDataRepository
+from app.streaming import MicroBatcher, StreamConfig
+from benchmarks.stand_ins import (
+    FakeGeocoder,
+    FakeInstructorClient,
+    LocalKernelPlancksterServer,
+    MessageMix,
+    SyntheticTelegramClient,
+    WILDFIRE_TEXTS,
+)
+
+
+def test_micro_batches_are_due_by_size_or_age() -> None:
+    now = [100.0]
+    batcher = MicroBatcher(StreamConfig(batch_size=3, batch_seconds=5.0), clock=lambda: now[0])
+    message = lambda message_id: type("Message", (), {"id": message_id, "date": None})()  # noqa: E731
+
+    assert not batcher.due() and batcher.latency_summary() is None
+    batcher.add(message(1))
+    batcher.add(message(2))
+    assert not batcher.due()
+    batcher.add(message(3))
+    assert batcher.due()
+    now[0] += 2.0
+    assert batcher.take() == [1, 2, 3] and len(batcher) == 0
+
+    batcher.add(message(4))
+    now[0] += 5.0
+    assert batcher.due()
+    batcher.take()
+
+    summary = batcher.latency_summary()
+    assert summary["count"] == 4 and summary["max_seconds"] == 5.0  # type: ignore
+    assert batcher.batches == 2
+
+
+def test_streamed_messages_are_registered_in_micro_batches() -> None:
+    mix = MessageMix(num_messages=24, photo_ratio=0.2, video_ratio=0.0, album_ratio=0.3, album_size=4)
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    instructor_client = FakeInstructorClient()
+    stop = asyncio.Event()
+
+    async def publish() -> None:
+        # give the job time to subscribe, then post an album's worth of messages at a time
+        await asyncio.sleep(0.2)
+        for start in range(1, mix.num_messages + 1, mix.album_size):
+            await client.publish(list(range(start, start + mix.album_size)))
+            await asyncio.sleep(0.05)
+        stop.set()
+
+    async def run(repository: ScrapedDataRepository):
+        job_output, _ = await asyncio.gather(
+            scrape(
+                job_id=1,
+                channel_name="benchmark",
+                tracer_id="stream",
+                scraped_data_repository=repository,
+                telegram_client=client,  # type: ignore
+                openai_api_key="",
+                log_level=logging.WARNING,  # type: ignore
+                instructor_client=instructor_client,  # type: ignore
+                geolocator=FakeGeocoder(),  # type: ignore
+                stream=StreamConfig(batch_size=8, batch_seconds=0.1),
+                stop=stop,
+            ),
+            publish(),
+        )
+        return job_output
+
+    with LocalKernelPlancksterServer() as server:
+        repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=KernelPlancksterGateway(
+                host=server.host, port=str(server.port), auth_token="bench", scheme="http"
+            ),
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+        )
+        job_output = asyncio.run(run(repository))
+        registered = [source_data["relative_path"] for source_data in server.state.registered]
+
+    assert job_output.job_state == BaseJobState.FINISHED
+    # every message went through the same steps as a crawl
+    assert instructor_client.calls["filterData"] == sum(1 for message in messages if message.text)
+    with_media = [message for message in messages if message.media]
+    assert sum(1 for path in registered if "/photos/" in path) == len(with_media)
+    album_paths = {path.split("-album-")[1].split("-")[0] for path in registered if "-album-" in path}
+    assert album_paths == {str(m.grouped_id) for m in messages if m.grouped_id}
+    # once their micro-batch is registered, the job drops the state of its messages, albums and source data included
+    assert not job_output.albums and len(job_output.source_data_list) < len(registered)
+
+    batches = [path for path in registered if "/augmented/" in path]
+    assert batches and all(path.rsplit("/", 1)[-1].startswith("batch-") for path in batches)
+    assert not any(path.endswith("augmented/data.json") for path in registered)
+
+    latency = job_output.message_latency
+    assert latency["count"] == mix.num_messages  # type: ignore
+    assert 0 <= latency["p50_seconds"] <= latency["p95_seconds"] <= latency["max_seconds"] < 5  # type: ignore
+
+
+def test_deferred_media_of_streams_keep_their_relevance() -> None:
+    mix = MessageMix(num_messages=24, photo_ratio=0.4, video_ratio=0.0, album_ratio=0.3, album_size=4)
+    client = SyntheticTelegramClient(mix)
+    messages = [client.build_message(i) for i in range(1, mix.num_messages + 1)]
+    stop = asyncio.Event()
+
+    async def publish() -> None:
+        await asyncio.sleep(0.2)
+        for start in range(1, mix.num_messages + 1, mix.album_size):
+            await client.publish(list(range(start, start + mix.album_size)))
+            await asyncio.sleep(0.05)
+        stop.set()
+
+    with LocalKernelPlancksterServer() as server:
+        repository = ScrapedDataRepository(
+            protocol=ProtocolEnum.S3,
+            kernel_planckster=KernelPlancksterGateway(
+                host=server.host, port=str(server.port), auth_token="bench", scheme="http"
+            ),
+            file_repository=FileRepository(protocol=ProtocolEnum.S3),
+        )
+
+        async def run():
+            job_output, _ = await asyncio.gather(
+                scrape(
+                    job_id=1,
+                    channel_name="benchmark",
+                    tracer_id="stream",
+                    scraped_data_repository=repository,
+                    telegram_client=client,  # type: ignore
+                    openai_api_key="",
+                    log_level=logging.WARNING,  # type: ignore
+                    instructor_client=FakeInstructorClient(),  # type: ignore
+                    geolocator=FakeGeocoder(),  # type: ignore
+                    defer_media=True,
+                    stream=StreamConfig(batch_size=4, batch_seconds=0.1),
+                    stop=stop,
+                ),
+                publish(),
+            )
+            return job_output
+
+        job_output = asyncio.run(run())
+
+    def is_relevant(message) -> bool:
+        if message.grouped_id:
+            message = next(m for m in messages if m.grouped_id == message.grouped_id and m.text)
+        return any(text in message.text for text in WILDFIRE_TEXTS)
+
+    deferred = job_output.deferred_media
+    assert sorted(record.message_id for record in deferred) == [m.id for m in messages if m.media]  # type: ignore
+    relevant = {m.id for m in messages if m.media and is_relevant(m)}
+    assert relevant and {record.message_id for record in deferred if record.relevant} == relevant  # type: ignore
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import tempfile
+import time
+
+import orjson
+import pytest
+
+from app.sdk.tracing import (
+    FileSpanExporter,
+    InMemorySpanExporter,
+    Tracer,
+    start_span,
+    trace_id_from_tracer_id,
+)
+
+
+def test_child_spans_inherit_trace_and_attributes() -> None:
+
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.start_span(
+        "telegram.message", attributes={"tracer_id": "test-tracer", "job_id": 1}
+    ) as root:
+        with start_span("openai.filter") as child:
+            pass
+
+    assert root is not None and child is not None
+    assert root.trace_id == trace_id_from_tracer_id("test-tracer")
+    assert child.trace_id == root.trace_id
+    assert child.parent_span_id == root.span_id
+    assert child.attributes == {"tracer_id": "test-tracer", "job_id": 1}
+    # children end first
+    assert [span.name for span in exporter.spans] == ["openai.filter", "telegram.message"]
+
+
+def test_span_status_on_error() -> None:
+
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter)
+
+    with pytest.raises(ValueError):
+        with tracer.start_span("failing"):
+            raise ValueError("boom")
+
+    assert exporter.spans[0].to_otlp()["status"] == {"code": 2, "message": "ValueError: boom"}
+
+
+def test_spans_are_isolated_across_tasks() -> None:
+
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter)
+
+    async def process(message_id: int) -> None:
+        with tracer.start_span("telegram.message", attributes={"message_id": message_id}):
+            await asyncio.sleep(0)
+            with start_span("telegram.download"):
+                await asyncio.sleep(0)
+
+    async def run() -> None:
+        await asyncio.gather(*(process(i) for i in range(5)))
+
+    asyncio.run(run())
+
+    roots = {span.span_id: span for span in exporter.spans if span.name == "telegram.message"}
+    children = [span for span in exporter.spans if span.name == "telegram.download"]
+    assert len(roots) == 5 and len(children) == 5
+    # every child is attached to its own message span
+    assert {child.parent_span_id for child in children} == set(roots)
+    for child in children:
+        assert roots[child.parent_span_id].trace_id == child.trace_id
+
+
+def test_start_span_without_active_trace_is_noop() -> None:
+
+    with start_span("orphan") as span:
+        assert span is None
+
+
+def test_file_exporter_writes_otlp_json_lines() -> None:
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "traces", "spans.jsonl")
+        tracer = Tracer(FileSpanExporter(path, batch_size=2))
+
+        for i in range(3):
+            with tracer.start_span("telegram.message", attributes={"tracer_id": "t", "message_id": i}):
+                pass
+        tracer.flush()
+
+        with open(path, "rb") as f:
+            lines = [orjson.loads(line) for line in f]
+
+    # one full batch, then the flushed remainder
+    assert len(lines) == 2
+    spans = [
+        span
+        for line in lines
+        for scope_spans in line["resourceSpans"][0]["scopeSpans"]
+        for span in scope_spans["spans"]
+    ]
+    assert len(spans) == 3
+    assert {"key": "message_id", "value": {"intValue": "2"}} in spans[-1]["attributes"]
+
+
+def test_tracing_overhead_is_low() -> None:
+
+    tracer = Tracer(InMemorySpanExporter())
+
+    num_spans = 2000
+    start = time.perf_counter()
+    for i in range(num_spans):
+        with tracer.start_span("telegram.message", attributes={"tracer_id": "t", "job_id": 1}):
+            with start_span("openai.filter"):
+                pass
+    per_message = (time.perf_counter() - start) / num_spans
+
+    # Generous bound for slow CI machines; typically well under 50us
+    assert per_message < 1e-3
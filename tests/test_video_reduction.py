@@ -0,0 +1,81 @@
+import os
+import subprocess
+
+import pytest
+from PIL import Image
+
+from app.sdk.models import BaseJobState
+from app.sdk.process_pool import shutdown_process_pool
+from app.sdk.video_reduction import VideoReductionConfig, ffmpeg_binary, reduce_video, video_duration
+from benchmarks.scrape_throughput import run_benchmark
+from benchmarks.stand_ins import MessageMix, SyntheticTelegramClient
+
+
+@pytest.fixture(scope="module")
+def fixture_video(tmp_path_factory) -> str:
+    """
+    A 4 second, 640x360 test pattern video with sound.
+    """
+    try:
+        binary = ffmpeg_binary()
+    except RuntimeError:
+        pytest.skip("ffmpeg is not available")
+    path = str(tmp_path_factory.mktemp("videos") / "fixture.mp4")
+    subprocess.run(
+        [
+            binary, "-hide_banner", "-nostdin", "-y",
+            "-f", "lavfi", "-i", "testsrc=duration=4:size=640x360:rate=25",
+            "-f", "lavfi", "-i", "sine=duration=4",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-b:v", "2M", "-c:a", "aac", "-shortest",
+            path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return path
+
+
+def test_extracts_evenly_spread_keyframes(fixture_video, tmp_path) -> None:
+    config = VideoReductionConfig(mode="keyframes", keyframes=3, max_dimension=320)
+
+    reduced = reduce_video(fixture_video, str(tmp_path / "video"), config)
+
+    assert reduced.duration == pytest.approx(4.0, abs=0.1)
+    assert len(reduced.files) == 3
+    for file_name in reduced.files:
+        with Image.open(file_name) as image:
+            assert image.format == "JPEG"
+            assert image.size == (320, 180)
+
+
+def test_transcodes_a_smaller_proxy(fixture_video, tmp_path) -> None:
+    config = VideoReductionConfig(mode="proxy", max_dimension=240, proxy_bitrate="100k")
+
+    reduced = reduce_video(fixture_video, str(tmp_path / "video"), config)
+
+    (proxy,) = reduced.files
+    assert video_duration(proxy) == pytest.approx(4.0, abs=0.2)
+    assert os.path.getsize(proxy) < os.path.getsize(fixture_video)
+
+
+@pytest.mark.parametrize("original", ["upload", "defer", "drop"])
+def test_scrape_uploads_keyframes_instead_of_videos(fixture_video, original) -> None:
+    mix = MessageMix(num_messages=12, photo_ratio=0.0, video_ratio=0.4, video_file=fixture_video)
+    client = SyntheticTelegramClient(mix)
+    videos = sum(1 for i in range(1, mix.num_messages + 1) if client.build_message(i).media is not None)
+    assert videos
+
+    try:
+        report = run_benchmark(
+            mix, video_reduction=VideoReductionConfig(keyframes=2, max_dimension=160, original=original)
+        )
+    finally:
+        shutdown_process_pool()
+
+    assert report["job_state"] == BaseJobState.FINISHED.value
+    paths = report["registered_paths"]
+    assert sum(1 for path in paths if "/keyframes/" in path) == 2 * videos
+    assert sum(1 for path in paths if path.endswith(".video")) == (videos if original == "upload" else 0)
+    deferred = report["job_output"].deferred_media
+    assert len(deferred) == (videos if original == "defer" else 0)
+    assert report["stages"]["video_reduction"]["count"] == videos